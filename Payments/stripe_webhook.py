@@ -1,19 +1,20 @@
 import os
+import sys
 from fastapi import FastAPI, Request, HTTPException
 import httpx
 import stripe
-from supabase import create_client, Client
+
+# Shared payment ledger in common/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from common.payment_ledger import record_payment
 
 app = FastAPI()
 
-# Environment variables
+# Environment variables (SUPABASE_URL and SUPABASE_SERVICE_KEY are read by common.supabase_client)
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 SERVICE_BOT_URL = os.getenv("SERVICE_BOT_URL")  # e.g., webhook endpoint for c0r_ai_Service_Bot
 
 stripe.api_key = STRIPE_SECRET_KEY
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 @app.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
@@ -34,20 +35,13 @@ async def stripe_webhook(request: Request):
         amount = intent["amount_received"] / 100  # Stripe uses cents
         # Determine credits to add (example: 10 for $2.99, 100 for $19.99)
         credits = 10 if amount < 10 else 100
-        # Update user credits in Supabase
-        user_res = supabase.table("users").select("id, credits_remaining").eq("telegram_id", telegram_user_id).execute()
-        if not user_res.data:
+        # Stripe retries deliveries - the ledger grants the credits of a PaymentIntent once
+        result = await record_payment("stripe", telegram_user_id, credits, payment_id=intent["id"],
+                                      amount=amount, event_type=event["type"])
+        if result is None:
             raise HTTPException(status_code=404, detail="User not found")
-        user_id = user_res.data[0]["id"]
-        new_credits = user_res.data[0]["credits_remaining"] + credits
-        supabase.table("users").update({"credits_remaining": new_credits}).eq("id", user_id).execute()
-        # Insert payment record
-        supabase.table("payments").insert({
-            "user_id": user_id,
-            "amount": amount,
-            "gateway": "stripe",
-            "status": "succeeded"
-        }).execute()
+        if result["status"] == "duplicate":
+            return {"status": "ok"}
         # Notify service bot (optional, via webhook or HTTP call)
         if SERVICE_BOT_URL:
             async with httpx.AsyncClient() as client:
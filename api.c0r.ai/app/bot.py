@@ -1,13 +1,13 @@
 import os
 import asyncio
-import time
-from collections import defaultdict
+from typing import Optional
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from handlers.commands import start_command, help_command, status_command, buy_credits_command, handle_action_callback
-from handlers.photo import photo_handler
+from handlers.photo import photo_handler, start_nutrition_workers
+from utils.report_charts import report_chart_cache
 from handlers.payments import handle_pre_checkout_query, handle_successful_payment, handle_buy_callback
 from handlers.profile import (
     profile_command,
@@ -22,76 +22,74 @@ from handlers.daily import daily_command, handle_daily_callback
 from handlers.nutrition import nutrition_insights_command, weekly_report_command, water_tracker_command, process_nutrition_photo, NutritionStates
 from handlers.language import language_command, handle_language_callback
 from i18n.i18n import i18n
+from config import (
+    RATE_LIMITS, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_REDIS_URL,
+    TELEGRAM_GLOBAL_SEND_RATE, TELEGRAM_CHAT_SEND_RATE, TELEGRAM_GROUP_SEND_RATE,
+    BROADCAST_DB_PATH, BROADCAST_BATCH_SIZE, BROADCAST_CONCURRENCY
+)
+from common.supabase_client import get_users_page
+from utils.rate_limiter import create_rate_limiter
+from utils.send_scheduler import OutboundScheduler
+from utils.broadcast import BroadcastEngine, BroadcastStore
 from loguru import logger
 
 # Must be set in .env file
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 bot = Bot(token=TOKEN)
 
+# All outgoing messages go through the scheduler to respect Telegram send limits
+bot.session.middleware(OutboundScheduler(
+    global_rate=TELEGRAM_GLOBAL_SEND_RATE,
+    chat_rate=TELEGRAM_CHAT_SEND_RATE,
+    group_rate=TELEGRAM_GROUP_SEND_RATE
+))
+
+# Announcements to many users, sent with low priority behind regular replies
+broadcast_engine = BroadcastEngine(
+    BroadcastStore(BROADCAST_DB_PATH),
+    get_users_page,
+    batch_size=BROADCAST_BATCH_SIZE,
+    concurrency=BROADCAST_CONCURRENCY
+)
+
 # Create dispatcher with memory storage for FSM
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
-# Anti-spam protection - Rate limiting
-class RateLimiter:
-    def __init__(self):
-        self.requests = defaultdict(list)
-        self.photo_requests = defaultdict(list)
-        
-    def is_rate_limited(self, user_id: int, request_type: str = "general") -> bool:
-        """Check if user is rate limited"""
-        current_time = time.time()
-        
-        if request_type == "photo":
-            # Photo analysis: max 5 photos per minute
-            user_requests = self.photo_requests[user_id]
-            # Remove old requests (older than 1 minute)
-            user_requests[:] = [req_time for req_time in user_requests if current_time - req_time < 60]
-            
-            if len(user_requests) >= 5:
-                return True
-            
-            user_requests.append(current_time)
-            return False
-        else:
-            # General commands: max 20 requests per minute
-            user_requests = self.requests[user_id]
-            # Remove old requests (older than 1 minute)
-            user_requests[:] = [req_time for req_time in user_requests if current_time - req_time < 60]
-            
-            if len(user_requests) >= 20:
-                return True
-            
-            user_requests.append(current_time)
-            return False
-    
-    def get_remaining_time(self, user_id: int, request_type: str = "general") -> int:
-        """Get remaining time until user can make next request"""
-        current_time = time.time()
-        
-        if request_type == "photo":
-            user_requests = self.photo_requests[user_id]
-            if user_requests:
-                return max(0, int(60 - (current_time - user_requests[0])))
-        else:
-            user_requests = self.requests[user_id]
-            if user_requests:
-                return max(0, int(60 - (current_time - user_requests[0])))
-        
-        return 0
+# Anti-spam protection - Rate limiting (limits configured in config.RATE_LIMITS)
+rate_limiter = create_rate_limiter(RATE_LIMITS, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_REDIS_URL)
 
-# Create rate limiter instance
-rate_limiter = RateLimiter()
+def get_request_type(event) -> Optional[str]:
+    """Map incoming event to rate limit action type, None if it should not be limited"""
+    if isinstance(event, types.CallbackQuery):
+        if event.data and event.data.startswith("buy_"):
+            return "payment"
+        return None
+    if not isinstance(event, types.Message):
+        return None
+    if event.successful_payment:
+        # Never drop payment confirmations
+        return None
+    if event.photo:
+        return "photo"
+    if event.text and event.text.startswith("/buy"):
+        return "payment"
+    return "general"
 
 # Rate limiting middleware
 async def rate_limit_middleware(handler, event, data: dict):
     """Middleware to check rate limits"""
-    # Only process messages, skip other events
-    if not isinstance(event, types.Message):
+    request_type = get_request_type(event)
+    if request_type is None:
+        return await handler(event, data)
+    
+    user_id = event.from_user.id
+    remaining = await rate_limiter.check(user_id, request_type)
+    if not remaining:
+        # Continue to handler if not rate limited
         return await handler(event, data)
     
-    message = event
-    user_id = message.from_user.id
+    logger.warning(f"Rate limit hit for {request_type} requests by user {user_id}")
     
     # Get user's language (default to English for rate limit messages)
     user_language = "en"
@@ -103,34 +101,31 @@ async def rate_limit_middleware(handler, event, data: dict):
     except:
         pass  # Use default English if we can't get user language
     
-    # Check for photo requests
-    if message.photo:
-        if rate_limiter.is_rate_limited(user_id, "photo"):
-            remaining = rate_limiter.get_remaining_time(user_id, "photo")
-            await message.answer(
-                f"{i18n.get_text('error_rate_limit_photo_title', user_language)}\n\n"
-                f"{i18n.get_text('error_rate_limit_photo', user_language, remaining=remaining)}",
-                parse_mode="Markdown"
-            )
-            logger.warning(f"Rate limit hit for photo analysis by user {user_id}")
-            return
+    if request_type == "photo":
+        text = (
+            f"{i18n.get_text('error_rate_limit_photo_title', user_language)}\n\n"
+            f"{i18n.get_text('error_rate_limit_photo', user_language, remaining=remaining)}"
+        )
+    elif request_type == "payment":
+        text = (
+            f"{i18n.get_text('error_rate_limit_title', user_language)}\n\n"
+            f"{i18n.get_text('error_rate_limit_payment', user_language, remaining=remaining)}"
+        )
     else:
-        # Check for general commands
-        if rate_limiter.is_rate_limited(user_id, "general"):
-            remaining = rate_limiter.get_remaining_time(user_id, "general")
-            await message.answer(
-                f"{i18n.get_text('error_rate_limit_title', user_language)}\n\n"
-                f"{i18n.get_text('error_rate_limit_general', user_language, remaining=remaining)}",
-                parse_mode="Markdown"
-            )
-            logger.warning(f"Rate limit hit for general commands by user {user_id}")
-            return
+        text = (
+            f"{i18n.get_text('error_rate_limit_title', user_language)}\n\n"
+            f"{i18n.get_text('error_rate_limit_general', user_language, remaining=remaining)}"
+        )
     
-    # Continue to handler if not rate limited
-    return await handler(event, data)
+    if isinstance(event, types.CallbackQuery):
+        await event.answer()
+        await event.message.answer(text, parse_mode="Markdown")
+    else:
+        await event.answer(text, parse_mode="Markdown")
 
 # Register middleware
 dp.message.middleware(rate_limit_middleware)
+dp.callback_query.middleware(rate_limit_middleware)
 
 # Command handlers
 dp.message.register(start_command, Command(commands=["start"]))
@@ -226,6 +221,17 @@ async def start_bot():
         # Clear webhook to ensure polling mode
         await bot.delete_webhook(drop_pending_updates=True)
         
+        # Start background workers for queued photo analysis
+        await start_nutrition_workers(bot)
+        
+        # Drop chart file_ids of past report weeks
+        purged = await report_chart_cache.purge_expired()
+        if purged:
+            logger.info(f"Purged {purged} expired report chart cache entries")
+        
+        # Continue broadcasts interrupted by a restart
+        await broadcast_engine.resume(bot)
+        
         # Start polling
         await dp.start_polling(bot, skip_updates=True)
         
@@ -31,4 +31,40 @@ PAYMENT_PLANS = {
         "recurring": True,
         "interval": "month"
     }
-} 
\ No newline at end of file
+}
+
+# Anti-spam rate limits per action type
+# limit: requests allowed per period (in seconds), refilled evenly over the period
+RATE_LIMITS = {
+    "general": {"limit": 20, "period": 60},
+    "photo": {"limit": 5, "period": 60},
+    "payment": {"limit": 5, "period": 60},
+}
+
+# Maximum number of users tracked in memory by the rate limiter
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Optional shared backend (Redis) so limits hold across bot replicas
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# Background photo analysis queue (durable local SQLite)
+PHOTO_QUEUE_DB_PATH = os.getenv("PHOTO_QUEUE_DB_PATH", "data/jobs.db")
+PHOTO_QUEUE_WORKERS = int(os.getenv("PHOTO_QUEUE_WORKERS", "4"))
+PHOTO_QUEUE_MAX_ATTEMPTS = int(os.getenv("PHOTO_QUEUE_MAX_ATTEMPTS", "3"))
+
+# Photo analysis result cache keyed by Telegram file_unique_id
+ANALYSIS_CACHE_DB_PATH = os.getenv("ANALYSIS_CACHE_DB_PATH", "data/analysis_cache.db")
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(7 * 86400)))
+
+# Outbound Telegram send limits (messages per second)
+TELEGRAM_GLOBAL_SEND_RATE = float(os.getenv("TELEGRAM_GLOBAL_SEND_RATE", "30"))
+TELEGRAM_CHAT_SEND_RATE = 1.0
+TELEGRAM_GROUP_SEND_RATE = 20 / 60
+
+# Broadcasts to users (progress checkpoints in local SQLite)
+BROADCAST_DB_PATH = os.getenv("BROADCAST_DB_PATH", "data/broadcasts.db")
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "500"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+
+# Repeated buy taps within this many seconds point to the unpaid invoice already sent
+PENDING_INVOICE_TTL = int(os.getenv("PENDING_INVOICE_TTL", "3600"))
@@ -8,7 +8,7 @@ from aiogram.fsm.context import FSMContext
 from loguru import logger
 from common.supabase_client import get_or_create_user, log_user_action, get_user_with_profile, get_daily_calories_consumed, get_user_total_paid
 from .keyboards import create_main_menu_keyboard, create_main_menu_text
-from i18n.i18n import i18n
+from i18n.i18n import i18n, static_screen
 from .language import detect_and_set_user_language
 from config import VERSION, PAYMENT_PLANS
 
@@ -68,6 +68,47 @@ async def start_command(message: types.Message):
         logger.error(f"Error in /start: {e}")
         await message.answer(i18n.get_text("error_general", "en"))
 
+@static_screen
+def render_help_screen(language: str):
+    """Help text and keyboard (static per language)"""
+    help_text = (
+        f"{i18n.get_text('help_title', language)}\n\n"
+        f"{i18n.get_text('help_usage_title', language)}\n"
+        f"{i18n.get_text('help_usage_1', language)}\n"
+        f"{i18n.get_text('help_usage_2', language)}\n"
+        f"{i18n.get_text('help_usage_3', language)}\n\n"
+        f"{i18n.get_text('help_credits_title', language)}\n"
+        f"{i18n.get_text('help_credits_1', language)}\n"
+        f"{i18n.get_text('help_credits_2', language)}\n\n"
+        f"{i18n.get_text('help_credits_explanation', language)}\n\n"
+        f"{i18n.get_text('help_features_title', language)}\n"
+        f"{i18n.get_text('help_features_1', language)}\n"
+        f"{i18n.get_text('help_features_2', language)}\n"
+        f"{i18n.get_text('help_features_3', language)}\n"
+        f"{i18n.get_text('help_features_4', language)}\n\n"
+        f"{i18n.get_text('help_commands_title', language)}\n"
+        f"{i18n.get_text('help_commands_1', language)}\n"
+        f"{i18n.get_text('help_commands_2', language)}\n"
+        f"{i18n.get_text('help_commands_3', language)}\n"
+        f"{i18n.get_text('help_commands_4', language)}\n"
+        f"{i18n.get_text('help_commands_5', language)}\n"
+        f"{i18n.get_text('help_commands_6', language)}\n"
+        f"{i18n.get_text('help_commands_7', language)}\n\n"
+        f"{i18n.get_text('help_credits_need', language)}\n"
+        f"{i18n.get_text('help_credits_info', language)}\n\n"
+        f"{i18n.get_text('help_support', language)}"
+    )
+    
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
+        [
+            types.InlineKeyboardButton(
+                text=i18n.get_text("btn_back", language),
+                callback_data="action_main_menu"
+            )
+        ]
+    ])
+    return help_text, keyboard
+
 # /help command handler
 async def help_command(message: types.Message):
     try:
@@ -88,43 +129,7 @@ async def help_command(message: types.Message):
             }
         )
         
-        # Create help text using i18n
-        help_text = (
-            f"{i18n.get_text('help_title', user_language)}\n\n"
-            f"{i18n.get_text('help_usage_title', user_language)}\n"
-            f"{i18n.get_text('help_usage_1', user_language)}\n"
-            f"{i18n.get_text('help_usage_2', user_language)}\n"
-            f"{i18n.get_text('help_usage_3', user_language)}\n\n"
-            f"{i18n.get_text('help_credits_title', user_language)}\n"
-            f"{i18n.get_text('help_credits_1', user_language)}\n"
-            f"{i18n.get_text('help_credits_2', user_language)}\n\n"
-            f"{i18n.get_text('help_credits_explanation', user_language)}\n\n"
-            f"{i18n.get_text('help_features_title', user_language)}\n"
-            f"{i18n.get_text('help_features_1', user_language)}\n"
-            f"{i18n.get_text('help_features_2', user_language)}\n"
-            f"{i18n.get_text('help_features_3', user_language)}\n"
-            f"{i18n.get_text('help_features_4', user_language)}\n\n"
-            f"{i18n.get_text('help_commands_title', user_language)}\n"
-            f"{i18n.get_text('help_commands_1', user_language)}\n"
-            f"{i18n.get_text('help_commands_2', user_language)}\n"
-            f"{i18n.get_text('help_commands_3', user_language)}\n"
-            f"{i18n.get_text('help_commands_4', user_language)}\n"
-            f"{i18n.get_text('help_commands_5', user_language)}\n"
-            f"{i18n.get_text('help_commands_6', user_language)}\n"
-            f"{i18n.get_text('help_commands_7', user_language)}\n\n"
-            f"{i18n.get_text('help_credits_need', user_language)}\n"
-            f"{i18n.get_text('help_credits_info', user_language)}\n\n"
-            f"{i18n.get_text('help_support', user_language)}"
-        )
-        
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [
-                types.InlineKeyboardButton(
-                    text=i18n.get_text("btn_back", user_language),
-                    callback_data="action_main_menu"
-                )
-            ]
-        ])
+        help_text, keyboard = render_help_screen(user_language)
         
         await message.answer(help_text, parse_mode="Markdown", reply_markup=keyboard)
         logger.info(f"/help by user {telegram_user_id} with language {user_language}")
@@ -148,41 +153,7 @@ async def help_callback(callback: types.CallbackQuery):
                 "credits_remaining": user['credits_remaining']
             }
         )
-        help_text = (
-            f"{i18n.get_text('help_title', user_language)}\n\n"
-            f"{i18n.get_text('help_usage_title', user_language)}\n"
-            f"{i18n.get_text('help_usage_1', user_language)}\n"
-            f"{i18n.get_text('help_usage_2', user_language)}\n"
-            f"{i18n.get_text('help_usage_3', user_language)}\n\n"
-            f"{i18n.get_text('help_credits_title', user_language)}\n"
-            f"{i18n.get_text('help_credits_1', user_language)}\n"
-            f"{i18n.get_text('help_credits_2', user_language)}\n\n"
-            f"{i18n.get_text('help_credits_explanation', user_language)}\n\n"
-            f"{i18n.get_text('help_features_title', user_language)}\n"
-            f"{i18n.get_text('help_features_1', user_language)}\n"
-            f"{i18n.get_text('help_features_2', user_language)}\n"
-            f"{i18n.get_text('help_features_3', user_language)}\n"
-            f"{i18n.get_text('help_features_4', user_language)}\n\n"
-            f"{i18n.get_text('help_commands_title', user_language)}\n"
-            f"{i18n.get_text('help_commands_1', user_language)}\n"
-            f"{i18n.get_text('help_commands_2', user_language)}\n"
-            f"{i18n.get_text('help_commands_3', user_language)}\n"
-            f"{i18n.get_text('help_commands_4', user_language)}\n"
-            f"{i18n.get_text('help_commands_5', user_language)}\n"
-            f"{i18n.get_text('help_commands_6', user_language)}\n"
-            f"{i18n.get_text('help_commands_7', user_language)}\n\n"
-            f"{i18n.get_text('help_credits_need', user_language)}\n"
-            f"{i18n.get_text('help_credits_info', user_language)}\n\n"
-            f"{i18n.get_text('help_support', user_language)}"
-        )
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [
-                types.InlineKeyboardButton(
-                    text=i18n.get_text("btn_back", user_language),
-                    callback_data="action_main_menu"
-                )
-            ]
-        ])
+        help_text, keyboard = render_help_screen(user_language)
         
         await callback.message.answer(help_text, parse_mode="Markdown", reply_markup=keyboard)
     except Exception as e:
@@ -329,6 +300,54 @@ async def status_callback(callback: types.CallbackQuery):
         logger.error(f"Status callback error traceback: {traceback.format_exc()}")
         await callback.message.answer("An error occurred while fetching your status. Please try again later.")
 
+@static_screen
+def render_buy_menu(language: str):
+    """
+    Static parts of the buy menu (per language)
+    
+    Returns:
+        (title, plans text, keyboard), the current credits go between title and plans
+    """
+    basic_price = PAYMENT_PLANS['basic']['price'] // 100  # Convert kopecks to rubles
+    pro_price = PAYMENT_PLANS['pro']['price'] // 100
+    credits_for = f"{i18n.get_text('credits', language)} {i18n.get_text('for', language)}"
+    
+    title = f"💳 **{i18n.get_text('buy_credits_title', language)}**\n\n"
+    plans = (
+        f"{i18n.get_text('credits_explanation', language)}\n\n"
+        f"📦 **{PAYMENT_PLANS['basic']['credits']} {credits_for} {basic_price}р**\n"
+        f"📦 **{PAYMENT_PLANS['pro']['credits']} {credits_for} {pro_price}р**\n\n"
+        f"{i18n.get_text('choose_plan_to_continue', language)}"
+    )
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
+        [
+            types.InlineKeyboardButton(
+                text=f"💰 {PAYMENT_PLANS['basic']['credits']} {credits_for} {basic_price}р",
+                callback_data="buy_basic"
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                text=f"💎 {PAYMENT_PLANS['pro']['credits']} {credits_for} {pro_price}р", 
+                callback_data="buy_pro"
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                text=i18n.get_text("btn_back", language),
+                callback_data="action_main_menu"
+            )
+        ]
+    ])
+    return title, plans, keyboard
+
+
+def render_buy_text(language: str, credits: int):
+    """Buy menu text and keyboard with the user's current credits"""
+    title, plans, keyboard = render_buy_menu(language)
+    current = f"**{i18n.get_text('current_credits', language, credits=credits)}**: *{credits}*\n\n"
+    return f"{title}{current}{plans}", keyboard
+
 # /buy command handler - NEW FEATURE
 async def buy_credits_command(message: types.Message):
     """
@@ -360,40 +379,9 @@ async def buy_credits_command(message: types.Message):
         # Get user's language
         user_language = user.get('language', 'en')
         
-        # Get prices from config
-        basic_price = PAYMENT_PLANS['basic']['price'] // 100  # Convert kopecks to rubles
-        pro_price = PAYMENT_PLANS['pro']['price'] // 100
-        
         # Show current credits and payment options
-        await message.answer(
-            f"💳 **{i18n.get_text('buy_credits_title', user_language)}**\n\n"
-            f"**{i18n.get_text('current_credits', user_language, credits=user['credits_remaining'])}**: *{user['credits_remaining']}*\n\n"
-            f"{i18n.get_text('credits_explanation', user_language)}\n\n"
-            f"📦 **{PAYMENT_PLANS['basic']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {basic_price}р**\n"
-            f"📦 **{PAYMENT_PLANS['pro']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {pro_price}р**\n\n"
-            f"{i18n.get_text('choose_plan_to_continue', user_language)}",
-            parse_mode="Markdown",
-            reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    types.InlineKeyboardButton(
-                        text=f"💰 {PAYMENT_PLANS['basic']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {basic_price}р",
-                        callback_data="buy_basic"
-                    )
-                ],
-                [
-                    types.InlineKeyboardButton(
-                        text=f"💎 {PAYMENT_PLANS['pro']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {pro_price}р", 
-                        callback_data="buy_pro"
-                    )
-                ],
-                [
-                    types.InlineKeyboardButton(
-                        text=i18n.get_text("btn_back", user_language),
-                        callback_data="action_main_menu"
-                    )
-                ]
-            ])
-        )
+        buy_text, keyboard = render_buy_text(user_language, user['credits_remaining'])
+        await message.answer(buy_text, parse_mode="Markdown", reply_markup=keyboard)
         
     except Exception as e:
         logger.error(f"Error in /buy for user {telegram_user_id}: {e}")
@@ -428,40 +416,9 @@ async def buy_callback(callback: types.CallbackQuery):
         # Get user's language
         user_language = user.get('language', 'en')
         
-        # Get prices from config
-        basic_price = PAYMENT_PLANS['basic']['price'] // 100  # Convert kopecks to rubles
-        pro_price = PAYMENT_PLANS['pro']['price'] // 100
-        
         # Show current credits and payment options
-        await callback.message.answer(
-            f"💳 **{i18n.get_text('buy_credits_title', user_language)}**\n\n"
-            f"**{i18n.get_text('current_credits', user_language, credits=user['credits_remaining'])}**: *{user['credits_remaining']}*\n\n"
-            f"{i18n.get_text('credits_explanation', user_language)}\n\n"
-            f"📦 **{PAYMENT_PLANS['basic']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {basic_price}р**\n"
-            f"📦 **{PAYMENT_PLANS['pro']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {pro_price}р**\n\n"
-            f"{i18n.get_text('choose_plan_to_continue', user_language)}",
-            parse_mode="Markdown",
-            reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    types.InlineKeyboardButton(
-                        text=f"💰 {PAYMENT_PLANS['basic']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {basic_price}р",
-                        callback_data="buy_basic"
-                    )
-                ],
-                [
-                    types.InlineKeyboardButton(
-                        text=f"💎 {PAYMENT_PLANS['pro']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {pro_price}р", 
-                        callback_data="buy_pro"
-                    )
-                ],
-                [
-                    types.InlineKeyboardButton(
-                        text=i18n.get_text("btn_back", user_language),
-                        callback_data="action_main_menu"
-                    )
-                ]
-            ])
-        )
+        buy_text, keyboard = render_buy_text(user_language, user['credits_remaining'])
+        await callback.message.answer(buy_text, parse_mode="Markdown", reply_markup=keyboard)
         
     except Exception as e:
         logger.error(f"Error in buy callback for user {telegram_user_id}: {e}")
@@ -1,11 +1,15 @@
 """
 Shared keyboard utilities for c0r.ai Telegram Bot
 This module contains reusable keyboard functions to avoid circular imports
+
+Keyboards only depend on the language, so each is rendered once per language
+and the frozen result is reused (see static_screen and freeze).
 """
 from aiogram import types
-from i18n.i18n import i18n
+from i18n.i18n import i18n, static_screen
 
 
+@static_screen
 def create_main_menu_keyboard(language: str = "en"):
     """Create keyboard with Main Menu button"""
     return types.InlineKeyboardMarkup(inline_keyboard=[
@@ -18,6 +22,7 @@ def create_main_menu_keyboard(language: str = "en"):
     ])
 
 
+@static_screen
 def create_payment_success_keyboard(language: str = "en"):
     """Create keyboard for payment success message with navigation options"""
     from i18n.i18n import i18n
@@ -53,6 +58,11 @@ def create_payment_success_keyboard(language: str = "en"):
 
 def create_main_menu_text(language: str = "en", has_profile: bool = False):
     """Create main menu message with interactive buttons"""
+    return _render_main_menu(language, bool(has_profile))
+
+
+@static_screen
+def _render_main_menu(language: str, has_profile: bool = False):
     from i18n.i18n import i18n
     
     # New layout according to requirements:
@@ -6,18 +6,30 @@ Provides BMI, ideal weight, water needs, macro distribution, and recommendations
 from aiogram import types
 from aiogram.fsm.state import State, StatesGroup
 from loguru import logger
-from common.supabase_client import get_user_with_profile, log_user_action, get_or_create_user
-from common.nutrition_calculations import (
-    calculate_bmi, calculate_ideal_weight, calculate_water_needs,
-    calculate_macro_distribution, calculate_metabolic_age,
-    calculate_meal_portions, get_nutrition_recommendations
-)
+from common.supabase_client import get_user_with_profile, log_user_action, get_or_create_user, get_nutrition_daily_totals
+from common.nutrition_calculations import get_profile_insights, get_nutrition_recommendations, calculate_water_needs, calculate_macro_distribution
+from common.render_cache import RenderCache
+from common.nutrition_stats import compute_rolling_stats, WINDOWS
 from .keyboards import create_main_menu_keyboard
 from i18n.i18n import i18n
-from datetime import datetime, timedelta
+from datetime import datetime
+import os
 import re
 from aiogram.fsm.storage.base import StorageKey
 
+INSIGHTS_CACHE_MAX_ENTRIES = int(os.getenv("INSIGHTS_CACHE_MAX_ENTRIES", "20000"))
+
+# Rendered insights texts per (user, profile version, language, section)
+insights_cache = RenderCache(INSIGHTS_CACHE_MAX_ENTRIES)
+
+
+def insights_cache_key(profile: dict, user: dict, section: str):
+    """Cache key of a rendered insights text, None for profiles without a version"""
+    version = profile.get('profile_version')
+    if version is None:
+        return None
+    return user.get('id'), version, user.get('language', 'en'), section
+
 
 # FSM States for nutrition analysis
 class NutritionStates(StatesGroup):
@@ -50,35 +62,61 @@ async def process_nutrition_photo(message: types.Message):
     await photo_handler(message, state)
 
 
-async def get_weekly_meals_count(user_id: str) -> int:
+async def get_recent_daily_totals(user_id: str) -> list:
     """
-    Get count of analyzed meals for the past 7 days
+    Daily nutrition totals of the longest statistics window (one query)
     
     Args:
         user_id: User UUID from database
         
     Returns:
-        Number of analyzed meals in the past week
+        nutrition_daily_totals rows, newest first (empty if they can't be read)
     """
-    from common.supabase_client import supabase
+    try:
+        return await get_nutrition_daily_totals(user_id, max(WINDOWS))
+    except Exception as e:
+        logger.error(f"Error getting daily nutrition totals for user {user_id}: {e}")
+        return []
+
+
+async def send_weekly_chart(message: types.Message, user: dict, profile: dict, daily_totals: list):
+    """
+    Send the weekly calories and macros chart
     
-    # Calculate date range for past 7 days
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=7)
+    A chart already sent for the same data is re-sent by its Telegram file_id,
+    otherwise it is rendered in the chart process pool.
+    """
+    from aiogram.types import BufferedInputFile
+    from utils.report_charts import (
+        charts_enabled, report_chart_cache, week_series, chart_data_version, render_chart
+    )
     
-    logger.info(f"Getting weekly meals count for user {user_id} from {start_date} to {end_date}")
+    if not charts_enabled():
+        return
     
-    try:
-        # Get all photo analyses for the past 7 days
-        logs = supabase.table("logs").select("*").eq("user_id", user_id).eq("action_type", "photo_analysis").gte("timestamp", start_date.isoformat()).lte("timestamp", end_date.isoformat()).execute().data
-        
-        meals_count = len(logs)
-        logger.info(f"Found {meals_count} analyzed meals for user {user_id} in the past week")
-        
-        return meals_count
-    except Exception as e:
-        logger.error(f"Error getting weekly meals count for user {user_id}: {e}")
-        return 0
+    user_language = user.get('language', 'en')
+    target = profile.get('daily_calories_target')
+    targets = {'calories': target, 'protein': None, 'fats': None, 'carbs': None}
+    if target:
+        macros = calculate_macro_distribution(target, profile.get('goal', 'maintain_weight'))
+        targets.update(protein=macros['protein']['grams'], fats=macros['fat']['grams'], carbs=macros['carbs']['grams'])
+    labels = {
+        name: i18n.get_text(f'report_chart_{name}', user_language)
+        for name in ('calories', 'macros', 'target', 'protein', 'fats', 'carbs')
+    }
+    
+    week_end = datetime.now().date()
+    series = week_series(daily_totals, week_end)
+    data_version = chart_data_version(series, targets, labels)
+    
+    file_id = await report_chart_cache.get(str(user['id']), week_end.isoformat(), data_version)
+    if file_id:
+        await message.answer_photo(file_id)
+        return
+    
+    png = await render_chart(series, targets, labels)
+    sent = await message.answer_photo(BufferedInputFile(png, filename="weekly_report.png"))
+    await report_chart_cache.put(str(user['id']), week_end.isoformat(), data_version, sent.photo[-1].file_id)
 
 
 async def nutrition_insights_command(message: types.Message):
@@ -291,97 +329,101 @@ async def generate_nutrition_insights(profile: dict, user: dict) -> str:
     Returns:
         Formatted insights text
     """
-    insights = []
-    
-    # Get user's language
     user_language = user.get('language', 'en')
+    body = insights_cache.get_or_render(
+        insights_cache_key(profile, user, "full"),
+        lambda: render_nutrition_insights(profile, get_profile_insights(profile), user_language)
+    )
+    
+    # Footer changes every day and with every analysis, so it is not cached
+    footer = (
+        f"{i18n.get_text('nutrition_analysis_date', user_language, date=datetime.now().strftime('%Y-%m-%d'))}\n"
+        f"{i18n.get_text('nutrition_credits_remaining', user_language, credits=user.get('credits_remaining', 0))}"
+    )
+    return sanitize_markdown_text(f"{body}\n{footer}")
+
+
+def render_nutrition_insights(profile: dict, insights: dict, user_language: str) -> str:
+    """Render insights text (without footer) from the precomputed profile insights"""
+    lines = []
     
     # Header
-    insights.append(f"{i18n.get_text('nutrition_analysis_title', user_language)}\n")
+    lines.append(f"{i18n.get_text('nutrition_analysis_title', user_language)}\n")
     
-    # Basic info
     age = profile.get('age', 0)
-    gender = profile.get('gender', 'unknown')
-    weight = profile.get('weight_kg', 0)
-    height = profile.get('height_cm', 0)
-    activity = profile.get('activity_level', 'sedentary')
     goal = profile.get('goal', 'maintain_weight')
-    daily_calories = profile.get('daily_calories_target', 0)
     
     # 1. BMI Analysis
-    if weight > 0 and height > 0:
-        bmi_data = calculate_bmi(weight, height, user_language)
-        insights.append(f"{i18n.get_text('nutrition_bmi_title', user_language)}")
-        insights.append(f"{bmi_data['emoji']} **{bmi_data['bmi']}** - {bmi_data['description']}")
-        insights.append(f"💡 {bmi_data['motivation']}")
-        insights.append("")
+    if 'bmi' in insights:
+        bmi_data = insights['bmi']
+        category = bmi_data['category']
+        lines.append(f"{i18n.get_text('nutrition_bmi_title', user_language)}")
+        lines.append(f"{bmi_data['emoji']} **{bmi_data['bmi']}** - {i18n.get_text(f'bmi_{category}', user_language)}")
+        lines.append(f"💡 {i18n.get_text(f'bmi_motivation_{category}', user_language)}")
+        lines.append("")
         
         # Ideal weight
-        ideal_weight = calculate_ideal_weight(height, gender)
-        insights.append(f"{i18n.get_text('nutrition_ideal_weight_title', user_language)}")
-        insights.append(f"**{ideal_weight['range']}** ({i18n.get_text('bmi_based', user_language)})")
-        insights.append(f"**{ideal_weight['broca']} {i18n.get_text('kg', user_language)}** ({i18n.get_text('broca_formula', user_language)})")
-        insights.append("")
+        ideal_weight = insights['ideal_weight']
+        lines.append(f"{i18n.get_text('nutrition_ideal_weight_title', user_language)}")
+        lines.append(f"**{ideal_weight['range']}** ({i18n.get_text('bmi_based', user_language)})")
+        lines.append(f"**{ideal_weight['broca']} {i18n.get_text('kg', user_language)}** ({i18n.get_text('broca_formula', user_language)})")
+        lines.append("")
     
     # 2. Metabolic Age
-    if age > 0 and weight > 0 and height > 0:
-        metabolic_data = calculate_metabolic_age(age, gender, weight, height, activity, user_language)
-        insights.append(f"{i18n.get_text('nutrition_metabolic_age_title', user_language)}")
-        insights.append(f"{metabolic_data['emoji']} **{metabolic_data['metabolic_age']} {i18n.get_text('years', user_language)}** (vs {age} {i18n.get_text('actual', user_language)})")
-        insights.append(f"{metabolic_data['description']}")
-        insights.append(f"💡 {metabolic_data['motivation']}")
-        insights.append("")
+    if 'metabolic_age' in insights:
+        metabolic_data = insights['metabolic_age']
+        lines.append(f"{i18n.get_text('nutrition_metabolic_age_title', user_language)}")
+        lines.append(f"{metabolic_data['emoji']} **{metabolic_data['metabolic_age']} {i18n.get_text('years', user_language)}** (vs {age} {i18n.get_text('actual', user_language)})")
+        status = metabolic_data['status']
+        lines.append(f"{i18n.get_text(f'metabolic_age_{status}', user_language)}")
+        lines.append(f"💡 {i18n.get_text(f'metabolic_motivation_{status}', user_language)}")
+        lines.append("")
     
     # 3. Daily Water Needs
-    if weight > 0:
-        water_data = calculate_water_needs(weight, activity)
-        insights.append(f"{i18n.get_text('nutrition_water_needs_title', user_language)}")
-        insights.append(f"**{water_data['liters']}{i18n.get_text('L', user_language)}** ({water_data['glasses']} {i18n.get_text('glasses', user_language)})")
-        insights.append(f"{i18n.get_text('base', user_language).capitalize()}: {water_data['base_ml']}{i18n.get_text('ml', user_language)} + {i18n.get_text('activity', user_language).capitalize()}: {water_data['activity_bonus']}{i18n.get_text('ml', user_language)}")
-        insights.append("")
+    if 'water_needs' in insights:
+        water_data = insights['water_needs']
+        lines.append(f"{i18n.get_text('nutrition_water_needs_title', user_language)}")
+        lines.append(f"**{water_data['liters']}{i18n.get_text('L', user_language)}** ({water_data['glasses']} {i18n.get_text('glasses', user_language)})")
+        lines.append(f"{i18n.get_text('base', user_language).capitalize()}: {water_data['base_ml']}{i18n.get_text('ml', user_language)} + {i18n.get_text('activity', user_language).capitalize()}: {water_data['activity_bonus']}{i18n.get_text('ml', user_language)}")
+        lines.append("")
     
     # 4. Macro Distribution
-    if daily_calories > 0:
-        macro_data = calculate_macro_distribution(daily_calories, goal)
-        insights.append(f"{i18n.get_text('nutrition_macro_title', user_language)}")
-        insights.append(f"**Protein:** {macro_data['protein']['grams']}{i18n.get_text('g', user_language)} ({macro_data['protein']['percent']}%)")
-        insights.append(f"**Carbs:** {macro_data['carbs']['grams']}{i18n.get_text('g', user_language)} ({macro_data['carbs']['percent']}%)")
-        insights.append(f"**Fats:** {macro_data['fat']['grams']}{i18n.get_text('g', user_language)} ({macro_data['fat']['percent']}%)")
-        insights.append("")
-        
-        # Meal portions
-        meal_data = calculate_meal_portions(daily_calories, 3, user_language)
-        insights.append(f"{i18n.get_text('nutrition_meal_distribution_title', user_language)}")
-        for meal in meal_data['meals']:
-            insights.append(f"**{meal['name']}:** {meal['calories']} {i18n.get_text('cal', user_language)} ({meal['percentage']}%)")
-        insights.append("")
+    if 'macro_distribution' in insights:
+        macro_data = insights['macro_distribution']
+        lines.append(f"{i18n.get_text('nutrition_macro_title', user_language)}")
+        lines.append(f"**Protein:** {macro_data['protein']['grams']}{i18n.get_text('g', user_language)} ({macro_data['protein']['percent']}%)")
+        lines.append(f"**Carbs:** {macro_data['carbs']['grams']}{i18n.get_text('g', user_language)} ({macro_data['carbs']['percent']}%)")
+        lines.append(f"**Fats:** {macro_data['fat']['grams']}{i18n.get_text('g', user_language)} ({macro_data['fat']['percent']}%)")
+        lines.append("")
+        
+    # Meal portions
+    if 'meal_portions' in insights:
+        lines.append(f"{i18n.get_text('nutrition_meal_distribution_title', user_language)}")
+        for meal in insights['meal_portions']:
+            meal_name = i18n.get_text(f"meal_{meal['meal']}", user_language)
+            lines.append(f"**{meal_name}:** {meal['calories']} {i18n.get_text('cal', user_language)} ({meal['percentage']}%)")
+        lines.append("")
     
     # 5. Personalized Recommendations
     recommendations = get_nutrition_recommendations(profile, [], user_language)
     if recommendations:
-        insights.append(f"{i18n.get_text('nutrition_personal_recommendations_title', user_language)}")
+        lines.append(f"{i18n.get_text('nutrition_personal_recommendations_title', user_language)}")
         for rec in recommendations[:4]:  # Show top 4 recommendations
-            insights.append(f"• {rec}")
-        insights.append("")
+            lines.append(f"• {rec}")
+        lines.append("")
     
     # 6. Goal-specific advice
     goal_advice = get_goal_specific_advice(goal, profile, user_language)
     if goal_advice:
-        insights.append(f"{i18n.get_text('nutrition_goal_advice_title', user_language)}")
+        lines.append(f"{i18n.get_text('nutrition_goal_advice_title', user_language)}")
         # Split the advice into lines and add each line
         advice_lines = goal_advice.split('\n')
         for line in advice_lines:
             if line.strip():  # Only add non-empty lines
-                insights.append(line)
-        insights.append("")
-    
-    # Footer
-    insights.append(f"{i18n.get_text('nutrition_analysis_date', user_language, date=datetime.now().strftime('%Y-%m-%d'))}")
-    insights.append(f"{i18n.get_text('nutrition_credits_remaining', user_language, credits=user.get('credits_remaining', 0))}")
+                lines.append(line)
+        lines.append("")
     
-    # Join all insights and sanitize
-    raw_text = "\n".join(insights)
-    return sanitize_markdown_text(raw_text)
+    return "\n".join(lines)
 
 
 def get_goal_specific_advice(goal: str, profile: dict, language: str) -> str:
@@ -396,46 +438,79 @@ def get_goal_specific_advice(goal: str, profile: dict, language: str) -> str:
 
 async def weekly_report_callback(callback: types.CallbackQuery):
     """Handle weekly report callback from button clicks"""
+    # Answer callback to remove loading state
+    await callback.answer()
+    await send_weekly_report(callback.message, callback.from_user)
+
+
+async def send_weekly_report(message: types.Message, from_user: types.User):
+    """
+    Send the weekly nutrition report (chart and text) as an answer to message
+    
+    Shared by /report and the main menu button, so both show the same report.
+    
+    Args:
+        message: Message to answer
+        from_user: Telegram user the report is for (a callback's message is from the bot)
+    """
+    telegram_user_id = from_user.id
     try:
-        # Answer callback to remove loading state
-        await callback.answer()
-        
-        # Get user ID from callback, not from message
-        telegram_user_id = callback.from_user.id
         user_data = await get_user_with_profile(telegram_user_id)
         user = user_data['user']
         
         # Get user's language
         user_language = user.get('language', 'en')
         
-        # Log weekly report action
         await log_user_action(
             user_id=user['id'],
             action_type="weekly_report",
             metadata={
-                "username": callback.from_user.username,
+                "username": from_user.username,
                 "has_profile": user_data['has_profile']
             }
         )
         
-        # Get actual meals count for the past week
-        meals_count = await get_weekly_meals_count(user['id'])
+        profile = user_data.get('profile') or {}
+        target = profile.get('daily_calories_target')
         
-        # Generate weekly report with actual data
-        report_text = (
-            f"{i18n.get_text('weekly_report_title', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_week_of', user_language, date=datetime.now().strftime('%b %d, %Y'))}\n\n"
-            f"{i18n.get_text('weekly_report_meals_analyzed', user_language, count=meals_count)}\n"
-            f"{i18n.get_text('weekly_report_avg_calories', user_language, calories=i18n.get_text('weekly_report_not_enough_data', user_language))}\n"
-            f"{i18n.get_text('weekly_report_goal_progress', user_language, progress=i18n.get_text('weekly_report_setup_profile', user_language))}\n"
-            f"{i18n.get_text('weekly_report_consistency_score', user_language, score='N/A')}\n\n"
-            f"{i18n.get_text('weekly_report_note', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_coming_soon', user_language)}\n"
-            f"{i18n.get_text('weekly_report_trends', user_language)}\n"
-            f"{i18n.get_text('weekly_report_macro', user_language)}\n"
-            f"{i18n.get_text('weekly_report_quality', user_language)}\n"
-            f"{i18n.get_text('weekly_report_tracking', user_language)}"
-        )
+        # One query of daily totals covers every window and the chart
+        daily_totals = await get_recent_daily_totals(user['id'])
+        stats = compute_rolling_stats(daily_totals, target)
+        week, month, quarter = stats['7d'], stats['30d'], stats['90d']
+        not_enough_data = i18n.get_text('weekly_report_not_enough_data', user_language)
+        
+        if not target:
+            progress = i18n.get_text('weekly_report_setup_profile', user_language)
+        elif week['adherence'] is None:
+            progress = not_enough_data
+        else:
+            progress = i18n.get_text('weekly_report_days_on_target', user_language, percent=week['adherence'])
+        
+        lines = [
+            f"{i18n.get_text('weekly_report_title', user_language)}\n",
+            f"{i18n.get_text('weekly_report_week_of', user_language, date=datetime.now().strftime('%b %d, %Y'))}\n",
+            i18n.get_text('weekly_report_meals_analyzed', user_language, count=week['meals']),
+            i18n.get_text('weekly_report_avg_calories', user_language,
+                          calories=week['average_calories'] if week['days_logged'] else not_enough_data),
+            i18n.get_text('weekly_report_goal_progress', user_language, progress=progress),
+            i18n.get_text('weekly_report_consistency_score', user_language,
+                          score=week['consistency_score'] if week['consistency_score'] is not None else 'N/A'),
+            i18n.get_text('weekly_report_streak', user_language, days=stats['streak']),
+        ]
+        if month['days_logged'] > week['days_logged']:
+            lines.append(i18n.get_text('weekly_report_month_avg', user_language,
+                                       calories=month['average_calories'], days=month['days_logged']))
+        if quarter['days_logged'] > month['days_logged']:
+            lines.append(i18n.get_text('weekly_report_quarter_avg', user_language,
+                                       calories=quarter['average_calories'], days=quarter['days_logged']))
+        if not quarter['days_logged']:
+            lines.append(f"\n{i18n.get_text('weekly_report_note', user_language)}")
+        lines += [
+            f"\n{i18n.get_text('weekly_report_coming_soon', user_language)}",
+            i18n.get_text('weekly_report_macro', user_language),
+            i18n.get_text('weekly_report_quality', user_language),
+        ]
+        report_text = "\n".join(lines)
         
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
             [
@@ -446,16 +521,23 @@ async def weekly_report_callback(callback: types.CallbackQuery):
             ]
         ])
         
-        await callback.message.answer(
+        if stats['7d']['days_logged']:
+            try:
+                await send_weekly_chart(message, user, profile, daily_totals)
+            except Exception as e:
+                # The text report is still sent without the chart
+                logger.error(f"Error sending weekly chart for user {user['id']}: {e}")
+        
+        await message.answer(
             report_text,
             parse_mode="Markdown",
             reply_markup=keyboard
         )
         
     except Exception as e:
-        logger.error(f"Error in weekly_report_callback: {e}")
+        logger.error(f"Error sending weekly report to user {telegram_user_id}: {e}")
         # Get user's language for error message
-        user = await get_or_create_user(callback.from_user.id)
+        user = await get_or_create_user(telegram_user_id)
         user_language = user.get('language', 'en')
         # Create keyboard with back button
         keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
@@ -466,7 +548,7 @@ async def weekly_report_callback(callback: types.CallbackQuery):
                 )
             ]
         ])
-        await callback.message.answer(
+        await message.answer(
             i18n.get_text("weekly_report_error", user_language),
             parse_mode="Markdown",
             reply_markup=keyboard
@@ -477,67 +559,7 @@ async def weekly_report_command(message: types.Message):
     """
     Generate weekly nutrition report for user
     """
-    try:
-        telegram_user_id = message.from_user.id
-        user_data = await get_user_with_profile(telegram_user_id)
-        user = user_data['user']
-        
-        # Get user's language
-        user_language = user.get('language', 'en')
-        
-        # Get actual meals count for the past week
-        meals_count = await get_weekly_meals_count(user['id'])
-        
-        # Generate weekly report with actual data
-        report_text = (
-            f"{i18n.get_text('weekly_report_title', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_week_of', user_language, date=datetime.now().strftime('%b %d, %Y'))}\n\n"
-            f"{i18n.get_text('weekly_report_meals_analyzed', user_language, count=meals_count)}\n"
-            f"{i18n.get_text('weekly_report_avg_calories', user_language, calories=i18n.get_text('weekly_report_not_enough_data', user_language))}\n"
-            f"{i18n.get_text('weekly_report_goal_progress', user_language, progress=i18n.get_text('weekly_report_setup_profile', user_language))}\n"
-            f"{i18n.get_text('weekly_report_consistency_score', user_language, score='N/A')}\n\n"
-            f"{i18n.get_text('weekly_report_note', user_language)}\n\n"
-            f"{i18n.get_text('weekly_report_coming_soon', user_language)}\n"
-            f"{i18n.get_text('weekly_report_trends', user_language)}\n"
-            f"{i18n.get_text('weekly_report_macro', user_language)}\n"
-            f"{i18n.get_text('weekly_report_quality', user_language)}\n"
-            f"{i18n.get_text('weekly_report_tracking', user_language)}"
-        )
-        
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [
-                types.InlineKeyboardButton(
-                    text=i18n.get_text("btn_back", user_language),
-                    callback_data="action_main_menu"
-                )
-            ]
-        ])
-        
-        await message.answer(
-            report_text,
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
-        
-    except Exception as e:
-        logger.error(f"Error in weekly_report_command: {e}")
-        # Get user's language for error message
-        user = await get_or_create_user(telegram_user_id)
-        user_language = user.get('language', 'en')
-        # Create keyboard with back button
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
-            [
-                types.InlineKeyboardButton(
-                    text=i18n.get_text('btn_back', user_language),
-                    callback_data="action_main_menu"
-                )
-            ]
-        ])
-        await message.answer(
-            i18n.get_text("weekly_report_error", user_language),
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
+    await send_weekly_report(message, message.from_user)
 
 
 async def water_tracker_callback(callback: types.CallbackQuery):
@@ -913,86 +935,68 @@ async def handle_nutrition_menu_callback(callback: types.CallbackQuery):
 
 
 # Section generation functions
-async def generate_bmi_section(profile: dict, user: dict) -> str:
-    """Generate BMI section content"""
+async def generate_section(section: str, profile: dict, user: dict, render, requires: tuple = ()) -> str:
+    """
+    Section text rendered from the precomputed profile insights, cached per profile version and language
+
+    Insights only contain the sections computable from the profile, so a
+    section whose required insights are missing asks to complete the profile.
+    """
     user_language = user.get('language', 'en')
-    
-    weight = profile.get('weight_kg', 70)
-    height = profile.get('height_cm', 170)
-    
-    bmi_data = calculate_bmi(weight, height, user_language)
-    
-    content = (
+
+    def render_section() -> str:
+        insights = get_profile_insights(profile)
+        if any(key not in insights for key in requires):
+            return sanitize_markdown_text(i18n.get_text('nutrition_incomplete_data', user_language))
+        return sanitize_markdown_text(render(profile, insights, user_language))
+
+    return insights_cache.get_or_render(insights_cache_key(profile, user, section), render_section)
+
+
+def render_bmi_section(profile: dict, insights: dict, user_language: str) -> str:
+    bmi_data = insights['bmi']
+    category = bmi_data['category']
+    return (
         f"**{i18n.get_text('nutrition_bmi_title', user_language)}**\n\n"
         f"**ИМТ:** {bmi_data['bmi']}\n"
-        f"**Категория:** {bmi_data['description']}\n\n"
+        f"**Категория:** {i18n.get_text(f'bmi_{category}', user_language)}\n\n"
         f"**Интерпретация:**\n"
         f"• ИМТ < 18.5: Недостаточный вес\n"
         f"• ИМТ 18.5-24.9: Нормальный вес\n"
         f"• ИМТ 25-29.9: Избыточный вес\n"
         f"• ИМТ ≥ 30: Ожирение\n\n"
-        f"**Мотивация:**\n{bmi_data['motivation']}"
+        f"**Мотивация:**\n{i18n.get_text(f'bmi_motivation_{category}', user_language)}"
     )
-    
-    return sanitize_markdown_text(content)
 
 
-async def generate_ideal_weight_section(profile: dict, user: dict) -> str:
-    """Generate ideal weight section content"""
-    user_language = user.get('language', 'en')
-    
-    weight = profile.get('weight_kg', 70)
-    height = profile.get('height_cm', 170)
-    gender = profile.get('gender', 'male')
-    
-    ideal_weight_data = calculate_ideal_weight(height, gender)
-    
-    content = (
+def render_ideal_weight_section(profile: dict, insights: dict, user_language: str) -> str:
+    ideal_weight_data = insights['ideal_weight']
+    return (
         f"**Идеальный диапазон веса**\n\n"
         f"**По ИМТ (18.5-25):** {ideal_weight_data['ideal_min']} - {ideal_weight_data['ideal_max']} кг\n"
         f"**По формуле Брока:** {ideal_weight_data['broca']} кг\n\n"
-        f"**Ваш текущий вес:** {weight} кг\n\n"
+        f"**Ваш текущий вес:** {profile.get('weight_kg')} кг\n\n"
         f"**Рекомендации:**\n"
         f"• Идеальный диапазон: {ideal_weight_data['range']}\n"
         f"• Формула Брока: {ideal_weight_data['broca']} кг"
     )
-    
-    return sanitize_markdown_text(content)
 
 
-async def generate_metabolic_age_section(profile: dict, user: dict) -> str:
-    """Generate metabolic age section content"""
-    user_language = user.get('language', 'en')
-    
-    weight = profile.get('weight_kg', 70)
-    height = profile.get('height_cm', 170)
-    age = profile.get('age', 30)
-    gender = profile.get('gender', 'male')
-    activity = profile.get('activity_level', 'moderately_active')
-    
-    metabolic_age_data = calculate_metabolic_age(age, gender, weight, height, activity, user_language)
-    
-    content = (
+def render_metabolic_age_section(profile: dict, insights: dict, user_language: str) -> str:
+    metabolic_age_data = insights['metabolic_age']
+    status = metabolic_age_data['status']
+    return (
         f"**Метаболический возраст**\n\n"
         f"**Ваш метаболический возраст:** {metabolic_age_data['metabolic_age']} лет\n"
-        f"**Ваш хронологический возраст:** {age} лет\n\n"
-        f"**Интерпретация:**\n{metabolic_age_data['description']}\n\n"
-        f"**Мотивация:**\n{metabolic_age_data['motivation']}"
+        f"**Ваш хронологический возраст:** {profile.get('age')} лет\n\n"
+        f"**Интерпретация:**\n{i18n.get_text(f'metabolic_age_{status}', user_language)}\n\n"
+        f"**Мотивация:**\n{i18n.get_text(f'metabolic_motivation_{status}', user_language)}"
     )
-    
-    return sanitize_markdown_text(content)
 
 
-async def generate_water_needs_section(profile: dict, user: dict) -> str:
-    """Generate water needs section content"""
-    user_language = user.get('language', 'en')
-    
-    weight = profile.get('weight_kg', 70)
-    activity = profile.get('activity_level', 'sedentary')
-    
-    water_data = calculate_water_needs(weight, activity)
-    
-    content = (
+def render_water_needs_section(profile: dict, insights: dict, user_language: str) -> str:
+    water_data = insights['water_needs']
+    return (
         f"**Дневные потребности в воде**\n\n"
         f"**Ежедневная норма:** {water_data['liters']} л ({water_data['glasses']} стаканов)\n\n"
         f"**Расчет:**\n"
@@ -1005,62 +1009,41 @@ async def generate_water_needs_section(profile: dict, user: dict) -> str:
         f"• Носите с собой бутылку воды\n"
         f"• Установите напоминания"
     )
-    
-    return sanitize_markdown_text(content)
 
 
-async def generate_macro_distribution_section(profile: dict, user: dict) -> str:
-    """Generate macro distribution section content"""
-    user_language = user.get('language', 'en')
-    
-    calories = profile.get('daily_calories_target', 2000)
-    goal = profile.get('goal', 'maintain_weight')
-    
-    macro_data = calculate_macro_distribution(calories, goal)
-    
-    content = (
+def render_macro_distribution_section(profile: dict, insights: dict, user_language: str) -> str:
+    macro_data = insights['macro_distribution']
+    return (
         f"**Оптимальное распределение макронутриентов**\n\n"
         f"**Белки:** {macro_data['protein']['grams']}г ({macro_data['protein']['percent']}%)\n"
         f"**Жиры:** {macro_data['fat']['grams']}г ({macro_data['fat']['percent']}%)\n"
         f"**Углеводы:** {macro_data['carbs']['grams']}г ({macro_data['carbs']['percent']}%)\n\n"
-        f"**Общее количество калорий:** {calories} ккал\n\n"
+        f"**Общее количество калорий:** {profile.get('daily_calories_target')} ккал\n\n"
         f"**Рекомендации:**\n"
         f"• Белки: строительный материал для мышц\n"
         f"• Жиры: источник энергии и витаминов\n"
         f"• Углеводы: основной источник энергии"
     )
-    
-    return sanitize_markdown_text(content)
 
 
-async def generate_meal_distribution_section(profile: dict, user: dict) -> str:
-    """Generate meal distribution section content"""
-    user_language = user.get('language', 'en')
-    
-    calories = profile.get('daily_calories_target', 2000)
-    
-    meal_data = calculate_meal_portions(calories, 3, user_language)
-    
+def render_meal_distribution_section(profile: dict, insights: dict, user_language: str) -> str:
     content = (
         f"**Распределение приемов пищи**\n\n"
     )
     
-    for meal in meal_data['meals']:
-        content += f"**{meal['name']}:** {meal['calories']} ккал ({meal['percentage']}%)\n"
+    for meal in insights['meal_portions']:
+        meal_name = i18n.get_text(f"meal_{meal['meal']}", user_language)
+        content += f"**{meal_name}:** {meal['calories']} ккал ({meal['percentage']}%)\n"
     
     content += f"\n**Советы:**\n"
     content += f"• Завтрак: 25% калорий - запускает метаболизм\n"
     content += f"• Обед: 40% калорий - основная энергия дня\n"
     content += f"• Ужин: 35% калорий - легкая пища перед сном\n"
     content += f"• Ешьте каждые 3-4 часа для стабильного уровня сахара"
-    
-    return sanitize_markdown_text(content)
+    return content
 
 
-async def generate_recommendations_section(profile: dict, user: dict) -> str:
-    """Generate recommendations section content"""
-    user_language = user.get('language', 'en')
-    
+def render_recommendations_section(profile: dict, insights: dict, user_language: str) -> str:
     # Pass empty list for recent_logs since we don't have them in this context
     recommendations = get_nutrition_recommendations(profile, [], user_language)
     
@@ -1070,20 +1053,53 @@ async def generate_recommendations_section(profile: dict, user: dict) -> str:
     
     for recommendation in recommendations:
         content += f"• {recommendation}\n"
-    
-    return sanitize_markdown_text(content)
+    return content
 
 
-async def generate_goal_advice_section(profile: dict, user: dict) -> str:
-    """Generate goal advice section content"""
-    user_language = user.get('language', 'en')
-    
+def render_goal_advice_section(profile: dict, insights: dict, user_language: str) -> str:
     goal = profile.get('goal', 'maintain_weight')
     goal_advice = get_goal_specific_advice(goal, profile, user_language)
-    
-    content = (
+    return (
         f"**Советы по цели**\n\n"
         f"{goal_advice}"
     )
-    
-    return sanitize_markdown_text(content) 
\ No newline at end of file
+
+
+async def generate_bmi_section(profile: dict, user: dict) -> str:
+    """Generate BMI section content"""
+    return await generate_section("bmi", profile, user, render_bmi_section, requires=('bmi',))
+
+
+async def generate_ideal_weight_section(profile: dict, user: dict) -> str:
+    """Generate ideal weight section content"""
+    return await generate_section("ideal_weight", profile, user, render_ideal_weight_section, requires=('ideal_weight',))
+
+
+async def generate_metabolic_age_section(profile: dict, user: dict) -> str:
+    """Generate metabolic age section content"""
+    return await generate_section("metabolic_age", profile, user, render_metabolic_age_section, requires=('metabolic_age',))
+
+
+async def generate_water_needs_section(profile: dict, user: dict) -> str:
+    """Generate water needs section content"""
+    return await generate_section("water_needs", profile, user, render_water_needs_section, requires=('water_needs',))
+
+
+async def generate_macro_distribution_section(profile: dict, user: dict) -> str:
+    """Generate macro distribution section content"""
+    return await generate_section("macro_distribution", profile, user, render_macro_distribution_section, requires=('macro_distribution',))
+
+
+async def generate_meal_distribution_section(profile: dict, user: dict) -> str:
+    """Generate meal distribution section content"""
+    return await generate_section("meal_distribution", profile, user, render_meal_distribution_section, requires=('meal_portions',))
+
+
+async def generate_recommendations_section(profile: dict, user: dict) -> str:
+    """Generate recommendations section content"""
+    return await generate_section("recommendations", profile, user, render_recommendations_section)
+
+
+async def generate_goal_advice_section(profile: dict, user: dict) -> str:
+    """Generate goal advice section content"""
+    return await generate_section("goal_advice", profile, user, render_goal_advice_section)
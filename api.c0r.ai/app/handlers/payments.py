@@ -4,10 +4,15 @@ Handles native Telegram payments without leaving the app
 """
 import os
 from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
 from loguru import logger
-from common.supabase_client import get_or_create_user, add_credits, add_payment, log_user_action
+from common.supabase_client import get_or_create_user, log_user_action
+from common.payment_ledger import record_payment
 from .keyboards import create_main_menu_keyboard, create_payment_success_keyboard
-from config import PAYMENT_PLANS
+from config import PAYMENT_PLANS, PENDING_INVOICE_TTL
+from utils.send_scheduler import send_priority, SendPriority
+from common.pending_invoices import PendingInvoiceCache
+from i18n.i18n import i18n
 import traceback
 import json
 
@@ -17,6 +22,9 @@ YOOKASSA_PROVIDER_TOKEN = os.getenv("YOOKASSA_PROVIDER_TOKEN")
 # Payment plans configuration - now imported from config
 # PAYMENT_PLANS imported from config.py
 
+# Invoice messages sent but not paid yet, so repeated buy taps reuse them
+pending_invoices = PendingInvoiceCache(PENDING_INVOICE_TTL)
+
 async def create_invoice_message(message: types.Message, plan_id: str = "basic", user_id: int = None):
     """
     Create and send Telegram invoice message
@@ -68,31 +76,50 @@ async def create_invoice_message(message: types.Message, plan_id: str = "basic",
             }
         })
 
-        # Create invoice
-        await message.answer_invoice(
-            title=plan["title"],
-            description=plan["description"],
-            payload=f"credits_{plan_id}_{user_id}",
-            provider_token=YOOKASSA_PROVIDER_TOKEN,
-            currency=plan["currency"],
-            prices=[
-                types.LabeledPrice(
-                    label=f"{plan['credits']} credits",
-                    amount=plan["price"]
+        async def send_invoice() -> dict:
+            sent = await message.answer_invoice(
+                title=plan["title"],
+                description=plan["description"],
+                payload=f"credits_{plan_id}_{user_id}",
+                provider_token=YOOKASSA_PROVIDER_TOKEN,
+                currency=plan["currency"],
+                prices=[
+                    types.LabeledPrice(
+                        label=f"{plan['credits']} credits",
+                        amount=plan["price"]
+                    )
+                ],
+                start_parameter=f"buy_{plan_id}",
+                photo_url="https://api.c0r.ai/assets/logo_v2.png",
+                photo_width=512,
+                photo_height=512,
+                need_email=True,
+                send_email_to_provider=True,
+                provider_data=provider_data,
+                need_phone_number=False,
+                need_shipping_address=False,
+                is_flexible=False
+            )
+            return {"message_id": sent.message_id}
+
+        # Telegram creates the provider payment only when the invoice is paid,
+        # so a repeated tap just points to the unpaid invoice already in the chat
+        invoice, reused = await pending_invoices.get_or_create(user_id, plan_id, "telegram_payments", send_invoice)
+        if reused:
+            logger.info(f"Reusing pending invoice message {invoice['message_id']} for user {user_id}, plan {plan_id}")
+            user = await get_or_create_user(user_id)
+            try:
+                await message.answer(
+                    i18n.get_text("payment_invoice_pending", user.get("language", "en")),
+                    reply_to_message_id=invoice["message_id"]
                 )
-            ],
-            start_parameter=f"buy_{plan_id}",
-            photo_url="https://api.c0r.ai/assets/logo_v2.png",
-            photo_width=512,
-            photo_height=512,
-            need_email=True,
-            send_email_to_provider=True,
-            provider_data=provider_data,
-            need_phone_number=False,
-            need_shipping_address=False,
-            is_flexible=False
-        )
-        
+                return
+            except TelegramBadRequest as e:
+                # The invoice message was deleted - forget it and send a new one
+                logger.info(f"Pending invoice message {invoice['message_id']} of user {user_id} is gone ({e}), sending a new invoice")
+                pending_invoices.settle(user_id, plan_id, "telegram_payments")
+                await pending_invoices.get_or_create(user_id, plan_id, "telegram_payments", send_invoice)
+
         logger.info(f"Created invoice for user {user_id}, plan {plan_id}")
         
     except Exception as e:
@@ -196,6 +223,7 @@ async def handle_successful_payment(message: types.Message):
         user_id = int(parts[2])
         
         logger.info(f"Payment details - plan: {plan_id}, user_id: {user_id}, telegram_user_id: {telegram_user_id}")
+        pending_invoices.settle(user_id, plan_id, "telegram_payments")
         
         # Get plan details
         plan = PAYMENT_PLANS.get(plan_id)
@@ -205,26 +233,25 @@ async def handle_successful_payment(message: types.Message):
 
         logger.info(f"Plan details: {plan}")
         
-        # Get user before adding credits
-        user_before = await get_or_create_user(user_id)
-        logger.info(f"User before payment: {user_before}")
-        
-        # Add credits to user account
-        updated_user = await add_credits(user_id, plan["credits"])
-        logger.info(f"User after payment: {updated_user}")
-        
-        # Add payment record to database
+        # Grant credits and record the payment in one transaction
         payment_amount = payment.total_amount / 100  # Convert kopecks to rubles
-        await add_payment(
-            user_id=updated_user['id'],
+        updated_user = await record_payment(
+            "telegram_payments",
+            user_id,
+            plan["credits"],
+            payment_id=payment.provider_payment_charge_id,
             amount=payment_amount,
-            gateway="telegram_payments",
-            status="succeeded"
+            event_type="successful_payment"
         )
+        logger.info(f"Payment ledger result: {updated_user}")
+        if updated_user is None:
+            raise ValueError(f"User {user_id} not found")
+        if updated_user["status"] == "duplicate":
+            return
         
         # Log payment action
         await log_user_action(
-            user_id=updated_user['id'],
+            user_id=updated_user['user_id'],
             action_type="payment_success",
             metadata={
                 "plan_id": plan_id,
@@ -236,17 +263,18 @@ async def handle_successful_payment(message: types.Message):
             }
         )
         
-        # Send confirmation message
-        await message.answer(
-            f"✅ **Payment Successful!**\n\n"
-            f"💳 **Plan**: {plan['title']}\n"
-            f"⚡ **Credits Added**: {plan['credits']}\n"
-            f"💰 **Amount Paid**: {payment.total_amount/100:.2f} {payment.currency}\n"
-            f"🔋 **Total Credits**: {updated_user['credits_remaining']}\n\n"
-            f"You can now continue analyzing your food photos!",
-            parse_mode="Markdown",
-            reply_markup=create_payment_success_keyboard()
-        )
+        # Send confirmation message ahead of other queued messages
+        with send_priority(SendPriority.HIGH):
+            await message.answer(
+                f"✅ **Payment Successful!**\n\n"
+                f"💳 **Plan**: {plan['title']}\n"
+                f"⚡ **Credits Added**: {plan['credits']}\n"
+                f"💰 **Amount Paid**: {payment.total_amount/100:.2f} {payment.currency}\n"
+                f"🔋 **Total Credits**: {updated_user['credits_remaining']}\n\n"
+                f"You can now continue analyzing your food photos!",
+                parse_mode="Markdown",
+                reply_markup=create_payment_success_keyboard()
+            )
         
         logger.info(f"Payment processed successfully for user {user_id}: {plan['credits']} credits added, total credits: {updated_user['credits_remaining']}")
         
@@ -254,4 +282,5 @@ async def handle_successful_payment(message: types.Message):
         logger.error(f"Failed to process successful payment for user {telegram_user_id}: {e}")
         import traceback
         logger.error(f"Payment error traceback: {traceback.format_exc()}")
-        await message.answer("❌ Payment was successful but there was an error adding credits. Please contact support.") 
\ No newline at end of file
+        with send_priority(SendPriority.HIGH):
+            await message.answer("❌ Payment was successful but there was an error adding credits. Please contact support.") 
\ No newline at end of file
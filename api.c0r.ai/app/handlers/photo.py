@@ -9,10 +9,15 @@ from aiogram.fsm.context import FSMContext
 from loguru import logger
 from common.routes import Routes
 from common.supabase_client import get_or_create_user, decrement_credits, get_user_with_profile, log_user_action, get_daily_calories_consumed
-from utils.r2 import upload_telegram_photo
+from utils.r2 import store_photo_in_r2, index_stored_photo
+from utils.analysis_cache import AnalysisCache
+from utils.job_queue import JobQueue, JobWorkerPool, NonRetryableJobError
 from .keyboards import create_main_menu_keyboard
-from i18n.i18n import i18n
-from config import PAYMENT_PLANS
+from i18n.i18n import i18n, static_screen
+from config import (
+    PAYMENT_PLANS, PHOTO_QUEUE_DB_PATH, PHOTO_QUEUE_WORKERS, PHOTO_QUEUE_MAX_ATTEMPTS,
+    ANALYSIS_CACHE_DB_PATH, ANALYSIS_CACHE_TTL_SECONDS
+)
 
 # All values must be set in .env file
 ML_SERVICE_URL = os.getenv("ML_SERVICE_URL")
@@ -41,10 +46,28 @@ def format_analysis_result(result: dict, user_language: str = 'en') -> str:
     
     return "\n".join(message_parts)
 
+# Background queue for photo analysis - handlers enqueue, workers do the slow part
+nutrition_job_queue = JobQueue(
+    PHOTO_QUEUE_DB_PATH,
+    queue="nutrition_analysis",
+    max_attempts=PHOTO_QUEUE_MAX_ATTEMPTS
+)
+nutrition_worker_pool = None
+
+# Results of previous analyses, reused for forwarded or re-sent photos
+nutrition_analysis_cache = AnalysisCache(ANALYSIS_CACHE_DB_PATH, ANALYSIS_CACHE_TTL_SECONDS)
+
+def nutrition_job_key(telegram_user_id: int, file_unique_id: str) -> str:
+    """Idempotency key for analysis of one photo by one user"""
+    return f"{telegram_user_id}:{file_unique_id}"
+
 # Process nutrition analysis for a photo
 async def process_nutrition_analysis(message: types.Message, state: FSMContext):
     """
     Process photo for nutrition analysis
+    
+    Validates the request and enqueues an analysis job; the "Analyzing..."
+    message is edited by a background worker once the job is done.
     """
     try:
         telegram_user_id = message.from_user.id
@@ -64,8 +87,6 @@ async def process_nutrition_analysis(message: types.Message, state: FSMContext):
         # Get user info
         user_data = await get_user_with_profile(telegram_user_id)
         user = user_data['user']
-        profile = user_data['profile']
-        has_profile = user_data['has_profile']
         
         credits = user["credits_remaining"]
         if credits <= 0:
@@ -76,29 +97,122 @@ async def process_nutrition_analysis(message: types.Message, state: FSMContext):
             )
             return
         
-        # Send processing message
         user_language = user.get('language', 'en')
+        
+        # Same photo already being analyzed (e.g. user retried) - don't duplicate work
+        job_key = nutrition_job_key(telegram_user_id, photo.file_unique_id)
+        if await nutrition_job_queue.get_active(job_key):
+            logger.info(f"Analysis of photo {photo.file_unique_id} already queued for user {telegram_user_id}")
+            if user_language == 'ru':
+                await message.answer("⏳ Это фото уже анализируется, результат скоро будет готов.")
+            else:
+                await message.answer("⏳ This photo is already being analyzed, the result will be ready soon.")
+            await state.clear()
+            return
+        
+        # Send processing message
         if user_language == 'ru':
             processing_msg = await message.answer("🔍 Анализирую фото...\n\nПожалуйста, подождите...")
         else:
             processing_msg = await message.answer("🔍 Analyzing photo...\n\nPlease wait...")
         
-        # Download and upload photo to R2
-        photo = message.photo[-1]  # Get highest resolution photo
-        photo_url = await upload_telegram_photo(
-            message.bot, 
-            photo, 
-            str(user["id"]), 
-            "nutrition_analysis"
+        job, created = await nutrition_job_queue.enqueue(
+            telegram_user_id,
+            job_key,
+            {
+                "telegram_user_id": telegram_user_id,
+                "chat_id": message.chat.id,
+                "message_id": processing_msg.message_id,
+                "file_id": photo.file_id,
+                "file_unique_id": photo.file_unique_id,
+                "user_language": user_language
+            }
         )
+        if created:
+            logger.info(f"Enqueued nutrition analysis job {job['id']} for user {telegram_user_id}")
+            if nutrition_worker_pool:
+                nutrition_worker_pool.notify()
+        else:
+            # Lost a race with a duplicate request
+            await processing_msg.delete()
+        
+        # Clear the state
+        await state.clear()
+        
+    except Exception as e:
+        logger.error(f"Error in nutrition analysis for user {telegram_user_id}: {e}")
+        await message.answer(
+            "❌ **Error**\n\n"
+            "Something went wrong during analysis. Please try again.",
+            parse_mode="Markdown"
+        )
+        # Clear state on error
+        await state.clear()
+
+async def run_nutrition_analysis_job(bot, job: dict):
+    """
+    Background worker: upload photo, call ML service, charge credit and
+    edit the "Analyzing..." message with the result
+    
+    Raises on transient errors so the job is retried with backoff. The
+    uploaded R2 key and the credit charge are recorded in the job payload,
+    so a retry neither uploads the photo again nor charges twice.
+    """
+    payload = job["payload"]
+    telegram_user_id = payload["telegram_user_id"]
+    chat_id = payload["chat_id"]
+    message_id = payload["message_id"]
+    user_language = payload["user_language"]
+    logger.info(f"Running nutrition analysis job {job['id']} for user {telegram_user_id} (attempt {job['attempts']})")
+    
+    # Credits may have been spent by an earlier job of this user
+    user_data = await get_user_with_profile(telegram_user_id)
+    user = user_data['user']
+    profile = user_data['profile']
+    has_profile = user_data['has_profile']
+    charged = payload.get("charged", False)
+    credits = user["credits_remaining"]
+    if credits <= 0 and not charged:
+        await bot.edit_message_text(
+            i18n.get_text("photo_no_credits", user_language),
+            chat_id=chat_id,
+            message_id=message_id,
+            parse_mode="Markdown"
+        )
+        return
+    
+    # Repeat photo (forwarded or re-sent) - reuse stored object and previous result
+    file_unique_id = payload["file_unique_id"]
+    cached = None
+    try:
+        cached = await nutrition_analysis_cache.get(file_unique_id, user_language)
+    except Exception as e:
+        logger.error(f"Analysis cache lookup failed for photo {file_unique_id}: {e}")
+    
+    if cached:
+        logger.info(f"Analysis cache hit for photo {file_unique_id}, skipping download, upload and ML call")
+        result = cached["result"]
+        # Record the photo for this user as an upload would (a blob reference, the object is already stored)
+        if cached["r2_key"] and "r2_key" not in payload:
+            try:
+                r2_key = await index_stored_photo(cached["r2_key"], str(user["id"]), "nutrition_analysis")
+                await nutrition_job_queue.update_payload(job, r2_key=r2_key)
+            except Exception as e:
+                logger.error(f"Failed to record cached photo {cached['r2_key']} for user {user['id']}: {e}")
+    else:
+        # Download photo once, use it for both R2 upload and ML analysis
+        photo_file = await bot.get_file(payload["file_id"])
+        photo_io = await bot.download_file(photo_file.file_path)
+        photo_bytes = photo_io.getvalue()
+        
+        if "r2_key" in payload:
+            r2_key = payload["r2_key"]
+        else:
+            r2_key = await store_photo_in_r2(photo_bytes, str(user["id"]), "image/jpeg", "nutrition_analysis")
+            await nutrition_job_queue.update_payload(job, r2_key=r2_key)
         
         # Call ML service for analysis
         async with httpx.AsyncClient() as client:
-            # Download photo data for ML service
-            photo_file = await message.bot.get_file(photo.file_id)
-            photo_bytes = await message.bot.download_file(photo_file.file_path)
-            
-            # Prepare form data for ML service
             files = {"photo": ("photo.jpg", photo_bytes, "image/jpeg")}
             data = {
                 "telegram_user_id": str(telegram_user_id),
@@ -112,67 +226,119 @@ async def process_nutrition_analysis(message: types.Message, state: FSMContext):
                 data=data,
                 timeout=60.0
             )
-            
-            if response.status_code != 200:
-                logger.error(f"ML service error: {response.status_code} - {response.text}")
-                await processing_msg.edit_text(
-                    "❌ **Analysis failed**\n\n"
-                    "Sorry, we couldn't analyze your photo. Please try again.",
-                    parse_mode="Markdown"
-                )
-                return
-            
-            result = response.json()
         
-        # Format and send result
-        analysis_text = format_analysis_result(result, user_language)
+        if response.status_code != 200:
+            logger.error(f"ML service error: {response.status_code} - {response.text}")
+            error = f"ML service returned {response.status_code}"
+            if response.status_code < 500 and response.status_code != 429:
+                raise NonRetryableJobError(error)
+            raise RuntimeError(error)
         
-        # Add daily progress if user has profile
-        if has_profile and profile:
-            daily_data = await get_daily_calories_consumed(str(user["id"]))
-            daily_consumed = daily_data.get("total_calories", 0) if isinstance(daily_data, dict) else daily_data
-            daily_target = profile.get("daily_calories_target", 2000)
-            remaining = daily_target - daily_consumed
-            
-            if user_language == 'ru':
-                progress_text = f"\n📊 **Дневной прогресс:**\nПотреблено: {daily_consumed} ккал\nЦель: {daily_target} ккал\nОсталось: {remaining} ккал"
-            else:
-                progress_text = f"\n📊 **Daily Progress:**\nConsumed: {daily_consumed} cal\nTarget: {daily_target} cal\nRemaining: {remaining} cal"
-            
-            analysis_text += progress_text
+        result = response.json()
         
-        # Decrement credits
-        await decrement_credits(telegram_user_id)
+        try:
+            await nutrition_analysis_cache.put(file_unique_id, user_language, r2_key, result)
+        except Exception as e:
+            logger.error(f"Failed to cache analysis for photo {file_unique_id}: {e}")
+    
+    # Format result
+    analysis_text = format_analysis_result(result, user_language)
+    
+    # Add daily progress if user has profile
+    if has_profile and profile:
+        daily_data = await get_daily_calories_consumed(str(user["id"]))
+        daily_consumed = daily_data.get("total_calories", 0) if isinstance(daily_data, dict) else daily_data
+        daily_target = profile.get("daily_calories_target", 2000)
+        remaining = daily_target - daily_consumed
         
-        # Log action
-        await log_user_action(str(user["id"]), "nutrition_analysis")
+        if user_language == 'ru':
+            progress_text = f"\n📊 **Дневной прогресс:**\nПотреблено: {daily_consumed} ккал\nЦель: {daily_target} ккал\nОсталось: {remaining} ккал"
+        else:
+            progress_text = f"\n📊 **Daily Progress:**\nConsumed: {daily_consumed} cal\nTarget: {daily_target} cal\nRemaining: {remaining} cal"
         
-        # Clear the state
-        await state.clear()
+        analysis_text += progress_text
+    
+    # Charge once per job: the marker is recorded first, so a retry after a crash never charges again
+    if charged:
+        credits_left = credits
+    else:
+        await nutrition_job_queue.update_payload(job, charged=True)
+        credits_left = credits - 1
+        try:
+            await decrement_credits(telegram_user_id, reference=f"nutrition_job:{job['id']}")
+        except Exception as e:
+            logger.error(f"Failed to charge credit for job {job['id']} of user {telegram_user_id}: {e}")
+    
+    # From here on the job counts as charged - never raise, the result is delivered at most once
+    try:
+        await log_user_action(str(user["id"]), "nutrition_analysis", metadata={"cached": bool(cached)})
         
-        # Send result with main menu
         keyboard = create_main_menu_keyboard(user_language)
-        
         if user_language == 'ru':
-            final_text = f"✅ **Анализ завершен!**\n\n{analysis_text}\n\n💳 **Осталось кредитов:** {credits - 1}"
+            final_text = f"✅ **Анализ завершен!**\n\n{analysis_text}\n\n💳 **Осталось кредитов:** {credits_left}"
         else:
-            final_text = f"✅ **Analysis complete!**\n\n{analysis_text}\n\n💳 **Credits remaining:** {credits - 1}"
+            final_text = f"✅ **Analysis complete!**\n\n{analysis_text}\n\n💳 **Credits remaining:** {credits_left}"
         
-        await processing_msg.edit_text(
+        await bot.edit_message_text(
             final_text,
+            chat_id=chat_id,
+            message_id=message_id,
             parse_mode="Markdown",
             reply_markup=keyboard
         )
-        
     except Exception as e:
-        logger.error(f"Error in nutrition analysis for user {telegram_user_id}: {e}")
-        await message.answer(
-            "❌ **Error**\n\n"
-            "Something went wrong during analysis. Please try again.",
-            parse_mode="Markdown"
-        )
-        # Clear state on error
-        await state.clear()
+        logger.error(f"Failed to deliver analysis result of job {job['id']} to user {telegram_user_id}: {e}")
+
+async def notify_nutrition_analysis_failed(bot, job: dict, error: str):
+    """Tell the user that analysis failed after all retries"""
+    payload = job["payload"]
+    await bot.edit_message_text(
+        i18n.get_text("photo_analysis_failed", payload.get("user_language", "en")),
+        chat_id=payload["chat_id"],
+        message_id=payload["message_id"],
+        parse_mode="Markdown"
+    )
+
+async def start_nutrition_workers(bot):
+    """Start background workers for queued photo analysis"""
+    global nutrition_worker_pool
+    purged = await nutrition_analysis_cache.purge_expired()
+    if purged:
+        logger.info(f"Purged {purged} expired analysis cache entries")
+    nutrition_worker_pool = JobWorkerPool(
+        nutrition_job_queue,
+        handler=lambda job: run_nutrition_analysis_job(bot, job),
+        on_failure=lambda job, error: notify_nutrition_analysis_failed(bot, job, error),
+        concurrency=PHOTO_QUEUE_WORKERS
+    )
+    await nutrition_worker_pool.start()
+    return nutrition_worker_pool
+
+@static_screen
+def render_out_of_credits_prompt(language: str):
+    """Plans text and keyboard of the out-of-credits prompt (static per language)"""
+    credits_for = f"{i18n.get_text('credits', language)} {i18n.get_text('for', language)}"
+    rubles = i18n.get_text('rubles', language)
+    plans_text = (
+        f"📦 {i18n.get_text('basic_plan_title', language)}: {PAYMENT_PLANS['basic']['credits']} {credits_for} {PAYMENT_PLANS['basic']['price'] // 100} {rubles}\n"
+        f"📦 {i18n.get_text('pro_plan_title', language)}: {PAYMENT_PLANS['pro']['credits']} {credits_for} {PAYMENT_PLANS['pro']['price'] // 100} {rubles}\n\n"
+        f"{i18n.get_text('photo_out_of_credits_choose_plan', language)}:"
+    )
+    keyboard = types.InlineKeyboardMarkup(inline_keyboard=[
+        [
+            types.InlineKeyboardButton(
+                text=f"💰 {i18n.get_text('basic_plan_btn', language, price=PAYMENT_PLANS['basic']['price'] // 100)}",
+                callback_data="buy_basic"
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                text=f"💎 {i18n.get_text('pro_plan_btn', language, price=PAYMENT_PLANS['pro']['price'] // 100)}",
+                callback_data="buy_pro"
+            )
+        ]
+    ])
+    return plans_text, keyboard
 
 # Main photo handler - only handles photos when no FSM state is set
 async def photo_handler(message: types.Message, state: FSMContext):
@@ -224,27 +390,13 @@ async def photo_handler(message: types.Message, state: FSMContext):
             user_language = user.get('language', 'en')
             
             # Out of credits - show payment options
+            plans_text, keyboard = render_out_of_credits_prompt(user_language)
             await message.answer(
                 f"{i18n.get_text('photo_out_of_credits_title', user_language)}\n\n"
                 f"{i18n.get_text('current_credits', user_language, credits=user['credits_remaining'])}: *{user['credits_remaining']}*\n\n"
-                f"📦 {i18n.get_text('basic_plan_title', user_language)}: {PAYMENT_PLANS['basic']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {PAYMENT_PLANS['basic']['price'] // 100} {i18n.get_text('rubles', user_language)}\n"
-                f"📦 {i18n.get_text('pro_plan_title', user_language)}: {PAYMENT_PLANS['pro']['credits']} {i18n.get_text('credits', user_language)} {i18n.get_text('for', user_language)} {PAYMENT_PLANS['pro']['price'] // 100} {i18n.get_text('rubles', user_language)}\n\n"
-                f"{i18n.get_text('photo_out_of_credits_choose_plan', user_language)}:",
+                f"{plans_text}",
                 parse_mode="Markdown",
-                reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[
-                    [
-                        types.InlineKeyboardButton(
-                            text=f"💰 {i18n.get_text('basic_plan_btn', user_language, price=PAYMENT_PLANS['basic']['price'] // 100)}",
-                            callback_data="buy_basic"
-                        )
-                    ],
-                    [
-                        types.InlineKeyboardButton(
-                            text=f"💎 {i18n.get_text('pro_plan_btn', user_language, price=PAYMENT_PLANS['pro']['price'] // 100)}",
-                            callback_data="buy_pro"
-                        )
-                    ]
-                ])
+                reply_markup=keyboard
             )
             return
         
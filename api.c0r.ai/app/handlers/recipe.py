@@ -600,7 +600,7 @@ async def process_recipe_photo(message: types.Message, state: FSMContext):
                 return
             
             # Decrement credits
-            await decrement_credits(telegram_user_id, 1)
+            await decrement_credits(telegram_user_id, 1, reason="recipe")
             
             # Log successful recipe generation
             await log_user_action(
@@ -1,14 +1,18 @@
 import sys; print("PYTHONPATH:", sys.path)
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 import asyncio
+from typing import Optional
 from bot import start_bot
 import os
 import httpx
 from common.routes import Routes
 from common.supabase_client import (
-    get_or_create_user, get_user_by_telegram_id, decrement_credits, add_credits, log_analysis, add_payment
+    get_or_create_user, get_user_by_telegram_id, decrement_credits, refund_credits, log_analysis,
+    get_credit_history, get_ledger_balance, snapshot_credit_balances
 )
+from common.payment_ledger import record_payment
 from utils.r2 import test_r2_connection, get_photo_stats, get_user_photos
 from loguru import logger
 
@@ -67,6 +71,7 @@ async def analyze(request: Request):
             json={"user_id": user_id, "image_url": image_url}
         )
     if resp.status_code != 200:
+        await refund_credits(user_id, 1, reason="analysis_failed")
         raise HTTPException(status_code=resp.status_code, detail=resp.text)
     result = resp.json()
     # Логирование анализа
@@ -79,6 +84,7 @@ async def buy_credits(request: Request):
     user_id = data.get("user_id")
     amount = data.get("amount")
     description = data.get("description", "Buy credits")
+    plan_id = data.get("plan_id", "basic")
     if not user_id or not amount:
         raise HTTPException(status_code=400, detail="user_id and amount required")
     # Прокси-запрос к pay.c0r.ai
@@ -86,7 +92,7 @@ async def buy_credits(request: Request):
         resp = await client.post(
             f"{PAY_SERVICE_URL}{Routes.PAY_INVOICE}",
             headers={"X-Internal-Token": INTERNAL_API_TOKEN},
-            json={"user_id": user_id, "amount": amount, "description": description}
+            json={"user_id": user_id, "amount": amount, "description": description, "plan_id": plan_id}
         )
     if resp.status_code != 200:
         raise HTTPException(status_code=resp.status_code, detail=resp.text)
@@ -103,16 +109,20 @@ async def add_credits_api(request: Request):
     status = data.get("status", "succeeded")
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id required")
-    user = await add_credits(user_id, count)
-    # Добавить запись о платеже, если есть данные
-    if amount is not None and payment_id is not None:
-        await add_payment(user["id"], amount, gateway, status)
-    return user
+    # Claim, credits and payment row in one transaction - provider retries grant credits only once
+    result = await record_payment(gateway, user_id, count, payment_id=payment_id, amount=amount,
+                                  status=status, event_type="credits.add")
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return result
 
 @app.get("/debug/r2")
 async def debug_r2():
     """Debug R2 configuration and status"""
-    from utils.r2 import R2_ENABLED, R2_ACCOUNT_ID, R2_BUCKET_NAME, test_r2_connection
+    from utils.r2 import (
+        R2_ENABLED, R2_ACCOUNT_ID, R2_BUCKET_NAME, test_r2_connection, get_r2_latency_stats,
+        get_storage_backend, storage_enabled
+    )
     
     r2_config = {
         "r2_enabled": R2_ENABLED,
@@ -120,14 +130,16 @@ async def debug_r2():
         "r2_bucket_name": R2_BUCKET_NAME,
         "r2_access_key_configured": bool(os.getenv("R2_ACCESS_KEY_ID")),
         "r2_secret_key_configured": bool(os.getenv("R2_SECRET_ACCESS_KEY")),
+        "storage_backend": get_storage_backend().name,
     }
     
-    if R2_ENABLED:
+    if storage_enabled():
         connection_test = await test_r2_connection()
         r2_config["connection_test"] = "SUCCESS" if connection_test else "FAILED"
     else:
         r2_config["connection_test"] = "SKIPPED (R2 not enabled)"
     
+    r2_config["latency"] = get_r2_latency_stats()
     return r2_config
 
 @app.get("/debug/recent-logs")
@@ -143,11 +155,81 @@ async def debug_recent_logs():
         "logs": logs
     }
 
+@app.get("/debug/jobs")
+async def debug_jobs():
+    """Get background photo analysis queue statistics"""
+    from handlers.photo import nutrition_job_queue
+    return await nutrition_job_queue.stats()
+
+def require_internal_token(request: Request):
+    if not INTERNAL_API_TOKEN or request.headers.get("X-Internal-Token") != INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.post("/admin/broadcast")
+async def start_broadcast(request: Request):
+    """Start announcement to all users, optionally filtered by languages/countries"""
+    require_internal_token(request)
+    from bot import bot, broadcast_engine
+    spec = await request.json()
+    try:
+        return await broadcast_engine.start(bot, spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/broadcast/{broadcast_id}")
+async def broadcast_status(broadcast_id: int, request: Request):
+    """Get broadcast progress and throughput"""
+    require_internal_token(request)
+    from bot import broadcast_engine
+    report = await broadcast_engine.report(broadcast_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return report
+
+@app.post("/admin/broadcast/{broadcast_id}/cancel")
+async def cancel_broadcast(broadcast_id: int, request: Request):
+    """Stop a running broadcast"""
+    require_internal_token(request)
+    from bot import broadcast_engine
+    report = await broadcast_engine.cancel(broadcast_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return report
+
+@app.get("/admin/credits/{telegram_id}")
+async def credit_history(telegram_id: int, request: Request, before: Optional[str] = None,
+                         before_id: Optional[int] = None, limit: int = 50):
+    """
+    Why a user has N credits: cached balance, balance recomputed from the ledger and ledger entries
+
+    The next page is requested with before=next_before and before_id=next_before_id.
+    """
+    require_internal_token(request)
+    user = await get_user_by_telegram_id(telegram_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    limit = min(limit, 500)
+    entries = await get_credit_history(user["id"], before=before, before_id=before_id, limit=limit)
+    last = entries[-1] if len(entries) == limit else None
+    return {
+        "credits_remaining": user["credits_remaining"],
+        "ledger_balance": await get_ledger_balance(user["id"]),
+        "entries": entries,
+        "next_before": last["created_at"] if last else None,
+        "next_before_id": last["id"] if last else None
+    }
+
+@app.post("/admin/credits/snapshot")
+async def snapshot_credits(request: Request):
+    """Snapshot credit balances (run periodically, e.g. daily from cron)"""
+    require_internal_token(request)
+    return {"snapshots": await snapshot_credit_balances()}
+
 @app.get("/r2/test")
 async def test_r2():
     """Test R2 connection and configuration"""
     connection_ok = await test_r2_connection()
-    stats = get_photo_stats()
+    stats = await get_photo_stats()
     
     return {
         "r2_connection": "ok" if connection_ok else "failed",
@@ -158,14 +240,87 @@ async def test_r2():
 @app.get("/r2/stats")
 async def r2_stats():
     """Get R2 bucket statistics"""
-    return get_photo_stats()
+    return await get_photo_stats()
+
+@app.get("/storage/{key:path}")
+async def get_stored_object(key: str, expires: int, signature: str):
+    """Serve photo from local storage backend (signed URL)"""
+    from utils.r2 import get_storage_backend
+    from utils.storage import LocalStorageBackend
+    storage = get_storage_backend()
+    if not isinstance(storage, LocalStorageBackend) or not storage.verify(key, expires, signature):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        path = storage.path_for(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(path)
+
+r2_rescan_task = None
+
+@app.post("/admin/r2/rescan")
+async def rescan_r2_stats(request: Request):
+    """Recount bucket statistics from a full listing (runs in background)"""
+    global r2_rescan_task
+    require_internal_token(request)
+    from utils.r2 import rescan_photo_stats
+    if r2_rescan_task and not r2_rescan_task.done():
+        return {"status": "already_running"}
+    r2_rescan_task = asyncio.create_task(rescan_photo_stats())
+    return {"status": "started"}
+
+recompression_task = None
+recompression_store = None
+
+def get_recompression_store():
+    global recompression_store
+    if recompression_store is None:
+        from utils.photo_recompression import RecompressionStore, RECOMPRESSION_DB_PATH
+        recompression_store = RecompressionStore(RECOMPRESSION_DB_PATH)
+    return recompression_store
+
+@app.post("/admin/r2/recompress")
+async def start_recompression(request: Request):
+    """
+    Recompress old photos to WebP (runs in background, resumes an interrupted run)
+
+    Optional JSON body: older_than_days, quality, delete_originals, max_side, resume
+    """
+    global recompression_task
+    require_internal_token(request)
+    from utils.photo_recompression import run_recompression
+    from utils.thumbnails import derivatives_enabled
+    if not derivatives_enabled():
+        raise HTTPException(status_code=503, detail="Pillow is not installed")
+    if recompression_task and not recompression_task.done():
+        return {"status": "already_running"}
+    options = await request.json() if await request.body() else {}
+    allowed = {"older_than_days", "quality", "delete_originals", "max_side", "resume"}
+    unknown = set(options) - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown options: {', '.join(sorted(unknown))}")
+    recompression_task = asyncio.create_task(run_recompression(get_recompression_store(), **options))
+    return {"status": "started"}
+
+@app.get("/admin/r2/recompress/{run_id}")
+async def recompression_status(run_id: int, request: Request):
+    """Get recompression run progress and bytes reclaimed"""
+    require_internal_token(request)
+    from utils.photo_recompression import recompression_report
+    run = await get_recompression_store().get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Recompression run not found")
+    return recompression_report(run)
 
 @app.get("/r2/user/{user_id}/photos")
-async def get_user_photos_api(user_id: str, limit: int = 20):
-    """Get photos for specific user"""
-    photos = await get_user_photos(user_id, limit)
+async def get_user_photos_api(user_id: str, limit: int = 20, before: Optional[str] = None):
+    """Get photos for specific user, newest first (pass next_cursor as before for the next page)"""
+    photos = await get_user_photos(user_id, limit, before)
     return {
         "user_id": user_id,
         "photos_count": len(photos),
-        "photos": photos
+        "photos": photos,
+        "next_cursor": photos[-1]["cursor"] if len(photos) == limit else None
     } 
\ No newline at end of file
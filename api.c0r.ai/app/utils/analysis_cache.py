@@ -0,0 +1,75 @@
+"""
+Persistent cache of photo analysis results keyed by Telegram file_unique_id
+
+Forwarded or re-sent photos keep the same file_unique_id, so a repeat photo
+can reuse the stored R2 object and the previous ML result instead of
+downloading, uploading and analyzing it again.
+"""
+import json
+import time
+from typing import Optional
+from common.sqlite_store import SQLiteStore
+
+ANALYSIS_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    file_unique_id TEXT NOT NULL,
+    language TEXT NOT NULL,
+    r2_key TEXT,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (file_unique_id, language)
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires ON analysis_cache(expires_at);
+"""
+
+
+class AnalysisCache(SQLiteStore):
+    """file_unique_id -> (R2 key, analysis result) with TTL"""
+
+    SCHEMA = ANALYSIS_CACHE_SCHEMA
+
+    def __init__(self, db_path: str, ttl_seconds: float = 7 * 86400):
+        """
+        Args:
+            db_path: Path to SQLite database file
+            ttl_seconds: How long a stored result is reused
+        """
+        super().__init__(db_path)
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, file_unique_id: str, language: str) -> Optional[dict]:
+        """
+        Get cached analysis for photo
+
+        Returns:
+            Dict with r2_key and result, or None if missing or expired
+        """
+        def op(conn):
+            row = conn.execute(
+                "SELECT r2_key, result FROM analysis_cache "
+                "WHERE file_unique_id = ? AND language = ? AND expires_at > ?",
+                (file_unique_id, language, time.time())
+            ).fetchone()
+            if not row:
+                return None
+            return {"r2_key": row["r2_key"], "result": json.loads(row["result"])}
+        return await self._run(op)
+
+    async def put(self, file_unique_id: str, language: str, r2_key: Optional[str], result: dict) -> None:
+        """Store analysis result for photo, replacing any previous entry"""
+        def op(conn):
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache "
+                "(file_unique_id, language, r2_key, result, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (file_unique_id, language, r2_key, json.dumps(result), now, now + self.ttl_seconds)
+            )
+        await self._run(op)
+
+    async def purge_expired(self) -> int:
+        """Delete expired entries, returns number of deleted rows"""
+        def op(conn):
+            cursor = conn.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (time.time(),))
+            return cursor.rowcount
+        return await self._run(op)
@@ -0,0 +1,258 @@
+"""
+Broadcast (announcement) engine for c0r.ai bot
+
+Sends one announcement to many users:
+- streams target users from `users` in keyset-paginated batches, filtered
+  by language and/or country, prefetching the next page while sending
+- renders the text once per language through i18n
+- sends through a bounded concurrent pool with LOW priority, so the
+  OutboundScheduler keeps normal replies and payments ahead of it
+- checkpoints progress after every batch in local SQLite and resumes
+  running broadcasts after a restart (a crash may resend at most one batch)
+- reports sent / failed / blocked counts and throughput
+"""
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Optional
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from loguru import logger
+from i18n.i18n import i18n
+from .send_scheduler import send_priority, SendPriority
+from common.sqlite_store import SQLiteStore
+
+BROADCAST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'running',
+    spec TEXT NOT NULL,
+    last_telegram_id INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts(status);
+"""
+
+
+class BroadcastStore(SQLiteStore):
+    """Broadcast definitions and progress checkpoints"""
+
+    SCHEMA = BROADCAST_SCHEMA
+
+    @staticmethod
+    def _row_to_broadcast(row) -> dict:
+        broadcast = dict(row)
+        broadcast["spec"] = json.loads(broadcast["spec"])
+        return broadcast
+
+    async def create(self, spec: dict) -> dict:
+        def op(conn):
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO broadcasts (spec, created_at, updated_at) VALUES (?, ?, ?) RETURNING *",
+                (json.dumps(spec), now, now)
+            )
+            return self._row_to_broadcast(cursor.fetchone())
+        return await self._run(op)
+
+    async def get(self, broadcast_id: int) -> Optional[dict]:
+        def op(conn):
+            row = conn.execute("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone()
+            return self._row_to_broadcast(row) if row else None
+        return await self._run(op)
+
+    async def list_running(self) -> list:
+        def op(conn):
+            rows = conn.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id").fetchall()
+            return [self._row_to_broadcast(row) for row in rows]
+        return await self._run(op)
+
+    async def checkpoint(self, broadcast_id: int, last_telegram_id: int, sent: int, failed: int, blocked: int) -> None:
+        """Record that all users up to last_telegram_id have been processed"""
+        def op(conn):
+            conn.execute(
+                "UPDATE broadcasts SET last_telegram_id = ?, sent = ?, failed = ?, blocked = ?, updated_at = ? "
+                "WHERE id = ?",
+                (last_telegram_id, sent, failed, blocked, time.time(), broadcast_id)
+            )
+        await self._run(op)
+
+    async def finish(self, broadcast_id: int, status: str, error: Optional[str] = None) -> None:
+        def op(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                (status, now, now, error, broadcast_id)
+            )
+        await self._run(op)
+
+
+def validate_broadcast_spec(spec: dict) -> dict:
+    """
+    Validate and normalize broadcast request
+
+    Spec fields:
+        text_key: i18n key of the announcement (with optional params), or
+        texts: Mapping of language code -> text (English used as fallback)
+        languages: Only send to users with these languages (optional)
+        countries: Only send to users from these countries (optional)
+        parse_mode: Telegram parse mode (default: Markdown)
+
+    Raises:
+        ValueError: If no text is given
+    """
+    if not spec.get("text_key") and not spec.get("texts"):
+        raise ValueError("text_key or texts required")
+    if spec.get("texts") and "en" not in spec["texts"]:
+        raise ValueError("texts must include English ('en') fallback")
+    return {
+        "text_key": spec.get("text_key"),
+        "params": spec.get("params") or {},
+        "texts": spec.get("texts") or {},
+        "languages": spec.get("languages") or None,
+        "countries": spec.get("countries") or None,
+        "parse_mode": spec.get("parse_mode", "Markdown"),
+    }
+
+
+def render_broadcast_text(spec: dict, language: str) -> str:
+    """Render announcement text for one language"""
+    if spec["texts"]:
+        return spec["texts"].get(language) or spec["texts"]["en"]
+    return i18n.get_text(spec["text_key"], language, **spec["params"])
+
+
+def broadcast_report(broadcast: dict) -> dict:
+    """Progress and throughput of a broadcast"""
+    end = broadcast["finished_at"] or time.time()
+    elapsed = max(end - broadcast["created_at"], 0.001)
+    processed = broadcast["sent"] + broadcast["failed"] + broadcast["blocked"]
+    return {
+        "id": broadcast["id"],
+        "status": broadcast["status"],
+        "sent": broadcast["sent"],
+        "failed": broadcast["failed"],
+        "blocked": broadcast["blocked"],
+        "processed": processed,
+        "last_telegram_id": broadcast["last_telegram_id"],
+        "elapsed_seconds": round(elapsed, 1),
+        "throughput_per_second": round(processed / elapsed, 2),
+        "last_error": broadcast["last_error"],
+    }
+
+
+class BroadcastEngine:
+    """Runs broadcasts as background tasks"""
+
+    def __init__(self, store: BroadcastStore, fetch_page: Callable[..., Awaitable[list]],
+                 batch_size: int = 500, concurrency: int = 20):
+        """
+        Args:
+            store: Broadcast checkpoint store
+            fetch_page: Coroutine (after_telegram_id, limit, languages, countries) -> users
+            batch_size: Users per page and per checkpoint
+            concurrency: Maximum sends in flight
+        """
+        self.store = store
+        self.fetch_page = fetch_page
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def start(self, bot, spec: dict) -> dict:
+        """Create broadcast and start sending in the background"""
+        broadcast = await self.store.create(validate_broadcast_spec(spec))
+        logger.info(f"Starting broadcast {broadcast['id']}: {broadcast['spec']}")
+        self._launch(bot, broadcast)
+        return broadcast_report(broadcast)
+
+    async def resume(self, bot) -> int:
+        """Resume broadcasts interrupted by a restart"""
+        running = await self.store.list_running()
+        for broadcast in running:
+            if broadcast["id"] not in self._tasks:
+                logger.info(f"Resuming broadcast {broadcast['id']} after telegram_id {broadcast['last_telegram_id']}")
+                self._launch(bot, broadcast)
+        return len(running)
+
+    async def cancel(self, broadcast_id: int) -> Optional[dict]:
+        task = self._tasks.pop(broadcast_id, None)
+        if task:
+            task.cancel()
+        broadcast = await self.store.get(broadcast_id)
+        if broadcast and broadcast["status"] == "running":
+            await self.store.finish(broadcast_id, "cancelled")
+            broadcast = await self.store.get(broadcast_id)
+        return broadcast_report(broadcast) if broadcast else None
+
+    async def report(self, broadcast_id: int) -> Optional[dict]:
+        broadcast = await self.store.get(broadcast_id)
+        return broadcast_report(broadcast) if broadcast else None
+
+    def _launch(self, bot, broadcast: dict) -> asyncio.Task:
+        task = asyncio.create_task(self._run(bot, broadcast))
+        self._tasks[broadcast["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast["id"], None))
+        return task
+
+    async def _run(self, bot, broadcast: dict) -> None:
+        broadcast_id = broadcast["id"]
+        spec = broadcast["spec"]
+        counters = {"sent": broadcast["sent"], "failed": broadcast["failed"], "blocked": broadcast["blocked"]}
+        texts: dict[str, str] = {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(user: dict) -> None:
+            language = user.get("language") or "en"
+            if language not in texts:
+                texts[language] = render_broadcast_text(spec, language)
+            async with semaphore:
+                try:
+                    with send_priority(SendPriority.LOW):
+                        await bot.send_message(
+                            chat_id=user["telegram_id"],
+                            text=texts[language],
+                            parse_mode=spec["parse_mode"]
+                        )
+                    counters["sent"] += 1
+                except TelegramForbiddenError:
+                    # User blocked the bot
+                    counters["blocked"] += 1
+                except TelegramAPIError as e:
+                    counters["failed"] += 1
+                    logger.warning(f"Broadcast {broadcast_id} failed for user {user['telegram_id']}: {e}")
+
+        def fetch(after: int):
+            return asyncio.create_task(
+                self.fetch_page(after, self.batch_size, spec["languages"], spec["countries"])
+            )
+
+        next_page = fetch(broadcast["last_telegram_id"])
+        try:
+            while True:
+                users = await next_page
+                if not users:
+                    break
+                last_telegram_id = users[-1]["telegram_id"]
+                # Prefetch the next page while this batch is being sent
+                next_page = fetch(last_telegram_id) if len(users) == self.batch_size else None
+                await asyncio.gather(*(send(user) for user in users))
+                await self.store.checkpoint(broadcast_id, last_telegram_id, **counters)
+                if next_page is None:
+                    break
+
+            await self.store.finish(broadcast_id, "done")
+            logger.info(f"Broadcast {broadcast_id} finished: {counters}")
+        except asyncio.CancelledError:
+            if next_page is not None:
+                next_page.cancel()
+            logger.info(f"Broadcast {broadcast_id} cancelled: {counters}")
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast {broadcast_id} failed: {e}")
+            await self.store.finish(broadcast_id, "failed", str(e))
@@ -0,0 +1,326 @@
+"""
+Durable background job queue for c0r.ai bot
+
+Jobs are stored in a local SQLite database so they survive bot restarts, and
+are processed by a pool of asyncio workers with:
+- per-user ordering (a user's jobs run one at a time, oldest first)
+- retries with exponential backoff
+- idempotency keys (a duplicate of an active job is not enqueued twice)
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+from common.sqlite_store import SQLiteStore
+
+
+class NonRetryableJobError(Exception):
+    """Raised by a job handler when retrying cannot help (e.g. invalid input)"""
+
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+-- Only one active (pending/running) job per idempotency key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_key
+    ON jobs(queue, idempotency_key) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(queue, status, run_at, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(queue, user_id, status, id);
+"""
+
+
+class JobQueue(SQLiteStore):
+    """SQLite-backed job queue, safe to share between asyncio workers"""
+
+    SCHEMA = JOBS_SCHEMA
+
+    def __init__(self, db_path: str, queue: str = "default", max_attempts: int = 3,
+                 backoff_base: float = 5.0, backoff_max: float = 300.0):
+        """
+        Args:
+            db_path: Path to SQLite database file
+            queue: Queue name (several queues may share one database)
+            max_attempts: Attempts before a job is marked as failed
+            backoff_base: Delay in seconds before the first retry, doubled on each retry
+            backoff_max: Maximum delay between retries
+        """
+        super().__init__(db_path)
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    # === Producer API ===
+
+    async def enqueue(self, user_id: str, idempotency_key: str, payload: dict) -> tuple[dict, bool]:
+        """
+        Add job to the queue unless an active job with the same key exists
+
+        Returns:
+            Tuple of (job, created) - created is False for duplicates
+        """
+        def op(conn):
+            now = time.time()
+            try:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (queue, user_id, idempotency_key, payload, run_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING *",
+                    (self.queue, str(user_id), idempotency_key, json.dumps(payload), now, now, now)
+                )
+                return self._row_to_job(cursor.fetchone()), True
+            except sqlite3.IntegrityError:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE queue = ? AND idempotency_key = ? AND status IN ('pending', 'running')",
+                    (self.queue, idempotency_key)
+                ).fetchone()
+                return self._row_to_job(row), False
+        return await self._run(op)
+
+    async def get_active(self, idempotency_key: str) -> Optional[dict]:
+        """Get pending or running job by idempotency key"""
+        def op(conn):
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE queue = ? AND idempotency_key = ? AND status IN ('pending', 'running')",
+                (self.queue, idempotency_key)
+            ).fetchone()
+            return self._row_to_job(row) if row else None
+        return await self._run(op)
+
+    # === Worker API ===
+
+    async def claim(self) -> Optional[dict]:
+        """
+        Claim the next runnable job
+
+        A job is runnable when it is due and it is its user's oldest unfinished
+        job, so jobs of one user are processed strictly in order.
+        """
+        def op(conn):
+            now = time.time()
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+                WHERE id = (
+                    SELECT j.id FROM jobs j
+                    WHERE j.queue = ? AND j.status = 'pending' AND j.run_at <= ?
+                      AND NOT EXISTS (
+                          SELECT 1 FROM jobs o
+                          WHERE o.queue = j.queue AND o.user_id = j.user_id
+                            AND o.status IN ('pending', 'running') AND o.id < j.id
+                      )
+                    ORDER BY j.run_at, j.id
+                    LIMIT 1
+                )
+                RETURNING *
+                """,
+                (now, self.queue, now)
+            )
+            row = cursor.fetchone()
+            return self._row_to_job(row) if row else None
+        return await self._run(op)
+
+    async def complete(self, job_id: int) -> None:
+        """Mark job as done"""
+        def op(conn):
+            conn.execute(
+                "UPDATE jobs SET status = 'done', updated_at = ?, last_error = NULL WHERE id = ?",
+                (time.time(), job_id)
+            )
+        await self._run(op)
+
+    async def update_payload(self, job: dict, **fields) -> None:
+        """
+        Merge fields into the payload of a claimed job (in memory and stored)
+
+        Handlers record finished side effects (uploaded object, charged
+        credit) this way, so a retry of the job does not repeat them.
+        """
+        job["payload"].update(fields)
+
+        def op(conn):
+            with self._transaction(conn):
+                row = conn.execute("SELECT payload FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+                if row is None:
+                    return
+                payload = {**json.loads(row["payload"]), **fields}
+                conn.execute(
+                    "UPDATE jobs SET payload = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(payload), time.time(), job["id"])
+                )
+        await self._run(op)
+
+    async def retry_or_fail(self, job: dict, error: str, retryable: bool = True) -> bool:
+        """
+        Schedule job for retry with exponential backoff, or fail it
+
+        Args:
+            job: Claimed job
+            error: Error description stored with the job
+            retryable: False to fail the job without further attempts
+
+        Returns:
+            True if the job will be retried, False if it has failed permanently
+        """
+        will_retry = retryable and job["attempts"] < self.max_attempts
+        delay = min(self.backoff_base * (2 ** (job["attempts"] - 1)), self.backoff_max)
+
+        def op(conn):
+            now = time.time()
+            if will_retry:
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', run_at = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                    (now + delay, now, error, job["id"])
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', updated_at = ?, last_error = ? WHERE id = ?",
+                    (now, error, job["id"])
+                )
+        await self._run(op)
+        return will_retry
+
+    async def requeue_running(self) -> int:
+        """Return jobs left running by a crashed process to the queue"""
+        def op(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', updated_at = ? WHERE queue = ? AND status = 'running'",
+                (time.time(), self.queue)
+            )
+            return cursor.rowcount
+        return await self._run(op)
+
+    async def purge_finished(self, older_than_seconds: float = 7 * 86400) -> int:
+        """Delete done/failed jobs older than given age"""
+        def op(conn):
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE queue = ? AND status IN ('done', 'failed') AND updated_at < ?",
+                (self.queue, time.time() - older_than_seconds)
+            )
+            return cursor.rowcount
+        return await self._run(op)
+
+    async def stats(self) -> dict:
+        """Get job counts by status and age of the oldest pending job"""
+        def op(conn):
+            counts = {
+                row["status"]: row["count"]
+                for row in conn.execute(
+                    "SELECT status, COUNT(*) AS count FROM jobs WHERE queue = ? GROUP BY status",
+                    (self.queue,)
+                )
+            }
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE queue = ? AND status = 'pending'",
+                (self.queue,)
+            ).fetchone()[0]
+            return {
+                "queue": self.queue,
+                "pending": counts.get("pending", 0),
+                "running": counts.get("running", 0),
+                "done": counts.get("done", 0),
+                "failed": counts.get("failed", 0),
+                "oldest_pending_age_seconds": round(time.time() - oldest, 1) if oldest else 0
+            }
+        return await self._run(op)
+
+
+class JobWorkerPool:
+    """Pool of asyncio workers processing jobs from a JobQueue"""
+
+    def __init__(self, queue: JobQueue, handler: Callable[[dict], Awaitable[None]],
+                 on_failure: Optional[Callable[[dict, str], Awaitable[None]]] = None,
+                 concurrency: int = 4, poll_interval: float = 1.0):
+        """
+        Args:
+            queue: Job queue to process
+            handler: Coroutine called with the job; raising schedules a retry
+            on_failure: Coroutine called with (job, error) once retries are exhausted
+            concurrency: Number of concurrent workers
+            poll_interval: Idle sleep between claims when no wakeup arrives
+        """
+        self.queue = queue
+        self.handler = handler
+        self.on_failure = on_failure
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    async def start(self) -> None:
+        requeued = await self.queue.requeue_running()
+        if requeued:
+            logger.warning(f"Requeued {requeued} interrupted jobs in queue {self.queue.queue}")
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logger.info(f"Started {self.concurrency} workers for queue {self.queue.queue}")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers after a job was enqueued"""
+        self._wakeup.set()
+
+    async def _worker(self, worker_id: int) -> None:
+        while not self._stopping:
+            try:
+                job = await self.queue.claim()
+            except Exception as e:
+                logger.error(f"Worker {worker_id} failed to claim job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Another job may be runnable right away (e.g. another user's)
+            self._wakeup.set()
+            await self._process(worker_id, job)
+
+    async def _process(self, worker_id: int, job: dict) -> None:
+        try:
+            await self.handler(job)
+            await self.queue.complete(job["id"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            retryable = not isinstance(e, NonRetryableJobError)
+            will_retry = await self.queue.retry_or_fail(job, error, retryable)
+            if will_retry:
+                logger.warning(f"Job {job['id']} attempt {job['attempts']} failed, will retry: {error}")
+            else:
+                logger.error(f"Job {job['id']} failed after {job['attempts']} attempts: {error}")
+                if self.on_failure:
+                    try:
+                        await self.on_failure(job, error)
+                    except Exception as failure_error:
+                        logger.error(f"Failure callback for job {job['id']} raised: {failure_error}")
+        finally:
+            # Finishing a job may unblock the same user's next job
+            self._wakeup.set()
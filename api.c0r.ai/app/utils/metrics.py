@@ -0,0 +1,74 @@
+"""
+Lightweight in-process metrics for c0r.ai services
+
+Fixed-bucket latency histograms: recording is O(number of buckets) with no
+allocation, and a snapshot gives counts per bucket plus estimated percentiles
+for the debug endpoints.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Sequence
+
+# Upper bounds in seconds, roughly doubling from 5ms to 30s
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    """Thread-safe histogram of durations in seconds"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last bucket is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+            self._count += 1
+            if seconds > self._max:
+                self._max = seconds
+
+    @contextmanager
+    def time(self):
+        """Record duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def percentile(self, q: float) -> float:
+        """Estimated q-th percentile (0-100): upper bound of the bucket that contains it"""
+        with self._lock:
+            if not self._count:
+                return 0.0
+            rank = q / 100 * self._count
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank and count:
+                    return self.buckets[index] if index < len(self.buckets) else self._max
+            return self._max
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, count, maximum = self._sum, self._count, self._max
+        buckets: Dict[str, int] = {f"le_{bound}": n for bound, n in zip(self.buckets, counts)}
+        buckets["le_inf"] = counts[-1]
+        return {
+            "count": count,
+            "avg_seconds": round(total / count, 4) if count else 0,
+            "max_seconds": round(maximum, 4),
+            "p50_seconds": self.percentile(50),
+            "p95_seconds": self.percentile(95),
+            "p99_seconds": self.percentile(99),
+            "buckets": buckets,
+        }
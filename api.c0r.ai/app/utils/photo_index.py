@@ -0,0 +1,294 @@
+"""
+Index of photos stored in R2
+
+Written on every upload so a user's photo history is an indexed query with
+keyset pagination (newest first) instead of a bucket listing. Photos that
+predate the index are added by the storage rescan (see r2.rescan_photo_stats).
+Keys of the thumbnail and preview derivatives are stored with the original.
+
+Photos are content-addressed: identical images share one stored object
+(blob). `photos` holds one row per upload (user, action) and `blobs` holds
+one row per stored object with the number of photos referencing it, so a
+repeated upload skips put_object and an object is deleted only when its
+last reference goes away.
+
+Objects replaced by another one (e.g. originals kept after recompression)
+are recorded in `superseded`, so a bucket rescan does not index them again
+and they are deleted together with their replacement.
+"""
+import json
+import time
+from typing import Iterable, Optional
+from common.sqlite_store import SQLiteStore
+
+PHOTO_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    action_type TEXT,
+    created_at REAL NOT NULL,
+    sha256 TEXT,
+    thumb_key TEXT,
+    preview_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_photos_user_created ON photos(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_photos_key ON photos(key);
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS superseded (
+    key TEXT PRIMARY KEY,
+    replaced_by TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_superseded_replaced_by ON superseded(replaced_by);
+"""
+
+
+def encode_cursor(photo: dict) -> str:
+    return f"{photo['created_at']!r}|{photo['id']}"
+
+
+def decode_cursor(cursor: str) -> tuple[float, int]:
+    created_at, photo_id = cursor.split("|", 1)
+    return float(created_at), int(photo_id)
+
+
+class PhotoIndex(SQLiteStore):
+    """photos (one row per upload) and blobs (one row per stored object, with refcount)"""
+
+    SCHEMA = PHOTO_INDEX_SCHEMA
+
+    async def get_blob(self, sha256: str) -> Optional[dict]:
+        """Get stored object with given content hash"""
+        def op(conn):
+            row = conn.execute("SELECT * FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            return dict(row) if row else None
+        return await self._run(op)
+
+    async def get_blob_by_key(self, key: str) -> Optional[dict]:
+        """Get stored object by its key, following a superseded key to its replacement"""
+        def op(conn):
+            row = conn.execute(
+                "SELECT * FROM blobs WHERE key = COALESCE((SELECT replaced_by FROM superseded WHERE key = ?), ?)",
+                (key, key)
+            ).fetchone()
+            return dict(row) if row else None
+        return await self._run(op)
+
+    async def add(self, key: str, user_id: str, size: int, action_type: Optional[str] = None,
+                  created_at: Optional[float] = None, sha256: Optional[str] = None) -> int:
+        """
+        Index an uploaded photo and take a reference on its blob
+
+        A photo of already stored content inherits the blob's derivatives.
+
+        Returns:
+            Photo id
+        """
+        def op(conn):
+            now = created_at or time.time()
+            with self._transaction(conn):
+                if sha256:
+                    conn.execute(
+                        "INSERT INTO blobs (sha256, key, size, refcount, created_at) VALUES (?, ?, ?, 1, ?) "
+                        "ON CONFLICT(sha256) DO UPDATE SET refcount = refcount + 1",
+                        (sha256, key, size, now)
+                    )
+                cursor = conn.execute(
+                    "INSERT INTO photos (key, user_id, size, action_type, created_at, sha256, thumb_key, preview_key) "
+                    "SELECT ?, ?, ?, ?, ?, ?, "
+                    "(SELECT thumb_key FROM photos WHERE key = ? AND thumb_key IS NOT NULL LIMIT 1), "
+                    "(SELECT preview_key FROM photos WHERE key = ? AND preview_key IS NOT NULL LIMIT 1)",
+                    (key, user_id, size, action_type, now, sha256, key, key)
+                )
+                return cursor.lastrowid
+        return await self._run(op)
+
+    async def remove(self, photo_id: int) -> Optional[dict]:
+        """
+        Remove photo from the index and release its blob reference
+
+        Returns:
+            The removed photo row if no other photo references its stored
+            object (the caller should delete the object, and the objects it
+            replaced listed in superseded_keys), otherwise None
+        """
+        def op(conn):
+            with self._transaction(conn):
+                row = conn.execute("SELECT * FROM photos WHERE id = ?", (photo_id,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("DELETE FROM photos WHERE id = ?", (photo_id,))
+                if row["sha256"]:
+                    conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (row["sha256"],))
+                    conn.execute("DELETE FROM blobs WHERE sha256 = ? AND refcount <= 0", (row["sha256"],))
+                still_used = conn.execute("SELECT 1 FROM photos WHERE key = ? LIMIT 1", (row["key"],)).fetchone()
+                if still_used:
+                    return None
+                superseded_keys = [
+                    superseded["key"] for superseded in conn.execute(
+                        "DELETE FROM superseded WHERE replaced_by = ? RETURNING key", (row["key"],)
+                    )
+                ]
+                return dict(row, superseded_keys=superseded_keys)
+        return await self._run(op)
+
+    async def set_derivatives(self, key: str, thumb_key: Optional[str], preview_key: Optional[str]) -> None:
+        """Attach derivative image keys to all photos of a stored object"""
+        def op(conn):
+            conn.execute(
+                "UPDATE photos SET thumb_key = ?, preview_key = ? WHERE key = ?",
+                (thumb_key, preview_key, key)
+            )
+        await self._run(op)
+
+    async def add_missing(self, photos: Iterable[tuple]) -> int:
+        """
+        Add photos found by a bucket listing that are not indexed yet
+
+        Objects that were replaced by another one are not photos of their own
+        and are skipped.
+
+        Args:
+            photos: Iterable of (key, user_id, size, action_type, created_at)
+
+        Returns:
+            Number of newly indexed photos
+        """
+        rows = [(*photo, photo[0], photo[0]) for photo in photos]
+
+        def op(conn):
+            with self._transaction(conn):
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT INTO photos (key, user_id, size, action_type, created_at) "
+                    "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM photos WHERE key = ?) "
+                    "AND NOT EXISTS (SELECT 1 FROM superseded WHERE key = ?)",
+                    rows
+                )
+                return conn.total_changes - before
+        return await self._run(op)
+
+    async def prune_missing(self, existing_keys: set, created_before: float) -> int:
+        """
+        Drop index entries whose object is no longer in the bucket
+
+        Only photos indexed before the bucket listing started are considered,
+        newer uploads may simply not have been listed yet.
+
+        Returns:
+            Number of removed photos
+        """
+        def op(conn):
+            with self._transaction(conn):
+                missing = [
+                    row["key"] for row in conn.execute(
+                        "SELECT DISTINCT key FROM photos WHERE created_at < ?", (created_before,)
+                    )
+                    if row["key"] not in existing_keys
+                ]
+                before = conn.total_changes
+                conn.executemany("DELETE FROM photos WHERE key = ?", [(key,) for key in missing])
+                removed = conn.total_changes - before
+                conn.executemany("DELETE FROM blobs WHERE key = ?", [(key,) for key in missing])
+                conn.execute(
+                    "DELETE FROM superseded WHERE created_at < ? AND key NOT IN (SELECT value FROM json_each(?))",
+                    (created_before, json.dumps(sorted(existing_keys)))
+                )
+                return removed
+        return await self._run(op)
+
+    async def list_cold_objects(self, created_before: float, after_key: str = "", limit: int = 100) -> list:
+        """
+        Stored objects whose first photo is older than created_before, in key order
+
+        Already recompressed (WebP) and superseded objects are skipped.
+
+        Returns:
+            List of dicts with key and size
+        """
+        def op(conn):
+            rows = conn.execute(
+                "SELECT key, MAX(size) AS size FROM photos WHERE key > ? AND key NOT LIKE '%.webp' "
+                "AND key NOT IN (SELECT key FROM superseded) "
+                "GROUP BY key HAVING MIN(created_at) < ? ORDER BY key LIMIT ?",
+                (after_key, created_before, limit)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        return await self._run(op)
+
+    async def replace_key(self, old_key: str, new_key: str, new_size: int) -> int:
+        """
+        Point all photos of a stored object to its replacement (e.g. recompressed copy)
+
+        The old key is recorded as superseded until the object is deleted
+        (see forget_superseded).
+
+        Returns:
+            Number of updated photos
+        """
+        def op(conn):
+            with self._transaction(conn):
+                updated = conn.execute(
+                    "UPDATE photos SET key = ?, size = ? WHERE key = ?", (new_key, new_size, old_key)
+                ).rowcount
+                conn.execute("UPDATE blobs SET key = ?, size = ? WHERE key = ?", (new_key, new_size, old_key))
+                conn.execute("UPDATE superseded SET replaced_by = ? WHERE replaced_by = ?", (new_key, old_key))
+                conn.execute(
+                    "INSERT OR REPLACE INTO superseded (key, replaced_by, created_at) VALUES (?, ?, ?)",
+                    (old_key, new_key, time.time())
+                )
+                return updated
+        return await self._run(op)
+
+    async def forget_superseded(self, key: str) -> None:
+        """Drop the superseded record of an object that was deleted"""
+        def op(conn):
+            conn.execute("DELETE FROM superseded WHERE key = ?", (key,))
+        await self._run(op)
+
+    async def is_referenced(self, key: str) -> bool:
+        def op(conn):
+            return conn.execute("SELECT 1 FROM photos WHERE key = ? LIMIT 1", (key,)).fetchone() is not None
+        return await self._run(op)
+
+    async def list_user_photos(self, user_id: str, limit: int = 50, before: Optional[str] = None) -> list:
+        """
+        Get user's photos, newest first
+
+        Args:
+            user_id: User UUID
+            limit: Page size
+            before: Cursor of the last photo of the previous page (optional)
+
+        Returns:
+            List of photo dicts, each with a cursor for the next page
+        """
+        def op(conn):
+            if before:
+                created_at, photo_id = decode_cursor(before)
+                rows = conn.execute(
+                    "SELECT * FROM photos WHERE user_id = ? AND (created_at, id) < (?, ?) "
+                    "ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (user_id, created_at, photo_id, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM photos WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (user_id, limit)
+                ).fetchall()
+            return [dict(row, cursor=encode_cursor(row)) for row in rows]
+        return await self._run(op)
+
+    async def usage_rows(self) -> list:
+        """(user_id, size, created_at) of every indexed photo, for recounting storage stats"""
+        def op(conn):
+            return [tuple(row) for row in conn.execute("SELECT user_id, size, created_at FROM photos")]
+        return await self._run(op)
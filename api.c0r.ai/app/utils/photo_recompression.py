@@ -0,0 +1,225 @@
+"""
+Cold storage job: recompress old meal photos
+
+Walks stored objects whose photos are older than N days (in key order, from
+the photo index), re-encodes each as WebP at a target quality in the image
+process pool, stores the copy next to the original (<name>.webp), points the
+index at it and optionally deletes the original. A kept original is recorded
+as superseded by its copy (see PhotoIndex.replace_key), so rescans and later
+runs leave it alone and it is deleted together with the copy.
+
+Progress (last processed key and counters) is checkpointed after every batch
+in local SQLite, so an interrupted run resumes where it stopped. Storage
+counters are corrected by the next storage rescan.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+from loguru import logger
+from common.sqlite_store import SQLiteStore
+from .thumbnails import derivatives_enabled, recompress, DERIVATIVE_CONTENT_TYPE, DERIVATIVE_WORKERS
+from . import r2
+
+RECOMPRESSION_DB_PATH = os.getenv("RECOMPRESSION_DB_PATH", "data/recompression.db")
+RECOMPRESS_OLDER_THAN_DAYS = int(os.getenv("RECOMPRESS_OLDER_THAN_DAYS", "90"))
+RECOMPRESS_QUALITY = int(os.getenv("RECOMPRESS_QUALITY", "70"))
+RECOMPRESS_DELETE_ORIGINALS = os.getenv("RECOMPRESS_DELETE_ORIGINALS", "false").lower() == "true"
+
+# Keep the original when recompression saves less than this fraction
+MIN_SAVINGS_RATIO = 0.1
+
+RECOMPRESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recompression_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'running',
+    options TEXT NOT NULL,
+    last_key TEXT NOT NULL DEFAULT '',
+    processed INTEGER NOT NULL DEFAULT 0,
+    recompressed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    bytes_before INTEGER NOT NULL DEFAULT 0,
+    bytes_after INTEGER NOT NULL DEFAULT 0,
+    bytes_reclaimed INTEGER NOT NULL DEFAULT 0,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    last_error TEXT
+);
+"""
+
+COUNTERS = ("processed", "recompressed", "skipped", "failed", "bytes_before", "bytes_after", "bytes_reclaimed")
+
+
+class RecompressionStore(SQLiteStore):
+    """Recompression runs with checkpoints"""
+
+    SCHEMA = RECOMPRESSION_SCHEMA
+
+    @staticmethod
+    def _row_to_run(row) -> dict:
+        run = dict(row)
+        run["options"] = json.loads(run["options"])
+        return run
+
+    async def create(self, options: dict) -> dict:
+        def op(conn):
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO recompression_runs (options, started_at, updated_at) VALUES (?, ?, ?) RETURNING *",
+                (json.dumps(options), now, now)
+            )
+            return self._row_to_run(cursor.fetchone())
+        return await self._run(op)
+
+    async def get(self, run_id: int) -> Optional[dict]:
+        def op(conn):
+            row = conn.execute("SELECT * FROM recompression_runs WHERE id = ?", (run_id,)).fetchone()
+            return self._row_to_run(row) if row else None
+        return await self._run(op)
+
+    async def get_unfinished(self) -> Optional[dict]:
+        def op(conn):
+            row = conn.execute(
+                "SELECT * FROM recompression_runs WHERE status = 'running' ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+            return self._row_to_run(row) if row else None
+        return await self._run(op)
+
+    async def checkpoint(self, run_id: int, last_key: str, counters: dict) -> None:
+        def op(conn):
+            conn.execute(
+                f"UPDATE recompression_runs SET last_key = ?, {', '.join(f'{name} = ?' for name in COUNTERS)}, "
+                "updated_at = ? WHERE id = ?",
+                (last_key, *(counters[name] for name in COUNTERS), time.time(), run_id)
+            )
+        await self._run(op)
+
+    async def finish(self, run_id: int, status: str, error: Optional[str] = None) -> None:
+        def op(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE recompression_runs SET status = ?, finished_at = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                (status, now, now, error, run_id)
+            )
+        await self._run(op)
+
+
+def recompressed_key(key: str) -> str:
+    return f"{os.path.splitext(key)[0]}.webp"
+
+
+async def recompress_object(obj: dict, options: dict) -> dict:
+    """
+    Recompress one stored object
+
+    Returns:
+        Counter deltas for this object
+    """
+    storage = r2.get_storage_backend()
+    original = await storage.get(obj["key"])
+    compressed = await recompress(original, options["quality"], options.get("max_side"))
+
+    if len(compressed) > len(original) * (1 - MIN_SAVINGS_RATIO):
+        return {"skipped": 1, "bytes_before": len(original), "bytes_after": len(original)}
+
+    new_key = recompressed_key(obj["key"])
+    await storage.put(new_key, compressed, DERIVATIVE_CONTENT_TYPE, metadata={"original_key": obj["key"]})
+    await r2.photo_index.replace_key(obj["key"], new_key, len(compressed))
+    r2.invalidate_signed_url(obj["key"])
+
+    reclaimed = 0
+    # A photo indexed while we were recompressing may still point to the original
+    if options["delete_originals"] and not await r2.photo_index.is_referenced(obj["key"]):
+        await storage.delete(obj["key"])
+        await r2.photo_index.forget_superseded(obj["key"])
+        reclaimed = len(original) - len(compressed)
+
+    return {
+        "recompressed": 1,
+        "bytes_before": len(original),
+        "bytes_after": len(compressed),
+        "bytes_reclaimed": reclaimed,
+    }
+
+
+def recompression_report(run: dict) -> dict:
+    report = {name: run[name] for name in ("id", "status", "options", "last_key", *COUNTERS)}
+    report["bytes_reclaimed_mb"] = round(run["bytes_reclaimed"] / (1024 * 1024), 2)
+    report["elapsed_seconds"] = round((run["finished_at"] or time.time()) - run["started_at"], 1)
+    report["last_error"] = run["last_error"]
+    return report
+
+
+async def run_recompression(store: RecompressionStore, older_than_days: int = RECOMPRESS_OLDER_THAN_DAYS,
+                            quality: int = RECOMPRESS_QUALITY, delete_originals: bool = RECOMPRESS_DELETE_ORIGINALS,
+                            max_side: Optional[int] = None, batch_size: int = 50,
+                            concurrency: int = DERIVATIVE_WORKERS, resume: bool = True) -> dict:
+    """
+    Recompress photos older than given age, resuming an interrupted run if any
+
+    Args:
+        store: Checkpoint store
+        older_than_days: Only photos first stored at least this many days ago
+        quality: WebP quality (0-100)
+        delete_originals: Delete original objects after recompression
+        max_side: Downscale to this longest side in pixels (optional)
+        batch_size: Objects per checkpoint
+        concurrency: Objects recompressed at the same time
+        resume: Continue the last unfinished run instead of starting a new one
+
+    Returns:
+        Run report with counters and bytes reclaimed
+    """
+    if not derivatives_enabled():
+        raise RuntimeError("Pillow is not installed")
+
+    run = await store.get_unfinished() if resume else None
+    if run:
+        logger.info(f"Resuming photo recompression run {run['id']} after {run['last_key']!r}")
+    else:
+        run = await store.create({
+            "older_than_days": older_than_days,
+            "quality": quality,
+            "delete_originals": delete_originals,
+            "max_side": max_side,
+            # Fixed when the run starts so a resumed run selects the same photos
+            "created_before": time.time() - older_than_days * 86400,
+        })
+        logger.info(f"Starting photo recompression run {run['id']}: {run['options']}")
+
+    options = run["options"]
+    counters = {name: run[name] for name in COUNTERS}
+    last_key = run["last_key"]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(obj: dict) -> dict:
+        async with semaphore:
+            try:
+                return await recompress_object(obj, options)
+            except Exception as e:
+                logger.error(f"Failed to recompress {obj['key']}: {e}")
+                return {"failed": 1}
+
+    try:
+        while True:
+            batch = await r2.photo_index.list_cold_objects(options["created_before"], last_key, batch_size)
+            if not batch:
+                break
+            for result in await asyncio.gather(*(process(obj) for obj in batch)):
+                counters["processed"] += 1
+                for name, value in result.items():
+                    counters[name] += value
+            last_key = batch[-1]["key"]
+            await store.checkpoint(run["id"], last_key, counters)
+
+        await store.finish(run["id"], "done")
+    except Exception as e:
+        logger.error(f"Photo recompression run {run['id']} failed: {e}")
+        await store.finish(run["id"], "failed", str(e))
+
+    report = recompression_report(await store.get(run["id"]))
+    logger.info(f"Photo recompression run {run['id']} finished: {report}")
+    return report
@@ -6,15 +6,31 @@ Note: For public photo access, you need to:
 2. Configure bucket policy for public read access
 
 Current implementation assumes private bucket with signed URLs capability.
+
+All object operations go through a StorageBackend (see utils/storage.py):
+R2 by default, or the local filesystem with STORAGE_BACKEND=local.
 """
 import os
-import uuid
+import asyncio
+import functools
 import hashlib
-import mimetypes
-from typing import BinaryIO, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 from loguru import logger
+from .metrics import LatencyHistogram
+from .storage_stats import StorageStatsStore
+from .photo_index import PhotoIndex
+from .storage import StorageBackend, LocalStorageBackend, STORAGE_BACKEND
+from .thumbnails import (
+    derivatives_enabled, derivative_key, generate_derivatives, is_derivative_key, DERIVATIVE_CONTENT_TYPE
+)
 
 # R2 configuration from environment
 R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
@@ -30,46 +46,159 @@ else:
     R2_ENABLED = True
     logger.info(f"R2 configured: bucket={R2_BUCKET_NAME}")
 
+# Connection pool size of the shared client, also the number of R2 I/O threads
+R2_MAX_POOL_CONNECTIONS = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "20"))
+
+_r2_client = None
+_r2_client_lock = threading.Lock()
+_r2_executor: Optional[ThreadPoolExecutor] = None
+
+# Bucket usage counters, updated on every upload
+STORAGE_STATS_DB_PATH = os.getenv("STORAGE_STATS_DB_PATH", "data/storage_stats.db")
+storage_stats = StorageStatsStore(STORAGE_STATS_DB_PATH)
+
+# Index of uploaded photos, used for photo history instead of bucket listings
+PHOTO_INDEX_DB_PATH = os.getenv("PHOTO_INDEX_DB_PATH", "data/photos.db")
+photo_index = PhotoIndex(PHOTO_INDEX_DB_PATH)
+
+# Signed URLs are reused until shortly before they expire
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "10000"))
+SIGNED_URL_REFRESH_MARGIN = 3600
+_signed_url_cache: "OrderedDict[tuple, tuple[str, float]]" = OrderedDict()
+
+# Background derivative uploads (references kept so tasks are not garbage collected)
+_derivative_tasks: set = set()
+
+# Latency of R2 calls (seconds), exposed by /debug/r2
+r2_upload_latency = LatencyHistogram()
+r2_list_latency = LatencyHistogram()
+
 # Create R2 client (compatible with S3 API)
 def get_r2_client():
-    """Create and return R2 client using S3-compatible API"""
+    """
+    Return the shared R2 client using S3-compatible API
+    
+    The client is created once on first use: building it loads service models
+    and a connection pool, which is far too slow to repeat on every call.
+    boto3 clients are thread-safe, so the same client serves all executor threads.
+    """
+    global _r2_client
     if not R2_ENABLED:
         raise Exception("R2 not configured")
     
-    return boto3.client(
-        's3',
-        endpoint_url=f'https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com',
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        region_name='auto'
-    )
+    if _r2_client is None:
+        with _r2_client_lock:
+            if _r2_client is None:
+                _r2_client = boto3.client(
+                    's3',
+                    endpoint_url=f'https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com',
+                    aws_access_key_id=R2_ACCESS_KEY_ID,
+                    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+                    region_name='auto',
+                    config=Config(
+                        max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+                        connect_timeout=5,
+                        read_timeout=30,
+                        retries={'max_attempts': 3, 'mode': 'standard'},
+                        tcp_keepalive=True
+                    )
+                )
+    return _r2_client
 
-def generate_photo_filename(user_id: str, file_extension: str = "jpg", action_type: str = "photo_analysis") -> str:
+async def run_r2_call(fn, *args, **kwargs):
     """
-    Generate unique filename for photo
+    Run blocking R2 client call in the dedicated R2 thread pool
     
-    Args:
-        user_id: User UUID
-        file_extension: File extension (default: jpg)
-        action_type: Type of action (photo_analysis, recipe_generation)
-        
-    Returns:
-        Unique filename in format: user_id/YYYY/MM/DD/action_type/uuid.ext
+    Keeps boto3 network I/O off the event loop without competing with other
+    users of the default executor.
     """
-    from datetime import datetime
+    global _r2_executor
+    if _r2_executor is None:
+        _r2_executor = ThreadPoolExecutor(max_workers=R2_MAX_POOL_CONNECTIONS, thread_name_prefix="r2")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_r2_executor, functools.partial(fn, *args, **kwargs))
+
+def get_r2_latency_stats() -> dict:
+    """Get R2 call latency histograms"""
+    return {
+        "upload": r2_upload_latency.snapshot(),
+        "list": r2_list_latency.snapshot(),
+    }
+
+class R2StorageBackend(StorageBackend):
+    """Cloudflare R2 through the shared boto3 client and R2 thread pool"""
+    
+    name = "r2"
+    
+    async def put(self, key: str, data: bytes, content_type: str, metadata: Optional[dict] = None) -> None:
+        r2_client = get_r2_client()
+        with r2_upload_latency.time():
+            await run_r2_call(
+                r2_client.put_object,
+                Bucket=R2_BUCKET_NAME,
+                Key=key,
+                Body=data,
+                ContentType=content_type,
+                Metadata=metadata or {}
+            )
+    
+    async def get(self, key: str) -> bytes:
+        r2_client = get_r2_client()
+        response = await run_r2_call(r2_client.get_object, Bucket=R2_BUCKET_NAME, Key=key)
+        return await run_r2_call(response['Body'].read)
     
-    # Create date-based path under user folder
-    now = datetime.now()
-    date_path = now.strftime("%Y/%m/%d")
+    def presign(self, key: str, expires_in: int = 86400) -> str:
+        return get_r2_client().generate_presigned_url(
+            'get_object',
+            Params={'Bucket': R2_BUCKET_NAME, 'Key': key},
+            ExpiresIn=expires_in
+        )
     
-    # Generate unique identifier
-    photo_uuid = str(uuid.uuid4())
+    async def list(self, prefix: str = "", page_size: int = 1000):
+        r2_client = get_r2_client()
+        params = {"Bucket": R2_BUCKET_NAME, "Prefix": prefix, "MaxKeys": page_size}
+        while True:
+            with r2_list_latency.time():
+                response = await run_r2_call(r2_client.list_objects_v2, **params)
+            for obj in response.get('Contents', []):
+                yield obj
+            if not response.get('IsTruncated'):
+                break
+            params["ContinuationToken"] = response['NextContinuationToken']
     
-    # Create filename: user_id/2025/01/20/action_type/uuid.jpg
-    filename = f"{user_id}/{date_path}/{action_type}/{photo_uuid}.{file_extension}"
+    async def delete(self, key: str) -> None:
+        await run_r2_call(get_r2_client().delete_object, Bucket=R2_BUCKET_NAME, Key=key)
     
-    logger.info(f"Generated photo filename: {filename}")
-    return filename
+    async def ping(self) -> bool:
+        # Try to list bucket contents (just first item)
+        await run_r2_call(get_r2_client().list_objects_v2, Bucket=R2_BUCKET_NAME, MaxKeys=1)
+        return True
+
+_storage_backend: Optional[StorageBackend] = None
+
+def get_storage_backend() -> StorageBackend:
+    """Return the configured storage backend (STORAGE_BACKEND=r2|local)"""
+    global _storage_backend
+    if _storage_backend is None:
+        _storage_backend = LocalStorageBackend() if STORAGE_BACKEND == "local" else R2StorageBackend()
+    return _storage_backend
+
+def storage_enabled() -> bool:
+    """Whether photos can be stored (R2 configured, or local storage selected)"""
+    return STORAGE_BACKEND == "local" or R2_ENABLED
+
+def generate_content_key(content_hash: str, file_extension: str = "jpg") -> str:
+    """
+    Generate content-addressed key for photo
+    
+    Args:
+        content_hash: SHA-256 hex digest of photo data
+        file_extension: File extension (default: jpg)
+        
+    Returns:
+        Key in format: blobs/ab/abcdef...ext (first hash byte spreads keys over prefixes)
+    """
+    return f"blobs/{content_hash[:2]}/{content_hash}.{file_extension}"
 
 def validate_photo_file(file_data: bytes, max_size_mb: int = 10) -> tuple[bool, str]:
     """
@@ -116,9 +245,9 @@ def validate_photo_file(file_data: bytes, max_size_mb: int = 10) -> tuple[bool,
     logger.info(f"File validation passed: {detected_format}, {file_size_mb:.1f}MB")
     return True, f"Valid {detected_format} image"
 
-async def upload_photo_to_r2(photo_data: bytes, user_id: str, content_type: str = "image/jpeg", action_type: str = "photo_analysis") -> Optional[str]:
+async def store_photo_in_r2(photo_data: bytes, user_id: str, content_type: str = "image/jpeg", action_type: str = "photo_analysis") -> Optional[str]:
     """
-    Upload photo to Cloudflare R2 with validation
+    Validate and store photo in Cloudflare R2
     
     Args:
         photo_data: Photo binary data
@@ -127,9 +256,9 @@ async def upload_photo_to_r2(photo_data: bytes, user_id: str, content_type: str
         action_type: Type of action (photo_analysis, recipe_generation)
         
     Returns:
-        Signed URL of uploaded photo or None if failed
+        R2 object key of stored photo or None if failed
     """
-    if not R2_ENABLED:
+    if not storage_enabled():
         logger.warning("R2 not enabled, skipping photo upload")
         return None
     
@@ -140,40 +269,51 @@ async def upload_photo_to_r2(photo_data: bytes, user_id: str, content_type: str
             logger.error(f"Photo validation failed for user {user_id}: {message}")
             return None
         
-        # Generate filename
+        # Content-addressed key: identical images map to the same object
         file_extension = "jpg" if "jpeg" in content_type else "png"
-        filename = generate_photo_filename(user_id, file_extension, action_type)
-        
-        # Create R2 client
-        r2_client = get_r2_client()
-        
-        # Calculate file hash for integrity
-        file_hash = hashlib.md5(photo_data).hexdigest()
-        
-        # Upload to R2
-        logger.info(f"Uploading photo to R2: {filename} (size: {len(photo_data)} bytes)")
+        content_hash = hashlib.sha256(photo_data).hexdigest()
+        filename = generate_content_key(content_hash, file_extension)
+        
+        try:
+            existing = await photo_index.get_blob(content_hash)
+        except Exception as e:
+            logger.error(f"Photo index lookup failed for {filename}: {e}")
+            existing = None
+        
+        if existing:
+            filename = existing['key']
+            logger.info(f"Photo already stored, skipping upload: {filename} (user: {user_id})")
+        else:
+            # Upload to R2
+            logger.info(f"Uploading photo to R2: {filename} (size: {len(photo_data)} bytes)")
+            
+            await get_storage_backend().put(
+                filename,
+                photo_data,
+                content_type,
+                metadata={
+                    'user_id': user_id,
+                    'upload_source': 'telegram_bot',
+                    'sha256': content_hash
+                }
+            )
+            
+            logger.info(f"Photo uploaded successfully: {filename}")
         
-        r2_client.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=filename,
-            Body=photo_data,
-            ContentType=content_type,
-            Metadata={
-                'user_id': user_id,
-                'upload_source': 'telegram_bot',
-                'file_hash': file_hash
-            }
-        )
+        try:
+            await photo_index.add(filename, user_id, len(photo_data), action_type, sha256=content_hash)
+            await storage_stats.record_upload(user_id, len(photo_data), stored=not existing)
+        except Exception as e:
+            # Counters and index are reconciled by the next rescan
+            logger.error(f"Failed to update storage stats for {filename}: {e}")
         
-        # Generate signed URL for private bucket access (valid for 24 hours)
-        signed_url = r2_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': R2_BUCKET_NAME, 'Key': filename},
-            ExpiresIn=86400  # 24 hours
-        )
+        # Thumbnail and preview are created in the background, the caller only needs the original
+        if derivatives_enabled() and not existing:
+            task = asyncio.create_task(create_photo_derivatives(filename, photo_data))
+            _derivative_tasks.add(task)
+            task.add_done_callback(_derivative_tasks.discard)
         
-        logger.info(f"Photo uploaded successfully: {filename}")
-        return signed_url
+        return filename
         
     except NoCredentialsError:
         logger.error("R2 credentials not found")
@@ -186,6 +326,95 @@ async def upload_photo_to_r2(photo_data: bytes, user_id: str, content_type: str
         logger.error(f"Unexpected error uploading to R2: {e}")
         return None
 
+async def index_stored_photo(key: str, user_id: str, action_type: str = "photo_analysis") -> Optional[str]:
+    """
+    Record a photo of already stored content for another user or action
+    
+    Used when a photo is recognized without downloading it (e.g. a forwarded
+    photo with a cached analysis): the content-addressed blob gets another
+    reference, nothing is uploaded.
+    
+    Returns:
+        Key of the stored object, or None if it is no longer stored
+    """
+    blob = await photo_index.get_blob_by_key(key)
+    if blob is None:
+        logger.warning(f"Stored photo {key} not found in index, not recorded for user {user_id}")
+        return None
+    await photo_index.add(blob['key'], user_id, blob['size'], action_type, sha256=blob['sha256'])
+    await storage_stats.record_upload(user_id, blob['size'], stored=False)
+    return blob['key']
+
+async def create_photo_derivatives(filename: str, photo_data: bytes) -> dict:
+    """
+    Render thumbnail and preview of stored photo, upload them next to the
+    original and record their keys in the photo index
+    
+    Returns:
+        Mapping of derivative name -> R2 key (empty if failed)
+    """
+    try:
+        derivatives = await generate_derivatives(photo_data)
+        storage = get_storage_backend()
+        keys = {}
+        for name, data in derivatives.items():
+            key = derivative_key(filename, name)
+            await storage.put(key, data, DERIVATIVE_CONTENT_TYPE, metadata={'original_key': filename})
+            keys[name] = key
+        
+        await photo_index.set_derivatives(filename, keys.get("thumb"), keys.get("preview"))
+        logger.info(f"Derivatives stored for {filename}: {keys}")
+        return keys
+        
+    except Exception as e:
+        logger.error(f"Failed to create derivatives for {filename}: {e}")
+        return {}
+
+async def delete_photo(photo_id: int) -> bool:
+    """
+    Delete photo from index, and from R2 once no other photo shares its content
+    
+    Objects the stored one replaced (originals kept after recompression) are
+    deleted with it. Storage counters are corrected by the next rescan.
+    
+    Returns:
+        True if the stored object (and its derivatives) was deleted
+    """
+    try:
+        orphan = await photo_index.remove(photo_id)
+        if not orphan:
+            return False
+        storage = get_storage_backend()
+        for key in (orphan['key'], orphan['thumb_key'], orphan['preview_key'], *orphan['superseded_keys']):
+            if key:
+                await storage.delete(key)
+        logger.info(f"Deleted stored photo {orphan['key']}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Failed to delete photo {photo_id}: {e}")
+        return False
+
+async def upload_photo_to_r2(photo_data: bytes, user_id: str, content_type: str = "image/jpeg", action_type: str = "photo_analysis") -> Optional[str]:
+    """
+    Upload photo to Cloudflare R2 with validation
+    
+    Args:
+        photo_data: Photo binary data
+        user_id: User UUID
+        content_type: MIME type of the photo
+        action_type: Type of action (photo_analysis, recipe_generation)
+        
+    Returns:
+        Signed URL of uploaded photo or None if failed
+    """
+    filename = await store_photo_in_r2(photo_data, user_id, content_type, action_type)
+    if not filename:
+        return None
+    
+    # Generate signed URL for private bucket access (valid for 24 hours)
+    return generate_signed_url(filename, expires_in=86400)
+
 async def upload_telegram_photo(bot, photo, user_id: str, action_type: str = "photo_analysis") -> Optional[str]:
     """
     Upload Telegram photo to R2
@@ -200,9 +429,9 @@ async def upload_telegram_photo(bot, photo, user_id: str, action_type: str = "ph
         Public URL of uploaded photo or None if failed
     """
     try:
-        logger.info(f"Starting R2 upload for user {user_id}, R2_ENABLED={R2_ENABLED}")
+        logger.info(f"Starting R2 upload for user {user_id}, storage enabled={storage_enabled()}")
         
-        if not R2_ENABLED:
+        if not storage_enabled():
             logger.warning(f"R2 is disabled for user {user_id}, skipping upload")
             return None
         
@@ -240,113 +469,154 @@ def generate_signed_url(filename: str, expires_in: int = 86400) -> Optional[str]
     Returns:
         Signed URL or None if failed
     """
-    if not R2_ENABLED:
+    if not storage_enabled():
         return None
     
     try:
-        r2_client = get_r2_client()
-        
-        signed_url = r2_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': R2_BUCKET_NAME, 'Key': filename},
-            ExpiresIn=expires_in
-        )
-        
-        return signed_url
+        return get_storage_backend().presign(filename, expires_in)
         
     except Exception as e:
         logger.error(f"Error generating signed URL for {filename}: {e}")
         return None
 
-def get_photo_stats() -> dict:
+def get_cached_signed_url(filename: str, expires_in: int = 86400) -> Optional[str]:
+    """
+    Get signed URL for photo, reusing a previously generated one while it
+    stays valid for at least SIGNED_URL_REFRESH_MARGIN seconds
+    """
+    cache_key = (filename, expires_in)
+    now = time.time()
+    cached = _signed_url_cache.get(cache_key)
+    if cached and cached[1] - SIGNED_URL_REFRESH_MARGIN > now:
+        _signed_url_cache.move_to_end(cache_key)
+        return cached[0]
+    
+    signed_url = generate_signed_url(filename, expires_in)
+    if signed_url:
+        _signed_url_cache[cache_key] = (signed_url, now + expires_in)
+        _signed_url_cache.move_to_end(cache_key)
+        if len(_signed_url_cache) > SIGNED_URL_CACHE_SIZE:
+            _signed_url_cache.popitem(last=False)
+    return signed_url
+
+def invalidate_signed_url(filename: str) -> None:
+    """Forget cached signed URLs of an object that was moved or deleted"""
+    for cache_key in [cache_key for cache_key in _signed_url_cache if cache_key[0] == filename]:
+        del _signed_url_cache[cache_key]
+
+async def get_photo_stats() -> dict:
     """
     Get statistics about photos in R2 bucket
     
+    Reads the incrementally maintained counters, see rescan_photo_stats()
+    for a full recount.
+    
     Returns:
         Dictionary with photo statistics
     """
-    if not R2_ENABLED:
+    if not storage_enabled():
         return {"error": "R2 not enabled"}
     
     try:
-        r2_client = get_r2_client()
-        
-        # List all objects in bucket (photos are now stored under user_id/)
-        response = r2_client.list_objects_v2(Bucket=R2_BUCKET_NAME)
-        
-        if 'Contents' not in response:
-            return {"total_photos": 0, "total_size": 0, "total_users": 0}
-        
-        photos = response['Contents']
-        total_photos = len(photos)
-        total_size = sum(obj['Size'] for obj in photos)
-        
-        # Count unique users (extract user_id from path)
-        users = set()
-        for photo in photos:
-            key = photo['Key']
-            # Extract user_id (first part before /)
-            if '/' in key:
-                user_id = key.split('/')[0]
-                # Check if it looks like a UUID (basic check)
-                if len(user_id) > 10:  # UUIDs are longer than 10 chars
-                    users.add(user_id)
-        
+        totals = await storage_stats.get_totals()
         return {
-            "total_photos": total_photos,
-            "total_size": total_size,
-            "total_size_mb": round(total_size / (1024 * 1024), 2),
-            "total_users": len(users),
-            "avg_photos_per_user": round(total_photos / len(users), 1) if users else 0
+            "total_photos": totals["photos"],
+            "total_size": totals["bytes"],
+            "total_size_mb": round(totals["bytes"] / (1024 * 1024), 2),
+            "total_users": totals["users"],
+            "avg_photos_per_user": round(totals["photos"] / totals["users"], 1) if totals["users"] else 0,
+            "stored_objects": totals["stored_objects"],
+            "stored_size": totals["stored_bytes"],
+            "dedup_saved_size": totals["bytes"] - totals["stored_bytes"],
+            "updated_at": totals["updated_at"],
+            "last_rescan_at": totals["last_rescan_at"]
         }
         
     except Exception as e:
         logger.error(f"Error getting photo stats: {e}")
         return {"error": str(e)}
 
-async def get_user_photos(user_id: str, limit: int = 50) -> list:
+async def list_all_objects(prefix: str = "", page_size: int = 1000):
+    """
+    Iterate over all objects in the bucket, one listing page at a time
+    
+    Yields:
+        Object dicts (Key, Size, LastModified, ...)
+    """
+    async for obj in get_storage_backend().list(prefix, page_size):
+        yield obj
+
+async def rescan_photo_stats() -> dict:
     """
-    Get photos for specific user
+    Recount storage statistics from a full, paginated bucket listing
+    
+    Legacy photos (stored under user_id/YYYY/MM/DD/action_type/uuid.ext) are
+    added to the photo index, index entries of objects no longer in the
+    bucket are dropped, and per-user counters are rebuilt from the index
+    (content-addressed keys do not name their users).
+    
+    Returns:
+        Photo statistics after the rescan
+    """
+    if not storage_enabled():
+        return {"error": "R2 not enabled"}
+    
+    try:
+        started_at = time.time()
+        existing_keys = set()
+        stored_bytes = 0
+        legacy_photos = []
+        async for obj in list_all_objects():
+            # Derivatives belong to their original photo
+            if is_derivative_key(obj['Key']):
+                continue
+            existing_keys.add(obj['Key'])
+            stored_bytes += obj['Size']
+            parts = obj['Key'].split('/')
+            if parts[0] != "blobs" and len(parts) > 1:
+                action_type = parts[4] if len(parts) == 6 else None
+                legacy_photos.append((obj['Key'], parts[0], obj['Size'], action_type, obj['LastModified'].timestamp()))
+        
+        indexed = await photo_index.add_missing(legacy_photos)
+        pruned = await photo_index.prune_missing(existing_keys, started_at)
+        totals = await storage_stats.replace_all(await photo_index.usage_rows(), len(existing_keys), stored_bytes)
+        logger.info(f"Storage stats rescan finished: {totals}, {indexed} photos added to index, {pruned} removed")
+        return await get_photo_stats()
+        
+    except Exception as e:
+        logger.error(f"Storage stats rescan failed: {e}")
+        return {"error": str(e)}
+
+async def get_user_photos(user_id: str, limit: int = 50, before: Optional[str] = None) -> list:
+    """
+    Get photos for specific user, newest first
     
     Args:
         user_id: User UUID
         limit: Maximum number of photos to return
+        before: Cursor of the last photo of the previous page (optional)
         
     Returns:
-        List of photo information
+        List of photo information, each with a cursor for the next page
     """
-    if not R2_ENABLED:
+    if not storage_enabled():
         return []
     
     try:
-        r2_client = get_r2_client()
-        
-        # List objects with user_id prefix
-        response = r2_client.list_objects_v2(
-            Bucket=R2_BUCKET_NAME,
-            Prefix=f"{user_id}/",
-            MaxKeys=limit
-        )
-        
-        if 'Contents' not in response:
-            return []
-        
-        photos = []
-        for obj in response['Contents']:
-            # Generate signed URL for each photo
-            signed_url = generate_signed_url(obj['Key'])
-            
-            photos.append({
-                'filename': obj['Key'],
-                'size': obj['Size'],
-                'last_modified': obj['LastModified'].isoformat(),
-                'url': signed_url
-            })
-        
-        # Sort by last modified (newest first)
-        photos.sort(key=lambda x: x['last_modified'], reverse=True)
-        
-        return photos
+        rows = await photo_index.list_user_photos(user_id, limit, before)
+        return [
+            {
+                'filename': row['key'],
+                'size': row['size'],
+                'action_type': row['action_type'],
+                'last_modified': datetime.fromtimestamp(row['created_at'], tz=timezone.utc).isoformat(),
+                'url': get_cached_signed_url(row['key']),
+                'thumb_url': get_cached_signed_url(row['thumb_key']) if row['thumb_key'] else None,
+                'preview_url': get_cached_signed_url(row['preview_key']) if row['preview_key'] else None,
+                'cursor': row['cursor']
+            }
+            for row in rows
+        ]
         
     except Exception as e:
         logger.error(f"Error getting photos for user {user_id}: {e}")
@@ -360,18 +630,12 @@ async def test_r2_connection() -> bool:
     Returns:
         True if connection successful, False otherwise
     """
-    if not R2_ENABLED:
+    if not storage_enabled():
         logger.warning("R2 not enabled, skipping connection test")
         return False
     
     try:
-        r2_client = get_r2_client()
-        
-        # Try to list bucket contents (just first item)
-        response = r2_client.list_objects_v2(
-            Bucket=R2_BUCKET_NAME,
-            MaxKeys=1
-        )
+        await get_storage_backend().ping()
         
         logger.info("R2 connection test successful")
         return True
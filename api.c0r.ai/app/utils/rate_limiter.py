@@ -0,0 +1,154 @@
+"""
+Anti-spam rate limiter for c0r.ai bot
+
+Uses GCRA (Generic Cell Rate Algorithm), a token-bucket equivalent that stores
+a single timestamp per key - the "theoretical arrival time" (TAT). Each check
+is O(1) and an idle key needs no cleanup: once its TAT is in the past it
+behaves exactly like a key that was never seen.
+
+Backends:
+- MemoryRateLimitBackend: per-process, bounded LRU of active keys
+- RedisRateLimitBackend: shared across bot replicas (optional, needs `redis`)
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from loguru import logger
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Optional dependency - only needed for the shared backend
+    aioredis = None
+
+
+class MemoryRateLimitBackend:
+    """In-process GCRA state with LRU eviction of least recently seen keys"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[tuple, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    async def acquire(self, key: tuple, interval: float, period: float) -> float:
+        """
+        Try to consume one request for key
+
+        Returns:
+            0 if allowed, otherwise seconds until the next request is allowed
+        """
+        now = time.monotonic()
+        tats = self._tats
+        tat = tats.get(key)
+        if tat is None or tat < now:
+            tat = now
+
+        new_tat = tat + interval
+        allow_at = new_tat - period
+        if now < allow_at:
+            tats.move_to_end(key)
+            return allow_at - now
+
+        tats[key] = new_tat
+        tats.move_to_end(key)
+        if len(tats) > self.max_keys:
+            # Evicting a key can only make limits looser for that user, never stricter
+            tats.popitem(last=False)
+        return 0.0
+
+
+class RedisRateLimitBackend:
+    """GCRA state stored in Redis so limits hold across bot replicas"""
+
+    # Uses Redis server time so replicas with skewed clocks agree.
+    # Numbers are returned as strings because Lua integers truncate floats.
+    GCRA_SCRIPT = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local interval = tonumber(ARGV[1])
+    local period = tonumber(ARGV[2])
+    local tat = tonumber(redis.call('GET', KEYS[1]))
+    if not tat or tat < now then
+        tat = now
+    end
+    local new_tat = tat + interval
+    local allow_at = new_tat - period
+    if now < allow_at then
+        return tostring(allow_at - now)
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return '0'
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "ratelimit"):
+        if aioredis is None:
+            raise RuntimeError("redis package is not installed")
+        self.prefix = prefix
+        self._redis = aioredis.from_url(redis_url)
+        self._script = self._redis.register_script(self.GCRA_SCRIPT)
+
+    async def acquire(self, key: tuple, interval: float, period: float) -> float:
+        redis_key = f"{self.prefix}:" + ":".join(str(part) for part in key)
+        result = await self._script(keys=[redis_key], args=[interval, period])
+        return float(result)
+
+
+class RateLimiter:
+    """Per-user, per-action rate limiter"""
+
+    def __init__(self, limits: Dict[str, dict], backend=None, max_keys: int = 100000):
+        """
+        Args:
+            limits: Mapping of action type -> {"limit": N, "period": seconds}
+            backend: Shared backend (e.g. RedisRateLimitBackend), optional
+            max_keys: Maximum number of keys kept by the in-memory backend
+        """
+        self.limits = limits
+        self.local_backend = MemoryRateLimitBackend(max_keys)
+        self.backend = backend or self.local_backend
+
+    async def check(self, user_id: int, request_type: str = "general") -> int:
+        """
+        Check and consume one request for user
+
+        Args:
+            user_id: Telegram user ID
+            request_type: Action type from limits (general, photo, payment)
+
+        Returns:
+            0 if the request is allowed, otherwise seconds to wait before retrying
+        """
+        rule = self.limits.get(request_type) or self.limits["general"]
+        period = float(rule["period"])
+        interval = period / rule["limit"]
+        key = (request_type, user_id)
+
+        try:
+            retry_after = await self.backend.acquire(key, interval, period)
+        except Exception as e:
+            # Shared backend unavailable - keep protecting this replica locally
+            logger.error(f"Rate limit backend error, falling back to memory: {e}")
+            retry_after = await self.local_backend.acquire(key, interval, period)
+
+        return math.ceil(retry_after) if retry_after > 0 else 0
+
+
+def create_rate_limiter(limits: Dict[str, dict], max_keys: int = 100000, redis_url: Optional[str] = None) -> RateLimiter:
+    """
+    Create rate limiter, using the shared Redis backend when configured
+
+    Args:
+        limits: Mapping of action type -> {"limit": N, "period": seconds}
+        max_keys: Maximum number of keys kept in memory
+        redis_url: Redis URL for the shared backend (optional)
+    """
+    backend = None
+    if redis_url:
+        try:
+            backend = RedisRateLimitBackend(redis_url)
+            logger.info("Rate limiter using shared Redis backend")
+        except Exception as e:
+            logger.warning(f"Shared rate limit backend not available, using memory: {e}")
+    return RateLimiter(limits, backend=backend, max_keys=max_keys)
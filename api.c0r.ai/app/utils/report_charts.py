@@ -0,0 +1,177 @@
+"""
+PNG charts for the weekly report
+
+The chart shows calories per day against the calorie target and the macro
+grams per day against the macro targets, drawn from the nutrition_daily_totals
+rows of the report week.
+
+Plotting is CPU-bound, so it runs with the headless Agg backend in a separate
+process pool and never holds the event loop. Charts sent once are reused by
+Telegram file_id: the cache key is (user, week end, data version), where the
+data version is a digest of everything the chart is drawn from, so a newly
+logged meal or a changed target gives a new key instead of a stale image.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from common.sqlite_store import SQLiteStore
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import pyplot
+except ImportError:  # Optional dependency - reports are sent without charts
+    pyplot = None
+
+REPORT_CHART_WORKERS = int(os.getenv("REPORT_CHART_WORKERS", "2"))
+REPORT_CHART_CACHE_DB_PATH = os.getenv("REPORT_CHART_CACHE_DB_PATH", "data/report_charts.db")
+REPORT_CHART_CACHE_TTL_SECONDS = int(os.getenv("REPORT_CHART_CACHE_TTL_SECONDS", str(14 * 86400)))
+
+MACRO_FIELDS = ("protein", "fats", "carbs")
+MACRO_COLORS = {"protein": "#4c72b0", "fats": "#dd8452", "carbs": "#55a868"}
+
+REPORT_CHART_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS report_charts (
+    user_id TEXT NOT NULL,
+    week_end TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (user_id, week_end, data_version)
+);
+CREATE INDEX IF NOT EXISTS idx_report_charts_expires ON report_charts(expires_at);
+"""
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def charts_enabled() -> bool:
+    return pyplot is not None
+
+
+class ReportChartCache(SQLiteStore):
+    """(user, week end, data version) -> Telegram file_id of the sent chart"""
+
+    SCHEMA = REPORT_CHART_CACHE_SCHEMA
+
+    def __init__(self, db_path: str, ttl_seconds: float = 14 * 86400):
+        super().__init__(db_path)
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, user_id: str, week_end: str, data_version: str) -> Optional[str]:
+        def op(conn):
+            row = conn.execute(
+                "SELECT file_id FROM report_charts "
+                "WHERE user_id = ? AND week_end = ? AND data_version = ? AND expires_at > ?",
+                (user_id, week_end, data_version, time.time())
+            ).fetchone()
+            return row["file_id"] if row else None
+        return await self._run(op)
+
+    async def put(self, user_id: str, week_end: str, data_version: str, file_id: str) -> None:
+        def op(conn):
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO report_charts "
+                "(user_id, week_end, data_version, file_id, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, week_end, data_version, file_id, now, now + self.ttl_seconds)
+            )
+        await self._run(op)
+
+    async def purge_expired(self) -> int:
+        """Delete expired entries, returns number of deleted rows"""
+        def op(conn):
+            return conn.execute("DELETE FROM report_charts WHERE expires_at <= ?", (time.time(),)).rowcount
+        return await self._run(op)
+
+
+report_chart_cache = ReportChartCache(REPORT_CHART_CACHE_DB_PATH, REPORT_CHART_CACHE_TTL_SECONDS)
+
+
+def week_series(daily_totals: List[dict], week_end: date, days: int = 7) -> Dict[str, list]:
+    """
+    Per-day values of the week ending at week_end (days without meals are 0)
+
+    Returns:
+        Dict with "days" (ISO dates, oldest first) and one list per
+        calories/protein/fats/carbs
+    """
+    by_day = {str(row["day"])[:10]: row for row in daily_totals}
+    series = {"days": [], "calories": [], **{field: [] for field in MACRO_FIELDS}}
+    for offset in range(days - 1, -1, -1):
+        day = (week_end - timedelta(days=offset)).isoformat()
+        row = by_day.get(day, {})
+        series["days"].append(day)
+        for field in ("calories",) + MACRO_FIELDS:
+            series[field].append(round(float(row.get(field) or 0), 1))
+    return series
+
+
+def chart_data_version(series: Dict[str, list], targets: Dict[str, Optional[float]], labels: Dict[str, str]) -> str:
+    """Digest of everything the chart is drawn from"""
+    payload = json.dumps({"series": series, "targets": targets, "labels": labels}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def render_week_chart(series: Dict[str, list], targets: Dict[str, Optional[float]], labels: Dict[str, str]) -> bytes:
+    """
+    Render the weekly chart as PNG (runs in a worker process)
+
+    Args:
+        series: Output of week_series()
+        targets: Daily targets: calories and grams per macro (None: no target line)
+        labels: Localized texts: calories, macros, target and one per macro
+    """
+    day_labels = [day[5:] for day in series["days"]]
+    positions = range(len(day_labels))
+    figure, (calories_axis, macros_axis) = pyplot.subplots(2, 1, figsize=(7, 6), dpi=100, sharex=True)
+    try:
+        calories_axis.bar(positions, series["calories"], color="#8172b3")
+        if targets.get("calories"):
+            calories_axis.axhline(targets["calories"], color="#c44e52", linestyle="--", label=labels["target"])
+            calories_axis.legend(loc="upper right", fontsize=8)
+        calories_axis.set_title(labels["calories"])
+
+        width = 0.8 / len(MACRO_FIELDS)
+        for index, field in enumerate(MACRO_FIELDS):
+            offsets = [position + (index - 1) * width for position in positions]
+            macros_axis.bar(offsets, series[field], width=width, color=MACRO_COLORS[field], label=labels[field])
+            if targets.get(field):
+                macros_axis.axhline(targets[field], color=MACRO_COLORS[field], linestyle=":", linewidth=1)
+        macros_axis.set_title(labels["macros"])
+        macros_axis.legend(loc="upper right", fontsize=8, ncol=len(MACRO_FIELDS))
+        macros_axis.set_xticks(list(positions))
+        macros_axis.set_xticklabels(day_labels)
+
+        figure.tight_layout()
+        output = io.BytesIO()
+        figure.savefig(output, format="png")
+        return output.getvalue()
+    finally:
+        pyplot.close(figure)
+
+
+def get_chart_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: the bot process runs threads (R2 and SQLite executors), which fork does not handle safely
+        _executor = ProcessPoolExecutor(
+            max_workers=REPORT_CHART_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def render_chart(series: Dict[str, list], targets: Dict[str, Optional[float]], labels: Dict[str, str]) -> bytes:
+    """Render the weekly chart in the process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_chart_executor(), render_week_chart, series, targets, labels)
@@ -0,0 +1,249 @@
+"""
+Outbound Telegram send scheduler for c0r.ai bot
+
+Registered as an aiogram request middleware, so every message.answer /
+edit_text / answer_invoice call goes through it. It keeps the bot under
+Telegram's send limits instead of running into 429 flood-waits:
+- global token bucket (Telegram allows ~30 messages per second per bot)
+- per-chat token buckets (~1 message per second per chat, 20 per minute per group)
+- priority lanes: payment messages are released before normal replies,
+  normal replies before bulk/marketing messages
+- automatic retry after TelegramRetryAfter (429) errors
+- coalescing of rapid successive edits of the same message
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Optional
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram import methods
+from loguru import logger
+
+
+class SendPriority(IntEnum):
+    """Lower value is sent first"""
+    HIGH = 0     # payment confirmations, invoices
+    NORMAL = 1   # replies to user actions
+    LOW = 2      # broadcasts, announcements
+
+
+# Priority of sends made from the current task, see send_priority()
+current_send_priority: ContextVar[SendPriority] = ContextVar("current_send_priority", default=SendPriority.NORMAL)
+
+
+@contextmanager
+def send_priority(priority: SendPriority):
+    """Send all messages inside the block with given priority"""
+    token = current_send_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_send_priority.reset(token)
+
+
+# Methods that count against Telegram send limits
+SEND_METHODS = (
+    methods.SendMessage,
+    methods.SendPhoto,
+    methods.SendDocument,
+    methods.SendMediaGroup,
+    methods.SendInvoice,
+    methods.CopyMessage,
+    methods.ForwardMessage,
+    methods.EditMessageText,
+    methods.EditMessageCaption,
+    methods.EditMessageReplyMarkup,
+)
+
+# Methods that are always sent with high priority
+HIGH_PRIORITY_METHODS = (methods.SendInvoice,)
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations, possibly in the future"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until one token is available"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Take one token now, returns seconds the caller must wait before using it"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """Block the bucket for given time (after a 429 from Telegram)"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """aiogram request middleware enforcing global and per-chat send limits"""
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, group_rate: float = 20 / 60,
+                 chat_burst: float = 3, max_retries: int = 3, max_chats: int = 100000):
+        """
+        Args:
+            global_rate: Messages per second for the whole bot
+            chat_rate: Messages per second for one private chat
+            group_rate: Messages per second for one group chat
+            chat_burst: Messages a chat may receive back-to-back
+            max_retries: Retries after TelegramRetryAfter before giving up
+            max_chats: Maximum number of per-chat buckets kept in memory
+        """
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+        self._pending_edits: dict = {}
+
+    # === Per-chat limits ===
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Group and channel ids are negative
+            rate = self.group_rate if chat_id < 0 else self.chat_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    # === Global limit with priority lanes ===
+
+    def _ensure_pump(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.create_task(self._pump())
+
+    async def _acquire_global(self, priority: SendPriority) -> None:
+        self._ensure_pump()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        self._wakeup.set()
+        await future
+
+    async def _pump(self) -> None:
+        """Release waiting sends one token at a time, highest priority first"""
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self.global_bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.cancelled():
+                continue
+            self.global_bucket.reserve()
+            future.set_result(None)
+
+    # === Middleware ===
+
+    async def __call__(self, make_request, bot, method):
+        if not isinstance(method, SEND_METHODS):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        chat_id = chat_id if isinstance(chat_id, int) else None
+        priority = SendPriority.HIGH if isinstance(method, HIGH_PRIORITY_METHODS) else current_send_priority.get()
+
+        if isinstance(method, methods.EditMessageText) and chat_id is not None and method.message_id:
+            return await self._send_edit(make_request, bot, method, chat_id, priority)
+        return await self._send(make_request, bot, method, chat_id, priority)
+
+    async def _send_edit(self, make_request, bot, method, chat_id: int, priority: SendPriority):
+        """Coalesce edits of one message: only the latest waiting text is sent"""
+        key = (chat_id, method.message_id)
+        pending = self._pending_edits.get(key)
+        if pending is not None:
+            # An earlier edit of this message is still waiting for a slot - replace its content
+            pending["method"] = method
+            return await asyncio.shield(pending["future"])
+
+        pending = {"method": method, "future": asyncio.get_running_loop().create_future()}
+        self._pending_edits[key] = pending
+        try:
+            await self._wait_for_slot(chat_id, priority)
+        except BaseException:
+            self._pending_edits.pop(key, None)
+            pending["future"].cancel()
+            raise
+
+        # From here on newer edits start a new entry
+        self._pending_edits.pop(key, None)
+        latest = pending["method"]
+        try:
+            result = await self._send(make_request, bot, latest, chat_id, priority, slot_acquired=True)
+        except Exception as e:
+            pending["future"].set_exception(e)
+            # Mark exception as retrieved when nobody else waits on it
+            pending["future"].exception()
+            raise
+        pending["future"].set_result(result)
+        return result
+
+    async def _wait_for_slot(self, chat_id: Optional[int], priority: SendPriority) -> None:
+        if chat_id is not None:
+            wait = self._chat_bucket(chat_id).reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await self._acquire_global(priority)
+
+    async def _send(self, make_request, bot, method, chat_id: Optional[int], priority: SendPriority,
+                    slot_acquired: bool = False):
+        attempt = 0
+        while True:
+            if not slot_acquired:
+                await self._wait_for_slot(chat_id, priority)
+            slot_acquired = False
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error(f"Telegram flood control for chat {chat_id}, giving up after {self.max_retries} retries")
+                    raise
+                logger.warning(f"Telegram flood control for chat {chat_id}, retrying in {e.retry_after}s")
+                if chat_id is not None:
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                else:
+                    self.global_bucket.pause(e.retry_after)
+                    await asyncio.sleep(e.retry_after)
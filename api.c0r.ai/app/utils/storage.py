@@ -0,0 +1,151 @@
+"""
+Photo storage backends
+
+StorageBackend is the interface used by the photo pipeline (utils/r2.py):
+put, get, presign, list, delete. Implementations:
+- R2StorageBackend (utils/r2.py): Cloudflare R2 through boto3
+- LocalStorageBackend: files under a local directory, with HMAC-signed URLs
+  served by the /storage route of the API - for offline development,
+  integration tests and latency benchmarks of the photo flow
+
+Selected with STORAGE_BACKEND=r2|local.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "r2")
+LOCAL_STORAGE_PATH = os.getenv("LOCAL_STORAGE_PATH", "data/storage")
+LOCAL_STORAGE_BASE_URL = os.getenv("LOCAL_STORAGE_BASE_URL", "http://localhost:8000")
+# Without a configured secret, signed URLs are only valid until the process restarts
+LOCAL_STORAGE_SECRET = os.getenv("LOCAL_STORAGE_SECRET") or secrets.token_hex(32)
+
+
+class StorageBackend:
+    """Object storage interface"""
+
+    name = "base"
+
+    async def put(self, key: str, data: bytes, content_type: str, metadata: Optional[dict] = None) -> None:
+        raise NotImplementedError
+
+    async def get(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def presign(self, key: str, expires_in: int = 86400) -> str:
+        """URL granting read access to the object for expires_in seconds"""
+        raise NotImplementedError
+
+    def list(self, prefix: str = "", page_size: int = 1000) -> AsyncIterator[dict]:
+        """Iterate over objects as dicts with Key, Size and LastModified (datetime)"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def ping(self) -> bool:
+        """Check that the storage is reachable"""
+        raise NotImplementedError
+
+
+class LocalStorageBackend(StorageBackend):
+    """Objects stored as files under root, keys map to relative paths"""
+
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_STORAGE_PATH, base_url: str = LOCAL_STORAGE_BASE_URL,
+                 secret: str = LOCAL_STORAGE_SECRET):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.secret = secret.encode()
+
+    def path_for(self, key: str) -> str:
+        """
+        Filesystem path of object
+
+        Raises:
+            ValueError: If key points outside the storage root
+        """
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial object
+        tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str) -> bytes:
+        with open(self.path_for(key), "rb") as f:
+            return f.read()
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def _scan(self, prefix: str) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        objects = []
+        for directory, _, files in os.walk(self.root):
+            for filename in files:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    stat = os.stat(path)
+                    objects.append({
+                        "Key": key,
+                        "Size": stat.st_size,
+                        "LastModified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+                    })
+        objects.sort(key=lambda obj: obj["Key"])
+        return objects
+
+    async def put(self, key: str, data: bytes, content_type: str, metadata: Optional[dict] = None) -> None:
+        # Content type is derived from the file extension when serving
+        await asyncio.to_thread(self._write, key, data)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._read, key)
+
+    def signature(self, key: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{key}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def presign(self, key: str, expires_in: int = 86400) -> str:
+        expires = int(time.time()) + expires_in
+        return f"{self.base_url}/storage/{quote(key)}?expires={expires}&signature={self.signature(key, expires)}"
+
+    def verify(self, key: str, expires: int, signature: str) -> bool:
+        """Check signed URL parameters"""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self.signature(key, expires), signature)
+
+    async def list(self, prefix: str = "", page_size: int = 1000) -> AsyncIterator[dict]:
+        for obj in await asyncio.to_thread(self._scan, prefix):
+            yield obj
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._remove, key)
+
+    def _check(self) -> bool:
+        os.makedirs(self.root, exist_ok=True)
+        return os.access(self.root, os.W_OK)
+
+    async def ping(self) -> bool:
+        return await asyncio.to_thread(self._check)
@@ -0,0 +1,159 @@
+"""
+Incremental R2 storage usage statistics
+
+Counters are updated on every upload, so bucket statistics are a single-row
+read instead of a listing of the whole bucket:
+- storage_usage_totals: one row with photo count, bytes and number of users,
+  plus objects and bytes actually stored (identical photos share an object)
+- storage_usage_users: photos and bytes per user
+- storage_usage_days: photos and bytes per upload day (UTC)
+
+A full rescan (paginated bucket listing) rebuilds all counters to reconcile
+drift, e.g. objects deleted outside the bot. Uploads that happen while a
+rescan is listing may be missed until the next rescan.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from common.sqlite_store import SQLiteStore
+
+STORAGE_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS storage_usage_users (
+    user_id TEXT PRIMARY KEY,
+    photos INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    last_upload_at REAL
+);
+CREATE TABLE IF NOT EXISTS storage_usage_days (
+    day TEXT PRIMARY KEY,
+    photos INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS storage_usage_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    photos INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    users INTEGER NOT NULL DEFAULT 0,
+    stored_objects INTEGER NOT NULL DEFAULT 0,
+    stored_bytes INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    last_rescan_at REAL
+);
+INSERT OR IGNORE INTO storage_usage_totals (id) VALUES (1);
+"""
+
+
+def utc_day(timestamp: Optional[float] = None) -> str:
+    return datetime.fromtimestamp(timestamp or time.time(), tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class StorageStatsStore(SQLiteStore):
+    """Per-user, per-day and total storage counters"""
+
+    SCHEMA = STORAGE_STATS_SCHEMA
+
+    async def record_upload(self, user_id: str, size: int, stored: bool = True,
+                            uploaded_at: Optional[float] = None) -> None:
+        """
+        Add one uploaded photo to all counters (single transaction)
+
+        Args:
+            user_id: User UUID
+            size: Photo size in bytes
+            stored: False if the content was already stored (deduplicated)
+            uploaded_at: Upload timestamp (default: now)
+        """
+        def op(conn):
+            now = uploaded_at or time.time()
+            with self._transaction(conn):
+                new_user = conn.execute(
+                    "INSERT OR IGNORE INTO storage_usage_users (user_id) VALUES (?)", (user_id,)
+                ).rowcount
+                conn.execute(
+                    "UPDATE storage_usage_users SET photos = photos + 1, bytes = bytes + ?, last_upload_at = ? "
+                    "WHERE user_id = ?",
+                    (size, now, user_id)
+                )
+                conn.execute(
+                    "INSERT INTO storage_usage_days (day, photos, bytes) VALUES (?, 1, ?) "
+                    "ON CONFLICT(day) DO UPDATE SET photos = photos + 1, bytes = bytes + excluded.bytes",
+                    (utc_day(now), size)
+                )
+                conn.execute(
+                    "UPDATE storage_usage_totals SET photos = photos + 1, bytes = bytes + ?, users = users + ?, "
+                    "stored_objects = stored_objects + ?, stored_bytes = stored_bytes + ?, updated_at = ? WHERE id = 1",
+                    (size, new_user, int(stored), size if stored else 0, now)
+                )
+        await self._run(op)
+
+    async def get_totals(self) -> dict:
+        def op(conn):
+            return dict(conn.execute(
+                "SELECT photos, bytes, users, stored_objects, stored_bytes, updated_at, last_rescan_at "
+                "FROM storage_usage_totals WHERE id = 1"
+            ).fetchone())
+        return await self._run(op)
+
+    async def get_user(self, user_id: str) -> dict:
+        def op(conn):
+            row = conn.execute(
+                "SELECT photos, bytes, last_upload_at FROM storage_usage_users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            return dict(row) if row else {"photos": 0, "bytes": 0, "last_upload_at": None}
+        return await self._run(op)
+
+    async def get_days(self, limit: int = 30) -> list:
+        """Most recent days first"""
+        def op(conn):
+            rows = conn.execute(
+                "SELECT day, photos, bytes FROM storage_usage_days ORDER BY day DESC LIMIT ?", (limit,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        return await self._run(op)
+
+    async def replace_all(self, objects: Iterable[tuple], stored_objects: int, stored_bytes: int) -> dict:
+        """
+        Rebuild counters after a full bucket listing
+
+        Args:
+            objects: Iterable of (user_id, size, uploaded_at timestamp), one per photo
+            stored_objects: Number of objects in the bucket
+            stored_bytes: Total size of objects in the bucket
+
+        Returns:
+            New totals
+        """
+        users: dict[str, list] = {}
+        days: dict[str, list] = {}
+        photos = total_bytes = 0
+        for user_id, size, uploaded_at in objects:
+            photos += 1
+            total_bytes += size
+            user = users.setdefault(user_id, [0, 0, 0.0])
+            user[0] += 1
+            user[1] += size
+            user[2] = max(user[2], uploaded_at)
+            day = days.setdefault(utc_day(uploaded_at), [0, 0])
+            day[0] += 1
+            day[1] += size
+
+        def op(conn):
+            now = time.time()
+            with self._transaction(conn):
+                conn.execute("DELETE FROM storage_usage_users")
+                conn.execute("DELETE FROM storage_usage_days")
+                conn.executemany(
+                    "INSERT INTO storage_usage_users (user_id, photos, bytes, last_upload_at) VALUES (?, ?, ?, ?)",
+                    [(user_id, *values) for user_id, values in users.items()]
+                )
+                conn.executemany(
+                    "INSERT INTO storage_usage_days (day, photos, bytes) VALUES (?, ?, ?)",
+                    [(day, *values) for day, values in days.items()]
+                )
+                conn.execute(
+                    "UPDATE storage_usage_totals SET photos = ?, bytes = ?, users = ?, stored_objects = ?, "
+                    "stored_bytes = ?, updated_at = ?, last_rescan_at = ? WHERE id = 1",
+                    (photos, total_bytes, len(users), stored_objects, stored_bytes, now, now)
+                )
+        await self._run(op)
+        return await self.get_totals()
@@ -0,0 +1,106 @@
+"""
+Derivative images (thumbnail, preview) for stored meal photos
+
+Derivatives are small WebP renditions stored next to the content-addressed
+original (see r2.generate_content_key):
+    blobs/ab/<sha256>.jpg
+    blobs/ab/<sha256>.thumb.webp
+    blobs/ab/<sha256>.preview.webp
+
+Old originals are recompressed to WebP by the cold storage job
+(utils/photo_recompression.py) in the same pool.
+
+Decoding and re-encoding images is CPU-bound, so it runs in a separate
+process pool and never holds the event loop or the GIL of the bot process.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional dependency - derivatives are skipped without Pillow
+    Image = None
+
+# Derivative name -> longest side in pixels
+DERIVATIVE_SIZES = {"thumb": 320, "preview": 1024}
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "80"))
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", "2"))
+DERIVATIVE_CONTENT_TYPE = "image/webp"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def derivatives_enabled() -> bool:
+    return Image is not None
+
+
+def derivative_key(original_key: str, name: str) -> str:
+    """Key of a derivative stored next to the original"""
+    base, _ = os.path.splitext(original_key)
+    return f"{base}.{name}.webp"
+
+
+def is_derivative_key(key: str) -> bool:
+    return any(key.endswith(f".{name}.webp") for name in DERIVATIVE_SIZES)
+
+
+def render_derivatives(photo_data: bytes, sizes: Dict[str, int], quality: int) -> Dict[str, bytes]:
+    """
+    Render WebP derivatives of an image (runs in a worker process)
+
+    Images smaller than a target size are re-encoded without upscaling.
+
+    Returns:
+        Mapping of derivative name -> WebP bytes
+    """
+    with Image.open(io.BytesIO(photo_data)) as image:
+        # Apply camera rotation before EXIF is dropped
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        derivatives = {}
+        for name, size in sizes.items():
+            rendition = image.copy()
+            rendition.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            rendition.save(output, format="WEBP", quality=quality, method=4)
+            derivatives[name] = output.getvalue()
+        return derivatives
+
+
+def recompress_image(photo_data: bytes, quality: int, max_side: Optional[int] = None) -> bytes:
+    """Re-encode an image as WebP, optionally downscaled (runs in a worker process)"""
+    with Image.open(io.BytesIO(photo_data)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        if max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="WEBP", quality=quality, method=6)
+        return output.getvalue()
+
+
+def get_derivative_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: the bot process runs threads (R2 and SQLite executors), which fork does not handle safely
+        _executor = ProcessPoolExecutor(
+            max_workers=DERIVATIVE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def generate_derivatives(photo_data: bytes) -> Dict[str, bytes]:
+    """Render thumbnail and preview in the process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_derivative_executor(), render_derivatives, photo_data, DERIVATIVE_SIZES, DERIVATIVE_QUALITY
+    )
+
+
+async def recompress(photo_data: bytes, quality: int, max_side: Optional[int] = None) -> bytes:
+    """Recompress image to WebP in the process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_derivative_executor(), recompress_image, photo_data, quality, max_side)
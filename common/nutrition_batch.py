@@ -0,0 +1,176 @@
+"""
+Vectorized nutrition metrics for many profiles at once
+Columnar (NumPy) counterpart of nutrition_calculations.py and
+calculate_daily_calories() for cohort analytics and bulk profile recomputation.
+
+Every function takes equally long arrays, one element per profile, and
+returns arrays computed with the same formulas and rounding as the scalar
+functions. Category columns (gender, activity_level, goal) are encoded to
+small integer codes once with encode(), so the metrics themselves are
+branch-free array arithmetic.
+"""
+
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+GENDERS = ("male", "female")
+ACTIVITY_LEVELS = ("sedentary", "lightly_active", "moderately_active", "very_active", "extremely_active")
+GOALS = ("lose_weight", "maintain_weight", "gain_weight")
+BMI_CATEGORIES = ("underweight", "normal", "overweight", "obese")
+
+# Code of values missing from the category list
+UNKNOWN = -1
+
+# Same tables as the scalar functions, indexed by ACTIVITY_LEVELS / GOALS code
+ACTIVITY_MULTIPLIERS = np.array([1.2, 1.375, 1.55, 1.725, 1.9])
+WATER_MULTIPLIERS = np.array([1.0, 1.2, 1.4, 1.6, 1.8])
+GOAL_FACTORS = np.array([0.85, 1.0, 1.15])
+# Protein, fat and carb shares of calories per goal
+MACRO_SHARES = np.array([
+    [0.30, 0.25, 0.45],
+    [0.25, 0.30, 0.45],
+    [0.25, 0.25, 0.50],
+])
+
+
+def encode(values: Iterable, categories: Sequence[str]) -> np.ndarray:
+    """
+    Encode category strings to codes (index in categories, UNKNOWN otherwise)
+
+    Exact matches are found with one vectorized comparison per category; only
+    the remaining values (other case, unknown) are compared one distinct value
+    at a time.
+    """
+    values = np.asarray(values, dtype=object)
+    codes = np.full(values.shape, UNKNOWN, dtype=np.int8)
+    for code, category in enumerate(categories):
+        codes[values == category] = code
+
+    rest = np.flatnonzero(codes == UNKNOWN)
+    if rest.size:
+        lookup = {category: code for code, category in enumerate(categories)}
+        uniques, inverse = np.unique(values[rest].astype(str), return_inverse=True)
+        rest_codes = np.array([lookup.get(value.lower(), UNKNOWN) for value in uniques], dtype=np.int8)
+        codes[rest] = rest_codes[inverse.reshape(-1)]
+    return codes
+
+
+def profiles_to_columns(profiles: List[dict]) -> Dict[str, np.ndarray]:
+    """Convert profile dicts (user_profiles rows) to the columns taken by compute_profile_metrics()"""
+    def column(field):
+        return [profile.get(field) for profile in profiles]
+
+    def numbers(field):
+        return np.array([np.nan if value is None else value for value in column(field)], dtype=np.float64)
+
+    def codes(field, categories):
+        return encode(["" if value is None else value for value in column(field)], categories)
+
+    return {
+        "age": numbers("age"),
+        "gender": codes("gender", GENDERS),
+        "height_cm": numbers("height_cm"),
+        "weight_kg": numbers("weight_kg"),
+        "activity_level": codes("activity_level", ACTIVITY_LEVELS),
+        "goal": codes("goal", GOALS),
+    }
+
+
+def bmi(weight_kg: np.ndarray, height_cm: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    BMI and its category code (BMI_CATEGORIES index), as calculate_bmi()
+
+    Rows with a non-positive height get BMI 0 and category UNKNOWN.
+    """
+    height_m = np.asarray(height_cm, dtype=np.float64) / 100
+    valid = height_m > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = np.where(valid, np.asarray(weight_kg, dtype=np.float64) / height_m ** 2, 0.0)
+    category = np.searchsorted(np.array([18.5, 25.0, 30.0]), value, side="right").astype(np.int8)
+    return {"bmi": value, "category": np.where(valid, category, UNKNOWN).astype(np.int8)}
+
+
+def water_needs(weight_kg: np.ndarray, activity_level: np.ndarray) -> Dict[str, np.ndarray]:
+    """Daily water needs in ml, as calculate_water_needs() (unknown activity counts as sedentary)"""
+    base = np.asarray(weight_kg, dtype=np.float64) * 35
+    multiplier = np.where(activity_level >= 0, WATER_MULTIPLIERS[np.maximum(activity_level, 0)], 1.0)
+    total = base * multiplier
+    return {"base_ml": np.rint(base), "total_ml": np.rint(total)}
+
+
+def bmr(age: np.ndarray, gender: np.ndarray, weight_kg: np.ndarray, height_cm: np.ndarray) -> np.ndarray:
+    """Mifflin-St Jeor BMR, non-male rows use the female formula"""
+    base = 10 * np.asarray(weight_kg, dtype=np.float64) + 6.25 * np.asarray(height_cm, dtype=np.float64) \
+        - 5 * np.asarray(age, dtype=np.float64)
+    return base + np.where(gender == 0, 5.0, -161.0)
+
+
+def daily_calories(age, gender, height_cm, weight_kg, activity_level, goal) -> np.ndarray:
+    """
+    Daily calorie target, as calculate_daily_calories()
+
+    Returns:
+        Float array, NaN where the scalar function raises ValueError
+        (missing value, unknown gender, activity level or goal)
+    """
+    valid = (gender >= 0) & (activity_level >= 0) & (goal >= 0) \
+        & ~np.isnan(np.asarray(age, dtype=np.float64)) & ~np.isnan(np.asarray(height_cm, dtype=np.float64)) \
+        & ~np.isnan(np.asarray(weight_kg, dtype=np.float64))
+    tdee = bmr(age, gender, weight_kg, height_cm) * ACTIVITY_MULTIPLIERS[np.maximum(activity_level, 0)]
+    return np.where(valid, np.rint(tdee * GOAL_FACTORS[np.maximum(goal, 0)]), np.nan)
+
+
+def metabolic_age(age, gender, weight_kg, height_cm, activity_level) -> np.ndarray:
+    """Estimated metabolic age, as calculate_metabolic_age() (unknown activity counts as moderate)"""
+    age = np.asarray(age, dtype=np.float64)
+    base = bmr(age, gender, weight_kg, height_cm)
+    multiplier = np.where(activity_level >= 0, ACTIVITY_MULTIPLIERS[np.maximum(activity_level, 0)], 1.55)
+    tdee = base * multiplier
+    expected = base * 1.55
+    return np.where(np.abs(tdee - expected) < 100, age,
+                    np.where(tdee > expected, np.maximum(18, age - 5), age + 5))
+
+
+def macro_distribution(calories: np.ndarray, goal: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Protein, fat and carb grams, as calculate_macro_distribution()
+
+    Unknown goals use the maintenance split.
+    """
+    shares = MACRO_SHARES[np.where(goal >= 0, goal, 1)]
+    calories = np.asarray(calories, dtype=np.float64)
+    return {
+        "protein_g": np.rint(calories * shares[:, 0] / 4),
+        "fat_g": np.rint(calories * shares[:, 1] / 9),
+        "carbs_g": np.rint(calories * shares[:, 2] / 4),
+    }
+
+
+def compute_profile_metrics(age, gender, height_cm, weight_kg, activity_level, goal) -> Dict[str, np.ndarray]:
+    """
+    All derived metrics of many profiles
+
+    Args:
+        age, height_cm, weight_kg: Numeric arrays (NaN for missing values)
+        gender, activity_level, goal: Codes from encode()
+
+    Returns:
+        Dict of arrays: bmi, bmi_category, water_ml, daily_calories (NaN for
+        invalid profiles), metabolic_age, protein_g, fat_g, carbs_g
+    """
+    gender = np.asarray(gender)
+    activity_level = np.asarray(activity_level)
+    goal = np.asarray(goal)
+
+    bmi_values = bmi(weight_kg, height_cm)
+    calories = daily_calories(age, gender, height_cm, weight_kg, activity_level, goal)
+    macros = macro_distribution(calories, goal)
+    return {
+        "bmi": bmi_values["bmi"],
+        "bmi_category": bmi_values["category"],
+        "water_ml": water_needs(weight_kg, activity_level)["total_ml"],
+        "daily_calories": calories,
+        "metabolic_age": metabolic_age(age, gender, weight_kg, height_cm, activity_level),
+        **macros,
+    }
@@ -4,7 +4,11 @@ Contains formulas for BMI, ideal weight, water needs, macro distribution, etc.
 """
 
 import math
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+
+# Version of the formulas behind stored profile insights, bump when a formula
+# changes so insights stored with older formulas are recomputed
+INSIGHTS_VERSION = 1
 
 
 def calculate_bmi(weight_kg: float, height_cm: float, language: str = 'en') -> Dict[str, Any]:
@@ -299,6 +303,7 @@ def calculate_metabolic_age(age: int, gender: str, weight_kg: float, height_cm:
     if abs(tdee - expected_tdee) < 100:
         # Metabolism matches age
         metabolic_age = age
+        status = "match"
         emoji = "✅"
         if use_i18n:
             description = i18n.get_text("metabolic_age_match", language)
@@ -309,6 +314,7 @@ def calculate_metabolic_age(age: int, gender: str, weight_kg: float, height_cm:
     elif tdee > expected_tdee:
         # Younger metabolism
         metabolic_age = max(18, age - 5)
+        status = "younger"
         emoji = "🌟"
         if use_i18n:
             description = i18n.get_text("metabolic_age_younger", language)
@@ -319,6 +325,7 @@ def calculate_metabolic_age(age: int, gender: str, weight_kg: float, height_cm:
     else:
         # Older metabolism
         metabolic_age = age + 5
+        status = "older"
         emoji = "💪"
         if use_i18n:
             description = i18n.get_text("metabolic_age_older", language)
@@ -329,6 +336,7 @@ def calculate_metabolic_age(age: int, gender: str, weight_kg: float, height_cm:
     
     return {
         'metabolic_age': metabolic_age,
+        'status': status,
         'emoji': emoji,
         'description': description,
         'motivation': motivation
@@ -419,9 +427,11 @@ def calculate_meal_portions(calories: int, meals_per_day: int = 3, language: str
             ]
     
     meal_breakdown = []
+    meal_keys = ('breakfast', 'lunch', 'dinner', 'snack')
     for i, (portion, meal_name) in enumerate(zip(portions, meal_names)):
         meal_calories = int(calories * portion)
         meal_breakdown.append({
+            'meal': meal_keys[i],
             'name': meal_name,
             'calories': meal_calories,
             'percentage': int(portion * 100)
@@ -524,4 +534,52 @@ def get_nutrition_recommendations(profile: Dict, recent_logs: List[Dict], langua
     # Consistency recommendation
     recommendations.append(fallback_texts[language]['recommendation_consistency'])
     
-    return recommendations 
\ No newline at end of file
+    return recommendations 
+
+
+def compute_profile_insights(profile: Dict) -> Dict[str, Any]:
+    """
+    Compute the language-independent values shown by nutrition insights
+
+    Stored with the profile when it is written, so opening insights does not
+    recompute them. Texts are rendered from these values per language.
+
+    Args:
+        profile: Profile data (after daily_calories_target was calculated)
+
+    Returns:
+        Dict with formula version and the sections computable from the profile
+    """
+    age = profile.get('age') or 0
+    gender = profile.get('gender') or 'unknown'
+    weight = profile.get('weight_kg') or 0
+    height = profile.get('height_cm') or 0
+    activity = profile.get('activity_level') or 'sedentary'
+    goal = profile.get('goal') or 'maintain_weight'
+    daily_calories = profile.get('daily_calories_target') or 0
+
+    insights = {'version': INSIGHTS_VERSION}
+    if weight > 0 and height > 0:
+        bmi_data = calculate_bmi(weight, height)
+        insights['bmi'] = {'bmi': bmi_data['bmi'], 'category': bmi_data['category'], 'emoji': bmi_data['emoji']}
+        insights['ideal_weight'] = calculate_ideal_weight(height, gender)
+    if age > 0 and weight > 0 and height > 0:
+        metabolic_data = calculate_metabolic_age(age, gender, weight, height, activity)
+        insights['metabolic_age'] = {key: metabolic_data[key] for key in ('metabolic_age', 'status', 'emoji')}
+    if weight > 0:
+        insights['water_needs'] = calculate_water_needs(weight, activity)
+    if daily_calories > 0:
+        insights['macro_distribution'] = calculate_macro_distribution(daily_calories, goal)
+        insights['meal_portions'] = [
+            {key: meal[key] for key in ('meal', 'calories', 'percentage')}
+            for meal in calculate_meal_portions(daily_calories, 3)['meals']
+        ]
+    return insights
+
+
+def get_profile_insights(profile: Dict) -> Dict[str, Any]:
+    """Stored insights of a profile, recomputed if missing or computed with older formulas"""
+    insights: Optional[Dict] = profile.get('insights')
+    if insights and insights.get('version') == INSIGHTS_VERSION:
+        return insights
+    return compute_profile_insights(profile)
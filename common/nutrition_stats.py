@@ -0,0 +1,144 @@
+"""
+Rolling per-user nutrition statistics
+Computes 7/30/90-day statistics of a user from the nutrition_daily_totals
+rows (one row per day with logged meals, kept up to date by a trigger on each
+logged meal).
+
+All windows are filled in one pass over at most the longest window's rows,
+with running sums and Welford's online mean/variance, so a 90-day report
+costs the same single query and pass as a 7-day one.
+"""
+
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+WINDOWS = (7, 30, 90)
+
+# A logged day within this share of the calorie target counts as on target
+ADHERENCE_TOLERANCE = 0.10
+
+
+class Welford:
+    """Running count, mean and variance (Welford's algorithm)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0 for fewer than two values)"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def population_variance(self) -> float:
+        return self._m2 / self.count if self.count else 0.0
+
+
+class WindowStats:
+    """Statistics of the logged days of one window"""
+
+    def __init__(self, days: int):
+        self.days = days
+        self.meals = 0
+        self.calories = Welford()
+        self.totals = {"calories": 0.0, "protein": 0.0, "fats": 0.0, "carbs": 0.0}
+        self.on_target_days = 0
+
+    def add(self, row: dict, target: Optional[float]) -> None:
+        calories = float(row.get("calories") or 0)
+        self.meals += int(row.get("meals") or 0)
+        self.calories.add(calories)
+        for field in self.totals:
+            self.totals[field] += float(row.get(field) or 0)
+        if target and abs(calories - target) <= target * ADHERENCE_TOLERANCE:
+            self.on_target_days += 1
+
+    def to_dict(self, target: Optional[float]) -> dict:
+        logged = self.calories.count
+        result = {
+            "days": self.days,
+            "days_logged": logged,
+            "meals": self.meals,
+            "total_calories": round(self.totals["calories"]),
+            "average_calories": round(self.calories.mean) if logged else None,
+            "calories_stddev": round(self.calories.stddev, 1) if logged else None,
+            "average_protein": round(self.totals["protein"] / logged, 1) if logged else None,
+            "average_fats": round(self.totals["fats"] / logged, 1) if logged else None,
+            "average_carbs": round(self.totals["carbs"] / logged, 1) if logged else None,
+            "adherence": None,
+            "consistency_score": None,
+        }
+        if target and logged:
+            # Root mean square deviation from target, from mean and variance of the window
+            rms = math.sqrt(self.calories.population_variance + (self.calories.mean - target) ** 2)
+            result["adherence"] = round(self.on_target_days / logged * 100)
+            result["consistency_score"] = round(max(0.0, 100 - rms / target * 100))
+        return result
+
+
+def _as_date(value: Union[str, date]) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+def current_streak(days: Iterable[date], today: date) -> int:
+    """Consecutive days with logged meals ending today (or yesterday, if nothing is logged today yet)"""
+    logged = set(days)
+    day = today if today in logged else today - timedelta(days=1)
+    streak = 0
+    while day in logged:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak
+
+
+def compute_rolling_stats(daily_totals: List[dict], target: Optional[float] = None,
+                          today: Optional[date] = None, windows: Sequence[int] = WINDOWS) -> Dict:
+    """
+    Rolling statistics of a user's daily totals
+
+    Args:
+        daily_totals: nutrition_daily_totals rows (day, meals, calories, protein, fats, carbs)
+        target: Daily calorie target (adherence and consistency are None without it)
+        today: Last day of every window (default: today)
+        windows: Window lengths in days
+
+    Returns:
+        Dict with "streak" and one entry per window ("7d", "30d", ...) holding
+        days_logged, meals, total/average calories, calories_stddev, average
+        macros, adherence (% of logged days within 10% of target) and
+        consistency_score (100 minus RMS deviation from target in %)
+    """
+    today = today or date.today()
+    stats = {days: WindowStats(days) for days in windows}
+    logged_days = []
+
+    for row in daily_totals:
+        day = _as_date(row["day"])
+        age = (today - day).days
+        if age < 0:
+            continue
+        logged_days.append(day)
+        for days, window in stats.items():
+            if age < days:
+                window.add(row, target)
+
+    result = {f"{days}d": window.to_dict(target) for days, window in stats.items()}
+    result["streak"] = current_streak(logged_days, today)
+    return result
@@ -0,0 +1,62 @@
+"""
+Payment ledger shared by Telegram payments, YooKassa and Stripe
+
+Every successful payment goes through record_payment(), a single call of the
+record_payment database function (database_payment_ledger_migration.sql).
+It claims the provider payment, grants the credits and stores the payment row
+in one transaction, so a payment costs one round trip. A repeated delivery of
+the same payment returns status "duplicate" and grants nothing.
+"""
+from typing import Optional
+from loguru import logger
+from postgrest.exceptions import APIError
+import common.supabase_client as db
+
+# Raised by record_payment when the user does not exist (no_data_found)
+USER_NOT_FOUND = "P0002"
+
+
+async def record_payment(provider: str, telegram_id: int, credits: int, payment_id: Optional[str] = None,
+                         amount: Optional[float] = None, gateway: Optional[str] = None,
+                         status: str = "succeeded", event_type: Optional[str] = None) -> Optional[dict]:
+    """
+    Grant the credits of a payment and record it, once per (provider, payment_id)
+
+    Args:
+        provider: Payment provider the payment_id belongs to (yookassa, stripe, telegram_payments)
+        telegram_id: Telegram ID of the paying user
+        credits: Credits granted by the payment
+        payment_id: Payment ID assigned by the provider, None grants without idempotency
+        amount: Amount paid, the payment row is stored only when set
+        gateway: Gateway stored in the payment row (defaults to provider)
+        status: Payment status stored in the payment row
+        event_type: Event that delivered the payment, for support
+
+    Returns:
+        Dict with status ("processed" or "duplicate"), payment_id, user_id and
+        credits_remaining, or None if the user does not exist
+    """
+    params = {
+        "p_provider": provider,
+        "p_payment_id": payment_id,
+        "p_telegram_id": int(telegram_id),
+        "p_credits": credits,
+        "p_amount": amount,
+        "p_gateway": gateway,
+        "p_status": status,
+        "p_event_type": event_type
+    }
+    try:
+        result = db.supabase.rpc("record_payment", params).execute().data
+    except APIError as e:
+        if e.code == USER_NOT_FOUND:
+            logger.error(f"User {telegram_id} not found for payment {provider}:{payment_id}")
+            return None
+        raise
+
+    if result["status"] == "duplicate":
+        logger.info(f"Payment {provider}:{payment_id} already processed, skipping")
+    else:
+        logger.info(f"Payment {provider}:{payment_id} granted {credits} credits to user {telegram_id}, "
+                    f"balance {result['credits_remaining']}")
+    return result
@@ -0,0 +1,179 @@
+"""
+Reconciliation of provider payments against the payments table
+
+Provider payment lists are streamed page by page. Each page is joined with
+`payments` (by provider_payment_id) and `processed_payment_events` in one
+bulk query each, so a run is O(n) in the number of provider payments and
+holds one page in memory. Differences are written to the report as JSON
+lines:
+
+- missing: paid at the provider, but no payment row and no processed event
+- unlinked: processed event exists but no payment row carries the provider
+  payment ID (rows recorded before provider_payment_id existed)
+- duplicate: several payment rows for one provider payment
+- amount_mismatch: the recorded amount differs from the provider's
+
+Missing payments can be repaired through the credit path of /credits/add,
+which claims the payment first, so a repair never grants credits twice.
+"""
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional, TextIO
+from urllib.parse import urlencode
+from loguru import logger
+
+# Provider payment lists are paged by this many payments (YooKassa allows up to 100)
+RECONCILE_PAGE_SIZE = 100
+# Amounts are in rubles/dollars, anything below a kopeck/cent is rounding
+AMOUNT_TOLERANCE = 0.005
+
+
+def normalize_yookassa(payment: dict) -> dict:
+    metadata = payment.get("metadata") or {}
+    return {
+        "provider": "yookassa",
+        "payment_id": payment["id"],
+        "user_id": metadata.get("user_id"),
+        "credits": int(metadata.get("credits_count") or 0),
+        "amount": float(payment["amount"]["value"]),
+        "created_at": payment.get("created_at")
+    }
+
+
+def normalize_stripe(intent: dict) -> dict:
+    amount = intent["amount_received"] / 100
+    return {
+        "provider": "stripe",
+        "payment_id": intent["id"],
+        "user_id": (intent.get("metadata") or {}).get("telegram_user_id"),
+        # Same rule as Payments/stripe_webhook.py
+        "credits": 10 if amount < 10 else 100,
+        "amount": amount,
+        "created_at": intent.get("created")
+    }
+
+
+async def yookassa_payment_pages(client, since: str, until: Optional[str] = None,
+                                 page_size: int = RECONCILE_PAGE_SIZE) -> AsyncIterator[list]:
+    """
+    Stream succeeded YooKassa payments page by page
+
+    Args:
+        client: YooKassaClient
+        since: ISO 8601 time of the oldest payment
+        until: ISO 8601 time of the newest payment (exclusive)
+    """
+    params = {"status": "succeeded", "created_at.gte": since, "limit": page_size}
+    if until:
+        params["created_at.lt"] = until
+    while True:
+        page = await client.request("GET", f"/payments?{urlencode(params)}")
+        yield [normalize_yookassa(payment) for payment in page.get("items", [])]
+        if not page.get("next_cursor"):
+            return
+        params["cursor"] = page["next_cursor"]
+
+
+async def stripe_payment_pages(since: int, until: Optional[int] = None,
+                               page_size: int = RECONCILE_PAGE_SIZE) -> AsyncIterator[list]:
+    """
+    Stream succeeded Stripe PaymentIntents page by page
+
+    Args:
+        since: Unix time of the oldest payment
+        until: Unix time of the newest payment (exclusive)
+    """
+    import stripe
+
+    created = {"gte": since}
+    if until:
+        created["lt"] = until
+    starting_after = None
+    while True:
+        params = {"created": created, "limit": page_size}
+        if starting_after:
+            params["starting_after"] = starting_after
+        page = await asyncio.to_thread(stripe.PaymentIntent.list, **params)
+        if page.data:
+            yield [normalize_stripe(intent) for intent in page.data if intent["status"] == "succeeded"]
+            starting_after = page.data[-1]["id"]
+        if not page.has_more:
+            return
+
+
+def diff_page(payments: list, recorded: list, claimed: set) -> list:
+    """
+    Compare one page of provider payments with their payment rows
+
+    Args:
+        payments: Normalized provider payments
+        recorded: Payment rows whose provider_payment_id is in the page
+        claimed: Payment IDs of the page that have a processed event
+
+    Returns:
+        Report rows
+    """
+    rows_by_id = {}
+    for row in recorded:
+        rows_by_id.setdefault(row["provider_payment_id"], []).append(row)
+
+    diffs = []
+    for payment in payments:
+        rows = rows_by_id.get(payment["payment_id"], [])
+        if not rows:
+            kind = "unlinked" if payment["payment_id"] in claimed else "missing"
+            diffs.append({"type": kind, **payment})
+        elif len(rows) > 1:
+            diffs.append({"type": "duplicate", **payment, "rows": [row["id"] for row in rows]})
+        elif abs(float(rows[0]["amount"]) - payment["amount"]) > AMOUNT_TOLERANCE:
+            diffs.append({"type": "amount_mismatch", **payment, "recorded_amount": float(rows[0]["amount"]),
+                          "rows": [rows[0]["id"]]})
+    return diffs
+
+
+async def reconcile_payments(pages: AsyncIterator[list],
+                             get_recorded: Callable[[list], Awaitable[list]],
+                             get_claimed: Callable[[list], Awaitable[Iterable]],
+                             report: TextIO,
+                             repair: Optional[Callable[[dict], Awaitable[str]]] = None) -> dict:
+    """
+    Reconcile provider payments against the payments table
+
+    Args:
+        pages: Pages of normalized provider payments
+        get_recorded: Payment rows for a list of provider payment IDs
+        get_claimed: Processed payment IDs among a list of provider payment IDs
+        report: Text stream the report is written to (JSON lines)
+        repair: Grants a missing payment and returns the result status
+
+    Returns:
+        Summary with counts of checked payments and of each difference type
+    """
+    started = time.time()
+    summary = {"checked": 0, "pages": 0, "missing": 0, "unlinked": 0, "duplicate": 0,
+               "amount_mismatch": 0, "repaired": 0, "repair_failed": 0}
+
+    async for payments in pages:
+        summary["pages"] += 1
+        if not payments:
+            continue
+        summary["checked"] += len(payments)
+        ids = [payment["payment_id"] for payment in payments]
+        recorded, claimed = await asyncio.gather(get_recorded(ids), get_claimed(ids))
+
+        for diff in diff_page(payments, recorded, set(claimed)):
+            summary[diff["type"]] += 1
+            if repair and diff["type"] == "missing":
+                try:
+                    diff["repair"] = await repair(diff)
+                    summary["repaired"] += 1
+                except Exception as e:
+                    logger.error(f"Failed to repair payment {diff['provider']}:{diff['payment_id']}: {e!r}")
+                    diff["repair"] = f"failed: {e}"
+                    summary["repair_failed"] += 1
+            report.write(json.dumps(diff, default=str) + "\n")
+
+    summary["duration_seconds"] = round(time.time() - started, 1)
+    logger.info(f"Payment reconciliation finished: {summary}")
+    return summary
@@ -0,0 +1,90 @@
+"""
+Short-lived cache of unpaid invoices
+
+Repeated taps on a buy button return the invoice created by the first tap
+instead of creating another provider payment. Entries are keyed by
+(user, plan, gateway), expire before the provider cancels an unpaid payment
+and are dropped as soon as the payment succeeds or is canceled. Concurrent
+requests for the same key share one creation.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+
+class PendingInvoiceCache:
+    """In-process map of (user, plan, gateway) -> unpaid invoice"""
+
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        """
+        Args:
+            ttl: Seconds an invoice is reused, keep below the provider's payment lifetime
+            max_entries: Oldest invoices are forgotten beyond this size
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple[dict, float]] = OrderedDict()
+        self._creating: dict[tuple, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user_id, plan_id: str, gateway: str) -> tuple:
+        return str(user_id), plan_id, gateway
+
+    def get(self, user_id, plan_id: str, gateway: str) -> Optional[dict]:
+        """Get unexpired pending invoice"""
+        key = self._key(user_id, plan_id, gateway)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        invoice, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        return invoice
+
+    def put(self, user_id, plan_id: str, gateway: str, invoice: dict) -> None:
+        key = self._key(user_id, plan_id, gateway)
+        self._entries[key] = (invoice, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_create(self, user_id, plan_id: str, gateway: str,
+                            create: Callable[[], Awaitable[dict]]) -> tuple[dict, bool]:
+        """
+        Return the pending invoice, or create one
+
+        Returns:
+            Tuple of (invoice, reused)
+        """
+        invoice = self.get(user_id, plan_id, gateway)
+        if invoice is not None:
+            self.hits += 1
+            return invoice, True
+
+        key = self._key(user_id, plan_id, gateway)
+        task = self._creating.get(key)
+        if task is not None:
+            # Another tap is creating this invoice right now
+            self.hits += 1
+            return await asyncio.shield(task), True
+
+        self.misses += 1
+        task = asyncio.ensure_future(create())
+        self._creating[key] = task
+        try:
+            invoice = await asyncio.shield(task)
+        finally:
+            self._creating.pop(key, None)
+        self.put(user_id, plan_id, gateway, invoice)
+        return invoice, False
+
+    def settle(self, user_id, plan_id: str, gateway: str) -> None:
+        """Forget the invoice of a user's plan (paid or canceled)"""
+        self._entries.pop(self._key(user_id, plan_id, gateway), None)
+
+    def stats(self) -> dict:
+        return {"pending": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,48 @@
+"""
+In-process cache of rendered message texts
+
+Keys include everything the text is rendered from (e.g. user, profile
+version, language, section), so an entry never has to be invalidated: a
+changed profile gets a new version and so a new key, and old entries age out
+of the LRU.
+"""
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+class RenderCache:
+    """Bounded LRU of key -> rendered text"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        text = self._entries.get(key)
+        if text is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return text
+
+    def put(self, key: Hashable, text: str) -> None:
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_render(self, key: Optional[Hashable], render: Callable[[], str]) -> str:
+        """Cached text for key, rendered and stored on a miss (key None: not cacheable)"""
+        if key is None:
+            return render()
+        text = self.get(key)
+        if text is None:
+            text = render()
+            self.put(key, text)
+        return text
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,58 @@
+"""
+Shared base for small local SQLite stores (bot job queue and caches, payment outbox)
+
+One connection per store, serialized by a lock and used from a worker thread
+so database calls never block the event loop.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+class SQLiteStore:
+    """Lazily connected SQLite database with an async execution helper"""
+
+    # Subclasses put their CREATE TABLE / CREATE INDEX statements here
+    SCHEMA = ""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            if self.SCHEMA:
+                conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    @contextmanager
+    def _transaction(conn: sqlite3.Connection):
+        """Run several statements atomically (connections are in autocommit mode)"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def _run(self, fn, *args):
+        """Run a database operation off the event loop"""
+        def call():
+            with self._lock:
+                return fn(self._connect(), *args)
+        return await asyncio.to_thread(call)
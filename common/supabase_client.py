@@ -1,8 +1,10 @@
 import os
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 import asyncio
 from typing import Optional
 from loguru import logger
+from common.nutrition_calculations import compute_profile_insights
 
 # Must be set in .env file
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -44,35 +46,46 @@ async def get_user_by_telegram_id(telegram_id: int):
     logger.info(f"User {telegram_id} query result: {result}")
     return result
 
-async def decrement_credits(telegram_id: int, count: int = 1):
-    logger.info(f"Decrementing {count} credits for user {telegram_id}")
-    user = await get_user_by_telegram_id(telegram_id)
-    if not user:
-        logger.error(f"User {telegram_id} not found for credit decrement")
+async def apply_credit_entry(telegram_id: int, delta: int, kind: str, reason: Optional[str] = None,
+                             reference: Optional[str] = None):
+    """
+    Change user's credits (never below zero) and append a credit_ledger entry, in one statement
+
+    Args:
+        telegram_id: Telegram user ID
+        delta: Credits to add (negative to consume)
+        kind: Ledger entry kind: grant, consume, refund, adjust
+        reason: What the credits were spent or granted for
+        reference: ID of the payment, analysis etc. that caused the change
+
+    Returns:
+        Updated user, None if the user does not exist
+    """
+    updated = supabase.rpc("apply_credit_entry", {
+        "p_telegram_id": int(telegram_id),
+        "p_delta": delta,
+        "p_kind": kind,
+        "p_reason": reason,
+        "p_reference": reference
+    }).execute().data
+    if not updated:
+        logger.error(f"User {telegram_id} not found for credit {kind} of {delta}")
         return None
-    
-    old_credits = user["credits_remaining"]
-    new_credits = max(0, old_credits - count)
-    logger.info(f"User {telegram_id} credits: {old_credits} -> {new_credits}")
-    
-    updated = supabase.table("users").update({"credits_remaining": new_credits}).eq("telegram_id", telegram_id).execute().data[0]
-    logger.info(f"Credits decremented for user {telegram_id}: {updated}")
-    return updated
+    logger.info(f"Credits {kind} {delta:+d} for user {telegram_id}, balance {updated[0]['credits_remaining']}")
+    return updated[0]
 
-async def add_credits(telegram_id: int, count: int = 20):
+async def decrement_credits(telegram_id: int, count: int = 1, reason: str = "analysis",
+                            reference: Optional[str] = None):
+    logger.info(f"Decrementing {count} credits for user {telegram_id}")
+    return await apply_credit_entry(telegram_id, -count, "consume", reason, reference)
+
+async def add_credits(telegram_id: int, count: int = 20, reason: Optional[str] = None):
     logger.info(f"Adding {count} credits for user {telegram_id}")
-    user = await get_user_by_telegram_id(telegram_id)
-    if not user:
-        logger.error(f"User {telegram_id} not found for credit addition")
-        return None
-    
-    old_credits = user["credits_remaining"]
-    new_credits = old_credits + count
-    logger.info(f"User {telegram_id} credits: {old_credits} -> {new_credits}")
-    
-    updated = supabase.table("users").update({"credits_remaining": new_credits}).eq("telegram_id", telegram_id).execute().data[0]
-    logger.info(f"Credits added for user {telegram_id}: {updated}")
-    return updated
+    return await apply_credit_entry(telegram_id, count, "grant", reason)
+
+async def refund_credits(telegram_id: int, count: int = 1, reason: Optional[str] = None):
+    logger.info(f"Refunding {count} credits to user {telegram_id}")
+    return await apply_credit_entry(telegram_id, count, "refund", reason)
 
 async def update_user_language(telegram_id: int, language: str):
     """
@@ -117,6 +130,26 @@ async def update_user_country_and_phone(telegram_id: int, country: Optional[str]
     logger.info(f"Country/phone updated for user {telegram_id}: {updated}")
     return updated
 
+async def get_users_page(after_telegram_id: int = 0, limit: int = 500, languages: Optional[list] = None, countries: Optional[list] = None):
+    """
+    Get one page of users ordered by telegram_id (keyset pagination)
+    
+    Args:
+        after_telegram_id: Return users with telegram_id greater than this
+        limit: Page size
+        languages: Only users with one of these language codes (optional)
+        countries: Only users from one of these country codes (optional)
+        
+    Returns:
+        List of users with id, telegram_id, language and country
+    """
+    query = supabase.table("users").select("id, telegram_id, language, country").gt("telegram_id", after_telegram_id)
+    if languages:
+        query = query.in_("language", languages)
+    if countries:
+        query = query.in_("country", countries)
+    return query.order("telegram_id").limit(limit).execute().data
+
 # USER PROFILES
 async def get_user_profile(user_id: str):
     """
@@ -183,6 +216,9 @@ async def create_user_profile(user_id: str, profile_data: dict):
             logger.error(f"Error calculating daily calories for user {user_id}: {e}")
             # Don't include calories in profile if calculation failed
     
+    # Store derived insights with the profile so reads don't recompute them
+    profile_data['insights'] = compute_profile_insights(profile_data)
+    
     # Add user_id to profile data
     profile_data['user_id'] = user_id
     
@@ -210,6 +246,9 @@ async def update_user_profile(user_id: str, profile_data: dict):
             logger.error(f"Error calculating daily calories for user {user_id}: {e}")
             # Don't include calories in profile if calculation failed
     
+    # Store derived insights with the profile so reads don't recompute them
+    profile_data['insights'] = compute_profile_insights(profile_data)
+    
     updated = supabase.table("user_profiles").update(profile_data).eq("user_id", user_id).execute().data[0]
     logger.info(f"Profile updated for user {user_id}: {updated}")
     return updated
@@ -329,6 +368,7 @@ async def create_or_update_profile(user_id: str, profile_data: dict):
         merged_data.pop('user_id', None)
         merged_data.pop('created_at', None)
         merged_data.pop('updated_at', None)
+        merged_data.pop('profile_version', None)  # bumped by the database on update
         
         logger.info(f"Merging profile data for user {user_id}: existing={existing_profile}, new={profile_data}, merged={merged_data}")
         
@@ -409,6 +449,23 @@ async def get_daily_calories_consumed(user_id: str, date: str = None):
     logger.info(f"Daily summary for user {user_id} on {date}: {result}")
     return result
 
+async def get_nutrition_daily_totals(user_id: str, days: int = 90):
+    """
+    Daily meal totals of the last days (one query, at most one row per day)
+
+    Args:
+        user_id: User UUID from database
+        days: Number of days back from today
+
+    Returns:
+        nutrition_daily_totals rows (day, meals, calories, protein, fats, carbs), newest first
+    """
+    from datetime import date, timedelta
+
+    since = (date.today() - timedelta(days=days - 1)).isoformat()
+    return supabase.table("nutrition_daily_totals").select("day, meals, calories, protein, fats, carbs") \
+        .eq("user_id", user_id).gte("day", since).order("day", desc=True).execute().data
+
 # LOGS
 async def log_user_action(user_id: str, action_type: str, metadata: dict = None, photo_url: str = None, kbzhu: dict = None, model_used: str = None):
     """
@@ -456,18 +513,106 @@ async def log_analysis(user_id: str, photo_url: str, kbzhu: dict, model_used: st
     )
 
 # PAYMENTS
-async def add_payment(user_id: str, amount: float, gateway: str, status: str):
+async def add_payment(user_id: str, amount: float, gateway: str, status: str, provider_payment_id: Optional[str] = None):
     logger.info(f"Adding payment record for user {user_id}: {amount} via {gateway}")
     payment = {
         "user_id": user_id,
         "amount": amount,
         "gateway": gateway,
-        "status": status
+        "status": status,
+        "provider_payment_id": provider_payment_id
     }
     supabase.table("payments").insert(payment).execute()
     logger.info(f"Payment recorded for user {user_id}")
     return True
 
+# Unique violation raised by PostgREST when the event was already claimed
+UNIQUE_VIOLATION = "23505"
+
+async def claim_payment_event(provider: str, payment_id: str, event_type: Optional[str] = None,
+                              user_id: Optional[str] = None, credits: Optional[int] = None,
+                              amount: Optional[float] = None) -> bool:
+    """
+    Claim a provider payment for processing (one insert on a unique key)
+
+    Args:
+        provider: Payment gateway (yookassa, stripe)
+        payment_id: Payment ID assigned by the gateway
+
+    Returns:
+        True if claimed now, False if the payment was already processed
+    """
+    event = {
+        "provider": provider,
+        "payment_id": payment_id,
+        "event_type": event_type,
+        "user_id": str(user_id) if user_id is not None else None,
+        "credits": credits,
+        "amount": amount
+    }
+    try:
+        supabase.table("processed_payment_events").insert(event).execute()
+    except APIError as e:
+        if e.code == UNIQUE_VIOLATION:
+            logger.info(f"Payment {provider}:{payment_id} already processed, skipping")
+            return False
+        raise
+    return True
+
+async def release_payment_event(provider: str, payment_id: str):
+    """Release claim of a payment whose processing failed, so a provider retry can process it"""
+    logger.warning(f"Releasing payment event {provider}:{payment_id}")
+    supabase.table("processed_payment_events").delete().eq("provider", provider).eq("payment_id", payment_id).execute()
+
+async def get_payments_by_provider_ids(provider_payment_ids: list) -> list:
+    """Payment rows recorded for the given provider payment IDs (one query)"""
+    if not provider_payment_ids:
+        return []
+    return supabase.table("payments").select("id, user_id, amount, gateway, status, provider_payment_id") \
+        .in_("provider_payment_id", provider_payment_ids).execute().data
+
+async def get_processed_payment_ids(payment_ids: list) -> set:
+    """Provider payment IDs among the given ones that have a processed payment event (one query)"""
+    if not payment_ids:
+        return set()
+    rows = supabase.table("processed_payment_events").select("payment_id").in_("payment_id", payment_ids).execute().data
+    return {row["payment_id"] for row in rows}
+
+# CREDIT LEDGER
+async def get_credit_history(user_id: str, before: Optional[str] = None, before_id: Optional[int] = None,
+                             limit: int = 50) -> list:
+    """
+    Credit ledger entries of a user, newest first
+
+    Pages are keyed by (created_at, id), so entries written in the same
+    transaction (same created_at) are neither skipped nor repeated.
+
+    Args:
+        user_id: User UUID from database
+        before: created_at of the last entry of the previous page
+        before_id: id of the last entry of the previous page
+
+    Returns:
+        Up to limit entries (index range scan on user_id, created_at, id)
+    """
+    query = supabase.table("credit_ledger").select("*").eq("user_id", user_id)
+    if before and before_id is not None:
+        # (created_at, id) < (before, before_id)
+        query = query.or_(f'created_at.lt."{before}",and(created_at.eq."{before}",id.lt.{int(before_id)})')
+    elif before:
+        query = query.lt("created_at", before)
+    return query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute().data
+
+async def get_ledger_balance(user_id: str) -> int:
+    """Balance recomputed from the latest snapshot plus the ledger entries after it"""
+    return supabase.rpc("credit_balance", {"p_user_id": user_id}).execute().data
+
+async def snapshot_credit_balances() -> int:
+    """Snapshot balances of users with ledger entries since the last run, returns snapshots written"""
+    count = supabase.rpc("snapshot_credit_balances", {}).execute().data
+    logger.info(f"Credit balance snapshots written: {count}")
+    return count
+
 async def get_user_total_paid(user_id: str) -> float:
     """
     Calculate total amount paid by user from payments table
@@ -0,0 +1,195 @@
+-- ==========================================
+-- CREDIT LEDGER MIGRATION
+-- ==========================================
+-- Purpose: Audit trail of every change of users.credits_remaining
+-- Description: Each change of a user's credits appends a credit_ledger entry
+--              (grant, consume, refund, adjust) with the balance after it.
+--              Entries are written by a trigger in the same transaction as
+--              the change, so the trail also covers record_payment() and
+--              manual edits in the dashboard. users.credits_remaining stays
+--              the O(1) balance; credit_balance_snapshots hold the balance
+--              at a ledger entry, and credit_balance() recomputes a balance
+--              as snapshot + entries since it to audit the cached one.
+-- Requires: database_payment_ledger_migration.sql (re-apply it, record_payment
+--           labels its ledger entries with the provider payment)
+
+-- ==========================================
+-- 1. CREATE TABLES
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS credit_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL CHECK (kind IN ('grant', 'consume', 'refund', 'adjust')),
+    delta INTEGER NOT NULL,
+    balance_after INTEGER NOT NULL,
+    reason TEXT,
+    reference TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS credit_balance_snapshots (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    balance INTEGER NOT NULL,
+    last_entry_id BIGINT NOT NULL,
+    taken_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- ==========================================
+-- 2. ADD INDEXES
+-- ==========================================
+
+-- History of a user, newest first (keyset pagination on created_at, id)
+CREATE INDEX IF NOT EXISTS idx_credit_ledger_user_created
+    ON credit_ledger(user_id, created_at DESC, id DESC);
+
+-- ==========================================
+-- 3. LEDGER TRIGGERS
+-- ==========================================
+
+-- Append a ledger entry for every change of credits_remaining. The kind,
+-- reason and reference of the change are passed through transaction-local
+-- settings (credits.kind, credits.reason, credits.reference).
+CREATE OR REPLACE FUNCTION append_credit_ledger_entry()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_delta INTEGER := NEW.credits_remaining - COALESCE(OLD.credits_remaining, 0);
+    v_kind TEXT := NULLIF(current_setting('credits.kind', true), '');
+BEGIN
+    IF v_delta = 0 THEN
+        RETURN NEW;
+    END IF;
+    IF v_kind IS NULL THEN
+        v_kind := CASE WHEN TG_OP = 'INSERT' OR v_delta > 0 THEN 'grant' ELSE 'consume' END;
+    END IF;
+    INSERT INTO credit_ledger (user_id, kind, delta, balance_after, reason, reference)
+    VALUES (
+        NEW.id, v_kind, v_delta, NEW.credits_remaining,
+        COALESCE(NULLIF(current_setting('credits.reason', true), ''), CASE WHEN TG_OP = 'INSERT' THEN 'signup' END),
+        NULLIF(current_setting('credits.reference', true), '')
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_credit_ledger ON users;
+CREATE TRIGGER trigger_credit_ledger
+    AFTER INSERT OR UPDATE OF credits_remaining ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION append_credit_ledger_entry();
+
+-- Entries are never changed or deleted, corrections are new 'adjust' entries.
+-- Deleting a user still removes its entries: ON DELETE CASCADE runs after the
+-- user row is gone, which is the only case a DELETE is let through.
+CREATE OR REPLACE FUNCTION reject_credit_ledger_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' AND NOT EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id) THEN
+        RETURN OLD;
+    END IF;
+    RAISE EXCEPTION 'credit_ledger is append-only (% rejected)', TG_OP;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_credit_ledger_append_only ON credit_ledger;
+CREATE TRIGGER trigger_credit_ledger_append_only
+    BEFORE UPDATE OR DELETE ON credit_ledger
+    FOR EACH ROW
+    EXECUTE FUNCTION reject_credit_ledger_change();
+
+DROP TRIGGER IF EXISTS trigger_credit_ledger_no_truncate ON credit_ledger;
+CREATE TRIGGER trigger_credit_ledger_no_truncate
+    BEFORE TRUNCATE ON credit_ledger
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION reject_credit_ledger_change();
+
+-- Replaced by reject_credit_ledger_change()
+DROP FUNCTION IF EXISTS reject_credit_ledger_update();
+
+-- ==========================================
+-- 4. CREATE FUNCTIONS
+-- ==========================================
+
+-- Change a user's credits by p_delta (never below zero) in one statement and
+-- return the updated user, NULL if the user does not exist
+CREATE OR REPLACE FUNCTION apply_credit_entry(
+    p_telegram_id BIGINT,
+    p_delta INTEGER,
+    p_kind TEXT,
+    p_reason TEXT DEFAULT NULL,
+    p_reference TEXT DEFAULT NULL
+)
+RETURNS SETOF users AS $$
+BEGIN
+    PERFORM set_config('credits.kind', p_kind, true);
+    PERFORM set_config('credits.reason', COALESCE(p_reason, ''), true);
+    PERFORM set_config('credits.reference', COALESCE(p_reference, ''), true);
+    RETURN QUERY
+        UPDATE users SET credits_remaining = GREATEST(0, credits_remaining + p_delta)
+        WHERE telegram_id = p_telegram_id
+        RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Balance recomputed from the user's snapshot and the entries after it
+CREATE OR REPLACE FUNCTION credit_balance(p_user_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+    v_balance INTEGER;
+    v_last_entry_id BIGINT;
+BEGIN
+    SELECT balance, last_entry_id INTO v_balance, v_last_entry_id
+    FROM credit_balance_snapshots WHERE user_id = p_user_id;
+
+    RETURN COALESCE(v_balance, 0) + COALESCE((
+        SELECT SUM(delta) FROM credit_ledger
+        WHERE user_id = p_user_id AND id > COALESCE(v_last_entry_id, 0)
+    ), 0);
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Snapshot the balance of every user with entries after the last run,
+-- returns the number of snapshots written
+CREATE OR REPLACE FUNCTION snapshot_credit_balances()
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    INSERT INTO credit_balance_snapshots (user_id, balance, last_entry_id, taken_at)
+    SELECT DISTINCT ON (user_id) user_id, balance_after, id, now()
+    FROM credit_ledger
+    WHERE id > (SELECT COALESCE(MAX(last_entry_id), 0) FROM credit_balance_snapshots)
+    ORDER BY user_id, id DESC
+    ON CONFLICT (user_id) DO UPDATE
+        SET balance = EXCLUDED.balance, last_entry_id = EXCLUDED.last_entry_id, taken_at = EXCLUDED.taken_at;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ==========================================
+-- 5. BACKFILL
+-- ==========================================
+
+-- Opening balance of existing users, so snapshot + entries equals credits_remaining
+INSERT INTO credit_ledger (user_id, kind, delta, balance_after, reason)
+SELECT u.id, 'adjust', u.credits_remaining, u.credits_remaining, 'opening_balance'
+FROM users u
+WHERE u.credits_remaining <> 0
+  AND NOT EXISTS (SELECT 1 FROM credit_ledger l WHERE l.user_id = u.id);
+
+SELECT snapshot_credit_balances();
+
+-- ==========================================
+-- 6. PERMISSIONS AND COMMENTS
+-- ==========================================
+
+REVOKE ALL ON FUNCTION apply_credit_entry(BIGINT, INTEGER, TEXT, TEXT, TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION apply_credit_entry(BIGINT, INTEGER, TEXT, TEXT, TEXT) TO service_role;
+REVOKE ALL ON FUNCTION snapshot_credit_balances() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION snapshot_credit_balances() TO service_role;
+
+COMMENT ON TABLE credit_ledger IS 'Append-only log of every change of users.credits_remaining';
+COMMENT ON COLUMN credit_ledger.kind IS 'grant (payment, signup), consume (analysis, recipe), refund, adjust (manual, opening balance)';
+COMMENT ON COLUMN credit_ledger.reference IS 'What caused the change, e.g. provider:payment_id';
+COMMENT ON TABLE credit_balance_snapshots IS 'Balance of a user as of credit_ledger entry last_entry_id';
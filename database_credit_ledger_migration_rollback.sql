@@ -0,0 +1,16 @@
+-- ==========================================
+-- CREDIT LEDGER MIGRATION ROLLBACK
+-- ==========================================
+-- Purpose: Rollback credit_ledger and balance snapshots
+-- Description: users.credits_remaining is kept, the audit trail is lost.
+--              Roll back the application code first (apply_credit_entry).
+
+DROP TRIGGER IF EXISTS trigger_credit_ledger ON users;
+DROP FUNCTION IF EXISTS snapshot_credit_balances();
+DROP FUNCTION IF EXISTS credit_balance(UUID);
+DROP FUNCTION IF EXISTS apply_credit_entry(BIGINT, INTEGER, TEXT, TEXT, TEXT);
+DROP FUNCTION IF EXISTS append_credit_ledger_entry();
+DROP TABLE IF EXISTS credit_balance_snapshots;
+DROP TABLE IF EXISTS credit_ledger;
+DROP FUNCTION IF EXISTS reject_credit_ledger_change();
+DROP FUNCTION IF EXISTS reject_credit_ledger_update();
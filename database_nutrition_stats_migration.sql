@@ -0,0 +1,86 @@
+-- ==========================================
+-- NUTRITION STATS MIGRATION
+-- ==========================================
+-- Purpose: Per-user daily nutrition totals for rolling statistics
+-- Description: Every logged meal (photo_analysis log with kbzhu) is added to
+--              the user's nutrition_daily_totals row of that day by a trigger,
+--              so reports read at most one row per day instead of scanning
+--              logs. Rolling 7/30/90-day statistics are computed from these
+--              rows in one pass (common/nutrition_stats.py), so a 90-day
+--              report costs one indexed query of at most 90 rows.
+
+-- ==========================================
+-- 1. CREATE TABLES
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS nutrition_daily_totals (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    meals INTEGER NOT NULL DEFAULT 0,
+    calories NUMERIC NOT NULL DEFAULT 0,
+    protein NUMERIC NOT NULL DEFAULT 0,
+    fats NUMERIC NOT NULL DEFAULT 0,
+    carbs NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (user_id, day)
+);
+
+-- ==========================================
+-- 2. DAILY TOTALS TRIGGER
+-- ==========================================
+
+CREATE OR REPLACE FUNCTION add_meal_to_daily_totals()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO nutrition_daily_totals (user_id, day, meals, calories, protein, fats, carbs)
+    VALUES (
+        NEW.user_id,
+        DATE(NEW.timestamp),
+        1,
+        COALESCE(CAST(NEW.kbzhu->>'calories' AS NUMERIC), 0),
+        COALESCE(CAST(NEW.kbzhu->>'proteins' AS NUMERIC), 0),
+        COALESCE(CAST(NEW.kbzhu->>'fats' AS NUMERIC), 0),
+        COALESCE(CAST(NEW.kbzhu->>'carbohydrates' AS NUMERIC), 0)
+    )
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        meals = nutrition_daily_totals.meals + 1,
+        calories = nutrition_daily_totals.calories + EXCLUDED.calories,
+        protein = nutrition_daily_totals.protein + EXCLUDED.protein,
+        fats = nutrition_daily_totals.fats + EXCLUDED.fats,
+        carbs = nutrition_daily_totals.carbs + EXCLUDED.carbs,
+        updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_add_meal_to_daily_totals ON logs;
+CREATE TRIGGER trigger_add_meal_to_daily_totals
+    AFTER INSERT ON logs
+    FOR EACH ROW
+    WHEN (NEW.action_type = 'photo_analysis' AND NEW.kbzhu IS NOT NULL)
+    EXECUTE FUNCTION add_meal_to_daily_totals();
+
+-- ==========================================
+-- 3. BACKFILL FROM EXISTING LOGS
+-- ==========================================
+
+INSERT INTO nutrition_daily_totals (user_id, day, meals, calories, protein, fats, carbs)
+SELECT
+    user_id,
+    DATE(timestamp),
+    COUNT(*),
+    SUM(COALESCE(CAST(kbzhu->>'calories' AS NUMERIC), 0)),
+    SUM(COALESCE(CAST(kbzhu->>'proteins' AS NUMERIC), 0)),
+    SUM(COALESCE(CAST(kbzhu->>'fats' AS NUMERIC), 0)),
+    SUM(COALESCE(CAST(kbzhu->>'carbohydrates' AS NUMERIC), 0))
+FROM logs
+WHERE action_type = 'photo_analysis' AND kbzhu IS NOT NULL AND user_id IS NOT NULL
+GROUP BY user_id, DATE(timestamp)
+ON CONFLICT (user_id, day) DO NOTHING;
+
+-- ==========================================
+-- 4. ADD COMMENTS
+-- ==========================================
+
+COMMENT ON TABLE nutrition_daily_totals IS 'Per-user daily sums of logged meals, maintained by a trigger on logs';
+COMMENT ON COLUMN nutrition_daily_totals.meals IS 'Number of photo_analysis logs of the day';
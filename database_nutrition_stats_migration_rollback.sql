@@ -0,0 +1,10 @@
+-- ==========================================
+-- NUTRITION STATS MIGRATION ROLLBACK
+-- ==========================================
+-- Purpose: Rollback nutrition_daily_totals
+-- Description: Weekly reports have no statistics after this rollback,
+--              roll back the application code first.
+
+DROP TRIGGER IF EXISTS trigger_add_meal_to_daily_totals ON logs;
+DROP FUNCTION IF EXISTS add_meal_to_daily_totals();
+DROP TABLE IF EXISTS nutrition_daily_totals;
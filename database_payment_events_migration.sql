@@ -0,0 +1,39 @@
+-- ==========================================
+-- PAYMENT EVENTS IDEMPOTENCY MIGRATION
+-- ==========================================
+-- Purpose: Process every provider payment exactly once
+-- Description: Payment webhooks claim (provider, payment_id) with a single
+--              insert before granting credits. A retried delivery hits the
+--              unique constraint and is acknowledged without granting again.
+
+-- ==========================================
+-- 1. CREATE PROCESSED PAYMENT EVENTS TABLE
+-- ==========================================
+
+CREATE TABLE IF NOT EXISTS processed_payment_events (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    provider TEXT NOT NULL,
+    payment_id TEXT NOT NULL,
+    event_type TEXT,
+    user_id TEXT,
+    credits INTEGER,
+    amount NUMERIC(12,2),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    CONSTRAINT processed_payment_events_provider_payment_key UNIQUE (provider, payment_id)
+);
+
+-- ==========================================
+-- 2. ADD INDEXES
+-- ==========================================
+
+-- Lookup of a user's processed payments (support, reconciliation)
+CREATE INDEX IF NOT EXISTS idx_processed_payment_events_user
+    ON processed_payment_events(user_id, created_at DESC);
+
+-- ==========================================
+-- 3. ADD COMMENTS
+-- ==========================================
+
+COMMENT ON TABLE processed_payment_events IS 'Provider payments whose credits were granted, one row per (provider, payment_id)';
+COMMENT ON COLUMN processed_payment_events.provider IS 'Payment gateway: yookassa, stripe';
+COMMENT ON COLUMN processed_payment_events.payment_id IS 'Payment ID assigned by the gateway';
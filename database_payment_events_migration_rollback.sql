@@ -0,0 +1,9 @@
+-- ==========================================
+-- PAYMENT EVENTS IDEMPOTENCY MIGRATION ROLLBACK
+-- ==========================================
+-- Purpose: Rollback processed_payment_events table
+-- Description: Without this table payment webhooks grant credits on every
+--              delivery again, roll back the application code first.
+
+DROP INDEX IF EXISTS idx_processed_payment_events_user;
+DROP TABLE IF EXISTS processed_payment_events;
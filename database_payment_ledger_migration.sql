@@ -0,0 +1,87 @@
+-- ==========================================
+-- PAYMENT LEDGER MIGRATION
+-- ==========================================
+-- Purpose: Process a payment in one transactional call
+-- Description: record_payment() claims the provider payment in
+--              processed_payment_events, grants the credits and records the
+--              payment row in a single transaction and returns the new
+--              balance. Telegram payments, YooKassa (/credits/add) and Stripe
+--              all go through it (common/payment_ledger.py): one round trip
+--              per payment, and a failure rolls back the claim together with
+--              the credits, so a provider retry processes the payment again.
+-- Requires: database_payment_events_migration.sql,
+--           database_payment_reconciliation_migration.sql
+
+-- ==========================================
+-- 1. CREATE RECORD_PAYMENT FUNCTION
+-- ==========================================
+
+CREATE OR REPLACE FUNCTION record_payment(
+    p_provider TEXT,
+    p_payment_id TEXT,
+    p_telegram_id BIGINT,
+    p_credits INTEGER,
+    p_amount NUMERIC DEFAULT NULL,
+    p_gateway TEXT DEFAULT NULL,
+    p_status TEXT DEFAULT 'succeeded',
+    p_event_type TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_user_id UUID;
+    v_balance INTEGER;
+BEGIN
+    -- Claim the payment, a repeated delivery changes nothing
+    IF p_payment_id IS NOT NULL THEN
+        INSERT INTO processed_payment_events (provider, payment_id, event_type, user_id, credits, amount)
+        VALUES (p_provider, p_payment_id, p_event_type, p_telegram_id::TEXT, p_credits, p_amount)
+        ON CONFLICT (provider, payment_id) DO NOTHING;
+
+        IF NOT FOUND THEN
+            SELECT id, credits_remaining INTO v_user_id, v_balance FROM users WHERE telegram_id = p_telegram_id;
+            RETURN jsonb_build_object(
+                'status', 'duplicate', 'payment_id', p_payment_id,
+                'user_id', v_user_id, 'credits_remaining', v_balance
+            );
+        END IF;
+    END IF;
+
+    -- Label the credit_ledger entry of this change (database_credit_ledger_migration.sql)
+    PERFORM set_config('credits.kind', 'grant', true);
+    PERFORM set_config('credits.reason', 'payment', true);
+    PERFORM set_config('credits.reference', p_provider || ':' || COALESCE(p_payment_id, ''), true);
+
+    UPDATE users SET credits_remaining = credits_remaining + p_credits
+    WHERE telegram_id = p_telegram_id
+    RETURNING id, credits_remaining INTO v_user_id, v_balance;
+
+    IF NOT FOUND THEN
+        -- Rolls back the claim as well
+        RAISE EXCEPTION 'User % not found', p_telegram_id USING ERRCODE = 'P0002';
+    END IF;
+
+    IF p_amount IS NOT NULL THEN
+        INSERT INTO payments (user_id, amount, gateway, status, provider_payment_id)
+        VALUES (v_user_id, p_amount, COALESCE(p_gateway, p_provider), p_status, p_payment_id);
+    END IF;
+
+    RETURN jsonb_build_object(
+        'status', 'processed', 'payment_id', p_payment_id,
+        'user_id', v_user_id, 'credits_remaining', v_balance
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- ==========================================
+-- 2. PERMISSIONS
+-- ==========================================
+
+REVOKE ALL ON FUNCTION record_payment(TEXT, TEXT, BIGINT, INTEGER, NUMERIC, TEXT, TEXT, TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION record_payment(TEXT, TEXT, BIGINT, INTEGER, NUMERIC, TEXT, TEXT, TEXT) TO service_role;
+
+-- ==========================================
+-- 3. ADD COMMENTS
+-- ==========================================
+
+COMMENT ON FUNCTION record_payment(TEXT, TEXT, BIGINT, INTEGER, NUMERIC, TEXT, TEXT, TEXT) IS
+    'Claim a provider payment, grant its credits and record it in one transaction, returns status and new balance';
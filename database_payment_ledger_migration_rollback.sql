@@ -0,0 +1,8 @@
+-- ==========================================
+-- PAYMENT LEDGER MIGRATION ROLLBACK
+-- ==========================================
+-- Purpose: Rollback record_payment function
+-- Description: Every payment path calls record_payment(), roll back the
+--              application code first.
+
+DROP FUNCTION IF EXISTS record_payment(TEXT, TEXT, BIGINT, INTEGER, NUMERIC, TEXT, TEXT, TEXT);
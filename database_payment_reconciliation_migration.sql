@@ -0,0 +1,32 @@
+-- ==========================================
+-- PAYMENT RECONCILIATION MIGRATION
+-- ==========================================
+-- Purpose: Link payment rows to provider payments
+-- Description: Payment rows store the ID the gateway assigned to the payment,
+--              so provider payment lists can be joined with payments in bulk
+--              (scripts/reconcile_payments.py). The index is not unique on
+--              purpose: duplicate rows must stay visible to reconciliation.
+
+-- ==========================================
+-- 1. ADD PROVIDER PAYMENT ID
+-- ==========================================
+
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS provider_payment_id TEXT;
+
+-- ==========================================
+-- 2. ADD INDEXES
+-- ==========================================
+
+CREATE INDEX IF NOT EXISTS idx_payments_provider_payment_id
+    ON payments(provider_payment_id)
+    WHERE provider_payment_id IS NOT NULL;
+
+-- Bulk lookup of processed events by payment ID regardless of provider
+CREATE INDEX IF NOT EXISTS idx_processed_payment_events_payment_id
+    ON processed_payment_events(payment_id);
+
+-- ==========================================
+-- 3. ADD COMMENTS
+-- ==========================================
+
+COMMENT ON COLUMN payments.provider_payment_id IS 'Payment ID assigned by the gateway (YooKassa payment, Stripe PaymentIntent)';
@@ -0,0 +1,10 @@
+-- ==========================================
+-- PAYMENT RECONCILIATION MIGRATION ROLLBACK
+-- ==========================================
+-- Purpose: Rollback payments.provider_payment_id
+-- Description: Payment reconciliation no longer finds recorded payments
+--              after this rollback, roll back the application code first.
+
+DROP INDEX IF EXISTS idx_processed_payment_events_payment_id;
+DROP INDEX IF EXISTS idx_payments_provider_payment_id;
+ALTER TABLE payments DROP COLUMN IF EXISTS provider_payment_id;
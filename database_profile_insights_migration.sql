@@ -0,0 +1,42 @@
+-- ==========================================
+-- PROFILE INSIGHTS MIGRATION
+-- ==========================================
+-- Purpose: Store precomputed nutrition insights with the profile
+-- Description: Profile writes store the derived values (BMI, ideal weight,
+--              metabolic age, water needs, macros, meal portions) computed by
+--              compute_profile_insights(), so opening nutrition insights does
+--              not recompute them. profile_version is bumped on every update
+--              and keys the bot's cache of rendered insights texts.
+
+-- ==========================================
+-- 1. ADD COLUMNS
+-- ==========================================
+
+ALTER TABLE user_profiles
+    ADD COLUMN IF NOT EXISTS profile_version INTEGER NOT NULL DEFAULT 1,
+    ADD COLUMN IF NOT EXISTS insights JSONB;
+
+-- ==========================================
+-- 2. VERSION TRIGGER
+-- ==========================================
+
+CREATE OR REPLACE FUNCTION bump_profile_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.profile_version := OLD.profile_version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_bump_profile_version ON user_profiles;
+CREATE TRIGGER trigger_bump_profile_version
+    BEFORE UPDATE ON user_profiles
+    FOR EACH ROW
+    EXECUTE FUNCTION bump_profile_version();
+
+-- ==========================================
+-- 3. ADD COMMENTS
+-- ==========================================
+
+COMMENT ON COLUMN user_profiles.profile_version IS 'Incremented on every profile update, keys cached insights texts';
+COMMENT ON COLUMN user_profiles.insights IS 'Derived nutrition values computed at profile write (includes formula version)';
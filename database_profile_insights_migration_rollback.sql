@@ -0,0 +1,11 @@
+-- ==========================================
+-- PROFILE INSIGHTS MIGRATION ROLLBACK
+-- ==========================================
+-- Purpose: Rollback user_profiles.profile_version and user_profiles.insights
+-- Description: Nutrition insights are computed on every read and no longer
+--              cached after this rollback, roll back the application code first.
+
+DROP TRIGGER IF EXISTS trigger_bump_profile_version ON user_profiles;
+DROP FUNCTION IF EXISTS bump_profile_version();
+ALTER TABLE user_profiles DROP COLUMN IF EXISTS insights;
+ALTER TABLE user_profiles DROP COLUMN IF EXISTS profile_version;
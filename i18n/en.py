@@ -73,6 +73,7 @@ TRANSLATIONS.update({
     "payment_pro_desc": "100 credits for food analysis",
     "payment_price": "{price} Р",
     "payment_credits": "{credits} credits",
+    "payment_invoice_pending": "🧾 Your invoice for this plan is above and still waiting for payment.",
     
     # Buy command messages
     "buy_credits_title": "Buy Credits",
@@ -95,6 +96,7 @@ TRANSLATIONS.update({
     "error_rate_limit_general": "🚫 Maximum 20 commands per minute\n⏰ Try again in {remaining} seconds",
     "error_rate_limit_photo_title": "⏳ **Photo analysis rate limit reached!**",
     "error_rate_limit_photo": "🚫 You can analyze maximum 5 photos per minute\n⏰ Try again in {remaining} seconds\n\n💡 This prevents system overload and ensures fair usage for all users.",
+    "error_rate_limit_payment": "🚫 Too many payment requests\n⏰ Try again in {remaining} seconds",
     "error_file_type": "❌ **File type not supported: {file_type}**\n\n🖼️ **Please send only photos** for food analysis.\n💡 Make sure to use the 📷 **Photo** option in Telegram, not 📎 **File/Document**.",
     "error_profile": "An error occurred. Please try again later.",
     
@@ -230,6 +232,8 @@ TRANSLATIONS.update({
     "photo_out_of_credits_title": "💳 **Your credits are running low!**",
     "photo_out_of_credits_choose_plan": "Choose a plan to continue analyzing your food:",
     "photo_error_analysis": "❌ **Analysis Error**\n\nAn error occurred during analysis. Please try again.",
+    "photo_no_credits": "❌ **No credits remaining!**\n\nPlease purchase more credits to continue.",
+    "photo_analysis_failed": "❌ **Analysis failed**\n\nSorry, we couldn't analyze your photo. Please try again.",
     
     # Daily plan messages
     "daily_title": "📊 **Daily Plan**",
@@ -287,6 +291,16 @@ TRANSLATIONS.update({
     "weekly_report_quality": "• Nutrition quality scoring",
     "weekly_report_tracking": "• Goal progress tracking",
     "weekly_report_error": "❌ **Error**\n\nSorry, there was an error generating your weekly report.",
+    "weekly_report_days_on_target": "{percent}% of logged days on target",
+    "weekly_report_streak": "🔥 **Logging Streak:** {days} days",
+    "weekly_report_month_avg": "📆 **30-Day Average:** {calories} kcal ({days} days logged)",
+    "weekly_report_quarter_avg": "📆 **90-Day Average:** {calories} kcal ({days} days logged)",
+    "report_chart_calories": "Calories per day",
+    "report_chart_macros": "Macros per day, g",
+    "report_chart_target": "Target",
+    "report_chart_protein": "Protein",
+    "report_chart_fats": "Fats",
+    "report_chart_carbs": "Carbs",
     
     # Water tracker messages
     "water_tracker_title": "💧 **Water Tracker**",
@@ -2,10 +2,13 @@
 Internationalization (i18n) module for c0r.ai Telegram Bot
 Handles language detection, translations, and language switching
 """
-from typing import Dict, Optional, List
+from typing import Any, Callable, Dict, Optional, List, Tuple
 from enum import Enum
+from functools import lru_cache, wraps
+from string import Formatter
 import re
 from loguru import logger
+from pydantic import BaseModel, ConfigDict
 
 
 class Language(Enum):
@@ -40,6 +43,7 @@ class I18nManager:
     
     def __init__(self):
         self.translations = self._load_translations()
+        self._constants, self._templates = self._compile(self.translations)
     
     def _load_translations(self) -> Dict[str, Dict[str, str]]:
         """Load all translations from separate files"""
@@ -59,6 +63,38 @@ class I18nManager:
                 Language.RUSSIAN.value: {},
             }
     
+    @staticmethod
+    def _compile(translations: Dict[str, Dict[str, str]]) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
+        """
+        Compile translations into per-language lookup tables
+        
+        Missing keys are filled from English once here instead of on every
+        lookup. Texts without format fields are stored ready to return (with
+        escaped braces already unescaped, as str.format would); only texts
+        with fields are formatted per call.
+        
+        Returns:
+            (constants, templates): language -> key -> text
+        """
+        english = translations.get(Language.ENGLISH.value, {})
+        constants, templates = {}, {}
+        for language, texts in translations.items():
+            missing = english.keys() - texts.keys()
+            if missing:
+                logger.warning(f"{len(missing)} translation keys missing for language {language}, using English: "
+                               f"{', '.join(sorted(missing))}")
+            constants[language], templates[language] = {}, {}
+            for key, text in {**english, **texts}.items():
+                try:
+                    has_fields = any(field is not None for _, field, _, _ in Formatter().parse(text))
+                except ValueError:
+                    has_fields = True  # Malformed template, fails in str.format as before
+                if has_fields:
+                    templates[language][key] = text
+                else:
+                    constants[language][key] = text.format()
+        return constants, templates
+    
     def detect_language(self, user_country: Optional[str] = None, phone_number: Optional[str] = None) -> str:
         """
         Detect user's preferred language based on country and phone number
@@ -98,19 +134,20 @@ class I18nManager:
         Returns:
             Translated and formatted text
         """
-        if language not in self.translations:
+        constants = self._constants.get(language)
+        if constants is None:
             logger.warning(f"Language {language} not found, falling back to English")
             language = Language.ENGLISH.value
+            constants = self._constants[language]
         
-        if key not in self.translations[language]:
+        text = constants.get(key)
+        if text is not None:
+            return text
+        
+        text = self._templates[language].get(key)
+        if text is None:
             logger.warning(f"Translation key '{key}' not found for language {language}")
-            # Fallback to English
-            if key in self.translations[Language.ENGLISH.value]:
-                text = self.translations[Language.ENGLISH.value][key]
-            else:
-                return f"[Missing translation: {key}]"
-        else:
-            text = self.translations[language][key]
+            return f"[Missing translation: {key}]"
         
         # Format the text with provided parameters
         try:
@@ -129,4 +166,72 @@ class I18nManager:
 
 
 # Global instance
-i18n = I18nManager() 
\ No newline at end of file
+i18n = I18nManager()
+
+
+class FrozenList(list):
+    """List that raises on mutation (still a list for aiogram and pydantic serialization)"""
+    
+    def _frozen(self, *args, **kwargs):
+        raise TypeError("static screens are shared between calls and cannot be modified")
+    
+    append = extend = insert = remove = pop = clear = sort = reverse = _frozen
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _frozen
+
+
+@lru_cache(maxsize=None)
+def _frozen_model_type(model_type: type) -> type:
+    return type(model_type.__name__, (model_type,), {
+        "model_config": ConfigDict(frozen=True),
+        "__module__": model_type.__module__,
+        "__qualname__": model_type.__qualname__,
+    })
+
+
+def freeze(value: Any) -> Any:
+    """
+    Read-only version of a rendered screen
+    
+    Lists and tuples are frozen item by item, pydantic models (aiogram
+    keyboards and buttons) become instances of a frozen subclass, so
+    assigning a field raises ValidationError. Strings and numbers are
+    returned as they are.
+    """
+    if isinstance(value, tuple):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    if isinstance(value, BaseModel):
+        return _frozen_model_type(type(value)).model_construct(
+            _fields_set=value.model_fields_set,
+            **{name: freeze(getattr(value, name)) for name in type(value).model_fields}
+        )
+    return value
+
+
+def static_screen(build: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Render a screen (text, keyboard, or both) once per language and reuse it
+    
+    For screens that depend only on the language (and a few hashable
+    options), such as help texts and menu keyboards. Screens are rendered for
+    every language at import and other option combinations on first use.
+    Unknown languages get the English screen, as get_text() would render it.
+    The result is shared between calls, so it is frozen (see freeze()):
+    callers that need to change a keyboard build their own.
+    """
+    rendered: Dict[tuple, Any] = {}
+    
+    @wraps(build)
+    def get(language: str = Language.ENGLISH.value, *args, **kwargs):
+        if language not in i18n.translations:
+            language = Language.ENGLISH.value
+        key = (language, args, tuple(sorted(kwargs.items())))
+        screen = rendered.get(key)
+        if screen is None:
+            screen = rendered[key] = freeze(build(language, *args, **kwargs))
+        return screen
+    
+    for language in i18n.translations:
+        get(language)
+    return get
@@ -73,6 +73,7 @@ TRANSLATIONS.update({
     "payment_pro_desc": "100 кредитов для анализа еды",
     "payment_price": "{price} Р",
     "payment_credits": "{credits} кредитов",
+    "payment_invoice_pending": "🧾 Твой счёт на этот тариф выше и всё ещё ждёт оплаты.",
     
     # Buy command messages
     "buy_credits_title": "Купить кредиты",
@@ -95,6 +96,7 @@ TRANSLATIONS.update({
     "error_rate_limit_general": "🚫 Максимум 20 команд в минуту\n⏰ Попробуй через {remaining} секунд",
     "error_rate_limit_photo_title": "⏳ **Достигнут лимит анализа фото!**",
     "error_rate_limit_photo": "🚫 Ты можешь анализировать максимум 5 фото в минуту\n⏰ Попробуй через {remaining} секунд\n\n💡 Это предотвращает перегрузку системы и обеспечивает справедливое использование для всех пользователей.",
+    "error_rate_limit_payment": "🚫 Слишком много запросов на оплату\n⏰ Попробуй через {remaining} секунд",
     "error_file_type": "❌ **Неподдерживаемый тип файла: {file_type}**\n\n🖼️ **Пожалуйста, отправляй только фотографии** для анализа еды.\n💡 Убедись, что используешь опцию 📷 **Фото** в Telegram, а не 📎 **Файл/Документ**.",
     "error_profile": "Произошла ошибка. Пожалуйста, попробуй позже.",
     
@@ -186,6 +188,8 @@ TRANSLATIONS.update({
     "photo_out_of_credits_title": "💳 **У тебя заканчиваются кредиты!**",
     "photo_out_of_credits_choose_plan": "Выбери план для продолжения анализа твоей еды:",
     "photo_error_analysis": "❌ **Ошибка анализа**\n\nПроизошла ошибка во время анализа. Пожалуйста, попробуй снова.",
+    "photo_no_credits": "❌ **Кредиты закончились!**\n\nПожалуйста, купи кредиты, чтобы продолжить.",
+    "photo_analysis_failed": "❌ **Анализ не удался**\n\nИзвини, не получилось проанализировать твое фото. Пожалуйста, попробуй снова.",
     
     # Food analysis result headers
     "food_items_detected": "🥘 Обнаруженные продукты:",
@@ -247,6 +251,16 @@ TRANSLATIONS.update({
     "weekly_report_quality": "• Оценка качества питания",
     "weekly_report_tracking": "• Отслеживание прогресса целей",
     "weekly_report_error": "❌ **Ошибка**\n\nИзвини, произошла ошибка при генерации твоего недельного отчета.",
+    "weekly_report_days_on_target": "{percent}% дней с записями в пределах цели",
+    "weekly_report_streak": "🔥 **Серия дней с записями:** {days}",
+    "weekly_report_month_avg": "📆 **Среднее за 30 дней:** {calories} ккал (дней с записями: {days})",
+    "weekly_report_quarter_avg": "📆 **Среднее за 90 дней:** {calories} ккал (дней с записями: {days})",
+    "report_chart_calories": "Калории по дням",
+    "report_chart_macros": "БЖУ по дням, г",
+    "report_chart_target": "Цель",
+    "report_chart_protein": "Белки",
+    "report_chart_fats": "Жиры",
+    "report_chart_carbs": "Углеводы",
     
     # Water tracker messages
     "water_tracker_title": "💧 **Трекер воды**",
@@ -569,6 +583,7 @@ TRANSLATIONS.update({
     "nutrition_menu_meal_distribution": "🍽️ Распределение приемов пищи",
     "nutrition_menu_recommendations": "💡 Персональные рекомендации",
     "nutrition_menu_goal_advice": "🎯 Советы по целям",
+    "nutrition_incomplete_data": "Недостаточно данных для отображения этого раздела. Пожалуйста, заполни профиль.",
     
     # Recipe generation messages
     "recipe_title": "🍽️ **Генерация рецептов**",
@@ -2,15 +2,24 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import json
+import time
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
+from typing import Optional
 import httpx
 from loguru import logger
 from common.routes import Routes
-from yookassa_handlers.client import create_yookassa_invoice, verify_yookassa_payment, validate_yookassa_webhook
+from common.pending_invoices import PendingInvoiceCache
+from yookassa_handlers.client import (
+    create_yookassa_invoice, verify_yookassa_payment, validate_yookassa_webhook, close_yookassa_client,
+    charge_yookassa_subscription, get_yookassa_client
+)
 from yookassa_handlers.config import PLANS_YOOKASSA
+from payment_outbox import PaymentOutbox, OutboxWorker, NonRetryableDeliveryError, PAYMENT_OUTBOX_DB_PATH
+from subscriptions import SubscriptionStore, RenewalEngine, add_interval, SUBSCRIPTIONS_DB_PATH
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
@@ -19,6 +28,12 @@ templates = Jinja2Templates(directory="templates")
 INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
 API_SERVICE_URL = os.getenv("API_SERVICE_URL", "https://api.c0r.ai")
 
+payment_outbox = PaymentOutbox(PAYMENT_OUTBOX_DB_PATH)
+subscription_store = SubscriptionStore(SUBSCRIPTIONS_DB_PATH)
+# Unpaid YooKassa redirect payments are canceled by the provider after a while, stop reusing them earlier
+PENDING_INVOICE_TTL = int(os.getenv("PENDING_INVOICE_TTL", "3600"))
+pending_invoices = PendingInvoiceCache(PENDING_INVOICE_TTL)
+
 class InvoiceRequest(BaseModel):
     user_id: str
     amount: float
@@ -37,13 +52,15 @@ async def create_invoice(request: InvoiceRequest):
     try:
         logger.info(f"Creating invoice for user {request.user_id}, plan {request.plan_id}")
         
-        # Create YooKassa payment
-        invoice_data = await create_yookassa_invoice(
-            user_id=int(request.user_id),
-            plan_id=request.plan_id
+        # Reuse the unpaid payment of a previous tap instead of creating another one
+        invoice_data, reused = await pending_invoices.get_or_create(
+            request.user_id, request.plan_id, "yookassa",
+            lambda: create_yookassa_invoice(user_id=int(request.user_id), plan_id=request.plan_id)
         )
+        if reused:
+            logger.info(f"Reusing pending invoice {invoice_data['payment_id']} for user {request.user_id}")
         
-        return invoice_data
+        return {**invoice_data, "reused": reused}
         
     except ValueError as e:
         logger.error(f"Invalid request for user {request.user_id}: {e}")
@@ -52,53 +69,89 @@ async def create_invoice(request: InvoiceRequest):
         logger.error(f"Failed to create invoice for user {request.user_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to create payment invoice")
 
+def credit_messages(payment_object: dict) -> list:
+    """Outbox messages granting the credits of a succeeded payment"""
+    payment_id = payment_object["id"]
+    metadata = payment_object.get("metadata", {})
+    user_id = metadata.get("user_id")
+    credits_count = int(metadata.get("credits_count", 0))
+    amount = float(payment_object.get("amount", {}).get("value", 0))
+    if not user_id or credits_count <= 0:
+        logger.warning(f"Missing user_id or credits_count in payment {payment_id}")
+        return []
+    return [("credits.add", {
+        "user_id": user_id,
+        "credits_count": credits_count,
+        "payment_id": payment_id,
+        "amount": amount
+    })]
+
+async def start_subscription(payment_object: dict):
+    """Subscribe user after the first payment of a recurring plan saved its payment method"""
+    metadata = payment_object.get("metadata", {})
+    payment_method = payment_object.get("payment_method", {})
+    plan = PLANS_YOOKASSA.get(metadata.get("plan_id"))
+    # Renewal payments carry subscription_id and belong to an existing subscription
+    if not plan or not plan["recurring"] or metadata.get("subscription_id") or not payment_method.get("saved"):
+        return
+    subscription = await subscription_store.upsert(
+        metadata["user_id"], metadata["plan_id"], "yookassa", payment_method["id"],
+        add_interval(time.time(), plan.get("interval", "month"))
+    )
+    if subscription:
+        logger.info(f"Subscription {subscription['id']} started for user {metadata['user_id']}, plan {metadata['plan_id']}")
+
 @app.post(Routes.PAY_WEBHOOK_YOOKASSA)
 async def yookassa_webhook(request: Request):
     """
     Handle YooKassa webhook notifications
-    Process successful payments and update user credits
+
+    The event is persisted with the credit grant it requires and acknowledged
+    immediately; the outbox worker adds the credits via the API service.
     """
+    body = await request.body()
+    headers = dict(request.headers)
+
+    # Validate webhook (basic validation for now)
+    if not validate_yookassa_webhook(body.decode(), headers):
+        logger.warning("Invalid YooKassa webhook signature")
+        raise HTTPException(status_code=400, detail="Invalid webhook signature")
+
     try:
-        # Get request body and headers
-        body = await request.body()
-        headers = dict(request.headers)
-        
-        # Validate webhook (basic validation for now)
-        if not validate_yookassa_webhook(body.decode(), headers):
-            logger.warning("Invalid YooKassa webhook signature")
-            raise HTTPException(status_code=400, detail="Invalid webhook signature")
-        
-        # Parse webhook data
-        data = await request.json()
-        logger.info(f"YooKassa webhook received: {data}")
-        
-        # Check if this is a payment success notification
-        if data.get("event") == "payment.succeeded":
-            payment_object = data.get("object", {})
-            payment_id = payment_object.get("id")
-            status = payment_object.get("status")
-            metadata = payment_object.get("metadata", {})
-            
-            if status == "succeeded" and payment_id:
-                # Extract user info from metadata
-                user_id = metadata.get("user_id")
-                credits_count = int(metadata.get("credits_count", 0))
-                plan_id = metadata.get("plan_id")
-                amount = float(payment_object.get("amount", {}).get("value", 0))
-                
-                if user_id and credits_count > 0:
-                    # Add credits to user account via API service
-                    await add_credits_to_user(user_id, credits_count, payment_id, amount)
-                    logger.info(f"Successfully processed payment {payment_id} for user {user_id}")
-                else:
-                    logger.warning(f"Missing user_id or credits_count in payment {payment_id}")
-        
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
+
+    event = data.get("event")
+    payment_object = data.get("object", {})
+    payment_id = payment_object.get("id")
+    logger.info(f"YooKassa webhook received: {event} for payment {payment_id}")
+    if not payment_id:
         return {"status": "ok"}
-        
+
+    if event in ("payment.succeeded", "payment.canceled"):
+        metadata = payment_object.get("metadata", {})
+        pending_invoices.settle(metadata.get("user_id"), metadata.get("plan_id"), "yookassa")
+
+    messages = []
+    # Check if this is a payment success notification
+    if event == "payment.succeeded" and payment_object.get("status") == "succeeded":
+        messages = credit_messages(payment_object)
+        await start_subscription(payment_object)
+
+    try:
+        created = await payment_outbox.record_event("yookassa", f"{event}:{payment_id}", event, data, messages)
     except Exception as e:
-        logger.error(f"Error processing YooKassa webhook: {e}")
+        # Not stored - let YooKassa retry the delivery
+        logger.error(f"Failed to store YooKassa webhook for payment {payment_id}: {e}")
         raise HTTPException(status_code=500, detail="Webhook processing failed")
 
+    if created and messages:
+        outbox_worker.notify()
+    elif not created:
+        logger.info(f"Duplicate YooKassa webhook {event} for payment {payment_id}")
+    return {"status": "ok"}
+
 async def add_credits_to_user(user_id: str, credits_count: int, payment_id: str, amount: float):
     """
     Add credits to user account via API service
@@ -118,12 +171,99 @@ async def add_credits_to_user(user_id: str, credits_count: int, payment_id: str,
                 }
             )
             response.raise_for_status()
-            logger.info(f"Added {credits_count} credits to user {user_id}")
+            if response.json().get("status") == "duplicate":
+                logger.info(f"Payment {payment_id} was already processed, credits not added again")
+            else:
+                logger.info(f"Added {credits_count} credits to user {user_id}")
             
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Failed to add credits to user {user_id}: {e}")
+        # The API rejected the request itself - retrying will not help
+        if 400 <= e.response.status_code < 500 and e.response.status_code not in (408, 429):
+            raise NonRetryableDeliveryError(str(e)) from e
+        raise
     except Exception as e:
         logger.error(f"Failed to add credits to user {user_id}: {e}")
         raise
 
+outbox_worker = OutboxWorker(payment_outbox, {"credits.add": lambda payload: add_credits_to_user(**payload)})
+
+async def grant_renewal_credits(subscription: dict, payment: dict):
+    # Same event key as the payment.succeeded webhook of this payment, whichever comes first grants
+    event_id = f"payment.succeeded:{payment['id']}"
+    if await payment_outbox.record_event("yookassa", event_id, "payment.succeeded", payment, credit_messages(payment)):
+        outbox_worker.notify()
+
+renewal_engine = RenewalEngine(
+    subscription_store,
+    charge=charge_yookassa_subscription,
+    fetch_payment=lambda payment_id: get_yookassa_client().get_payment(payment_id),
+    intervals={plan_id: plan.get("interval", "month") for plan_id, plan in PLANS_YOOKASSA.items() if plan["recurring"]},
+    on_renewed=grant_renewal_credits
+)
+
+@app.on_event("startup")
+async def start_background_workers():
+    await outbox_worker.start()
+    renewal_engine.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await renewal_engine.stop()
+    await outbox_worker.stop()
+    await close_yookassa_client()
+
+def require_internal_token(request: Request):
+    if not INTERNAL_API_TOKEN or request.headers.get("X-Internal-Token") != INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.get("/metrics/outbox")
+async def outbox_metrics():
+    """Outbox queue depth, age of the oldest undelivered message and delivery counters"""
+    return await outbox_worker.metrics()
+
+@app.get("/metrics/invoices")
+async def invoice_metrics():
+    """Pending invoice cache size and reuse counters"""
+    return pending_invoices.stats()
+
+@app.get("/metrics/renewals")
+async def renewal_metrics():
+    """Subscriptions by status, renewals due and renewal counters"""
+    return await renewal_engine.metrics()
+
+@app.post("/admin/renewals/run")
+async def run_renewals(request: Request):
+    """Process due renewals now instead of waiting for the next pass"""
+    require_internal_token(request)
+    return {"processed": await renewal_engine.run_once(), **await renewal_engine.metrics()}
+
+@app.get("/subscriptions/{user_id}")
+async def get_subscriptions(user_id: str, request: Request):
+    """Get user's subscriptions"""
+    require_internal_token(request)
+    return await subscription_store.list_user(user_id)
+
+@app.post("/subscriptions/{user_id}/cancel")
+async def cancel_subscriptions(user_id: str, request: Request, plan_id: Optional[str] = None):
+    """Stop renewing user's subscriptions (all, or of one plan)"""
+    require_internal_token(request)
+    return {"canceled": await subscription_store.cancel(user_id, plan_id)}
+
+@app.get("/admin/outbox/dead")
+async def list_dead_letters(request: Request, limit: int = 50):
+    """List dead-lettered messages"""
+    require_internal_token(request)
+    return await payment_outbox.list_dead(limit)
+
+@app.post("/admin/outbox/requeue")
+async def requeue_dead_letters(request: Request, message_id: Optional[int] = None):
+    """Replay dead-lettered messages (all, or one by message_id)"""
+    require_internal_token(request)
+    requeued = await payment_outbox.requeue_dead(message_id)
+    outbox_worker.notify()
+    return {"requeued": requeued}
+
 @app.get("/payment/success", response_class=HTMLResponse)
 async def payment_success(request: Request, user_id: str, plan_id: str):
     """
@@ -0,0 +1,294 @@
+"""
+Transactional outbox for payment webhooks
+
+The webhook stores the provider event and the messages it produces (e.g. a
+credit grant for the API service) in one local SQLite transaction and returns
+200 right away. OutboxWorker delivers the messages in the background with
+exponential backoff; messages that keep failing, or fail in a way retrying
+cannot fix, are moved to the dead letter state for manual replay.
+
+Delivery is at least once: the API grants credits once per payment_id
+(processed_payment_events), so a repeated delivery is harmless.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+from common.sqlite_store import SQLiteStore
+
+PAYMENT_OUTBOX_DB_PATH = os.getenv("PAYMENT_OUTBOX_DB_PATH", "data/payment_outbox.db")
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "1800"))
+
+
+class NonRetryableDeliveryError(Exception):
+    """Raised by a delivery handler when retrying cannot help (e.g. rejected request)"""
+
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    event_type TEXT,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    UNIQUE (provider, event_id)
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id INTEGER NOT NULL REFERENCES webhook_events(id),
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    delivered_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at, id);
+"""
+
+
+class PaymentOutbox(SQLiteStore):
+    """Received webhook events and the messages waiting to be delivered"""
+
+    SCHEMA = OUTBOX_SCHEMA
+
+    def __init__(self, db_path: str, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 backoff_base: float = OUTBOX_BACKOFF_BASE, backoff_max: float = OUTBOX_BACKOFF_MAX):
+        """
+        Args:
+            db_path: Path to SQLite database file
+            max_attempts: Attempts before a message is dead-lettered
+            backoff_base: Delay in seconds before the first retry, doubled on each retry
+            backoff_max: Maximum delay between retries
+        """
+        super().__init__(db_path)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @staticmethod
+    def _row_to_message(row: sqlite3.Row) -> dict:
+        message = dict(row)
+        message["payload"] = json.loads(message["payload"])
+        return message
+
+    async def record_event(self, provider: str, event_id: str, event_type: Optional[str],
+                           payload: dict, messages: list) -> bool:
+        """
+        Store webhook event and its outgoing messages atomically
+
+        Args:
+            provider: Payment gateway
+            event_id: Provider event identifier (deduplication key)
+            event_type: Provider event type
+            payload: Raw event
+            messages: List of (kind, payload) to deliver
+
+        Returns:
+            False if the event was already received (nothing is stored)
+        """
+        def op(conn):
+            now = time.time()
+            with self._transaction(conn):
+                cursor = conn.execute(
+                    "INSERT INTO webhook_events (provider, event_id, event_type, payload, received_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(provider, event_id) DO NOTHING",
+                    (provider, event_id, event_type, json.dumps(payload), now)
+                )
+                if cursor.rowcount == 0:
+                    return False
+                conn.executemany(
+                    "INSERT INTO outbox (event_id, kind, payload, next_attempt_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(cursor.lastrowid, kind, json.dumps(body), now, now, now) for kind, body in messages]
+                )
+                return True
+        return await self._run(op)
+
+    async def claim_due(self, limit: int = 10) -> list:
+        """Claim messages due for delivery"""
+        def op(conn):
+            now = time.time()
+            rows = conn.execute(
+                """
+                UPDATE outbox SET status = 'delivering', attempts = attempts + 1, updated_at = ?
+                WHERE id IN (
+                    SELECT id FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at, id LIMIT ?
+                )
+                RETURNING *
+                """,
+                (now, now, limit)
+            ).fetchall()
+            return sorted((self._row_to_message(row) for row in rows), key=lambda message: message["id"])
+        return await self._run(op)
+
+    async def mark_delivered(self, message_id: int) -> None:
+        def op(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE outbox SET status = 'delivered', delivered_at = ?, updated_at = ?, last_error = NULL "
+                "WHERE id = ?",
+                (now, now, message_id)
+            )
+        await self._run(op)
+
+    async def retry_or_dead_letter(self, message: dict, error: str, retryable: bool = True) -> bool:
+        """
+        Schedule message for retry with exponential backoff, or dead-letter it
+
+        Returns:
+            True if the message will be retried
+        """
+        will_retry = retryable and message["attempts"] < self.max_attempts
+        delay = min(self.backoff_base * (2 ** (message["attempts"] - 1)), self.backoff_max)
+
+        def op(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE outbox SET status = ?, next_attempt_at = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                ("pending" if will_retry else "dead", now + delay, now, error, message["id"])
+            )
+        await self._run(op)
+        return will_retry
+
+    async def requeue_delivering(self) -> int:
+        """Return messages left in delivery by a crashed process to the queue"""
+        def op(conn):
+            return conn.execute(
+                "UPDATE outbox SET status = 'pending', updated_at = ? WHERE status = 'delivering'",
+                (time.time(),)
+            ).rowcount
+        return await self._run(op)
+
+    async def requeue_dead(self, message_id: Optional[int] = None) -> int:
+        """Replay dead-lettered messages (all, or one by id) with a fresh attempt budget"""
+        def op(conn):
+            now = time.time()
+            query = "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ? " \
+                    "WHERE status = 'dead'"
+            params = [now, now]
+            if message_id is not None:
+                query += " AND id = ?"
+                params.append(message_id)
+            return conn.execute(query, params).rowcount
+        return await self._run(op)
+
+    async def list_dead(self, limit: int = 50) -> list:
+        def op(conn):
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE status = 'dead' ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+            return [self._row_to_message(row) for row in rows]
+        return await self._run(op)
+
+    async def stats(self) -> dict:
+        """Get message counts by status and age of the oldest undelivered message"""
+        def op(conn):
+            counts = {
+                row["status"]: row["count"]
+                for row in conn.execute("SELECT status, COUNT(*) AS count FROM outbox GROUP BY status")
+            }
+            oldest = conn.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'delivering')"
+            ).fetchone()[0]
+            return {
+                "pending": counts.get("pending", 0),
+                "delivering": counts.get("delivering", 0),
+                "delivered": counts.get("delivered", 0),
+                "dead": counts.get("dead", 0),
+                "oldest_pending_age_seconds": round(time.time() - oldest, 1) if oldest else 0
+            }
+        return await self._run(op)
+
+
+class OutboxWorker:
+    """Background delivery of outbox messages"""
+
+    def __init__(self, outbox: PaymentOutbox, handlers: dict[str, Callable[[dict], Awaitable[None]]],
+                 batch_size: int = 10, poll_interval: float = 1.0):
+        """
+        Args:
+            outbox: Outbox to deliver from
+            handlers: Message kind -> coroutine called with the message payload
+            batch_size: Messages claimed at once (delivered concurrently)
+            poll_interval: Idle sleep between polls when no wakeup arrives
+        """
+        self.outbox = outbox
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.counters = {"delivered": 0, "retried": 0, "dead_lettered": 0}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self) -> None:
+        requeued = await self.outbox.requeue_delivering()
+        if requeued:
+            logger.warning(f"Requeued {requeued} interrupted outbox messages")
+        self._stopping = False
+        self._task = asyncio.create_task(self._loop())
+        logger.info("Payment outbox worker started")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self) -> None:
+        """Wake the worker after an event was recorded"""
+        self._wakeup.set()
+
+    async def metrics(self) -> dict:
+        return {**await self.outbox.stats(), **self.counters}
+
+    async def run_once(self) -> int:
+        """Deliver one batch of due messages, returns number of messages claimed"""
+        messages = await self.outbox.claim_due(self.batch_size)
+        await asyncio.gather(*(self._deliver(message) for message in messages))
+        return len(messages)
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Outbox worker failed to claim messages: {e}")
+                claimed = 0
+            if claimed:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, message: dict) -> None:
+        try:
+            handler = self.handlers.get(message["kind"])
+            if handler is None:
+                raise NonRetryableDeliveryError(f"No handler for message kind {message['kind']}")
+            await handler(message["payload"])
+            await self.outbox.mark_delivered(message["id"])
+            self.counters["delivered"] += 1
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            retryable = not isinstance(e, NonRetryableDeliveryError)
+            if await self.outbox.retry_or_dead_letter(message, error, retryable):
+                self.counters["retried"] += 1
+                logger.warning(f"Outbox message {message['id']} attempt {message['attempts']} failed, will retry: {error}")
+            else:
+                self.counters["dead_lettered"] += 1
+                logger.error(f"Outbox message {message['id']} dead-lettered after {message['attempts']} attempts: {error}")
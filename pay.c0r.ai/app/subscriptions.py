@@ -0,0 +1,337 @@
+"""
+Subscription renewals for recurring plans
+
+A subscription is created when the first payment of a recurring plan succeeds
+with a saved payment method. RenewalEngine charges due subscriptions:
+
+- due rows are claimed in batches with a lease (lease_until), so a row is
+  processed by one worker at a time and a crashed worker's rows become due
+  again once the lease expires (SKIP LOCKED-style, in SQLite)
+- charges run with bounded concurrency; the idempotency key identifies the
+  billing period and attempt, so repeating a charge after a timeout or crash
+  returns the same provider payment instead of charging twice
+- a pending payment is polled by id until it settles
+- a declined charge is retried on the dunning schedule, then the
+  subscription is canceled
+"""
+import asyncio
+import calendar
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+from common.sqlite_store import SQLiteStore
+
+SUBSCRIPTIONS_DB_PATH = os.getenv("SUBSCRIPTIONS_DB_PATH", "data/subscriptions.db")
+RENEWAL_BATCH_SIZE = int(os.getenv("RENEWAL_BATCH_SIZE", "100"))
+RENEWAL_CONCURRENCY = int(os.getenv("RENEWAL_CONCURRENCY", "20"))
+RENEWAL_POLL_INTERVAL = float(os.getenv("RENEWAL_POLL_INTERVAL", "60"))
+RENEWAL_LEASE_SECONDS = 300
+# Recheck of a payment the provider is still processing
+PENDING_RECHECK_SECONDS = 600
+# Retry after an error talking to the provider (same idempotency key)
+ERROR_RETRY_SECONDS = 300
+# Delay before each retry of a declined charge; canceled after the last one
+DUNNING_SCHEDULE = (86400, 3 * 86400, 7 * 86400)
+
+SUBSCRIPTIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    plan_id TEXT NOT NULL,
+    gateway TEXT NOT NULL,
+    payment_method_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'active',
+    period INTEGER NOT NULL DEFAULT 1,
+    paid_until REAL NOT NULL,
+    next_charge_at REAL NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    pending_payment_id TEXT,
+    last_payment_id TEXT,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (user_id, plan_id, gateway)
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_due ON subscriptions(next_charge_at)
+    WHERE status IN ('active', 'past_due');
+"""
+
+
+def add_interval(timestamp: float, interval: str) -> float:
+    """Timestamp one billing interval (month/year) later, clamped to the month's last day"""
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    months = {"month": 1, "year": 12}[interval]
+    month_index = moment.month - 1 + months
+    year, month = moment.year + month_index // 12, month_index % 12 + 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day).timestamp()
+
+
+def renewal_idempotency_key(subscription: dict) -> str:
+    """Same key for every repetition of one charge attempt of one billing period"""
+    return f"renewal-{subscription['id']}-{subscription['period']}-{subscription['failures']}"
+
+
+class SubscriptionStore(SQLiteStore):
+    """Subscriptions with leased claiming of due renewals"""
+
+    SCHEMA = SUBSCRIPTIONS_SCHEMA
+
+    async def upsert(self, user_id: str, plan_id: str, gateway: str, payment_method_id: str,
+                     paid_until: float) -> Optional[dict]:
+        """
+        Create subscription, or reactivate it with a new payment method
+
+        Returns:
+            The subscription, or None if it is already active with this payment method
+            (e.g. a redelivered webhook)
+        """
+        def op(conn):
+            now = time.time()
+            cursor = conn.execute(
+                """
+                INSERT INTO subscriptions (user_id, plan_id, gateway, payment_method_id, paid_until,
+                                           next_charge_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, plan_id, gateway) DO UPDATE SET
+                    payment_method_id = excluded.payment_method_id, status = 'active', failures = 0,
+                    paid_until = excluded.paid_until, next_charge_at = excluded.next_charge_at,
+                    pending_payment_id = NULL, last_error = NULL, updated_at = excluded.updated_at
+                WHERE subscriptions.payment_method_id != excluded.payment_method_id
+                   OR subscriptions.status = 'canceled'
+                RETURNING *
+                """,
+                (str(user_id), plan_id, gateway, payment_method_id, paid_until, paid_until, now, now)
+            )
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        return await self._run(op)
+
+    async def get(self, subscription_id: int) -> Optional[dict]:
+        def op(conn):
+            row = conn.execute("SELECT * FROM subscriptions WHERE id = ?", (subscription_id,)).fetchone()
+            return dict(row) if row else None
+        return await self._run(op)
+
+    async def list_user(self, user_id: str) -> list:
+        def op(conn):
+            rows = conn.execute("SELECT * FROM subscriptions WHERE user_id = ? ORDER BY id", (str(user_id),))
+            return [dict(row) for row in rows]
+        return await self._run(op)
+
+    async def claim_due(self, limit: int = RENEWAL_BATCH_SIZE, lease_seconds: float = RENEWAL_LEASE_SECONDS) -> list:
+        """Lease due subscriptions that no other worker holds"""
+        def op(conn):
+            now = time.time()
+            rows = conn.execute(
+                """
+                UPDATE subscriptions SET lease_until = ?, updated_at = ?
+                WHERE id IN (
+                    SELECT id FROM subscriptions
+                    WHERE status IN ('active', 'past_due') AND next_charge_at <= ?
+                      AND (lease_until IS NULL OR lease_until < ?)
+                    ORDER BY next_charge_at LIMIT ?
+                )
+                RETURNING *
+                """,
+                (now + lease_seconds, now, now, now, limit)
+            ).fetchall()
+            return sorted((dict(row) for row in rows), key=lambda sub: sub["next_charge_at"])
+        return await self._run(op)
+
+    async def _update(self, subscription_id: int, **fields) -> None:
+        fields["lease_until"] = None
+        fields["updated_at"] = time.time()
+
+        def op(conn):
+            conn.execute(
+                f"UPDATE subscriptions SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+                (*fields.values(), subscription_id)
+            )
+        await self._run(op)
+
+    async def renew(self, subscription: dict, payment_id: str, paid_until: float) -> None:
+        """Record a paid period, the next charge is due when it ends"""
+        await self._update(
+            subscription["id"], status="active", period=subscription["period"] + 1, failures=0,
+            paid_until=paid_until, next_charge_at=paid_until, pending_payment_id=None,
+            last_payment_id=payment_id, last_error=None
+        )
+
+    async def set_pending(self, subscription: dict, payment_id: str, recheck_at: float) -> None:
+        await self._update(subscription["id"], pending_payment_id=payment_id, next_charge_at=recheck_at)
+
+    async def decline(self, subscription: dict, error: str, retry_at: Optional[float]) -> None:
+        """Record a declined charge; without retry_at the subscription is canceled"""
+        await self._update(
+            subscription["id"], status="past_due" if retry_at else "canceled",
+            failures=subscription["failures"] + 1, next_charge_at=retry_at or subscription["next_charge_at"],
+            pending_payment_id=None, last_error=error
+        )
+
+    async def release(self, subscription: dict, error: str, retry_at: float,
+                      payment_id: Optional[str] = None) -> None:
+        """
+        Give up the lease after an error, the same charge is repeated at retry_at
+
+        With payment_id (the charge already succeeded) the payment is fetched
+        again at retry_at instead of charged.
+        """
+        fields = {"next_charge_at": retry_at, "last_error": error}
+        if payment_id:
+            fields["pending_payment_id"] = payment_id
+        await self._update(subscription["id"], **fields)
+
+    async def cancel(self, user_id: str, plan_id: Optional[str] = None) -> int:
+        """Cancel user's subscriptions (all, or of one plan)"""
+        def op(conn):
+            query = "UPDATE subscriptions SET status = 'canceled', updated_at = ? " \
+                    "WHERE user_id = ? AND status != 'canceled'"
+            params = [time.time(), str(user_id)]
+            if plan_id:
+                query += " AND plan_id = ?"
+                params.append(plan_id)
+            return conn.execute(query, params).rowcount
+        return await self._run(op)
+
+    async def stats(self) -> dict:
+        """Subscription counts by status, renewals due now and age of the most overdue one"""
+        def op(conn):
+            now = time.time()
+            counts = {
+                row["status"]: row["count"]
+                for row in conn.execute("SELECT status, COUNT(*) AS count FROM subscriptions GROUP BY status")
+            }
+            due, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(next_charge_at) FROM subscriptions "
+                "WHERE status IN ('active', 'past_due') AND next_charge_at <= ?",
+                (now,)
+            ).fetchone()
+            return {
+                "active": counts.get("active", 0),
+                "past_due": counts.get("past_due", 0),
+                "canceled": counts.get("canceled", 0),
+                "due": due,
+                "oldest_due_age_seconds": round(now - oldest, 1) if oldest else 0
+            }
+        return await self._run(op)
+
+
+class RenewalEngine:
+    """Charges due subscriptions in leased batches with bounded concurrency"""
+
+    def __init__(self, store: SubscriptionStore,
+                 charge: Callable[[dict, str], Awaitable[dict]],
+                 fetch_payment: Callable[[str], Awaitable[dict]],
+                 intervals: dict[str, str],
+                 on_renewed: Optional[Callable[[dict, dict], Awaitable[None]]] = None,
+                 batch_size: int = RENEWAL_BATCH_SIZE, concurrency: int = RENEWAL_CONCURRENCY,
+                 poll_interval: float = RENEWAL_POLL_INTERVAL):
+        """
+        Args:
+            store: Subscription store
+            charge: Coroutine (subscription, idempotency_key) -> provider payment dict
+            fetch_payment: Coroutine (payment_id) -> provider payment dict
+            intervals: Plan ID -> billing interval (month/year)
+            on_renewed: Coroutine called with (subscription, payment) after a successful charge
+            batch_size: Subscriptions leased per claim
+            concurrency: Charges in flight at once
+            poll_interval: Sleep between passes when nothing is due
+        """
+        self.store = store
+        self.charge = charge
+        self.fetch_payment = fetch_payment
+        self.intervals = intervals
+        self.on_renewed = on_renewed
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.counters = {"renewed": 0, "pending": 0, "declined": 0, "canceled": 0, "errors": 0}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+        logger.info("Subscription renewal engine started")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def metrics(self) -> dict:
+        return {**await self.store.stats(), **self.counters}
+
+    async def run_once(self) -> int:
+        """Process due subscriptions until none are left, returns number processed"""
+        processed = 0
+        while True:
+            batch = await self.store.claim_due(self.batch_size)
+            if not batch:
+                return processed
+            await asyncio.gather(*(self._process(subscription) for subscription in batch))
+            processed += len(batch)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                processed = await self.run_once()
+                if processed:
+                    logger.info(f"Processed {processed} subscription renewals")
+            except Exception as e:
+                logger.error(f"Subscription renewal pass failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _process(self, subscription: dict) -> None:
+        async with self._semaphore:
+            payment = None
+            try:
+                if subscription["pending_payment_id"]:
+                    payment = await self.fetch_payment(subscription["pending_payment_id"])
+                else:
+                    payment = await self.charge(subscription, renewal_idempotency_key(subscription))
+                await self._apply(subscription, payment)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Renewal of subscription {subscription['id']} failed, will retry: {e!r}")
+                # A succeeded charge is only re-checked, never repeated
+                paid_id = payment["id"] if payment and payment.get("status") == "succeeded" else None
+                await self.store.release(subscription, repr(e), time.time() + ERROR_RETRY_SECONDS, paid_id)
+
+    async def _apply(self, subscription: dict, payment: dict) -> None:
+        now = time.time()
+        status = payment.get("status")
+
+        if status == "succeeded":
+            interval = self.intervals.get(subscription["plan_id"], "month")
+            # Periods stay anchored to the subscription start even when a charge was retried
+            paid_until = add_interval(subscription["paid_until"], interval)
+            # After a long outage, bill from now instead of catching up on missed periods
+            if paid_until <= now:
+                paid_until = add_interval(now, interval)
+            # Queue the credits before advancing the period: on_renewed is idempotent per payment,
+            # so a failure here or in renew() only repeats it, and nothing fails after renew()
+            if self.on_renewed:
+                await self.on_renewed(subscription, payment)
+            await self.store.renew(subscription, payment["id"], paid_until)
+            self.counters["renewed"] += 1
+            logger.info(f"Renewed subscription {subscription['id']} of user {subscription['user_id']}, payment {payment['id']}")
+
+        elif status in ("pending", "waiting_for_capture"):
+            await self.store.set_pending(subscription, payment["id"], now + PENDING_RECHECK_SECONDS)
+            self.counters["pending"] += 1
+
+        else:
+            reason = payment.get("cancellation_details", {}).get("reason", status)
+            failures = subscription["failures"]
+            retry_at = now + DUNNING_SCHEDULE[failures] if failures < len(DUNNING_SCHEDULE) else None
+            await self.store.decline(subscription, f"Payment {payment.get('id')} {status}: {reason}", retry_at)
+            if retry_at:
+                self.counters["declined"] += 1
+                logger.warning(f"Renewal of subscription {subscription['id']} declined ({reason}), retry #{failures + 1} scheduled")
+            else:
+                self.counters["canceled"] += 1
+                logger.warning(f"Subscription {subscription['id']} canceled after {failures + 1} declined renewals")
@@ -1,22 +1,174 @@
 import os
 import uuid
-from yookassa import Configuration, Payment
+import asyncio
+import random
+from typing import Optional
+import httpx
 from loguru import logger
 import traceback
 from .config import PLANS_YOOKASSA
 
-# Configure YooKassa SDK
+# YooKassa REST API credentials
 YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
 YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
+# Point to a fake server (tests/benchmarks/fake_yookassa.py) for load tests
+YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
+YOOKASSA_TIMEOUT = float(os.getenv("YOOKASSA_TIMEOUT", "10"))
+YOOKASSA_MAX_RETRIES = int(os.getenv("YOOKASSA_MAX_RETRIES", "3"))
+YOOKASSA_MAX_CONNECTIONS = int(os.getenv("YOOKASSA_MAX_CONNECTIONS", "20"))
 
 if YOOKASSA_SHOP_ID and YOOKASSA_SECRET_KEY:
-    Configuration.account_id = YOOKASSA_SHOP_ID
-    Configuration.secret_key = YOOKASSA_SECRET_KEY
-    logger.info(f"YooKassa SDK configured successfully: SHOP_ID={YOOKASSA_SHOP_ID}, SECRET_KEY={YOOKASSA_SECRET_KEY[:6]}***")
+    logger.info(f"YooKassa client configured: SHOP_ID={YOOKASSA_SHOP_ID}, SECRET_KEY={YOOKASSA_SECRET_KEY[:6]}***")
 else:
     logger.warning("YooKassa credentials not found in environment variables")
 
-async def create_yookassa_invoice(user_id: int, plan_id: str) -> dict:
+
+class YooKassaError(Exception):
+    """Error response of the YooKassa API"""
+
+    def __init__(self, status_code: int, code: Optional[str] = None, description: Optional[str] = None):
+        self.status_code = status_code
+        self.code = code
+        self.description = description
+        super().__init__(f"YooKassa API error {status_code}: {code} {description or ''}".strip())
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code == 429 or self.status_code >= 500
+
+
+def _json_body(response: httpx.Response) -> dict:
+    """JSON object of a response, {} for an empty or non-JSON body"""
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+class YooKassaClient:
+    """
+    Async client for the YooKassa REST API
+
+    One pooled HTTP connection set is shared by all requests. Failed requests
+    (network errors, 429, 5xx, 202 "still processing") are retried with
+    backoff; a payment creation is retried with the same Idempotence-Key, so
+    YooKassa returns the payment created by an earlier attempt instead of
+    creating another one.
+    """
+
+    def __init__(self, shop_id: str, secret_key: str, base_url: str = YOOKASSA_API_URL,
+                 timeout: float = YOOKASSA_TIMEOUT, max_retries: int = YOOKASSA_MAX_RETRIES,
+                 backoff_base: float = 0.5, max_connections: int = YOOKASSA_MAX_CONNECTIONS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Args:
+            shop_id: YooKassa shop ID
+            secret_key: YooKassa secret key
+            base_url: API base URL
+            timeout: Request timeout in seconds
+            max_retries: Retries after the first attempt
+            backoff_base: Delay before the first retry, doubled on each retry
+            max_connections: Connection pool size
+            transport: Custom transport (tests)
+        """
+        self.shop_id = shop_id
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_connections = max_connections
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.shop_id, self.secret_key),
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self.transport
+            )
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        delay = self.backoff_base * (2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    async def request(self, method: str, path: str, json: Optional[dict] = None,
+                      idempotency_key: Optional[str] = None) -> dict:
+        """
+        Send API request with retries
+
+        Raises:
+            YooKassaError: On an error response, or a retryable one after the last retry
+            httpx.TransportError: On network errors after the last retry
+        """
+        headers = {"Idempotence-Key": idempotency_key} if idempotency_key else {}
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self._get_client().request(method, path, json=json, headers=headers)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise
+                logger.warning(f"[YooKassa] {method} {path} attempt {attempt + 1} failed: {e!r}")
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 202:
+                # Request accepted but not processed yet, repeat it after retry_after ms
+                if last_attempt:
+                    raise YooKassaError(202, "processing", "Request is still being processed")
+                retry_after = _json_body(response).get("retry_after", 1000) / 1000
+                await asyncio.sleep(min(retry_after, self.timeout))
+                continue
+
+            if response.status_code < 400:
+                return response.json()
+
+            # Proxies in front of the API answer 5xx with HTML, which must stay retryable
+            body = _json_body(response)
+            error = YooKassaError(response.status_code, body.get("code"), body.get("description"))
+            if not error.retryable or last_attempt:
+                raise error
+            logger.warning(f"[YooKassa] {method} {path} attempt {attempt + 1} failed: {error}")
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def create_payment(self, payment_data: dict, idempotency_key: str) -> dict:
+        return await self.request("POST", "/payments", json=payment_data, idempotency_key=idempotency_key)
+
+    async def get_payment(self, payment_id: str) -> dict:
+        return await self.request("GET", f"/payments/{payment_id}")
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_yookassa_client: Optional[YooKassaClient] = None
+
+
+def get_yookassa_client() -> YooKassaClient:
+    """Shared YooKassa client of the pay service"""
+    global _yookassa_client
+    if _yookassa_client is None:
+        _yookassa_client = YooKassaClient(YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY)
+    return _yookassa_client
+
+
+async def close_yookassa_client() -> None:
+    global _yookassa_client
+    if _yookassa_client is not None:
+        await _yookassa_client.aclose()
+        _yookassa_client = None
+
+
+async def create_yookassa_invoice(user_id: int, plan_id: str, idempotency_key: Optional[str] = None) -> dict:
     """
     Create YooKassa payment invoice for user
     Returns payment URL and invoice details
@@ -26,14 +178,14 @@ async def create_yookassa_invoice(user_id: int, plan_id: str) -> dict:
         if not plan:
             logger.error(f"Unknown plan_id: {plan_id}")
             raise ValueError(f"Unknown plan_id: {plan_id}")
-        
+
         if not YOOKASSA_SHOP_ID or not YOOKASSA_SECRET_KEY:
             logger.error("YooKassa credentials not configured")
             raise ValueError("YooKassa credentials not configured")
-        
-        # Generate unique idempotency key
-        idempotency_key = str(uuid.uuid4())
-        
+
+        # Same key on every retry of this invoice creation
+        idempotency_key = idempotency_key or str(uuid.uuid4())
+
         # Create payment request
         payment_data = {
             "amount": {
@@ -45,6 +197,8 @@ async def create_yookassa_invoice(user_id: int, plan_id: str) -> dict:
                 "return_url": f"https://api.c0r.ai/payment/success?user_id={user_id}&plan_id={plan_id}"
             },
             "capture": True,
+            # Recurring plans are renewed by charging the saved payment method
+            "save_payment_method": plan["recurring"],
             "description": plan["description"],
             "metadata": {
                 "user_id": str(user_id),
@@ -55,27 +209,54 @@ async def create_yookassa_invoice(user_id: int, plan_id: str) -> dict:
             }
         }
         logger.info(f"[YooKassa] Creating payment: user_id={user_id}, plan_id={plan_id}, payment_data={payment_data}")
-        
-        # Create payment via YooKassa SDK
-        payment = Payment.create(payment_data, idempotency_key)
-        logger.info(f"[YooKassa] Payment created: payment_id={getattr(payment, 'id', None)}, status={getattr(payment, 'status', None)}, confirmation_url={getattr(getattr(payment, 'confirmation', None), 'confirmation_url', None)}")
-        
+
+        payment = await get_yookassa_client().create_payment(payment_data, idempotency_key)
+        confirmation_url = payment.get("confirmation", {}).get("confirmation_url")
+        logger.info(f"[YooKassa] Payment created: payment_id={payment.get('id')}, status={payment.get('status')}, confirmation_url={confirmation_url}")
+
         return {
             "status": "success",
-            "payment_id": payment.id,
-            "invoice_url": payment.confirmation.confirmation_url,
+            "payment_id": payment["id"],
+            "invoice_url": confirmation_url,
             "amount": plan["amount"],
             "credits_count": plan["count"],
             "plan_id": plan_id,
             "user_id": user_id,
             "recurring": plan["recurring"]
         }
-        
+
     except Exception as e:
         logger.error(f"[YooKassa] Failed to create payment for user {user_id}, plan {plan_id}: {e!r}")
         logger.error(traceback.format_exc())
         raise
 
+async def charge_yookassa_subscription(subscription: dict, idempotency_key: str) -> dict:
+    """
+    Charge the saved payment method of a subscription for its next period
+
+    Returns:
+        YooKassa payment object
+    """
+    plan = PLANS_YOOKASSA[subscription["plan_id"]]
+    payment_data = {
+        "amount": {
+            "value": f"{plan['amount']/100:.2f}",
+            "currency": "RUB"
+        },
+        "capture": True,
+        "payment_method_id": subscription["payment_method_id"],
+        "description": f"{plan['description']} (renewal)",
+        "metadata": {
+            "user_id": subscription["user_id"],
+            "plan_id": subscription["plan_id"],
+            "credits_count": str(plan["count"]),
+            "subscription_id": str(subscription["id"]),
+            "period": str(subscription["period"])
+        }
+    }
+    logger.info(f"[YooKassa] Charging subscription {subscription['id']} of user {subscription['user_id']}, key={idempotency_key}")
+    return await get_yookassa_client().create_payment(payment_data, idempotency_key)
+
 async def verify_yookassa_payment(payment_id: str) -> dict:
     """
     Verify payment status with YooKassa API
@@ -84,19 +265,19 @@ async def verify_yookassa_payment(payment_id: str) -> dict:
     try:
         if not YOOKASSA_SHOP_ID or not YOOKASSA_SECRET_KEY:
             raise ValueError("YooKassa credentials not configured")
-        
-        payment = Payment.find_one(payment_id)
-        
+
+        payment = await get_yookassa_client().get_payment(payment_id)
+
         return {
-            "payment_id": payment.id,
-            "status": payment.status,
-            "amount": payment.amount.value,
-            "currency": payment.amount.currency,
-            "metadata": payment.metadata,
-            "created_at": payment.created_at,
-            "paid": payment.paid
+            "payment_id": payment["id"],
+            "status": payment["status"],
+            "amount": payment["amount"]["value"],
+            "currency": payment["amount"]["currency"],
+            "metadata": payment.get("metadata", {}),
+            "created_at": payment.get("created_at"),
+            "paid": payment.get("paid", False)
         }
-        
+
     except Exception as e:
         logger.error(f"Failed to verify YooKassa payment {payment_id}: {e}")
         raise
@@ -108,4 +289,4 @@ def validate_yookassa_webhook(request_body: str, headers: dict) -> bool:
     """
     # YooKassa doesn't use webhook signatures by default
     # But we can validate the payment exists in their system
-    return True 
\ No newline at end of file
+    return True
@@ -0,0 +1,85 @@
+"""
+Reconcile provider payments against the payments table
+
+Streams succeeded payments of a provider for a time window, joins them with
+`payments` and `processed_payment_events` page by page and writes a JSON
+lines diff report (missing, unlinked, duplicate and amount_mismatch rows).
+With --repair, missing payments are granted through the API's /credits/add,
+which claims the payment first and so never grants credits twice.
+
+Usage:
+    python scripts/reconcile_payments.py --provider yookassa --days 7 --report reconcile.jsonl
+    API_SERVICE_URL=... INTERNAL_API_TOKEN=... python scripts/reconcile_payments.py --days 1 --repair
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared modules and the pay service YooKassa client (pay service last so its packages do not shadow installed ones)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, "pay.c0r.ai", "app"))
+
+from common.payment_reconciliation import reconcile_payments, yookassa_payment_pages, stripe_payment_pages
+from common.supabase_client import get_payments_by_provider_ids, get_processed_payment_ids
+
+API_SERVICE_URL = os.getenv("API_SERVICE_URL", "https://api.c0r.ai")
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+
+
+def make_repair(client: httpx.AsyncClient):
+    async def repair(payment: dict) -> str:
+        if not payment["user_id"] or payment["credits"] <= 0:
+            return "skipped: no user_id or credits in provider metadata"
+        response = await client.post(
+            f"{API_SERVICE_URL}/credits/add",
+            headers={"X-Internal-Token": INTERNAL_API_TOKEN},
+            json={
+                "user_id": payment["user_id"],
+                "count": payment["credits"],
+                "payment_id": payment["payment_id"],
+                "amount": payment["amount"],
+                "gateway": payment["provider"],
+                "status": "succeeded"
+            }
+        )
+        response.raise_for_status()
+        return response.json().get("status", "ok")
+    return repair
+
+
+async def main(args):
+    since = datetime.now(timezone.utc) - timedelta(days=args.days)
+    if args.provider == "yookassa":
+        from yookassa_handlers.client import get_yookassa_client, close_yookassa_client
+        pages = yookassa_payment_pages(get_yookassa_client(), since.isoformat().replace("+00:00", "Z"))
+    else:
+        import stripe
+        stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+        pages = stripe_payment_pages(int(since.timestamp()))
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        with open(args.report, "w") as report:
+            summary = await reconcile_payments(
+                pages, get_payments_by_provider_ids, get_processed_payment_ids, report,
+                repair=make_repair(client) if args.repair else None
+            )
+
+    if args.provider == "yookassa":
+        await close_yookassa_client()
+    print(f"[RECONCILE] {args.provider} since {since:%Y-%m-%d %H:%M} UTC: {summary}, report: {args.report}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--provider", choices=["yookassa", "stripe"], default="yookassa")
+    parser.add_argument("--days", type=float, default=1, help="Reconcile payments of the last N days")
+    parser.add_argument("--report", default="reconcile_payments.jsonl", help="Diff report path (JSON lines)")
+    parser.add_argument("--repair", action="store_true", help="Grant missing payments through /credits/add")
+    asyncio.run(main(parser.parse_args()))
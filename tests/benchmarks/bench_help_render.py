@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of help_command rendering: per-call get_text lookups and
+formatting (previous I18nManager.get_text), the compiled catalog, and the
+pre-rendered help screen
+
+Usage:
+    python tests/benchmarks/bench_help_render.py [iterations]
+"""
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+
+from loguru import logger
+
+logger.remove()
+
+from i18n.i18n import i18n, Language
+from handlers.commands import render_help_screen
+
+LANGUAGES = ("en", "ru")
+
+
+def uncompiled_get_text(key: str, language: str = Language.ENGLISH.value, **kwargs) -> str:
+    """get_text as it was before the catalog was compiled"""
+    if language not in i18n.translations:
+        logger.warning(f"Language {language} not found, falling back to English")
+        language = Language.ENGLISH.value
+    if key not in i18n.translations[language]:
+        logger.warning(f"Translation key '{key}' not found for language {language}")
+        if key in i18n.translations[Language.ENGLISH.value]:
+            text = i18n.translations[Language.ENGLISH.value][key]
+        else:
+            return f"[Missing translation: {key}]"
+    else:
+        text = i18n.translations[language][key]
+    try:
+        return text.format(**kwargs)
+    except KeyError as e:
+        logger.error(f"Missing format parameter {e} for key '{key}' in language {language}")
+        return text
+
+
+def timed(render, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        render(LANGUAGES[i % 2])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(iterations: int):
+    build = render_help_screen.__wrapped__
+    assert build("ru")[0] == render_help_screen("ru")[0]
+
+    with patch.object(i18n, "get_text", uncompiled_get_text):
+        assert build("ru")[0] == render_help_screen("ru")[0]
+        uncompiled = timed(build, iterations)
+    compiled = timed(build, iterations)
+    static = timed(render_help_screen, iterations)
+
+    print(f"iterations:          {iterations:,}")
+    print(f"uncompiled get_text: {uncompiled:8.2f} us per help screen")
+    print(f"compiled catalog:    {compiled:8.2f} us per help screen ({uncompiled / compiled:.1f}x)")
+    print(f"pre-rendered screen: {static:8.2f} us per help screen ({uncompiled / static:.0f}x)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
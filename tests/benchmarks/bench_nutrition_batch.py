@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark of vectorized nutrition metrics against the scalar functions at 1M profiles
+
+Usage:
+    python tests/benchmarks/bench_nutrition_batch.py [profiles] [scalar_profiles]
+
+The scalar path is timed on scalar_profiles (default: all) and extrapolated.
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from common.nutrition_batch import compute_profile_metrics, encode, GENDERS, ACTIVITY_LEVELS, GOALS
+from common.nutrition_calculations import (
+    calculate_bmi, calculate_water_needs, calculate_metabolic_age, calculate_macro_distribution
+)
+from common.supabase_client import calculate_daily_calories
+
+
+def make_columns(count: int, seed: int = 7) -> dict:
+    rng = np.random.default_rng(seed)
+    return {
+        "age": rng.integers(14, 90, count).astype(np.float64),
+        "gender": np.array(GENDERS, dtype=object)[rng.integers(0, len(GENDERS), count)],
+        "height_cm": np.round(rng.uniform(140, 210, count), 1),
+        "weight_kg": np.round(rng.uniform(35, 180, count), 1),
+        "activity_level": np.array(ACTIVITY_LEVELS, dtype=object)[rng.integers(0, len(ACTIVITY_LEVELS), count)],
+        "goal": np.array(GOALS, dtype=object)[rng.integers(0, len(GOALS), count)],
+    }
+
+
+def scalar_metrics(profile: dict):
+    calories = calculate_daily_calories(profile)
+    calculate_bmi(profile["weight_kg"], profile["height_cm"])
+    calculate_water_needs(profile["weight_kg"], profile["activity_level"])
+    calculate_metabolic_age(profile["age"], profile["gender"], profile["weight_kg"], profile["height_cm"],
+                            profile["activity_level"])
+    calculate_macro_distribution(calories, profile["goal"])
+
+
+def run(count: int, scalar_count: int):
+    columns = make_columns(count)
+
+    started = time.perf_counter()
+    codes = {
+        "gender": encode(columns["gender"], GENDERS),
+        "activity_level": encode(columns["activity_level"], ACTIVITY_LEVELS),
+        "goal": encode(columns["goal"], GOALS),
+    }
+    encoded = time.perf_counter() - started
+    started = time.perf_counter()
+    metrics = compute_profile_metrics(columns["age"], codes["gender"], columns["height_cm"], columns["weight_kg"],
+                                      codes["activity_level"], codes["goal"])
+    vectorized = time.perf_counter() - started
+
+    profiles = [{field: columns[field][i].item() if hasattr(columns[field][i], "item") else columns[field][i]
+                 for field in columns} for i in range(scalar_count)]
+    started = time.perf_counter()
+    for profile in profiles:
+        scalar_metrics(profile)
+    scalar = (time.perf_counter() - started) * count / scalar_count
+
+    batch_total = encoded + vectorized
+    print(f"profiles:          {count:,}")
+    print(f"metrics:           {len(metrics)}")
+    print(f"batch encode:      {encoded:.3f} s")
+    print(f"batch metrics:     {vectorized:.3f} s")
+    print(f"scalar path:       {scalar:.2f} s" + (f" (extrapolated from {scalar_count:,})" if scalar_count < count else ""))
+    print(f"speedup:           {scalar / batch_total:.0f}x (with encoding), {scalar / vectorized:.0f}x (metrics only)")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    scalar_count = int(sys.argv[2]) if len(sys.argv) > 2 else count
+    run(count, min(scalar_count, count))
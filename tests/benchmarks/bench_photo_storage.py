@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency benchmark of the photo storage flow on the local backend
+
+Stores photos through store_photo_in_r2 (hash, dedup lookup, write, index and
+stats update), then pages through photo history with signed URLs.
+
+Usage:
+    python tests/benchmarks/bench_photo_storage.py [photos] [photo_kb]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import utils.r2 as r2
+from utils.metrics import LatencyHistogram
+from utils.photo_index import PhotoIndex
+from utils.storage import LocalStorageBackend
+from utils.storage_stats import StorageStatsStore
+
+USERS = 10
+
+
+def report(name: str, histogram: LatencyHistogram) -> None:
+    snapshot = histogram.snapshot()
+    print(f"{name:<16} n={snapshot['count']:<6} avg={snapshot['avg_seconds'] * 1000:.2f}ms "
+          f"p50<={snapshot['p50_seconds'] * 1000:.0f}ms p95<={snapshot['p95_seconds'] * 1000:.0f}ms "
+          f"max={snapshot['max_seconds'] * 1000:.2f}ms")
+
+
+async def run(photos: int, photo_kb: int):
+    with tempfile.TemporaryDirectory() as root:
+        r2.STORAGE_BACKEND = "local"
+        r2._storage_backend = LocalStorageBackend(os.path.join(root, "storage"), secret="bench")
+        r2.photo_index = PhotoIndex(os.path.join(root, "photos.db"))
+        r2.storage_stats = StorageStatsStore(os.path.join(root, "storage_stats.db"))
+
+        body = os.urandom(photo_kb * 1024)
+        uploads, dedup, history = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+
+        started = time.perf_counter()
+        for i in range(photos):
+            data = b'\xff\xd8\xff\xe0' + i.to_bytes(8, "big") + body
+            with uploads.time():
+                await r2.store_photo_in_r2(data, f"user-{i % USERS:010d}")
+            if i % 10 == 0:
+                # Same photo sent again
+                with dedup.time():
+                    await r2.store_photo_in_r2(data, f"user-{i % USERS:010d}")
+        elapsed = time.perf_counter() - started
+
+        for user in range(USERS):
+            cursor = None
+            while True:
+                with history.time():
+                    page = await r2.get_user_photos(f"user-{user:010d}", 20, cursor)
+                if len(page) < 20:
+                    break
+                cursor = page[-1]["cursor"]
+
+        print(f"{photos} photos of {photo_kb}KB in {elapsed:.2f}s ({photos / elapsed:.0f} uploads/s)")
+        report("upload", uploads)
+        report("duplicate upload", dedup)
+        report("history page", history)
+        print(await r2.get_photo_stats())
+
+
+if __name__ == "__main__":
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    photos = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    photo_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(run(photos, photo_kb))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the anti-spam rate limiter at 100k active users
+
+Usage:
+    python tests/benchmarks/bench_rate_limiter.py [active_users] [checks]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from utils.rate_limiter import RateLimiter
+
+LIMITS = {
+    "general": {"limit": 20, "period": 60},
+    "photo": {"limit": 5, "period": 60},
+    "payment": {"limit": 5, "period": 60},
+}
+
+
+async def run(active_users: int, checks: int):
+    limiter = RateLimiter(LIMITS, max_keys=active_users)
+    user_ids = [random.randrange(10**9) for _ in range(active_users)]
+    actions = ["general"] * 8 + ["photo"] + ["payment"]
+
+    # Warm up: every user becomes active once
+    for user_id in user_ids:
+        await limiter.check(user_id, "general")
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(checks):
+        await limiter.check(random.choice(user_ids), random.choice(actions))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"active users:   {active_users}")
+    print(f"tracked keys:   {len(limiter.local_backend)} (max {limiter.local_backend.max_keys})")
+    print(f"checks:         {checks}")
+    print(f"per check:      {elapsed / checks * 1e6:.2f} us")
+    print(f"throughput:     {checks / elapsed:,.0f} checks/s")
+    print(f"peak alloc:     {peak / 1024 / 1024:.1f} MB during checks")
+
+
+if __name__ == "__main__":
+    active_users = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    checks = int(sys.argv[2]) if len(sys.argv) > 2 else 500_000
+    asyncio.run(run(active_users, checks))
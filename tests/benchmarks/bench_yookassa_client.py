@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Load test of YooKassa invoice creation against the fake YooKassa API
+
+Creates invoices concurrently through create_yookassa_invoice (pooled async
+client with retries) and reports throughput and latency percentiles.
+
+Usage:
+    python tests/benchmarks/fake_yookassa.py --latency 0.2 --error-rate 0.05 &
+    python tests/benchmarks/bench_yookassa_client.py [invoices] [concurrency] [api_url]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../pay.c0r.ai/app'))
+
+os.environ.setdefault("YOOKASSA_SHOP_ID", "bench")
+os.environ.setdefault("YOOKASSA_SECRET_KEY", "bench-secret")
+
+import yookassa_handlers.client as yookassa_client
+from utils.metrics import LatencyHistogram
+
+
+async def run(invoices: int, concurrency: int, api_url: str):
+    yookassa_client._yookassa_client = yookassa_client.YooKassaClient(
+        "bench", "bench-secret", base_url=api_url, max_connections=concurrency
+    )
+    latency = LatencyHistogram()
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def create(i: int):
+        nonlocal failures
+        async with semaphore:
+            try:
+                with latency.time():
+                    await yookassa_client.create_yookassa_invoice(i, "basic" if i % 2 else "pro")
+            except Exception:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(create(i) for i in range(invoices)))
+    elapsed = time.perf_counter() - started
+    await yookassa_client.close_yookassa_client()
+
+    snapshot = latency.snapshot()
+    print(f"{invoices} invoices, concurrency {concurrency}: {invoices / elapsed:.1f} invoices/s, "
+          f"{failures} failed")
+    print(f"latency avg={snapshot['avg_seconds'] * 1000:.1f}ms p50<={snapshot['p50_seconds'] * 1000:.0f}ms "
+          f"p95<={snapshot['p95_seconds'] * 1000:.0f}ms max={snapshot['max_seconds'] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    from loguru import logger
+    logger.remove()
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    parallel = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    url = sys.argv[3] if len(sys.argv) > 3 else "http://127.0.0.1:8765/v3"
+    asyncio.run(run(count, parallel, url))
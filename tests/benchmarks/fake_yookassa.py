@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Fake YooKassa REST API for load tests of the pay service
+
+Implements POST /v3/payments (honouring Idempotence-Key) and
+GET /v3/payments/{id} with configurable latency and error rate. With
+--webhook-url, every created payment is confirmed after --confirm-after
+seconds by posting a payment.succeeded notification, like a user paying.
+
+Usage:
+    python tests/benchmarks/fake_yookassa.py [--port 8765] [--latency 0.2] [--error-rate 0.05]
+        [--webhook-url http://localhost:8002/webhook/yookassa] [--confirm-after 1.0]
+
+Then run the pay service with YOOKASSA_API_URL=http://localhost:8765/v3.
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0, webhook_url: str = None,
+               confirm_after: float = 1.0) -> FastAPI:
+    app = FastAPI()
+    payments = {}
+    by_idempotency_key = {}
+    background = set()
+    app.state.stats = {"created": 0, "replayed": 0, "failed": 0, "fetched": 0}
+
+    async def simulate_latency():
+        if latency:
+            # Roughly exponential around the configured mean, like a real provider
+            await asyncio.sleep(random.expovariate(1 / latency))
+
+    async def confirm(payment: dict):
+        await asyncio.sleep(confirm_after)
+        payment.update(status="succeeded", paid=True)
+        async with httpx.AsyncClient(timeout=10) as client:
+            try:
+                await client.post(webhook_url, json={
+                    "type": "notification", "event": "payment.succeeded", "object": payment
+                })
+            except httpx.HTTPError:
+                pass
+
+    @app.post("/v3/payments")
+    async def create_payment(request: Request, idempotence_key: str = Header(None)):
+        if not request.headers.get("authorization"):
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        if not idempotence_key:
+            return JSONResponse(status_code=400, content={
+                "type": "error", "code": "invalid_request", "description": "Idempotence-Key header is required"
+            })
+        await simulate_latency()
+        if random.random() < error_rate:
+            app.state.stats["failed"] += 1
+            return JSONResponse(status_code=500, content={"type": "error", "code": "internal_server_error"})
+
+        if idempotence_key in by_idempotency_key:
+            app.state.stats["replayed"] += 1
+            return payments[by_idempotency_key[idempotence_key]]
+
+        data = await request.json()
+        payment_id = str(uuid.uuid4())
+        payment = {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": data["amount"],
+            "description": data.get("description"),
+            "metadata": data.get("metadata", {}),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": f"https://yoomoney.ru/checkout/payments/v2/contract?orderId={payment_id}"
+            },
+            "test": True
+        }
+        payments[payment_id] = payment
+        by_idempotency_key[idempotence_key] = payment_id
+        app.state.stats["created"] += 1
+        if webhook_url:
+            task = asyncio.create_task(confirm(payment))
+            background.add(task)
+            task.add_done_callback(background.discard)
+        return payment
+
+    @app.get("/v3/payments/{payment_id}")
+    async def get_payment(payment_id: str):
+        await simulate_latency()
+        app.state.stats["fetched"] += 1
+        if payment_id not in payments:
+            return JSONResponse(status_code=404, content={"type": "error", "code": "not_found"})
+        return payments[payment_id]
+
+    @app.get("/stats")
+    async def stats():
+        return {**app.state.stats, "payments": len(payments)}
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake YooKassa API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 500 responses")
+    parser.add_argument("--webhook-url", default=None, help="Send payment.succeeded here after creation")
+    parser.add_argument("--confirm-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency, args.error_rate, args.webhook_url, args.confirm_after),
+                host="127.0.0.1", port=args.port, log_level="warning")
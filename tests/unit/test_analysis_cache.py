@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/analysis_cache.py and cached photo analysis jobs
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, AsyncMock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from utils.analysis_cache import AnalysisCache
+from utils.job_queue import JobQueue
+
+RESULT = {"kbzhu": {"calories": 420, "proteins": 30, "fats": 12, "carbohydrates": 45}}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+
+
+class TestAnalysisCache:
+    """Test suite for file_unique_id result cache"""
+
+    @pytest.mark.asyncio
+    async def test_put_and_get(self, cache):
+        """Test that a stored result is returned with its R2 key"""
+        await cache.put("AgADxyz", "en", "user/2025/01/20/nutrition_analysis/a.jpg", RESULT)
+
+        cached = await cache.get("AgADxyz", "en")
+        assert cached == {"r2_key": "user/2025/01/20/nutrition_analysis/a.jpg", "result": RESULT}
+
+    @pytest.mark.asyncio
+    async def test_miss(self, cache):
+        """Test that unknown photos are not found"""
+        assert await cache.get("unknown", "en") is None
+
+    @pytest.mark.asyncio
+    async def test_language_is_part_of_key(self, cache):
+        """Test that results are not shared between languages"""
+        await cache.put("AgADxyz", "en", None, RESULT)
+        assert await cache.get("AgADxyz", "ru") is None
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_not_returned(self, cache):
+        """Test TTL expiry and purge of expired entries"""
+        with patch('utils.analysis_cache.time.time', return_value=1000.0):
+            await cache.put("AgADxyz", "en", None, RESULT)
+
+        with patch('utils.analysis_cache.time.time', return_value=1061.0):
+            assert await cache.get("AgADxyz", "en") is None
+            assert await cache.purge_expired() == 1
+
+    @pytest.mark.asyncio
+    async def test_put_replaces_previous_entry(self, cache):
+        """Test that re-analysis overwrites the cached result"""
+        await cache.put("AgADxyz", "en", None, RESULT)
+        await cache.put("AgADxyz", "en", "new-key", {"kbzhu": {"calories": 100}})
+
+        cached = await cache.get("AgADxyz", "en")
+        assert cached["r2_key"] == "new-key"
+        assert cached["result"]["kbzhu"]["calories"] == 100
+
+
+class TestCachedNutritionAnalysisJob:
+    """Test that repeat photos skip download, upload and ML call but are still charged"""
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_skips_work_and_charges(self, cache):
+        """Test that a cache hit charges one credit and edits the message with the cached result"""
+        from handlers import photo
+
+        await cache.put("AgADxyz", "en", "key.jpg", RESULT)
+        bot = Mock()
+        bot.get_file = AsyncMock()
+        bot.download_file = AsyncMock()
+        bot.edit_message_text = AsyncMock()
+        job = {
+            "id": 1,
+            "attempts": 1,
+            "payload": {
+                "telegram_user_id": 123,
+                "chat_id": 123,
+                "message_id": 10,
+                "file_id": "file",
+                "file_unique_id": "AgADxyz",
+                "user_language": "en"
+            }
+        }
+        user_data = {
+            'user': {'id': 'user-uuid', 'credits_remaining': 5, 'language': 'en'},
+            'profile': None,
+            'has_profile': False
+        }
+
+        with patch.object(photo, 'nutrition_analysis_cache', cache), \
+             patch.object(photo, 'nutrition_job_queue', Mock(update_payload=AsyncMock())), \
+             patch('handlers.photo.get_user_with_profile', AsyncMock(return_value=user_data)), \
+             patch('handlers.photo.store_photo_in_r2', AsyncMock()) as mock_store, \
+             patch('handlers.photo.index_stored_photo', AsyncMock(return_value="key.jpg")) as mock_index, \
+             patch('handlers.photo.decrement_credits', AsyncMock()) as mock_decrement, \
+             patch('handlers.photo.log_user_action', AsyncMock()) as mock_log, \
+             patch('handlers.photo.httpx.AsyncClient') as mock_client:
+            await photo.run_nutrition_analysis_job(bot, job)
+
+        bot.get_file.assert_not_called()
+        mock_store.assert_not_called()
+        mock_client.assert_not_called()
+        mock_index.assert_awaited_once_with("key.jpg", "user-uuid", "nutrition_analysis")
+        mock_decrement.assert_awaited_once_with(123, reference='nutrition_job:1')
+        mock_log.assert_awaited_once_with('user-uuid', 'nutrition_analysis', metadata={'cached': True})
+        text = bot.edit_message_text.call_args[0][0]
+        assert "420" in text
+        assert "**Credits remaining:** 4" in text
+
+    @pytest.mark.asyncio
+    async def test_retry_does_not_upload_or_charge_again(self, cache, tmp_path):
+        """Test that a retried job reuses its uploaded photo and is charged once"""
+        from handlers import photo
+
+        queue = JobQueue(str(tmp_path / "jobs.db"), queue="test", backoff_base=0)
+        await queue.enqueue(123, "123:AgADxyz", {
+            "telegram_user_id": 123,
+            "chat_id": 123,
+            "message_id": 10,
+            "file_id": "file",
+            "file_unique_id": "AgADxyz",
+            "user_language": "en"
+        })
+        bot = Mock()
+        bot.get_file = AsyncMock(return_value=Mock(file_path="photo.jpg"))
+        bot.download_file = AsyncMock(return_value=Mock(getvalue=Mock(return_value=b"jpeg")))
+        bot.edit_message_text = AsyncMock()
+        user = {'id': 'user-uuid', 'credits_remaining': 1, 'language': 'en'}
+        response = Mock(status_code=200, json=Mock(return_value=RESULT))
+        client = AsyncMock()
+        client.__aenter__.return_value.post = AsyncMock(side_effect=[RuntimeError("timeout"), response, response])
+
+        async def get_user(telegram_user_id):
+            return {'user': dict(user), 'profile': None, 'has_profile': False}
+
+        async def decrement(telegram_user_id, reference=None):
+            user['credits_remaining'] -= 1
+
+        with patch.object(photo, 'nutrition_analysis_cache', Mock(get=AsyncMock(return_value=None), put=AsyncMock())), \
+             patch.object(photo, 'nutrition_job_queue', queue), \
+             patch('handlers.photo.get_user_with_profile', get_user), \
+             patch('handlers.photo.store_photo_in_r2', AsyncMock(return_value="blobs/ab/abc.jpg")) as mock_store, \
+             patch('handlers.photo.decrement_credits', AsyncMock(side_effect=decrement)) as mock_decrement, \
+             patch('handlers.photo.log_user_action', AsyncMock()), \
+             patch('handlers.photo.httpx.AsyncClient', return_value=client):
+            job = await queue.claim()
+            with pytest.raises(RuntimeError):
+                await photo.run_nutrition_analysis_job(bot, job)
+            await queue.retry_or_fail(job, "timeout")
+            await photo.run_nutrition_analysis_job(bot, await queue.claim())
+
+            # Process crashed after charging: the job runs again from the stored payload
+            await queue.requeue_running()
+            job = await queue.claim()
+            assert job["payload"]["charged"] is True
+            await photo.run_nutrition_analysis_job(bot, job)
+
+        mock_store.assert_awaited_once()
+        mock_decrement.assert_awaited_once_with(123, reference=f"nutrition_job:{job['id']}")
+        assert "**Credits remaining:** 0" in bot.edit_message_text.call_args[0][0]
+
+    @pytest.mark.asyncio
+    async def test_failure_notice_in_user_language(self):
+        """Test that the failure notice is sent in the language stored with the job"""
+        from handlers import photo
+        from i18n.i18n import i18n
+
+        bot = Mock()
+        bot.edit_message_text = AsyncMock()
+        job = {"id": 1, "attempts": 3, "payload": {"chat_id": 123, "message_id": 10, "user_language": "ru"}}
+
+        await photo.notify_nutrition_analysis_failed(bot, job, "RuntimeError: timeout")
+
+        assert bot.edit_message_text.call_args[0][0] == i18n.get_text("photo_analysis_failed", "ru")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/broadcast.py
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+from unittest.mock import Mock, AsyncMock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from utils.broadcast import BroadcastEngine, BroadcastStore, validate_broadcast_spec
+from utils.send_scheduler import current_send_priority, SendPriority
+
+USERS = [
+    {"id": f"u{i}", "telegram_id": i, "language": "ru" if i % 2 else "en", "country": None}
+    for i in range(1, 8)
+]
+SPEC = {"texts": {"en": "News", "ru": "Новости"}}
+
+
+def make_fetch_page(users=USERS):
+    async def fetch_page(after_telegram_id, limit, languages=None, countries=None):
+        selected = [u for u in users if u["telegram_id"] > after_telegram_id]
+        if languages:
+            selected = [u for u in selected if u["language"] in languages]
+        return selected[:limit]
+    return AsyncMock(side_effect=fetch_page)
+
+
+def make_bot():
+    bot = Mock()
+    bot.send_message = AsyncMock()
+    return bot
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BroadcastStore(str(tmp_path / "broadcasts.db"))
+
+
+async def wait_finished(engine, broadcast_id):
+    for _ in range(200):
+        report = await engine.report(broadcast_id)
+        if report["status"] != "running":
+            return report
+        await asyncio.sleep(0.01)
+    raise AssertionError("broadcast did not finish")
+
+
+class TestBroadcastEngine:
+    """Test suite for broadcast sending, checkpoints and resume"""
+
+    def test_spec_requires_text(self):
+        """Test that a broadcast without any text is rejected"""
+        with pytest.raises(ValueError):
+            validate_broadcast_spec({"languages": ["en"]})
+        with pytest.raises(ValueError):
+            validate_broadcast_spec({"texts": {"ru": "Новости"}})
+
+    @pytest.mark.asyncio
+    async def test_sends_localized_text_to_all_users(self, store):
+        """Test that every user gets the text in their language, in batches"""
+        bot = make_bot()
+        fetch_page = make_fetch_page()
+        engine = BroadcastEngine(store, fetch_page, batch_size=3, concurrency=2)
+
+        started = await engine.start(bot, SPEC)
+        report = await wait_finished(engine, started["id"])
+
+        assert report["status"] == "done"
+        assert report["sent"] == 7
+        assert report["last_telegram_id"] == 7
+        sent = {call.kwargs["chat_id"]: call.kwargs["text"] for call in bot.send_message.call_args_list}
+        assert sent[1] == "Новости"
+        assert sent[2] == "News"
+        # Pages of 3: after 0, 3 and 6
+        assert [call.args[0] for call in fetch_page.call_args_list] == [0, 3, 6]
+
+    @pytest.mark.asyncio
+    async def test_i18n_text_rendered_once_per_language(self, store):
+        """Test that i18n text is rendered once per language, not per user"""
+        bot = make_bot()
+        engine = BroadcastEngine(store, make_fetch_page(), batch_size=3)
+
+        with patch("utils.broadcast.i18n.get_text", side_effect=lambda key, lang, **kw: f"{key}:{lang}") as get_text:
+            started = await engine.start(bot, {"text_key": "announcement", "params": {"x": 1}})
+            await wait_finished(engine, started["id"])
+
+        assert get_text.call_count == 2
+        assert bot.send_message.call_count == 7
+
+    @pytest.mark.asyncio
+    async def test_sends_with_low_priority(self, store):
+        """Test that broadcast messages are queued behind regular replies"""
+        priorities = []
+        bot = make_bot()
+        bot.send_message = AsyncMock(side_effect=lambda **kw: priorities.append(current_send_priority.get()))
+        engine = BroadcastEngine(store, make_fetch_page(USERS[:2]))
+
+        started = await engine.start(bot, SPEC)
+        await wait_finished(engine, started["id"])
+
+        assert priorities == [SendPriority.LOW, SendPriority.LOW]
+
+    @pytest.mark.asyncio
+    async def test_counts_blocked_and_failed(self, store):
+        """Test that blocked users are counted separately from other failures"""
+        async def send_message(chat_id, **kwargs):
+            if chat_id == 2:
+                raise TelegramForbiddenError(method=Mock(), message="bot was blocked by the user")
+            if chat_id == 3:
+                raise TelegramBadRequest(method=Mock(), message="chat not found")
+
+        bot = make_bot()
+        bot.send_message = AsyncMock(side_effect=send_message)
+        engine = BroadcastEngine(store, make_fetch_page())
+
+        started = await engine.start(bot, SPEC)
+        report = await wait_finished(engine, started["id"])
+
+        assert (report["sent"], report["blocked"], report["failed"]) == (5, 1, 1)
+        assert report["processed"] == 7
+
+    @pytest.mark.asyncio
+    async def test_resume_continues_after_checkpoint(self, store):
+        """Test that a broadcast interrupted by a restart continues after the last finished batch"""
+        broadcast = await store.create(validate_broadcast_spec(SPEC))
+        await store.checkpoint(broadcast["id"], 3, sent=3, failed=0, blocked=0)
+
+        bot = make_bot()
+        engine = BroadcastEngine(store, make_fetch_page(), batch_size=3)
+        assert await engine.resume(bot) == 1
+        report = await wait_finished(engine, broadcast["id"])
+
+        assert report["status"] == "done"
+        assert report["sent"] == 7
+        assert sorted(call.kwargs["chat_id"] for call in bot.send_message.call_args_list) == [4, 5, 6, 7]
+
+    @pytest.mark.asyncio
+    async def test_cancel(self, store):
+        """Test that a cancelled broadcast stops and is not resumed"""
+        async def send_message(**kwargs):
+            await asyncio.sleep(10)
+
+        bot = make_bot()
+        bot.send_message = AsyncMock(side_effect=send_message)
+        engine = BroadcastEngine(store, make_fetch_page())
+
+        started = await engine.start(bot, SPEC)
+        await asyncio.sleep(0.05)
+        report = await engine.cancel(started["id"])
+
+        assert report["status"] == "cancelled"
+        assert await store.list_running() == []
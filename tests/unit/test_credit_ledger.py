@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Unit tests for credit changes and the credit ledger in common/supabase_client.py
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import common.supabase_client as supabase_client
+from common.supabase_client import (
+    decrement_credits, add_credits, refund_credits, get_credit_history, get_ledger_balance
+)
+
+
+def make_supabase(data):
+    supabase = Mock()
+    supabase.rpc.return_value.execute.return_value = Mock(data=data)
+    query = supabase.table.return_value.select.return_value.eq.return_value
+    query.lt.return_value = query
+    query.or_.return_value = query
+    query.order.return_value = query
+    query.limit.return_value.execute.return_value = Mock(data=data)
+    return supabase
+
+
+class TestCreditLedger:
+    """Test suite for ledger-backed credit changes"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("change, delta, kind", [
+        (lambda: decrement_credits(42), -1, "consume"),
+        (lambda: add_credits(42, 20), 20, "grant"),
+        (lambda: refund_credits(42, 1, reason="analysis_failed"), 1, "refund"),
+    ])
+    async def test_change_is_one_rpc_call(self, change, delta, kind):
+        """Test that a credit change is a single atomic call instead of read-modify-write"""
+        supabase = make_supabase([{"id": "user-uuid", "telegram_id": 42, "credits_remaining": 7}])
+        with patch.object(supabase_client, "supabase", supabase):
+            user = await change()
+
+        assert user["credits_remaining"] == 7
+        supabase.table.assert_not_called()
+        name, params = supabase.rpc.call_args.args
+        assert name == "apply_credit_entry"
+        assert params["p_telegram_id"] == 42
+        assert params["p_delta"] == delta
+        assert params["p_kind"] == kind
+
+    @pytest.mark.asyncio
+    async def test_unknown_user(self):
+        """Test that changing credits of an unknown user returns None"""
+        with patch.object(supabase_client, "supabase", make_supabase([])):
+            assert await decrement_credits(42) is None
+
+    @pytest.mark.asyncio
+    async def test_history_page(self):
+        """Test that history pages are read newest first from before the previous page"""
+        entries = [{"id": 2, "delta": -1, "created_at": "2025-01-02T00:00:00Z"}]
+        supabase = make_supabase(entries)
+        with patch.object(supabase_client, "supabase", supabase):
+            page = await get_credit_history("user-uuid", before="2025-01-03T00:00:00Z", limit=10)
+
+        assert page == entries
+        query = supabase.table.return_value.select.return_value.eq.return_value
+        supabase.table.assert_called_with("credit_ledger")
+        query.lt.assert_called_with("created_at", "2025-01-03T00:00:00Z")
+        query.limit.assert_called_with(10)
+
+    @pytest.mark.asyncio
+    async def test_history_page_keyed_by_created_at_and_id(self):
+        """Test that the next page starts after the last (created_at, id) of the previous one"""
+        supabase = make_supabase([])
+        with patch.object(supabase_client, "supabase", supabase):
+            await get_credit_history("user-uuid", before="2025-01-03T00:00:00+00:00", before_id=17, limit=10)
+
+        query = supabase.table.return_value.select.return_value.eq.return_value
+        query.lt.assert_not_called()
+        query.or_.assert_called_once_with(
+            'created_at.lt."2025-01-03T00:00:00+00:00",'
+            'and(created_at.eq."2025-01-03T00:00:00+00:00",id.lt.17)'
+        )
+
+    @pytest.mark.asyncio
+    async def test_ledger_balance(self):
+        """Test that the ledger balance comes from the snapshot function"""
+        supabase = make_supabase(12)
+        with patch.object(supabase_client, "supabase", supabase):
+            assert await get_ledger_balance("user-uuid") == 12
+        supabase.rpc.assert_called_with("credit_balance", {"p_user_id": "user-uuid"})
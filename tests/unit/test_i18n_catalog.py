@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the compiled translation catalog and static screens in i18n/i18n.py
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from i18n.i18n import I18nManager, i18n, static_screen, freeze
+
+TRANSLATIONS = {
+    "en": {
+        "plain": "Hello",
+        "braces": "Use {{curly}} braces",
+        "greeting": "Hi, {name}!",
+        "only_en": "English only",
+    },
+    "ru": {
+        "plain": "Привет",
+        "braces": "Фигурные {{скобки}}",
+        "greeting": "Привет, {name}!",
+    },
+}
+
+
+@pytest.fixture
+def manager():
+    with patch.object(I18nManager, "_load_translations", return_value=TRANSLATIONS):
+        return I18nManager()
+
+
+class TestCompiledCatalog:
+    """Test suite for get_text on the compiled catalog"""
+
+    def test_same_texts_as_format(self):
+        """Test that every real translation without fields is returned as str.format() returned it"""
+        for language, texts in i18n.translations.items():
+            for key, text in texts.items():
+                if key in i18n._constants[language]:
+                    assert i18n.get_text(key, language) == text.format()
+
+    def test_constants_and_templates(self, manager):
+        """Test constants, unescaped braces and formatted templates"""
+        assert manager.get_text("plain", "ru") == "Привет"
+        assert manager.get_text("braces", "en") == "Use {curly} braces"
+        assert manager.get_text("plain", "en", unused=1) == "Hello"
+        assert manager.get_text("greeting", "ru", name="Аня") == "Привет, Аня!"
+
+    def test_missing_format_parameter(self, manager):
+        """Test that a template without its parameters is returned unformatted"""
+        assert manager.get_text("greeting", "en") == "Hi, {name}!"
+
+    def test_fallbacks(self, manager):
+        """Test English fallback for missing keys and unknown languages"""
+        assert manager.get_text("only_en", "ru") == "English only"
+        assert manager.get_text("plain", "de") == "Hello"
+        assert manager.get_text("nothing", "ru") == "[Missing translation: nothing]"
+
+
+class TestStaticScreen:
+    """Test suite for screens rendered once per language"""
+
+    def test_rendered_once_per_language(self):
+        """Test that screens are pre-rendered per language and reused"""
+        build = Mock(side_effect=lambda language, compact=False: (language, compact))
+        screen = static_screen(build)
+        assert build.call_count == len(i18n.translations)
+
+        assert screen("ru") is screen("ru")
+        assert screen("de") == ("en", False)
+        assert screen("ru", True) == ("ru", True)
+        screen("ru", True)
+        assert build.call_count == len(i18n.translations) + 1
+
+    def test_screens_are_frozen(self):
+        """Test that a shared keyboard cannot be changed by one caller for the next"""
+        from aiogram import types
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from pydantic import ValidationError
+
+        screen = static_screen(lambda language: ("text", types.InlineKeyboardMarkup(inline_keyboard=[
+            [types.InlineKeyboardButton(text=language, callback_data="action_main_menu")]
+        ])))
+        text, keyboard = screen("ru")
+
+        assert isinstance(keyboard, types.InlineKeyboardMarkup)
+        with pytest.raises(TypeError):
+            keyboard.inline_keyboard.append([])
+        with pytest.raises(TypeError):
+            keyboard.inline_keyboard[0][0] = None
+        with pytest.raises(ValidationError):
+            keyboard.inline_keyboard[0][0].text = "changed"
+        assert screen("ru")[1].inline_keyboard[0][0].text == "ru"
+
+        prepared = AiohttpSession().prepare_value(keyboard, bot=Mock(), files={}, _dumps_json=False)
+        assert prepared == {"inline_keyboard": [[{"text": "ru", "callback_data": "action_main_menu"}]]}
+
+    def test_freeze_keeps_values(self):
+        """Test that frozen screens compare equal to what was rendered"""
+        assert freeze(("a", ["b", ("c",)], 1)) == ("a", ["b", ("c",)], 1)
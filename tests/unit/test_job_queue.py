@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/job_queue.py - durable background job queue
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from utils.job_queue import JobQueue, JobWorkerPool, NonRetryableJobError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), queue="test", max_attempts=3, backoff_base=0, backoff_max=0)
+
+
+class TestJobQueue:
+    """Test suite for enqueue/claim/complete semantics"""
+
+    @pytest.mark.asyncio
+    async def test_enqueue_and_claim(self, queue):
+        """Test that an enqueued job is claimed with its payload"""
+        job, created = await queue.enqueue(1, "1:abc", {"file_id": "abc"})
+        assert created is True
+
+        claimed = await queue.claim()
+        assert claimed["id"] == job["id"]
+        assert claimed["status"] == "running"
+        assert claimed["attempts"] == 1
+        assert claimed["payload"] == {"file_id": "abc"}
+        assert await queue.claim() is None
+
+    @pytest.mark.asyncio
+    async def test_duplicate_active_job_not_enqueued(self, queue):
+        """Test idempotency key deduplication of active jobs"""
+        first, _ = await queue.enqueue(1, "1:abc", {})
+        second, created = await queue.enqueue(1, "1:abc", {})
+
+        assert created is False
+        assert second["id"] == first["id"]
+
+    @pytest.mark.asyncio
+    async def test_same_key_allowed_after_completion(self, queue):
+        """Test that a finished job does not block a new one with the same key"""
+        await queue.enqueue(1, "1:abc", {})
+        job = await queue.claim()
+        await queue.complete(job["id"])
+
+        _, created = await queue.enqueue(1, "1:abc", {})
+        assert created is True
+        assert await queue.get_active("1:abc") is not None
+
+    @pytest.mark.asyncio
+    async def test_per_user_ordering(self, queue):
+        """Test that a user's second job waits for the first, other users don't"""
+        user1_first, _ = await queue.enqueue(1, "1:a", {})
+        await queue.enqueue(1, "1:b", {})
+        user2_job, _ = await queue.enqueue(2, "2:a", {})
+
+        first = await queue.claim()
+        second = await queue.claim()
+        assert first["id"] == user1_first["id"]
+        assert second["id"] == user2_job["id"]
+        assert await queue.claim() is None
+
+        await queue.complete(first["id"])
+        third = await queue.claim()
+        assert third["idempotency_key"] == "1:b"
+
+    @pytest.mark.asyncio
+    async def test_retry_then_fail(self, queue):
+        """Test retries up to max_attempts, then permanent failure"""
+        await queue.enqueue(1, "1:a", {})
+        for attempt in range(1, 3):
+            job = await queue.claim()
+            assert job["attempts"] == attempt
+            assert await queue.retry_or_fail(job, "boom") is True
+
+        job = await queue.claim()
+        assert await queue.retry_or_fail(job, "boom") is False
+        stats = await queue.stats()
+        assert stats["failed"] == 1
+        assert stats["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_backoff_delays_retry(self, tmp_path):
+        """Test that a retried job is not claimable before its backoff expires"""
+        queue = JobQueue(str(tmp_path / "jobs.db"), backoff_base=60)
+        await queue.enqueue(1, "1:a", {})
+        job = await queue.claim()
+        await queue.retry_or_fail(job, "boom")
+
+        assert await queue.claim() is None
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_fails_immediately(self, queue):
+        """Test that retryable=False skips remaining attempts"""
+        await queue.enqueue(1, "1:a", {})
+        job = await queue.claim()
+        assert await queue.retry_or_fail(job, "bad input", retryable=False) is False
+        assert (await queue.stats())["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_requeue_running_after_crash(self, tmp_path):
+        """Test that jobs left running by a crashed process are picked up again"""
+        path = str(tmp_path / "jobs.db")
+        crashed = JobQueue(path)
+        await crashed.enqueue(1, "1:a", {})
+        await crashed.claim()
+
+        restarted = JobQueue(path)
+        assert await restarted.requeue_running() == 1
+        job = await restarted.claim()
+        assert job["attempts"] == 2
+
+    @pytest.mark.asyncio
+    async def test_update_payload_survives_retry(self, queue):
+        """Test that fields recorded by a handler are in the payload of the retried job"""
+        await queue.enqueue(1, "1:abc", {"file_id": "abc"})
+        job = await queue.claim()
+        await queue.update_payload(job, r2_key="blobs/ab/abc.jpg", charged=True)
+        assert job["payload"]["charged"] is True
+
+        await queue.retry_or_fail(job, "timeout")
+        retried = await queue.claim()
+        assert retried["payload"] == {"file_id": "abc", "r2_key": "blobs/ab/abc.jpg", "charged": True}
+
+
+class TestJobWorkerPool:
+    """Test suite for background workers"""
+
+    @pytest.mark.asyncio
+    async def test_workers_process_jobs(self, queue):
+        """Test that workers run the handler and complete jobs"""
+        processed = []
+
+        async def handler(job):
+            processed.append(job["payload"]["n"])
+
+        for n in range(5):
+            await queue.enqueue(n, f"{n}:a", {"n": n})
+
+        pool = JobWorkerPool(queue, handler, concurrency=2, poll_interval=0.01)
+        await pool.start()
+        for _ in range(100):
+            if len(processed) == 5:
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+
+        assert sorted(processed) == [0, 1, 2, 3, 4]
+        assert (await queue.stats())["done"] == 5
+
+    @pytest.mark.asyncio
+    async def test_failure_callback_after_retries(self, queue):
+        """Test that on_failure is called once when retries are exhausted"""
+        failures = []
+
+        async def handler(job):
+            raise RuntimeError("ml down")
+
+        async def on_failure(job, error):
+            failures.append(error)
+
+        await queue.enqueue(1, "1:a", {})
+        pool = JobWorkerPool(queue, handler, on_failure, concurrency=1, poll_interval=0.01)
+        await pool.start()
+        for _ in range(100):
+            if failures:
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+
+        assert failures == ["RuntimeError: ml down"]
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error_fails_on_first_attempt(self, queue):
+        """Test that NonRetryableJobError is not retried"""
+        attempts = []
+
+        async def handler(job):
+            attempts.append(job["attempts"])
+            raise NonRetryableJobError("bad photo")
+
+        await queue.enqueue(1, "1:a", {})
+        pool = JobWorkerPool(queue, handler, concurrency=1, poll_interval=0.01)
+        await pool.start()
+        await asyncio.sleep(0.1)
+        await pool.stop()
+
+        assert attempts == [1]
@@ -19,6 +19,7 @@ from handlers.nutrition import (
     generate_nutrition_insights,
     get_goal_specific_advice,
     weekly_report_command,
+    weekly_report_callback,
     water_tracker_command,
     sanitize_markdown_text
 )
@@ -564,6 +565,37 @@ class TestWeeklyReport:
                     assert "📊 **Weekly Report**" in call_args
                     assert "Week of:" in call_args
 
+    @pytest.mark.asyncio
+    async def test_weekly_report_button_matches_command(self):
+        """Test that the main menu button sends the same report as /report"""
+        from datetime import date
+        rows = [{'day': date.today().isoformat(), 'meals': 2, 'calories': 1800,
+                 'protein': 90, 'fats': 60, 'carbs': 200}]
+        user_data = {
+            'user': {'id': 'user-uuid', 'credits_remaining': 10, 'language': 'en'},
+            'profile': {'daily_calories_target': 2000, 'goal': 'maintain_weight'},
+            'has_profile': True
+        }
+        message = Mock()
+        message.from_user.id = 123456789
+        message.answer = AsyncMock()
+        callback = Mock()
+        callback.from_user = message.from_user
+        callback.answer = AsyncMock()
+        callback.message.answer = AsyncMock()
+
+        with patch('handlers.nutrition.get_user_with_profile', AsyncMock(return_value=user_data)), \
+             patch('handlers.nutrition.log_user_action', AsyncMock()), \
+             patch('handlers.nutrition.get_nutrition_daily_totals', AsyncMock(return_value=rows)), \
+             patch('handlers.nutrition.send_weekly_chart', AsyncMock()) as mock_chart:
+            await weekly_report_command(message)
+            await weekly_report_callback(callback)
+
+        callback.answer.assert_awaited_once()
+        assert callback.message.answer.call_args == message.answer.call_args
+        assert "1800" in message.answer.call_args[0][0]
+        assert mock_chart.await_args_list[1].args[0] is callback.message
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"]) 
\ No newline at end of file
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Equivalence tests of common/nutrition_batch.py against the scalar nutrition functions
+"""
+
+import random
+import pytest
+import sys
+import os
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from common.nutrition_batch import (
+    compute_profile_metrics, profiles_to_columns, encode, BMI_CATEGORIES, ACTIVITY_LEVELS, GOALS, UNKNOWN
+)
+from common.nutrition_calculations import (
+    calculate_bmi, calculate_water_needs, calculate_metabolic_age, calculate_macro_distribution
+)
+from common.supabase_client import calculate_daily_calories
+
+
+def random_profiles(count, seed=7):
+    rng = random.Random(seed)
+    return [{
+        "age": rng.randint(14, 90),
+        "gender": rng.choice(["male", "female", "Male"]),
+        "height_cm": round(rng.uniform(140, 210), 1),
+        "weight_kg": round(rng.uniform(35, 180), 1),
+        "activity_level": rng.choice(ACTIVITY_LEVELS),
+        "goal": rng.choice(GOALS),
+    } for _ in range(count)]
+
+
+class TestNutritionBatch:
+    """Test suite comparing batch metrics with the scalar functions"""
+
+    def test_matches_scalar_functions(self):
+        """Test that every metric equals the scalar result for random profiles"""
+        profiles = random_profiles(3000)
+        metrics = compute_profile_metrics(**profiles_to_columns(profiles))
+
+        for i, profile in enumerate(profiles):
+            calories = calculate_daily_calories(profile)
+            bmi = calculate_bmi(profile["weight_kg"], profile["height_cm"])
+            macros = calculate_macro_distribution(calories, profile["goal"])
+            metabolic = calculate_metabolic_age(profile["age"], profile["gender"], profile["weight_kg"],
+                                                profile["height_cm"], profile["activity_level"])
+
+            assert metrics["daily_calories"][i] == calories
+            assert round(metrics["bmi"][i], 1) == bmi["bmi"]
+            assert BMI_CATEGORIES[metrics["bmi_category"][i]] == bmi["category"]
+            assert metrics["water_ml"][i] == calculate_water_needs(profile["weight_kg"], profile["activity_level"])["total_ml"]
+            assert metrics["metabolic_age"][i] == metabolic["metabolic_age"]
+            assert metrics["protein_g"][i] == macros["protein"]["grams"]
+            assert metrics["fat_g"][i] == macros["fat"]["grams"]
+            assert metrics["carbs_g"][i] == macros["carbs"]["grams"]
+
+    def test_invalid_profiles(self):
+        """Test that profiles rejected by calculate_daily_calories get NaN calories"""
+        valid = random_profiles(1)[0]
+        invalid = [
+            {**valid, "gender": "other"},
+            {**valid, "activity_level": "couch"},
+            {**valid, "goal": "bulk"},
+            {**valid, "age": None},
+        ]
+        for profile in invalid:
+            with pytest.raises(ValueError):
+                calculate_daily_calories(profile)
+
+        metrics = compute_profile_metrics(**profiles_to_columns([valid] + invalid))
+
+        assert not np.isnan(metrics["daily_calories"][0])
+        assert np.isnan(metrics["daily_calories"][1:]).all()
+
+    def test_bmi_boundaries_and_invalid_height(self):
+        """Test BMI category boundaries and zero height like calculate_bmi()"""
+        heights = np.array([100.0, 100.0, 100.0, 100.0, 0.0])
+        weights = np.array([18.4, 18.5, 25.0, 30.0, 70.0])
+        codes = encode(["male"] * 5, ["male", "female"])
+        metrics = compute_profile_metrics(np.full(5, 30.0), codes, heights, weights,
+                                          np.zeros(5, dtype=np.int8), np.zeros(5, dtype=np.int8))
+
+        expected = [calculate_bmi(w, h)["category"] for w, h in zip(weights, heights)]
+        assert expected == ["underweight", "normal", "overweight", "obese", "unknown"]
+        assert list(metrics["bmi_category"]) == [0, 1, 2, 3, UNKNOWN]
+        assert metrics["bmi"][4] == 0.0
+
+    def test_encode(self):
+        """Test that encoding is case-insensitive and marks unknown values"""
+        assert list(encode(["female", "MALE", "x", "female"], ["male", "female"])) == [1, 0, UNKNOWN, 1]
+        assert encode([], ["male"]).size == 0
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Unit tests for precomputed profile insights and the rendered insights cache
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'api.c0r.ai')))
+
+from common.nutrition_calculations import (
+    compute_profile_insights, get_profile_insights, INSIGHTS_VERSION,
+    calculate_bmi, calculate_ideal_weight, calculate_water_needs, calculate_macro_distribution,
+    calculate_metabolic_age, calculate_meal_portions
+)
+from common.render_cache import RenderCache
+from app.handlers import nutrition
+
+
+PROFILE = {
+    'age': 30,
+    'gender': 'male',
+    'weight_kg': 75.0,
+    'height_cm': 180.0,
+    'activity_level': 'moderately_active',
+    'goal': 'lose_weight',
+    'daily_calories_target': 2000,
+}
+
+
+class TestProfileInsights:
+    """Test suite for insights stored with the profile"""
+
+    def test_matches_calculations(self):
+        """Test that precomputed insights equal the individual calculations"""
+        insights = compute_profile_insights(PROFILE)
+
+        bmi = calculate_bmi(75.0, 180.0)
+        assert insights['version'] == INSIGHTS_VERSION
+        assert insights['bmi'] == {'bmi': bmi['bmi'], 'category': bmi['category'], 'emoji': bmi['emoji']}
+        assert insights['ideal_weight'] == calculate_ideal_weight(180.0, 'male')
+        assert insights['water_needs'] == calculate_water_needs(75.0, 'moderately_active')
+        assert insights['macro_distribution'] == calculate_macro_distribution(2000, 'lose_weight')
+        metabolic = calculate_metabolic_age(30, 'male', 75.0, 180.0, 'moderately_active')
+        assert insights['metabolic_age']['metabolic_age'] == metabolic['metabolic_age']
+        assert [meal['calories'] for meal in insights['meal_portions']] == [500, 800, 700]
+        assert insights['meal_portions'] == [
+            {'meal': meal['meal'], 'calories': meal['calories'], 'percentage': meal['percentage']}
+            for meal in calculate_meal_portions(2000, 3)['meals']
+        ]
+
+    def test_incomplete_profile(self):
+        """Test that sections missing their inputs are left out"""
+        insights = compute_profile_insights({'weight_kg': 70})
+
+        assert set(insights) == {'version', 'water_needs'}
+
+    def test_stored_insights_reused_only_for_current_version(self):
+        """Test that stored insights are used as-is and recomputed when stale"""
+        stored = {'version': INSIGHTS_VERSION, 'water_needs': {'liters': 9.9}}
+        assert get_profile_insights({**PROFILE, 'insights': stored}) is stored
+
+        stale = {'version': INSIGHTS_VERSION - 1, 'water_needs': {'liters': 9.9}}
+        assert get_profile_insights({**PROFILE, 'insights': stale}) == compute_profile_insights(PROFILE)
+
+
+class TestRenderCache:
+    """Test suite for the rendered text LRU"""
+
+    def test_hit_and_eviction(self):
+        """Test that texts are rendered once per key and the oldest key is evicted"""
+        cache = RenderCache(max_entries=2)
+        render = Mock(side_effect=lambda: "text")
+
+        cache.get_or_render("a", render)
+        cache.get_or_render("a", render)
+        cache.get_or_render("b", render)
+        cache.get_or_render("c", render)
+
+        assert render.call_count == 3
+        assert cache.get("a") is None
+        assert cache.stats()["entries"] == 2
+
+    def test_key_none_not_cached(self):
+        """Test that a None key always renders"""
+        cache = RenderCache()
+        render = Mock(return_value="text")
+
+        cache.get_or_render(None, render)
+        cache.get_or_render(None, render)
+
+        assert render.call_count == 2
+        assert cache.stats()["entries"] == 0
+
+    @pytest.mark.asyncio
+    async def test_section_cached_per_profile_version(self):
+        """Test that a section is rendered once per profile version"""
+        user = {'id': 'user-uuid', 'language': 'en'}
+        profile = {**PROFILE, 'profile_version': 3, 'insights': compute_profile_insights(PROFILE)}
+
+        with patch.object(nutrition, "insights_cache", RenderCache()), \
+                patch.object(nutrition, "get_profile_insights", wraps=get_profile_insights) as insights:
+            first = await nutrition.generate_bmi_section(profile, user)
+            second = await nutrition.generate_bmi_section(profile, user)
+            assert insights.call_count == 1
+
+            await nutrition.generate_bmi_section({**profile, 'profile_version': 4}, user)
+            assert insights.call_count == 2
+
+        assert first == second
+        assert str(profile['insights']['bmi']['bmi']) in first
+
+    @pytest.mark.asyncio
+    async def test_section_of_incomplete_profile(self):
+        """Test that a section without its insights asks to complete the profile"""
+        user = {'id': 'user-uuid', 'language': 'en'}
+        profile = {'weight_kg': 70, 'profile_version': 1}
+
+        with patch.object(nutrition, "insights_cache", RenderCache()):
+            for generate in (nutrition.generate_bmi_section, nutrition.generate_ideal_weight_section,
+                             nutrition.generate_metabolic_age_section, nutrition.generate_macro_distribution_section,
+                             nutrition.generate_meal_distribution_section):
+                assert "complete your profile" in await generate(profile, user)
+            assert "complete your profile" not in await nutrition.generate_water_needs_section(profile, user)
+            assert await nutrition.generate_nutrition_insights(profile, user)
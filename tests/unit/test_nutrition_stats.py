@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for rolling nutrition statistics in common/nutrition_stats.py
+"""
+
+import random
+import statistics
+import pytest
+import sys
+import os
+from datetime import date, timedelta
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from common.nutrition_stats import Welford, compute_rolling_stats, current_streak
+
+TODAY = date(2025, 3, 31)
+
+
+def day_row(days_ago, calories, meals=3):
+    return {
+        "day": (TODAY - timedelta(days=days_ago)).isoformat(),
+        "meals": meals,
+        "calories": calories,
+        "protein": calories * 0.05,
+        "fats": calories * 0.03,
+        "carbs": calories * 0.1,
+    }
+
+
+class TestNutritionStats:
+    """Test suite for rolling per-user statistics"""
+
+    def test_welford_matches_statistics(self):
+        """Test that the running mean and variance equal the two-pass results"""
+        rng = random.Random(3)
+        values = [rng.uniform(800, 3500) for _ in range(500)]
+        acc = Welford()
+        for value in values:
+            acc.add(value)
+
+        assert acc.mean == pytest.approx(statistics.mean(values))
+        assert acc.variance == pytest.approx(statistics.variance(values))
+        assert acc.population_variance == pytest.approx(statistics.pvariance(values))
+
+    def test_windows_from_one_pass(self):
+        """Test that each window only counts days within it"""
+        rows = [day_row(0, 2000), day_row(3, 1800), day_row(10, 2500), day_row(45, 3000), day_row(120, 1000)]
+        stats = compute_rolling_stats(rows, target=2000, today=TODAY)
+
+        assert stats["7d"]["days_logged"] == 2
+        assert stats["7d"]["meals"] == 6
+        assert stats["7d"]["average_calories"] == 1900
+        assert stats["30d"]["days_logged"] == 3
+        assert stats["90d"]["days_logged"] == 4
+        assert stats["90d"]["total_calories"] == 9300
+        assert stats["90d"]["calories_stddev"] == pytest.approx(statistics.stdev([2000, 1800, 2500, 3000]), abs=0.1)
+
+    def test_adherence_and_consistency(self):
+        """Test adherence and consistency against the calorie target"""
+        stats = compute_rolling_stats([day_row(0, 2000), day_row(1, 2150), day_row(2, 2600)], target=2000, today=TODAY)
+
+        week = stats["7d"]
+        assert week["adherence"] == 67
+        rms = (sum((c - 2000) ** 2 for c in (2000, 2150, 2600)) / 3) ** 0.5
+        assert week["consistency_score"] == round(100 - rms / 2000 * 100)
+
+        assert compute_rolling_stats([day_row(0, 2000)], today=TODAY)["7d"]["adherence"] is None
+
+    def test_empty(self):
+        """Test statistics of a user without logged meals"""
+        stats = compute_rolling_stats([], target=2000, today=TODAY)
+
+        assert stats["streak"] == 0
+        assert stats["90d"]["days_logged"] == 0
+        assert stats["90d"]["average_calories"] is None
+
+    def test_streak(self):
+        """Test that the streak may end yesterday but not earlier"""
+        assert current_streak([TODAY, TODAY - timedelta(days=1), TODAY - timedelta(days=3)], TODAY) == 2
+        assert current_streak([TODAY - timedelta(days=1), TODAY - timedelta(days=2)], TODAY) == 2
+        assert current_streak([TODAY - timedelta(days=2)], TODAY) == 0
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Unit tests for payment event claiming in common/supabase_client.py
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from postgrest.exceptions import APIError
+import common.supabase_client as supabase_client
+from common.supabase_client import claim_payment_event, release_payment_event
+
+
+def make_supabase(insert_error=None):
+    """Supabase mock whose processed_payment_events insert fails like PostgREST"""
+    supabase = Mock()
+    table = supabase.table.return_value
+    if insert_error:
+        table.insert.return_value.execute.side_effect = insert_error
+    return supabase
+
+
+class TestPaymentEvents:
+    """Test suite for idempotent payment processing"""
+
+    @pytest.mark.asyncio
+    async def test_claim_new_payment(self):
+        """Test that a new payment is claimed with one insert"""
+        supabase = make_supabase()
+        with patch.object(supabase_client, "supabase", supabase):
+            assert await claim_payment_event("yookassa", "pay-1", "payment.succeeded", user_id=42, credits=100, amount=99.0)
+
+        supabase.table.assert_called_with("processed_payment_events")
+        inserted = supabase.table.return_value.insert.call_args.args[0]
+        assert inserted["provider"] == "yookassa"
+        assert inserted["payment_id"] == "pay-1"
+        assert inserted["user_id"] == "42"
+        assert inserted["credits"] == 100
+
+    @pytest.mark.asyncio
+    async def test_duplicate_payment_is_not_claimed(self):
+        """Test that a retried delivery hits the unique key and is skipped"""
+        error = APIError({"code": "23505", "message": "duplicate key value violates unique constraint"})
+        with patch.object(supabase_client, "supabase", make_supabase(error)):
+            assert not await claim_payment_event("yookassa", "pay-1")
+
+    @pytest.mark.asyncio
+    async def test_other_errors_are_raised(self):
+        """Test that database errors other than duplicates propagate, so the provider retries"""
+        error = APIError({"code": "42P01", "message": "relation does not exist"})
+        with patch.object(supabase_client, "supabase", make_supabase(error)):
+            with pytest.raises(APIError):
+                await claim_payment_event("stripe", "pi_1")
+
+    @pytest.mark.asyncio
+    async def test_release_payment(self):
+        """Test that releasing deletes the claim of exactly this payment"""
+        supabase = make_supabase()
+        with patch.object(supabase_client, "supabase", supabase):
+            await release_payment_event("stripe", "pi_1")
+
+        delete = supabase.table.return_value.delete.return_value
+        delete.eq.assert_called_with("provider", "stripe")
+        delete.eq.return_value.eq.assert_called_with("payment_id", "pi_1")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Unit tests for common/payment_ledger.py
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add project root to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from postgrest.exceptions import APIError
+import common.supabase_client as supabase_client
+from common.payment_ledger import record_payment
+
+
+def make_supabase(result=None, error=None):
+    """Supabase mock whose record_payment RPC returns the result or fails like PostgREST"""
+    supabase = Mock()
+    execute = supabase.rpc.return_value.execute
+    if error:
+        execute.side_effect = error
+    else:
+        execute.return_value = Mock(data=result)
+    return supabase
+
+
+class TestPaymentLedger:
+    """Test suite for the shared payment ledger"""
+
+    @pytest.mark.asyncio
+    async def test_payment_is_one_rpc_call(self):
+        """Test that claim, credits and payment row are sent as a single RPC"""
+        supabase = make_supabase({"status": "processed", "payment_id": "pay-1", "user_id": "u-1", "credits_remaining": 120})
+        with patch.object(supabase_client, "supabase", supabase):
+            result = await record_payment("yookassa", "42", 100, payment_id="pay-1", amount=99.0, event_type="credits.add")
+
+        assert result["credits_remaining"] == 120
+        supabase.rpc.assert_called_once()
+        supabase.table.assert_not_called()
+        name, params = supabase.rpc.call_args.args
+        assert name == "record_payment"
+        assert params["p_provider"] == "yookassa"
+        assert params["p_payment_id"] == "pay-1"
+        assert params["p_telegram_id"] == 42
+        assert params["p_credits"] == 100
+        assert params["p_amount"] == 99.0
+
+    @pytest.mark.asyncio
+    async def test_duplicate_payment(self):
+        """Test that a repeated delivery is reported as duplicate"""
+        supabase = make_supabase({"status": "duplicate", "payment_id": "pi_1", "user_id": "u-1", "credits_remaining": 20})
+        with patch.object(supabase_client, "supabase", supabase):
+            result = await record_payment("stripe", 42, 10, payment_id="pi_1", amount=2.99)
+
+        assert result["status"] == "duplicate"
+
+    @pytest.mark.asyncio
+    async def test_unknown_user(self):
+        """Test that a payment of an unknown user returns None"""
+        error = APIError({"code": "P0002", "message": "User 42 not found"})
+        with patch.object(supabase_client, "supabase", make_supabase(error=error)):
+            assert await record_payment("telegram_payments", 42, 100, payment_id="yk-1") is None
+
+    @pytest.mark.asyncio
+    async def test_other_errors_are_raised(self):
+        """Test that database errors propagate, so the provider retries the payment"""
+        error = APIError({"code": "08006", "message": "connection failure"})
+        with patch.object(supabase_client, "supabase", make_supabase(error=error)):
+            with pytest.raises(APIError):
+                await record_payment("yookassa", 42, 100, payment_id="pay-1")
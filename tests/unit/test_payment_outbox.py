@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Unit tests for pay.c0r.ai/app/payment_outbox.py
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import AsyncMock
+
+# Add project paths (pay service last so its packages do not shadow installed ones)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../pay.c0r.ai/app'))
+
+from payment_outbox import PaymentOutbox, OutboxWorker, NonRetryableDeliveryError
+
+EVENT = {"event": "payment.succeeded", "object": {"id": "pay-1", "status": "succeeded"}}
+GRANT = ("credits.add", {"user_id": "42", "credits_count": 100, "payment_id": "pay-1", "amount": 99.0})
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    # No backoff so retried messages are due again immediately
+    return PaymentOutbox(str(tmp_path / "outbox.db"), max_attempts=3, backoff_base=0, backoff_max=0)
+
+
+class TestPaymentOutbox:
+    """Test suite for the webhook outbox"""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_event_is_stored_once(self, outbox):
+        """Test that a redelivered webhook does not enqueue a second grant"""
+        assert await outbox.record_event("yookassa", "payment.succeeded:pay-1", "payment.succeeded", EVENT, [GRANT])
+        assert not await outbox.record_event("yookassa", "payment.succeeded:pay-1", "payment.succeeded", EVENT, [GRANT])
+
+        stats = await outbox.stats()
+        assert stats["pending"] == 1
+
+    @pytest.mark.asyncio
+    async def test_delivers_message(self, outbox):
+        """Test that the worker hands the payload to the handler and marks it delivered"""
+        handler = AsyncMock()
+        worker = OutboxWorker(outbox, {"credits.add": handler})
+        await outbox.record_event("yookassa", "payment.succeeded:pay-1", "payment.succeeded", EVENT, [GRANT])
+
+        assert await worker.run_once() == 1
+
+        handler.assert_awaited_once_with(GRANT[1])
+        metrics = await worker.metrics()
+        assert metrics["delivered"] == 1
+        assert metrics["pending"] == 0
+        assert metrics["oldest_pending_age_seconds"] == 0
+
+    @pytest.mark.asyncio
+    async def test_retries_then_dead_letters(self, outbox):
+        """Test that a failing delivery is retried and dead-lettered after max attempts"""
+        handler = AsyncMock(side_effect=ConnectionError("api down"))
+        worker = OutboxWorker(outbox, {"credits.add": handler})
+        await outbox.record_event("yookassa", "payment.succeeded:pay-1", "payment.succeeded", EVENT, [GRANT])
+
+        for _ in range(3):
+            assert await worker.run_once() == 1
+        assert await worker.run_once() == 0
+
+        assert handler.await_count == 3
+        metrics = await worker.metrics()
+        assert metrics["retried"] == 2
+        assert metrics["dead_lettered"] == 1
+        dead = await outbox.list_dead()
+        assert dead[0]["payload"] == GRANT[1]
+        assert "api down" in dead[0]["last_error"]
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error_dead_letters_immediately(self, outbox):
+        """Test that a rejected request is not retried"""
+        handler = AsyncMock(side_effect=NonRetryableDeliveryError("400 Bad Request"))
+        worker = OutboxWorker(outbox, {"credits.add": handler})
+        await outbox.record_event("yookassa", "payment.succeeded:pay-1", "payment.succeeded", EVENT, [GRANT])
+
+        await worker.run_once()
+
+        assert handler.await_count == 1
+        assert (await outbox.stats())["dead"] == 1
+
+    @pytest.mark.asyncio
+    async def test_requeue_dead_letters(self, outbox):
+        """Test that dead-lettered messages can be replayed"""
+        handler = AsyncMock(side_effect=[NonRetryableDeliveryError("rejected"), None])
+        worker = OutboxWorker(outbox, {"credits.add": handler})
+        await outbox.record_event("yookassa", "payment.succeeded:pay-1", "payment.succeeded", EVENT, [GRANT])
+        await worker.run_once()
+
+        assert await outbox.requeue_dead() == 1
+        await worker.run_once()
+
+        stats = await outbox.stats()
+        assert stats["dead"] == 0
+        assert stats["delivered"] == 1
+
+    @pytest.mark.asyncio
+    async def test_requeues_interrupted_deliveries(self, outbox):
+        """Test that messages claimed by a crashed worker are delivered after restart"""
+        await outbox.record_event("yookassa", "payment.succeeded:pay-1", "payment.succeeded", EVENT, [GRANT])
+        await outbox.claim_due()
+
+        handler = AsyncMock()
+        worker = OutboxWorker(outbox, {"credits.add": handler})
+        assert await worker.run_once() == 0
+
+        assert await outbox.requeue_delivering() == 1
+        assert await worker.run_once() == 1
+        handler.assert_awaited_once()
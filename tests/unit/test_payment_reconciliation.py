@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Unit tests for common/payment_reconciliation.py
+"""
+
+import io
+import json
+import httpx
+import pytest
+import sys
+import os
+from unittest.mock import AsyncMock
+
+# Add project paths (pay service last so its packages do not shadow installed ones)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../pay.c0r.ai/app'))
+
+from common.payment_reconciliation import reconcile_payments, yookassa_payment_pages
+from yookassa_handlers.client import YooKassaClient
+
+
+def provider_payment(payment_id, amount=99.0, user_id="42", credits=20):
+    return {"provider": "yookassa", "payment_id": payment_id, "user_id": user_id,
+            "credits": credits, "amount": amount, "created_at": None}
+
+
+def row(row_id, payment_id, amount=99.0):
+    return {"id": row_id, "user_id": "u-42", "amount": amount, "gateway": "yookassa", "status": "succeeded",
+            "provider_payment_id": payment_id}
+
+
+async def pages_of(*pages):
+    for page in pages:
+        yield page
+
+
+def make_lookups(rows, claimed):
+    async def get_recorded(ids):
+        lookups.append(len(ids))
+        return [r for r in rows if r["provider_payment_id"] in ids]
+
+    async def get_claimed(ids):
+        return {payment_id for payment_id in claimed if payment_id in ids}
+
+    lookups = []
+    return get_recorded, get_claimed, lookups
+
+
+def read_report(report):
+    return [json.loads(line) for line in report.getvalue().splitlines()]
+
+
+class TestReconcilePayments:
+    """Test suite for payment reconciliation"""
+
+    @pytest.mark.asyncio
+    async def test_diff_report(self):
+        """Test that missing, unlinked, duplicate and mismatched payments are reported"""
+        rows = [row(1, "ok"), row(2, "dup"), row(3, "dup"), row(4, "short", amount=49.0)]
+        get_recorded, get_claimed, lookups = make_lookups(rows, claimed={"ok", "legacy"})
+        report = io.StringIO()
+
+        summary = await reconcile_payments(
+            pages_of([provider_payment("ok"), provider_payment("dup"), provider_payment("gone")],
+                     [provider_payment("short"), provider_payment("legacy")]),
+            get_recorded, get_claimed, report
+        )
+
+        diffs = {diff["payment_id"]: diff for diff in read_report(report)}
+        assert {payment_id: diff["type"] for payment_id, diff in diffs.items()} == {
+            "dup": "duplicate", "gone": "missing", "short": "amount_mismatch", "legacy": "unlinked"
+        }
+        assert diffs["dup"]["rows"] == [2, 3]
+        assert diffs["short"]["recorded_amount"] == 49.0
+        assert summary["checked"] == 5
+        assert summary["missing"] == summary["duplicate"] == summary["amount_mismatch"] == summary["unlinked"] == 1
+        # One bulk lookup per page
+        assert lookups == [3, 2]
+
+    @pytest.mark.asyncio
+    async def test_repair_only_missing_payments(self):
+        """Test that auto-repair grants missing payments and records the outcome"""
+        get_recorded, get_claimed, _ = make_lookups([row(1, "dup"), row(2, "dup")], claimed=set())
+        repair = AsyncMock(side_effect=["ok", ConnectionError("api down")])
+        report = io.StringIO()
+
+        summary = await reconcile_payments(
+            pages_of([provider_payment("gone-1"), provider_payment("dup"), provider_payment("gone-2")]),
+            get_recorded, get_claimed, report, repair=repair
+        )
+
+        assert [call.args[0]["payment_id"] for call in repair.await_args_list] == ["gone-1", "gone-2"]
+        assert summary["repaired"] == 1
+        assert summary["repair_failed"] == 1
+        repairs = {diff["payment_id"]: diff.get("repair") for diff in read_report(report)}
+        assert repairs["gone-1"] == "ok"
+        assert repairs["gone-2"].startswith("failed")
+        assert repairs["dup"] is None
+
+    @pytest.mark.asyncio
+    async def test_yookassa_pages_follow_cursor(self):
+        """Test that YooKassa payment lists are streamed with next_cursor"""
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            cursor = request.url.params.get("cursor")
+            if cursor is None:
+                return httpx.Response(200, json={"items": [
+                    {"id": "p1", "amount": {"value": "99.00"}, "metadata": {"user_id": "42", "credits_count": "20"}}
+                ], "next_cursor": "c2"})
+            return httpx.Response(200, json={"items": [{"id": "p2", "amount": {"value": "10.50"}}]})
+
+        client = YooKassaClient("shop", "secret", base_url="https://yookassa.test/v3", backoff_base=0,
+                                transport=httpx.MockTransport(handler))
+
+        pages = [page async for page in yookassa_payment_pages(client, "2025-01-01T00:00:00Z", page_size=1)]
+
+        assert [[payment["payment_id"] for payment in page] for page in pages] == [["p1"], ["p2"]]
+        assert pages[0][0]["credits"] == 20
+        assert pages[1][0] == {"provider": "yookassa", "payment_id": "p2", "user_id": None,
+                               "credits": 0, "amount": 10.5, "created_at": None}
+        assert requests[0].url.params["status"] == "succeeded"
+        assert requests[0].url.params["limit"] == "1"
+        assert requests[1].url.params["cursor"] == "c2"
+        await client.aclose()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Unit tests for common/pending_invoices.py and invoice reuse in handlers/payments.py
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+from unittest.mock import AsyncMock, Mock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from aiogram.exceptions import TelegramBadRequest
+from common.pending_invoices import PendingInvoiceCache
+import handlers.payments as payments
+
+
+def invoice(payment_id="pay-1"):
+    return {"payment_id": payment_id, "invoice_url": f"https://yoomoney.ru/checkout?orderId={payment_id}"}
+
+
+class TestPendingInvoiceCache:
+    """Test suite for pending invoice reuse"""
+
+    @pytest.mark.asyncio
+    async def test_repeated_taps_reuse_invoice(self):
+        """Test that a second buy tap returns the unpaid invoice of the first one"""
+        cache = PendingInvoiceCache(ttl=60)
+        create = AsyncMock(side_effect=[invoice("pay-1"), invoice("pay-2")])
+
+        first, first_reused = await cache.get_or_create(42, "basic", "yookassa", create)
+        again, again_reused = await cache.get_or_create("42", "basic", "yookassa", create)
+        other_plan, _ = await cache.get_or_create(42, "pro", "yookassa", create)
+
+        assert (first["payment_id"], first_reused) == ("pay-1", False)
+        assert (again["payment_id"], again_reused) == ("pay-1", True)
+        assert other_plan["payment_id"] == "pay-2"
+        assert create.await_count == 2
+        assert cache.stats() == {"pending": 2, "hits": 1, "misses": 2}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_taps_create_once(self):
+        """Test that taps arriving while the invoice is being created share one creation"""
+        cache = PendingInvoiceCache(ttl=60)
+        calls = 0
+
+        async def create():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return invoice()
+
+        results = await asyncio.gather(*[cache.get_or_create(42, "basic", "yookassa", create) for _ in range(10)])
+
+        assert calls == 1
+        assert {result["payment_id"] for result, _ in results} == {"pay-1"}
+        assert [reused for _, reused in results].count(False) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_creation_is_not_cached(self):
+        """Test that a failed creation is retried by the next tap"""
+        cache = PendingInvoiceCache(ttl=60)
+        create = AsyncMock(side_effect=[ConnectionError("timeout"), invoice()])
+
+        with pytest.raises(ConnectionError):
+            await cache.get_or_create(42, "basic", "yookassa", create)
+        result, reused = await cache.get_or_create(42, "basic", "yookassa", create)
+
+        assert result["payment_id"] == "pay-1"
+        assert not reused
+
+    @pytest.mark.asyncio
+    async def test_expired_and_settled_invoices_are_replaced(self):
+        """Test that a new invoice is created after expiry or after payment"""
+        cache = PendingInvoiceCache(ttl=60)
+        create = AsyncMock(side_effect=[invoice("pay-1"), invoice("pay-2"), invoice("pay-3")])
+
+        await cache.get_or_create(42, "basic", "yookassa", create)
+        with patch("common.pending_invoices.time.time", return_value=cache._entries[("42", "basic", "yookassa")][1]):
+            expired, reused = await cache.get_or_create(42, "basic", "yookassa", create)
+        assert (expired["payment_id"], reused) == ("pay-2", False)
+
+        cache.settle(42, "basic", "yookassa")
+        paid_again, reused = await cache.get_or_create(42, "basic", "yookassa", create)
+        assert (paid_again["payment_id"], reused) == ("pay-3", False)
+
+    def test_size_is_bounded(self):
+        """Test that the oldest invoices are forgotten beyond max_entries"""
+        cache = PendingInvoiceCache(ttl=60, max_entries=3)
+        for user in range(5):
+            cache.put(user, "basic", "yookassa", invoice(f"pay-{user}"))
+
+        assert cache.stats()["pending"] == 3
+        assert cache.get(0, "basic", "yookassa") is None
+        assert cache.get(4, "basic", "yookassa")["payment_id"] == "pay-4"
+
+
+class TestInvoiceMessage:
+    """Test suite for reusing Telegram invoice messages in handlers/payments.py"""
+
+    @pytest.fixture(autouse=True)
+    def configured(self):
+        with patch.object(payments, "YOOKASSA_PROVIDER_TOKEN", "provider-token"), \
+             patch.object(payments, "pending_invoices", PendingInvoiceCache(ttl=60)), \
+             patch.object(payments, "get_or_create_user", AsyncMock(return_value={"language": "ru"})):
+            yield
+
+    @staticmethod
+    def message(message_ids):
+        message = Mock()
+        message.answer_invoice = AsyncMock(side_effect=[Mock(message_id=message_id) for message_id in message_ids])
+        message.answer = AsyncMock()
+        return message
+
+    @pytest.mark.asyncio
+    async def test_repeated_tap_replies_to_pending_invoice(self):
+        """Test that a repeated tap answers in the user's language instead of sending another invoice"""
+        message = self.message([10])
+
+        await payments.create_invoice_message(message, "basic", user_id=42)
+        await payments.create_invoice_message(message, "basic", user_id=42)
+
+        message.answer_invoice.assert_awaited_once()
+        text = message.answer.call_args.args[0]
+        assert text == payments.i18n.get_text("payment_invoice_pending", "ru")
+        assert message.answer.call_args.kwargs["reply_to_message_id"] == 10
+
+    @pytest.mark.asyncio
+    async def test_deleted_invoice_is_sent_again(self):
+        """Test that a new invoice is sent when the pending invoice message was deleted"""
+        message = self.message([10, 11])
+        message.answer.side_effect = TelegramBadRequest(Mock(), "Bad Request: message to be replied not found")
+
+        await payments.create_invoice_message(message, "basic", user_id=42)
+        await payments.create_invoice_message(message, "basic", user_id=42)
+
+        assert message.answer_invoice.await_count == 2
+        assert payments.pending_invoices.get(42, "basic", "telegram_payments") == {"message_id": 11}
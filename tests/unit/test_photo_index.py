@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/photo_index.py and R2 photo history
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import utils.r2 as r2
+from utils.photo_index import PhotoIndex
+from utils.storage_stats import StorageStatsStore
+
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 100
+
+
+@pytest.fixture
+def index(tmp_path):
+    return PhotoIndex(str(tmp_path / "photos.db"))
+
+
+@pytest.fixture
+def r2_enabled(index, tmp_path):
+    with patch.object(r2, "R2_ENABLED", True), \
+         patch.object(r2, "R2_BUCKET_NAME", "bucket"), \
+         patch.object(r2, "_r2_client", None), \
+         patch.object(r2, "_signed_url_cache", r2.OrderedDict()), \
+         patch.object(r2, "storage_stats", StorageStatsStore(str(tmp_path / "storage_stats.db"))), \
+         patch.object(r2, "photo_index", index):
+        yield
+
+
+class TestPhotoIndex:
+    """Test suite for keyset-paginated photo index"""
+
+    @pytest.mark.asyncio
+    async def test_pages_newest_first(self, index):
+        """Test that pages follow each other without gaps or repeats"""
+        for i in range(5):
+            await index.add(f"user-a/{i}.jpg", "user-a", 10, "photo_analysis", created_at=1000 + i)
+        await index.add("user-b/0.jpg", "user-b", 10, created_at=2000)
+
+        first = await index.list_user_photos("user-a", limit=2)
+        second = await index.list_user_photos("user-a", limit=2, before=first[-1]["cursor"])
+        third = await index.list_user_photos("user-a", limit=2, before=second[-1]["cursor"])
+
+        keys = [photo["key"] for photo in first + second + third]
+        assert keys == [f"user-a/{i}.jpg" for i in (4, 3, 2, 1, 0)]
+
+    @pytest.mark.asyncio
+    async def test_same_timestamp(self, index):
+        """Test that photos with equal timestamps are paginated by key"""
+        for key in ("a", "b", "c"):
+            await index.add(key, "user-a", 10, created_at=1000)
+
+        first = await index.list_user_photos("user-a", limit=2)
+        second = await index.list_user_photos("user-a", limit=2, before=first[-1]["cursor"])
+
+        assert [photo["key"] for photo in first + second] == ["c", "b", "a"]
+
+    @pytest.mark.asyncio
+    async def test_blob_refcount(self, index):
+        """Test that a stored object is orphaned only when its last photo is removed"""
+        first = await index.add("blobs/ab/abc.jpg", "user-a", 10, sha256="abc")
+        second = await index.add("blobs/ab/abc.jpg", "user-b", 10, sha256="abc")
+        assert (await index.get_blob("abc"))["refcount"] == 2
+
+        assert await index.remove(first) is None
+        assert (await index.get_blob("abc"))["refcount"] == 1
+        orphan = await index.remove(second)
+        assert orphan["key"] == "blobs/ab/abc.jpg"
+        assert await index.get_blob("abc") is None
+
+    @pytest.mark.asyncio
+    async def test_shared_content_inherits_derivatives(self, index):
+        """Test that a repeated upload reuses derivatives of the stored object"""
+        await index.add("blobs/ab/abc.jpg", "user-a", 10, sha256="abc")
+        await index.set_derivatives("blobs/ab/abc.jpg", "blobs/ab/abc.thumb.webp", "blobs/ab/abc.preview.webp")
+        await index.add("blobs/ab/abc.jpg", "user-b", 10, sha256="abc")
+
+        photos = await index.list_user_photos("user-b")
+        assert photos[0]["thumb_key"] == "blobs/ab/abc.thumb.webp"
+
+    @pytest.mark.asyncio
+    async def test_add_missing_keeps_existing(self, index):
+        """Test that backfill does not overwrite indexed photos"""
+        await index.add("user-a/1.jpg", "user-a", 10, "recipe_generation", created_at=1000)
+
+        added = await index.add_missing([
+            ("user-a/1.jpg", "user-a", 10, None, 999),
+            ("user-a/2.jpg", "user-a", 20, None, 1001),
+        ])
+
+        assert added == 1
+        photos = await index.list_user_photos("user-a")
+        assert [(p["key"], p["action_type"]) for p in photos] == [
+            ("user-a/2.jpg", None), ("user-a/1.jpg", "recipe_generation")
+        ]
+
+
+class TestUserPhotos:
+    """Test suite for photo history served from the index"""
+
+    @pytest.mark.asyncio
+    async def test_duplicate_content_skips_upload(self, r2_enabled):
+        """Test that the same image sent twice (even by different users) is stored once"""
+        client = Mock()
+        with patch.object(r2.boto3, "client", return_value=client):
+            first = await r2.store_photo_in_r2(JPEG, "user-1234567890")
+            second = await r2.store_photo_in_r2(JPEG, "user-0987654321", action_type="recipe_generation")
+            other = await r2.store_photo_in_r2(JPEG + b"\x01", "user-1234567890")
+
+        assert first == second != other
+        assert client.put_object.call_count == 2
+        assert len(await r2.get_user_photos("user-0987654321")) == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_keeps_shared_content(self, r2_enabled, index):
+        """Test that deleting one user's photo keeps content still used by another"""
+        client = Mock()
+        with patch.object(r2.boto3, "client", return_value=client):
+            await r2.store_photo_in_r2(JPEG, "user-1234567890")
+            await r2.store_photo_in_r2(JPEG, "user-0987654321")
+            first, = await index.list_user_photos("user-1234567890")
+            second, = await index.list_user_photos("user-0987654321")
+
+            assert await r2.delete_photo(first["id"]) is False
+            client.delete_object.assert_not_called()
+            assert await r2.delete_photo(second["id"]) is True
+
+        client.delete_object.assert_called_once_with(Bucket="bucket", Key=second["key"])
+
+    @pytest.mark.asyncio
+    async def test_history_without_listing_and_cached_urls(self, r2_enabled):
+        """Test that photo history never lists the bucket and presigns each photo once"""
+        client = Mock()
+        client.generate_presigned_url.side_effect = lambda *args, **kwargs: f"https://signed/{kwargs['Params']['Key']}"
+        with patch.object(r2.boto3, "client", return_value=client):
+            key = await r2.store_photo_in_r2(JPEG, "user-1234567890", action_type="recipe_generation")
+            first = await r2.get_user_photos("user-1234567890")
+            second = await r2.get_user_photos("user-1234567890")
+
+        client.list_objects_v2.assert_not_called()
+        assert client.generate_presigned_url.call_count == 1
+        assert first == second
+        assert first[0]["filename"] == key
+        assert first[0]["action_type"] == "recipe_generation"
+        assert first[0]["url"] == f"https://signed/{key}"
+
+    def test_signed_url_refreshed_before_expiry(self, r2_enabled):
+        """Test that a cached URL close to expiry is regenerated"""
+        client = Mock()
+        client.generate_presigned_url.side_effect = ["https://signed/1", "https://signed/2"]
+        with patch.object(r2.boto3, "client", return_value=client), \
+             patch.object(r2.time, "time", return_value=1000):
+            assert r2.get_cached_signed_url("k", expires_in=7200) == "https://signed/1"
+        with patch.object(r2.boto3, "client", return_value=client), \
+             patch.object(r2.time, "time", return_value=1000 + 7200 - r2.SIGNED_URL_REFRESH_MARGIN + 1):
+            assert r2.get_cached_signed_url("k", expires_in=7200) == "https://signed/2"
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/photo_recompression.py
+"""
+
+import pytest
+import sys
+import os
+import time
+from unittest.mock import AsyncMock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import utils.r2 as r2
+import utils.photo_recompression as recompression
+from utils.photo_index import PhotoIndex
+from utils.photo_recompression import RecompressionStore, run_recompression
+from utils.storage import LocalStorageBackend
+from utils.storage_stats import StorageStatsStore
+
+OLD = time.time() - 200 * 86400
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalStorageBackend(str(tmp_path / "storage"), base_url="http://testserver", secret="secret")
+
+
+@pytest.fixture
+def index(tmp_path):
+    return PhotoIndex(str(tmp_path / "photos.db"))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RecompressionStore(str(tmp_path / "recompression.db"))
+
+
+@pytest.fixture
+def pipeline(storage, index):
+    # Recompression shrinks every image to a quarter of its size
+    async def fake_recompress(data, quality, max_side=None):
+        return b"W" * (len(data) // 4)
+
+    with patch.object(r2, "STORAGE_BACKEND", "local"), \
+         patch.object(r2, "_storage_backend", storage), \
+         patch.object(r2, "_signed_url_cache", r2.OrderedDict()), \
+         patch.object(r2, "photo_index", index), \
+         patch.object(recompression, "derivatives_enabled", return_value=True), \
+         patch.object(recompression, "recompress", AsyncMock(side_effect=fake_recompress)) as mock_recompress:
+        yield mock_recompress
+
+
+async def add_photo(storage, index, key, size, created_at, user_id="user-1"):
+    await storage.put(key, b"J" * size, "image/jpeg")
+    await index.add(key, user_id, size, "analysis", created_at=created_at, sha256=key.split("/")[-1].split(".")[0])
+
+
+class TestPhotoRecompression:
+    """Test suite for the cold storage recompression job"""
+
+    @pytest.mark.asyncio
+    async def test_recompresses_old_photos_only(self, pipeline, storage, index, store):
+        """Test that old photos are replaced by WebP copies and recent ones are left alone"""
+        await add_photo(storage, index, "blobs/aa/aaa.jpg", 1000, OLD)
+        await add_photo(storage, index, "blobs/bb/bbb.jpg", 1000, time.time())
+
+        report = await run_recompression(store, older_than_days=90, quality=60, delete_originals=True)
+
+        assert report["status"] == "done"
+        assert report["recompressed"] == 1
+        assert report["bytes_before"] == 1000
+        assert report["bytes_after"] == 250
+        assert report["bytes_reclaimed"] == 750
+        assert await storage.get("blobs/aa/aaa.webp") == b"W" * 250
+        assert not os.path.exists(storage.path_for("blobs/aa/aaa.jpg"))
+        assert os.path.exists(storage.path_for("blobs/bb/bbb.jpg"))
+
+        photos = await index.list_user_photos("user-1")
+        assert sorted((photo["key"], photo["size"]) for photo in photos) == [
+            ("blobs/aa/aaa.webp", 250), ("blobs/bb/bbb.jpg", 1000)
+        ]
+        assert (await index.get_blob("aaa"))["key"] == "blobs/aa/aaa.webp"
+        assert pipeline.await_args.args[1] == 60
+
+    @pytest.mark.asyncio
+    async def test_keeps_originals_by_default(self, pipeline, storage, index, store):
+        """Test that originals are kept unless deletion is requested"""
+        await add_photo(storage, index, "blobs/aa/aaa.jpg", 1000, OLD)
+
+        report = await run_recompression(store, older_than_days=90, delete_originals=False)
+
+        assert report["recompressed"] == 1
+        assert report["bytes_reclaimed"] == 0
+        assert os.path.exists(storage.path_for("blobs/aa/aaa.jpg"))
+
+    @pytest.mark.asyncio
+    async def test_skips_when_not_smaller(self, pipeline, storage, index, store):
+        """Test that objects recompression would not shrink are left untouched"""
+        await add_photo(storage, index, "blobs/aa/aaa.jpg", 1000, OLD)
+        pipeline.side_effect = None
+        pipeline.return_value = b"W" * 950
+
+        report = await run_recompression(store, older_than_days=90, delete_originals=True)
+
+        assert report["skipped"] == 1
+        assert report["recompressed"] == 0
+        assert (await index.list_user_photos("user-1"))[0]["key"] == "blobs/aa/aaa.jpg"
+
+    @pytest.mark.asyncio
+    async def test_counts_failures(self, pipeline, storage, index, store):
+        """Test that a missing object is counted as failed without stopping the run"""
+        await add_photo(storage, index, "blobs/aa/aaa.jpg", 1000, OLD)
+        await add_photo(storage, index, "blobs/bb/bbb.jpg", 1000, OLD)
+        await storage.delete("blobs/aa/aaa.jpg")
+
+        report = await run_recompression(store, older_than_days=90, delete_originals=True)
+
+        assert report["status"] == "done"
+        assert report["failed"] == 1
+        assert report["recompressed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_resumes_from_checkpoint(self, pipeline, storage, index, store):
+        """Test that an unfinished run continues after its last checkpoint"""
+        for name in ("aaa", "bbb", "ccc"):
+            await add_photo(storage, index, f"blobs/{name[:2]}/{name}.jpg", 1000, OLD)
+        run = await store.create({
+            "older_than_days": 90, "quality": 70, "delete_originals": True, "max_side": None,
+            "created_before": time.time() - 90 * 86400,
+        })
+        counters = dict.fromkeys(recompression.COUNTERS, 0)
+        await store.checkpoint(run["id"], "blobs/bb/bbb.jpg", dict(counters, processed=2))
+
+        report = await run_recompression(store, batch_size=1)
+
+        assert report["id"] == run["id"]
+        assert report["processed"] == 3
+        assert report["recompressed"] == 1
+        assert pipeline.await_count == 1
+        assert os.path.exists(storage.path_for("blobs/aa/aaa.jpg"))
+        assert os.path.exists(storage.path_for("blobs/cc/ccc.webp"))
+
+    @pytest.mark.asyncio
+    async def test_kept_original_not_indexed_again(self, pipeline, storage, index, store, tmp_path):
+        """Test that a rescan after recompression does not count the kept original as another photo"""
+        legacy_key = "user-1/2025/01/20/analysis/photo.jpg"
+        await add_photo(storage, index, legacy_key, 1000, OLD)
+        await add_photo(storage, index, "blobs/bb/bbb.jpg", 1000, OLD)
+
+        with patch.object(r2, "storage_stats", StorageStatsStore(str(tmp_path / "storage_stats.db"))):
+            assert (await r2.rescan_photo_stats())["total_photos"] == 2
+            await run_recompression(store, older_than_days=90, delete_originals=False)
+            stats = await r2.rescan_photo_stats()
+
+        assert stats["total_photos"] == 2
+        photos = await index.list_user_photos("user-1")
+        assert sorted(photo["key"] for photo in photos) == [
+            "blobs/bb/bbb.webp", "user-1/2025/01/20/analysis/photo.webp"
+        ]
+        assert await index.list_cold_objects(time.time(), "", 10) == []
+
+        # Deleting the photo deletes the kept original with its replacement
+        photo = next(photo for photo in photos if photo["key"].startswith("user-1/"))
+        assert await r2.delete_photo(photo["id"]) is True
+        assert not os.path.exists(storage.path_for(legacy_key))
+        assert not os.path.exists(storage.path_for("user-1/2025/01/20/analysis/photo.webp"))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared R2 client in utils/r2.py and utils/metrics.py
+"""
+
+import pytest
+import sys
+import os
+import threading
+from unittest.mock import Mock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import utils.r2 as r2
+from utils.metrics import LatencyHistogram
+from utils.storage_stats import StorageStatsStore
+from utils.photo_index import PhotoIndex
+
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 100
+
+
+@pytest.fixture
+def r2_enabled(tmp_path):
+    with patch.object(r2, "R2_ENABLED", True), \
+         patch.object(r2, "R2_BUCKET_NAME", "bucket"), \
+         patch.object(r2, "_r2_client", None), \
+         patch.object(r2, "storage_stats", StorageStatsStore(str(tmp_path / "storage_stats.db"))), \
+         patch.object(r2, "photo_index", PhotoIndex(str(tmp_path / "photos.db"))):
+        yield
+
+
+class TestR2Client:
+    """Test suite for R2 client reuse and non-blocking calls"""
+
+    def test_client_created_once(self, r2_enabled):
+        """Test that all calls share one lazily created client"""
+        with patch.object(r2.boto3, "client", return_value=Mock()) as create:
+            first = r2.get_r2_client()
+            second = r2.get_r2_client()
+
+        assert first is second
+        create.assert_called_once()
+        assert create.call_args.kwargs["config"].max_pool_connections == r2.R2_MAX_POOL_CONNECTIONS
+
+    def test_client_requires_configuration(self):
+        """Test that the client is not created without R2 credentials"""
+        with patch.object(r2, "R2_ENABLED", False):
+            with pytest.raises(Exception):
+                r2.get_r2_client()
+
+    @pytest.mark.asyncio
+    async def test_upload_runs_off_event_loop(self, r2_enabled):
+        """Test that put_object runs in the R2 thread pool and its latency is recorded"""
+        threads = []
+        client = Mock()
+        client.put_object.side_effect = lambda **kwargs: threads.append(threading.current_thread().name)
+        uploads_before = r2.r2_upload_latency.snapshot()["count"]
+
+        with patch.object(r2.boto3, "client", return_value=client):
+            key = await r2.store_photo_in_r2(JPEG, "user-1234567890")
+
+        assert key.startswith("blobs/")
+        assert client.put_object.call_args.kwargs["Key"] == key
+        assert threads and threads[0].startswith("r2")
+        assert r2.r2_upload_latency.snapshot()["count"] == uploads_before + 1
+
+    @pytest.mark.asyncio
+    async def test_list_runs_off_event_loop(self, r2_enabled):
+        """Test that bucket listing goes through the R2 thread pool"""
+        threads = []
+        client = Mock()
+
+        def list_objects_v2(**kwargs):
+            threads.append(threading.current_thread().name)
+            return {}
+
+        client.list_objects_v2.side_effect = list_objects_v2
+        with patch.object(r2.boto3, "client", return_value=client):
+            assert [obj async for obj in r2.list_all_objects()] == []
+
+        assert threads and threads[0].startswith("r2")
+
+
+class TestLatencyHistogram:
+    """Test suite for fixed-bucket latency histogram"""
+
+    def test_buckets_and_percentiles(self):
+        """Test that observations land in the right buckets"""
+        histogram = LatencyHistogram(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.05, 0.05, 0.5, 3.0):
+            histogram.observe(seconds)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 5
+        assert snapshot["buckets"] == {"le_0.1": 3, "le_1.0": 1, "le_inf": 1}
+        assert snapshot["p50_seconds"] == 0.1
+        assert snapshot["p99_seconds"] == 3.0
+        assert snapshot["max_seconds"] == 3.0
+
+    def test_empty(self):
+        """Test that an empty histogram reports zeros"""
+        snapshot = LatencyHistogram().snapshot()
+        assert snapshot["count"] == 0
+        assert snapshot["p95_seconds"] == 0.0
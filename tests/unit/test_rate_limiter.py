@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/rate_limiter.py - GCRA anti-spam rate limiter
+"""
+
+import pytest
+import sys
+import os
+from unittest.mock import patch, AsyncMock
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from utils.rate_limiter import RateLimiter, MemoryRateLimitBackend, create_rate_limiter
+
+LIMITS = {
+    "general": {"limit": 20, "period": 60},
+    "photo": {"limit": 5, "period": 60},
+    "payment": {"limit": 5, "period": 60},
+}
+
+
+class FakeClock:
+    """Controllable replacement for time.monotonic"""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch('utils.rate_limiter.time.monotonic', fake):
+        yield fake
+
+
+class TestRateLimiter:
+    """Test suite for per-action rate limits"""
+
+    @pytest.mark.asyncio
+    async def test_photo_burst_allowed_then_limited(self, clock):
+        """Test that 5 photos pass and the 6th waits one refill interval"""
+        limiter = RateLimiter(LIMITS)
+
+        for _ in range(5):
+            assert await limiter.check(1, "photo") == 0
+
+        assert await limiter.check(1, "photo") == 12
+
+    @pytest.mark.asyncio
+    async def test_refill_after_interval(self, clock):
+        """Test that one request becomes available after period / limit seconds"""
+        limiter = RateLimiter(LIMITS)
+        for _ in range(5):
+            await limiter.check(1, "photo")
+
+        clock.now += 12
+        assert await limiter.check(1, "photo") == 0
+        assert await limiter.check(1, "photo") > 0
+
+    @pytest.mark.asyncio
+    async def test_limited_requests_do_not_consume_quota(self, clock):
+        """Test that rejected requests do not push the retry time further"""
+        limiter = RateLimiter(LIMITS)
+        for _ in range(5):
+            await limiter.check(1, "photo")
+
+        first = await limiter.check(1, "photo")
+        second = await limiter.check(1, "photo")
+        assert first == second == 12
+
+    @pytest.mark.asyncio
+    async def test_actions_and_users_are_independent(self, clock):
+        """Test that limits are tracked per user and per action type"""
+        limiter = RateLimiter(LIMITS)
+        for _ in range(5):
+            await limiter.check(1, "photo")
+
+        assert await limiter.check(1, "photo") > 0
+        assert await limiter.check(1, "general") == 0
+        assert await limiter.check(1, "payment") == 0
+        assert await limiter.check(2, "photo") == 0
+
+    @pytest.mark.asyncio
+    async def test_general_limit(self, clock):
+        """Test 20 general requests per minute"""
+        limiter = RateLimiter(LIMITS)
+        for _ in range(20):
+            assert await limiter.check(1) == 0
+        assert await limiter.check(1) == 3
+
+    @pytest.mark.asyncio
+    async def test_unknown_action_uses_general_limit(self, clock):
+        """Test that unknown action types fall back to the general rule"""
+        limiter = RateLimiter(LIMITS)
+        for _ in range(20):
+            assert await limiter.check(1, "unknown") == 0
+        assert await limiter.check(1, "unknown") > 0
+
+    @pytest.mark.asyncio
+    async def test_backend_error_falls_back_to_memory(self, clock):
+        """Test that a failing shared backend does not disable limiting"""
+        backend = AsyncMock()
+        backend.acquire.side_effect = ConnectionError("redis down")
+        limiter = RateLimiter(LIMITS, backend=backend)
+
+        for _ in range(5):
+            assert await limiter.check(1, "photo") == 0
+        assert await limiter.check(1, "photo") > 0
+
+
+class TestMemoryRateLimitBackend:
+    """Test suite for the bounded in-memory backend"""
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_bounds_memory(self, clock):
+        """Test that the number of tracked keys never exceeds max_keys"""
+        backend = MemoryRateLimitBackend(max_keys=100)
+        for user_id in range(1000):
+            await backend.acquire(("general", user_id), 3.0, 60.0)
+
+        assert len(backend) == 100
+
+    @pytest.mark.asyncio
+    async def test_lru_keeps_recently_seen_keys(self, clock):
+        """Test that an active key survives eviction of idle ones"""
+        backend = MemoryRateLimitBackend(max_keys=3)
+        await backend.acquire(("photo", 1), 12.0, 60.0)
+        await backend.acquire(("photo", 2), 12.0, 60.0)
+        await backend.acquire(("photo", 3), 12.0, 60.0)
+        await backend.acquire(("photo", 1), 12.0, 60.0)
+        await backend.acquire(("photo", 4), 12.0, 60.0)
+
+        assert ("photo", 1) in backend._tats
+        assert ("photo", 2) not in backend._tats
+
+
+class TestCreateRateLimiter:
+    """Test suite for rate limiter factory"""
+
+    def test_memory_backend_without_redis_url(self):
+        """Test that no Redis URL means the in-memory backend"""
+        limiter = create_rate_limiter(LIMITS, max_keys=10)
+        assert limiter.backend is limiter.local_backend
+        assert limiter.local_backend.max_keys == 10
+
+    def test_redis_unavailable_falls_back_to_memory(self):
+        """Test that a missing redis package does not break startup"""
+        with patch('utils.rate_limiter.aioredis', None):
+            limiter = create_rate_limiter(LIMITS, redis_url="redis://localhost:6379/0")
+        assert limiter.backend is limiter.local_backend
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/report_charts.py and the weekly report chart
+"""
+
+import pytest
+import sys
+import os
+from datetime import date
+from unittest.mock import Mock, AsyncMock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import utils.report_charts as report_charts
+from utils.report_charts import ReportChartCache, week_series, chart_data_version, render_week_chart
+
+WEEK_END = date(2025, 3, 31)
+ROWS = [
+    {"day": "2025-03-31", "meals": 2, "calories": 1500, "protein": 90, "fats": 50, "carbs": 160},
+    {"day": "2025-03-27", "meals": 3, "calories": 2100, "protein": 120, "fats": 70, "carbs": 230},
+    {"day": "2025-03-20", "meals": 3, "calories": 2400, "protein": 100, "fats": 80, "carbs": 300},
+]
+TARGETS = {"calories": 2000, "protein": 125, "fats": 67, "carbs": 225}
+LABELS = {name: name for name in ("calories", "macros", "target", "protein", "fats", "carbs")}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ReportChartCache(str(tmp_path / "report_charts.db"))
+
+
+class TestReportCharts:
+    """Test suite for weekly report chart data and cache"""
+
+    def test_week_series(self):
+        """Test that the series covers the 7 days of the week with 0 for days without meals"""
+        series = week_series(ROWS, WEEK_END)
+
+        assert series["days"][0] == "2025-03-25"
+        assert series["days"][-1] == "2025-03-31"
+        assert series["calories"] == [0, 0, 2100, 0, 0, 0, 1500]
+        assert series["carbs"][2] == 230
+
+    def test_data_version(self):
+        """Test that the version changes with the data and not otherwise"""
+        series = week_series(ROWS, WEEK_END)
+        version = chart_data_version(series, TARGETS, LABELS)
+
+        assert chart_data_version(week_series(list(reversed(ROWS)), WEEK_END), TARGETS, LABELS) == version
+        more = [{**ROWS[0], "calories": 1900}] + ROWS[1:]
+        assert chart_data_version(week_series(more, WEEK_END), TARGETS, LABELS) != version
+        assert chart_data_version(series, {**TARGETS, "calories": 1800}, LABELS) != version
+
+    @pytest.mark.asyncio
+    async def test_cache(self, cache):
+        """Test that file_ids are found by user, week and data version"""
+        await cache.put("user-1", "2025-03-31", "v1", "file-1")
+
+        assert await cache.get("user-1", "2025-03-31", "v1") == "file-1"
+        assert await cache.get("user-1", "2025-03-31", "v2") is None
+        assert await cache.get("user-2", "2025-03-31", "v1") is None
+
+    def test_render_png(self):
+        """Test that the chart renders as PNG"""
+        pytest.importorskip("matplotlib")
+        png = render_week_chart(week_series(ROWS, WEEK_END), TARGETS, LABELS)
+
+        assert png.startswith(b"\x89PNG")
+
+    @pytest.mark.asyncio
+    async def test_send_uses_cached_file_id(self, cache):
+        """Test that a chart is rendered once and re-sent by file_id for the same data"""
+        from handlers.nutrition import send_weekly_chart
+
+        message = Mock()
+        message.answer_photo = AsyncMock(return_value=Mock(photo=[Mock(file_id="small"), Mock(file_id="file-1")]))
+        user = {"id": "user-1", "language": "en"}
+        profile = {"daily_calories_target": 2000, "goal": "maintain_weight"}
+        render = AsyncMock(return_value=b"\x89PNG")
+
+        with patch.object(report_charts, "charts_enabled", return_value=True), \
+             patch.object(report_charts, "report_chart_cache", cache), \
+             patch.object(report_charts, "render_chart", render):
+            await send_weekly_chart(message, user, profile, ROWS)
+            await send_weekly_chart(message, user, profile, ROWS)
+
+        render.assert_awaited_once()
+        assert message.answer_photo.call_args_list[1].args == ("file-1",)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/send_scheduler.py - outbound Telegram send scheduler
+"""
+
+import pytest
+import asyncio
+import sys
+import os
+from unittest.mock import AsyncMock
+from aiogram import methods
+from aiogram.exceptions import TelegramRetryAfter
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from utils.send_scheduler import OutboundScheduler, SendPriority, TokenBucket, send_priority
+
+
+def recording_request(sent: list):
+    """make_request replacement that records sent methods"""
+    async def make_request(bot, method):
+        sent.append(method)
+        return f"result:{getattr(method, 'text', None)}"
+    return make_request
+
+
+class TestTokenBucket:
+    """Test suite for token bucket reservations"""
+
+    def test_burst_then_wait(self):
+        """Test that capacity is available immediately and then refills at rate"""
+        bucket = TokenBucket(rate=1, capacity=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(1, abs=0.05)
+        assert bucket.reserve() == pytest.approx(2, abs=0.05)
+
+    def test_pause_blocks_bucket(self):
+        """Test that pause() delays the next token by the retry time"""
+        bucket = TokenBucket(rate=10, capacity=10)
+        bucket.pause(3)
+        assert bucket.delay() == pytest.approx(3.1, abs=0.05)
+
+
+class TestOutboundScheduler:
+    """Test suite for the request middleware"""
+
+    @pytest.mark.asyncio
+    async def test_non_send_methods_pass_through(self):
+        """Test that methods not limited by Telegram are not scheduled"""
+        scheduler = OutboundScheduler()
+        make_request = AsyncMock(return_value="me")
+
+        assert await scheduler(make_request, None, methods.GetMe()) == "me"
+        assert scheduler._pump_task is None
+
+    @pytest.mark.asyncio
+    async def test_send_message_is_delivered(self):
+        """Test that a send within limits goes straight through"""
+        scheduler = OutboundScheduler()
+        sent = []
+
+        result = await scheduler(recording_request(sent), None, methods.SendMessage(chat_id=1, text="hi"))
+
+        assert result == "result:hi"
+        assert len(sent) == 1
+
+    @pytest.mark.asyncio
+    async def test_high_priority_sent_before_queued_low_priority(self):
+        """Test that payment messages overtake bulk messages waiting for the global limit"""
+        scheduler = OutboundScheduler(global_rate=50)
+        scheduler.global_bucket.tokens = 0
+        sent = []
+        make_request = recording_request(sent)
+
+        async def send(chat_id, text, priority):
+            with send_priority(priority):
+                await scheduler(make_request, None, methods.SendMessage(chat_id=chat_id, text=text))
+
+        low = [asyncio.create_task(send(i, "low", SendPriority.LOW)) for i in range(1, 4)]
+        await asyncio.sleep(0)
+        high = asyncio.create_task(send(100, "payment", SendPriority.HIGH))
+        await asyncio.gather(*low, high)
+
+        assert sent[0].text == "payment"
+
+    @pytest.mark.asyncio
+    async def test_invoice_is_high_priority(self):
+        """Test that invoices are sent first even without explicit priority"""
+        scheduler = OutboundScheduler(global_rate=50)
+        scheduler.global_bucket.tokens = 0
+        sent = []
+        make_request = recording_request(sent)
+
+        with send_priority(SendPriority.LOW):
+            low = asyncio.create_task(scheduler(make_request, None, methods.SendMessage(chat_id=1, text="low")))
+        await asyncio.sleep(0)
+        invoice = methods.SendInvoice(
+            chat_id=2, title="Basic", description="20 credits", payload="credits_basic_2",
+            currency="RUB", prices=[{"label": "20 credits", "amount": 9900}]
+        )
+        await asyncio.gather(low, scheduler(make_request, None, invoice))
+
+        assert isinstance(sent[0], methods.SendInvoice)
+
+    @pytest.mark.asyncio
+    async def test_per_chat_limit_spaces_messages(self):
+        """Test that messages to one chat are spaced by the chat rate"""
+        scheduler = OutboundScheduler(chat_rate=20, chat_burst=1)
+        sent = []
+        make_request = recording_request(sent)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*[
+            scheduler(make_request, None, methods.SendMessage(chat_id=1, text=str(i))) for i in range(3)
+        ])
+
+        assert len(sent) == 3
+        assert loop.time() - started >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_retried(self):
+        """Test automatic retry after Telegram flood control"""
+        scheduler = OutboundScheduler(chat_rate=100)
+        method = methods.SendMessage(chat_id=1, text="hi")
+        make_request = AsyncMock(side_effect=[
+            TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0),
+            "ok"
+        ])
+
+        assert await scheduler(make_request, None, method) == "ok"
+        assert make_request.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_retry_after_gives_up(self):
+        """Test that the error is raised after max_retries"""
+        scheduler = OutboundScheduler(chat_rate=100, max_retries=2)
+        method = methods.SendMessage(chat_id=1, text="hi")
+        make_request = AsyncMock(
+            side_effect=TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=0)
+        )
+
+        with pytest.raises(TelegramRetryAfter):
+            await scheduler(make_request, None, method)
+        assert make_request.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_rapid_edits_are_coalesced(self):
+        """Test that only the latest of several waiting edits is sent"""
+        scheduler = OutboundScheduler(global_rate=50)
+        scheduler.global_bucket.tokens = 0
+        sent = []
+        make_request = recording_request(sent)
+
+        edits = [
+            scheduler(make_request, None, methods.EditMessageText(chat_id=1, message_id=10, text=f"step {i}"))
+            for i in range(3)
+        ]
+        results = await asyncio.gather(*edits)
+
+        assert [m.text for m in sent] == ["step 2"]
+        assert results == ["result:step 2"] * 3
+
+    @pytest.mark.asyncio
+    async def test_edits_of_different_messages_not_coalesced(self):
+        """Test that edits of different messages are all sent"""
+        scheduler = OutboundScheduler()
+        sent = []
+        make_request = recording_request(sent)
+
+        await asyncio.gather(
+            scheduler(make_request, None, methods.EditMessageText(chat_id=1, message_id=10, text="a")),
+            scheduler(make_request, None, methods.EditMessageText(chat_id=1, message_id=11, text="b"))
+        )
+
+        assert sorted(m.text for m in sent) == ["a", "b"]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/storage_stats.py and incremental R2 bucket statistics
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import utils.r2 as r2
+from utils.storage_stats import StorageStatsStore
+from utils.photo_index import PhotoIndex
+
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 100
+DAY_1 = datetime(2025, 1, 20, 12, tzinfo=timezone.utc)
+DAY_2 = datetime(2025, 1, 21, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return StorageStatsStore(str(tmp_path / "storage_stats.db"))
+
+
+@pytest.fixture
+def r2_enabled(stats, tmp_path):
+    with patch.object(r2, "R2_ENABLED", True), \
+         patch.object(r2, "R2_BUCKET_NAME", "bucket"), \
+         patch.object(r2, "_r2_client", None), \
+         patch.object(r2, "storage_stats", stats), \
+         patch.object(r2, "photo_index", PhotoIndex(str(tmp_path / "photos.db"))):
+        yield
+
+
+class TestStorageStatsStore:
+    """Test suite for storage usage counters"""
+
+    @pytest.mark.asyncio
+    async def test_record_upload(self, stats):
+        """Test that uploads update total, per-user and per-day counters"""
+        await stats.record_upload("user-a", 100, uploaded_at=DAY_1.timestamp())
+        await stats.record_upload("user-a", 50, uploaded_at=DAY_1.timestamp())
+        await stats.record_upload("user-b", 10, stored=False, uploaded_at=DAY_2.timestamp())
+
+        totals = await stats.get_totals()
+        assert (totals["photos"], totals["bytes"], totals["users"]) == (3, 160, 2)
+        assert (totals["stored_objects"], totals["stored_bytes"]) == (2, 150)
+        user = await stats.get_user("user-a")
+        assert (user["photos"], user["bytes"]) == (2, 150)
+        assert await stats.get_days() == [
+            {"day": "2025-01-21", "photos": 1, "bytes": 10},
+            {"day": "2025-01-20", "photos": 2, "bytes": 150},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_replace_all(self, stats):
+        """Test that a rescan replaces drifted counters"""
+        await stats.record_upload("gone-user", 999)
+
+        totals = await stats.replace_all([
+            ("user-a", 100, DAY_1.timestamp()),
+            ("user-b", 100, DAY_2.timestamp()),
+        ], stored_objects=1, stored_bytes=100)
+
+        assert (totals["photos"], totals["bytes"], totals["users"]) == (2, 200, 2)
+        assert (totals["stored_objects"], totals["stored_bytes"]) == (1, 100)
+        assert totals["last_rescan_at"] is not None
+        assert (await stats.get_user("gone-user"))["photos"] == 0
+
+
+class TestPhotoStats:
+    """Test suite for R2 photo statistics"""
+
+    @pytest.mark.asyncio
+    async def test_stats_read_counters_without_listing(self, r2_enabled):
+        """Test that stats come from counters maintained on upload"""
+        client = Mock()
+        with patch.object(r2.boto3, "client", return_value=client):
+            await r2.store_photo_in_r2(JPEG, "user-1234567890")
+            await r2.store_photo_in_r2(JPEG, "user-1234567890")
+            stats = await r2.get_photo_stats()
+
+        client.list_objects_v2.assert_not_called()
+        assert stats["total_photos"] == 2
+        assert stats["total_size"] == 2 * len(JPEG)
+        assert stats["total_users"] == 1
+        assert stats["avg_photos_per_user"] == 2.0
+        # The second upload has the same content and is not stored again
+        assert stats["stored_size"] == len(JPEG)
+        assert stats["dedup_saved_size"] == len(JPEG)
+
+    @pytest.mark.asyncio
+    async def test_stored_photo_indexed_for_another_user(self, r2_enabled):
+        """Test that a photo recognized without upload is counted for the new user"""
+        client = Mock()
+        with patch.object(r2.boto3, "client", return_value=client):
+            key = await r2.store_photo_in_r2(JPEG, "user-1")
+            assert await r2.index_stored_photo(key, "user-2", "nutrition_analysis") == key
+            assert await r2.index_stored_photo("user-1/2025/01/20/analysis/gone.jpg", "user-2") is None
+            stats = await r2.get_photo_stats()
+
+        client.put_object.assert_called_once()
+        assert stats["total_photos"] == 2
+        assert stats["total_users"] == 2
+        assert stats["stored_size"] == len(JPEG)
+        assert [photo["filename"] for photo in await r2.get_user_photos("user-2")] == [key]
+
+    @pytest.mark.asyncio
+    async def test_rescan_pages_through_bucket(self, r2_enabled):
+        """Test that a rescan follows continuation tokens past the first 1000 objects"""
+        pages = [
+            {"Contents": [{"Key": "user-a/2025/01/20/photo_analysis/1.jpg", "Size": 10, "LastModified": DAY_1}],
+             "IsTruncated": True, "NextContinuationToken": "next"},
+            {"Contents": [{"Key": "user-b/2025/01/21/photo_analysis/2.jpg", "Size": 30, "LastModified": DAY_2}],
+             "IsTruncated": False},
+        ]
+        client = Mock()
+        client.list_objects_v2.side_effect = pages
+        with patch.object(r2.boto3, "client", return_value=client):
+            stats = await r2.rescan_photo_stats()
+
+        assert client.list_objects_v2.call_count == 2
+        assert client.list_objects_v2.call_args.kwargs["ContinuationToken"] == "next"
+        assert (stats["total_photos"], stats["total_size"], stats["total_users"]) == (2, 40, 2)
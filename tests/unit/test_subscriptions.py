@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Unit tests for pay.c0r.ai/app/subscriptions.py
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+import time
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+# Add project paths (pay service last so its packages do not shadow installed ones)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../pay.c0r.ai/app'))
+
+from subscriptions import SubscriptionStore, RenewalEngine, add_interval, DUNNING_SCHEDULE
+
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SubscriptionStore(str(tmp_path / "subscriptions.db"))
+
+
+def make_engine(store, charge, fetch_payment=None, on_renewed=None, concurrency=20):
+    return RenewalEngine(store, charge=charge, fetch_payment=fetch_payment or AsyncMock(),
+                         intervals={"pro": "month"}, on_renewed=on_renewed, batch_size=50,
+                         concurrency=concurrency)
+
+
+def payment(status, payment_id="pay-1", reason=None):
+    result = {"id": payment_id, "status": status}
+    if reason:
+        result["cancellation_details"] = {"reason": reason}
+    return result
+
+
+async def add_due(store, user_id="1", days_overdue=1):
+    return await store.upsert(user_id, "pro", "yookassa", f"pm-{user_id}", time.time() - days_overdue * DAY)
+
+
+class TestAddInterval:
+    """Test suite for billing period arithmetic"""
+
+    def test_month_end_is_clamped(self):
+        """Test that Jan 31 renews on the last day of February"""
+        jan31 = datetime(2025, 1, 31, 12, tzinfo=timezone.utc).timestamp()
+        assert datetime.fromtimestamp(add_interval(jan31, "month"), tz=timezone.utc).date().isoformat() == "2025-02-28"
+
+    def test_december_rolls_over(self):
+        dec15 = datetime(2025, 12, 15, tzinfo=timezone.utc).timestamp()
+        assert datetime.fromtimestamp(add_interval(dec15, "month"), tz=timezone.utc).date().isoformat() == "2026-01-15"
+
+
+class TestSubscriptionStore:
+    """Test suite for subscription storage and leasing"""
+
+    @pytest.mark.asyncio
+    async def test_leased_rows_are_not_claimed_twice(self, store):
+        """Test that a claimed subscription is skipped until its lease expires"""
+        await add_due(store, "1")
+        await add_due(store, "2")
+
+        first = await store.claim_due(limit=10, lease_seconds=60)
+        second = await store.claim_due(limit=10, lease_seconds=60)
+        expired = await store.claim_due(limit=10, lease_seconds=-1)
+
+        assert {sub["user_id"] for sub in first} == {"1", "2"}
+        assert second == []
+        assert expired == []
+        await store._update(first[0]["id"])  # release
+        assert [sub["id"] for sub in await store.claim_due()] == [first[0]["id"]]
+
+    @pytest.mark.asyncio
+    async def test_redelivered_start_is_ignored(self, store):
+        """Test that a repeated subscription start with the same payment method changes nothing"""
+        assert await add_due(store, "1") is not None
+        assert await add_due(store, "1") is None
+        assert await store.upsert("1", "pro", "yookassa", "pm-new", time.time()) is not None
+
+
+class TestRenewalEngine:
+    """Test suite for subscription renewals"""
+
+    @pytest.mark.asyncio
+    async def test_successful_renewal(self, store):
+        """Test that a paid renewal advances the period and grants credits once"""
+        subscription = await add_due(store, "1", days_overdue=0.5)
+        charge = AsyncMock(return_value=payment("succeeded"))
+        on_renewed = AsyncMock()
+        engine = make_engine(store, charge, on_renewed=on_renewed)
+
+        assert await engine.run_once() == 1
+        assert await engine.run_once() == 0
+
+        renewed = await store.get(subscription["id"])
+        assert renewed["period"] == 2
+        assert renewed["paid_until"] == add_interval(subscription["paid_until"], "month")
+        assert renewed["next_charge_at"] == renewed["paid_until"]
+        assert renewed["last_payment_id"] == "pay-1"
+        charge.assert_awaited_once()
+        assert charge.await_args.args[1] == f"renewal-{subscription['id']}-1-0"
+        on_renewed.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_error_retries_with_same_idempotency_key(self, store):
+        """Test that a charge repeated after a provider error cannot charge twice"""
+        await add_due(store, "1")
+        charge = AsyncMock(side_effect=[ConnectionError("timeout"), payment("succeeded")])
+        engine = make_engine(store, charge)
+
+        await engine.run_once()
+        # Make the released subscription due again
+        for sub in await store.list_user("1"):
+            await store._update(sub["id"], next_charge_at=time.time() - 1)
+        await engine.run_once()
+
+        keys = [call.args[1] for call in charge.await_args_list]
+        assert len(keys) == 2 and keys[0] == keys[1]
+        assert engine.counters["errors"] == 1
+        assert engine.counters["renewed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_credit_grant_does_not_charge_again(self, store):
+        """Test that an error after a successful charge re-checks the payment instead of charging"""
+        subscription = await add_due(store, "1", days_overdue=0.5)
+        charge = AsyncMock(return_value=payment("succeeded"))
+        fetch_payment = AsyncMock(return_value=payment("succeeded"))
+        on_renewed = AsyncMock(side_effect=[ConnectionError("outbox down"), None])
+        engine = make_engine(store, charge, fetch_payment=fetch_payment, on_renewed=on_renewed)
+
+        await engine.run_once()
+        released = await store.get(subscription["id"])
+        assert released["period"] == 1
+        assert released["pending_payment_id"] == "pay-1"
+
+        await store._update(subscription["id"], next_charge_at=time.time() - 1)
+        await engine.run_once()
+
+        charge.assert_awaited_once()
+        fetch_payment.assert_awaited_once_with("pay-1")
+        assert on_renewed.await_count == 2
+        renewed = await store.get(subscription["id"])
+        assert renewed["period"] == 2
+        assert renewed["pending_payment_id"] is None
+
+    @pytest.mark.asyncio
+    async def test_pending_payment_is_polled(self, store):
+        """Test that a pending charge is checked by payment id instead of charged again"""
+        subscription = await add_due(store, "1")
+        charge = AsyncMock(return_value=payment("pending"))
+        fetch_payment = AsyncMock(return_value=payment("succeeded"))
+        engine = make_engine(store, charge, fetch_payment)
+
+        await engine.run_once()
+        assert (await store.get(subscription["id"]))["pending_payment_id"] == "pay-1"
+        await store._update(subscription["id"], next_charge_at=time.time() - 1)
+        await engine.run_once()
+
+        charge.assert_awaited_once()
+        fetch_payment.assert_awaited_once_with("pay-1")
+        assert (await store.get(subscription["id"]))["period"] == 2
+
+    @pytest.mark.asyncio
+    async def test_dunning_then_cancel(self, store):
+        """Test that declined charges follow the dunning schedule and finally cancel"""
+        subscription = await add_due(store, "1")
+        charge = AsyncMock(return_value=payment("canceled", reason="insufficient_funds"))
+        engine = make_engine(store, charge)
+
+        for attempt in range(len(DUNNING_SCHEDULE) + 1):
+            await engine.run_once()
+            current = await store.get(subscription["id"])
+            if attempt < len(DUNNING_SCHEDULE):
+                assert current["status"] == "past_due"
+                assert current["next_charge_at"] == pytest.approx(time.time() + DUNNING_SCHEDULE[attempt], abs=5)
+                await store._update(subscription["id"], next_charge_at=time.time() - 1)
+
+        assert current["status"] == "canceled"
+        assert current["failures"] == len(DUNNING_SCHEDULE) + 1
+        assert "insufficient_funds" in current["last_error"]
+        # Each dunning attempt is a new charge with its own key
+        keys = [call.args[1] for call in charge.await_args_list]
+        assert len(set(keys)) == len(keys) == len(DUNNING_SCHEDULE) + 1
+        assert await engine.run_once() == 0
+
+    @pytest.mark.asyncio
+    async def test_bounded_concurrency(self, store):
+        """Test that many due renewals are charged once each within the concurrency limit"""
+        for user in range(200):
+            await add_due(store, str(user))
+        in_flight = peak = 0
+
+        async def charge(subscription, key):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return payment("succeeded", f"pay-{subscription['id']}")
+
+        engine = make_engine(store, AsyncMock(side_effect=charge), concurrency=8)
+
+        assert await engine.run_once() == 200
+        assert peak <= 8
+        assert engine.counters["renewed"] == 200
+        stats = await store.stats()
+        assert stats["due"] == 0
+        assert stats["active"] == 200
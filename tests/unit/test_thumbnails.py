@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Unit tests for utils/thumbnails.py and photo derivative storage
+"""
+
+import io
+import pytest
+import sys
+import os
+from unittest.mock import Mock, AsyncMock, patch
+
+# Add project paths
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../api.c0r.ai/app'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+import utils.r2 as r2
+from utils.photo_index import PhotoIndex
+from utils.storage_stats import StorageStatsStore
+from utils.thumbnails import derivative_key, is_derivative_key, render_derivatives
+
+ORIGINAL_KEY = "user-1234567890/2025/01/20/photo_analysis/abc.jpg"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return PhotoIndex(str(tmp_path / "photos.db"))
+
+
+@pytest.fixture
+def r2_enabled(index, tmp_path):
+    with patch.object(r2, "R2_ENABLED", True), \
+         patch.object(r2, "R2_BUCKET_NAME", "bucket"), \
+         patch.object(r2, "_r2_client", None), \
+         patch.object(r2, "storage_stats", StorageStatsStore(str(tmp_path / "storage_stats.db"))), \
+         patch.object(r2, "photo_index", index):
+        yield
+
+
+class TestDerivativeKeys:
+    """Test suite for derivative naming"""
+
+    def test_derivative_key(self):
+        """Test that derivatives are stored next to the original"""
+        assert derivative_key(ORIGINAL_KEY, "thumb") == "user-1234567890/2025/01/20/photo_analysis/abc.thumb.webp"
+        assert is_derivative_key(derivative_key(ORIGINAL_KEY, "preview"))
+        assert not is_derivative_key(ORIGINAL_KEY)
+
+
+class TestRenderDerivatives:
+    """Test suite for WebP rendering"""
+
+    def test_render_sizes(self):
+        """Test that derivatives are downscaled WebP images"""
+        Image = pytest.importorskip("PIL.Image")
+        source = io.BytesIO()
+        Image.new("RGB", (2000, 1500), "red").save(source, format="JPEG")
+
+        derivatives = render_derivatives(source.getvalue(), {"thumb": 320, "preview": 1024}, 80)
+
+        with Image.open(io.BytesIO(derivatives["thumb"])) as thumb:
+            assert thumb.format == "WEBP"
+            assert thumb.size == (320, 240)
+        with Image.open(io.BytesIO(derivatives["preview"])) as preview:
+            assert preview.size == (1024, 768)
+
+
+class TestPhotoDerivatives:
+    """Test suite for derivative upload and index update"""
+
+    @pytest.mark.asyncio
+    async def test_derivatives_uploaded_and_indexed(self, r2_enabled, index):
+        """Test that derivatives are uploaded and served with photo history"""
+        await index.add(ORIGINAL_KEY, "user-1234567890", 5000, "photo_analysis")
+        client = Mock()
+        client.generate_presigned_url.side_effect = lambda *args, **kwargs: f"https://signed/{kwargs['Params']['Key']}"
+        rendered = {"thumb": b"thumb-bytes", "preview": b"preview-bytes"}
+
+        with patch.object(r2.boto3, "client", return_value=client), \
+             patch.object(r2, "generate_derivatives", AsyncMock(return_value=rendered)):
+            keys = await r2.create_photo_derivatives(ORIGINAL_KEY, b"original")
+            photos = await r2.get_user_photos("user-1234567890")
+
+        uploaded = {call.kwargs["Key"]: call.kwargs["Body"] for call in client.put_object.call_args_list}
+        assert uploaded == {keys["thumb"]: b"thumb-bytes", keys["preview"]: b"preview-bytes"}
+        assert client.put_object.call_args.kwargs["ContentType"] == "image/webp"
+        assert photos[0]["thumb_url"] == f"https://signed/{keys['thumb']}"
+        assert photos[0]["preview_url"] == f"https://signed/{keys['preview']}"
+
+    @pytest.mark.asyncio
+    async def test_derivative_failure_is_not_fatal(self, r2_enabled):
+        """Test that a broken image does not raise"""
+        with patch.object(r2.boto3, "client", return_value=Mock()), \
+             patch.object(r2, "generate_derivatives", AsyncMock(side_effect=OSError("cannot identify image"))):
+            assert await r2.create_photo_derivatives(ORIGINAL_KEY, b"broken") == {}
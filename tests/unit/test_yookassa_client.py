@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the async YooKassa client (pay.c0r.ai/app/yookassa_handlers/client.py)
+"""
+
+import httpx
+import pytest
+import sys
+import os
+from unittest.mock import AsyncMock, patch
+
+# Add project paths (pay service last so its packages do not shadow installed ones)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../pay.c0r.ai/app'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../benchmarks'))
+
+import yookassa_handlers.client as yookassa_client
+from yookassa_handlers.client import YooKassaClient, YooKassaError
+from fake_yookassa import create_app
+
+PAYMENT = {
+    "id": "pay-1", "status": "pending", "paid": False,
+    "amount": {"value": "10.00", "currency": "RUB"},
+    "confirmation": {"type": "redirect", "confirmation_url": "https://yoomoney.ru/checkout?orderId=pay-1"}
+}
+
+
+def make_client(responses: list, requests: list) -> YooKassaClient:
+    """Client whose transport returns the given responses (or raises exceptions) in order"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return YooKassaClient("shop", "secret", base_url="https://yookassa.test/v3", backoff_base=0,
+                          transport=httpx.MockTransport(handler))
+
+
+class TestYooKassaClient:
+    """Test suite for the YooKassa REST client"""
+
+    @pytest.mark.asyncio
+    async def test_retries_server_errors_with_same_idempotency_key(self):
+        """Test that a failed creation is repeated with the same Idempotence-Key"""
+        requests = []
+        client = make_client([
+            httpx.Response(500, json={"type": "error", "code": "internal_server_error"}),
+            httpx.ConnectError("connection reset"),
+            httpx.Response(200, json=PAYMENT),
+        ], requests)
+
+        payment = await client.create_payment({"amount": PAYMENT["amount"]}, "key-1")
+
+        assert payment["id"] == "pay-1"
+        assert len(requests) == 3
+        assert {request.headers["Idempotence-Key"] for request in requests} == {"key-1"}
+        assert requests[0].headers["Authorization"].startswith("Basic ")
+        await client.aclose()
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        """Test that a rejected request raises immediately"""
+        requests = []
+        client = make_client([
+            httpx.Response(400, json={"type": "error", "code": "invalid_request", "description": "Bad amount"}),
+        ], requests)
+
+        with pytest.raises(YooKassaError) as error:
+            await client.create_payment({}, "key-1")
+
+        assert error.value.status_code == 400
+        assert error.value.code == "invalid_request"
+        assert len(requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_processing_response_is_repeated(self):
+        """Test that a 202 (still processing) response is polled until the result is ready"""
+        requests = []
+        client = make_client([
+            httpx.Response(202, json={"type": "processing", "retry_after": 1}),
+            httpx.Response(200, json=PAYMENT),
+        ], requests)
+
+        assert (await client.get_payment("pay-1"))["status"] == "pending"
+        assert len(requests) == 2
+
+    @pytest.mark.asyncio
+    async def test_non_json_server_error_is_retried(self):
+        """Test that a proxy's HTML 503 and a non-JSON 202 are retried instead of failing to parse"""
+        requests = []
+        client = make_client([
+            httpx.Response(503, text="<html>Service Unavailable</html>"),
+            httpx.Response(202, text=""),
+            httpx.Response(200, json=PAYMENT),
+        ], requests)
+
+        with patch("yookassa_handlers.client.asyncio.sleep", AsyncMock()):
+            assert (await client.get_payment("pay-1"))["id"] == "pay-1"
+        assert len(requests) == 3
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        """Test that retries are bounded"""
+        requests = []
+        client = make_client([httpx.Response(503, json={})] * 4, requests)
+
+        with pytest.raises(YooKassaError) as error:
+            await client.get_payment("pay-1")
+
+        assert error.value.retryable
+        assert len(requests) == client.max_retries + 1
+
+    @pytest.mark.asyncio
+    async def test_invoice_against_fake_server(self):
+        """Test invoice creation and verification end to end against the fake YooKassa API"""
+        app = create_app(error_rate=0.0)
+        client = YooKassaClient("shop", "secret", base_url="http://fake/v3", backoff_base=0,
+                                transport=httpx.ASGITransport(app=app))
+        with patch.object(yookassa_client, "_yookassa_client", client), \
+             patch.object(yookassa_client, "YOOKASSA_SHOP_ID", "shop"), \
+             patch.object(yookassa_client, "YOOKASSA_SECRET_KEY", "secret"):
+            first = await yookassa_client.create_yookassa_invoice(42, "basic", idempotency_key="buy-1")
+            again = await yookassa_client.create_yookassa_invoice(42, "basic", idempotency_key="buy-1")
+            verified = await yookassa_client.verify_yookassa_payment(first["payment_id"])
+
+        assert first["invoice_url"].endswith(first["payment_id"])
+        assert again["payment_id"] == first["payment_id"]
+        assert verified["status"] == "pending"
+        assert verified["metadata"]["user_id"] == "42"
+        assert app.state.stats["created"] == 1
+        assert app.state.stats["replayed"] == 1
+        await client.aclose()